@@ -0,0 +1,212 @@
+"""
+Benchmark de cold start dos dois Lambdas: tempo de import do módulo e tempo até o primeiro retorno
+do lambda_handler, cada execução em um processo Python novo (como um container recém-criado).
+
+Os clientes boto3 são criados normalmente (o custo de criação faz parte da medida), mas apontam
+para um stub HTTP local de S3/SES (AWS_ENDPOINT_URL); o webservice é o fake_saudi_server.
+
+Falha (código de saída 1) se:
+- a mediana de algum tempo ultrapassar o orçamento em cold_start_budget.json;
+- o boto3 for importado no import do módulo, ou o cliente SES for criado na cópia sem erro.
+
+Uso:
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --importtime          # lista os imports mais pesados
+    python benchmarks/bench_cold_start.py --update-budget       # grava o orçamento (medianas x margem)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'buckets_s3'))
+BUDGET_FILE = os.path.join(BASE_DIR, 'cold_start_budget.json')
+sys.path.insert(0, BASE_DIR)
+
+from fake_saudi_server import FakeSaudiServer
+
+CSV_CONTENT = b'id;nome;cpf\n' + b''.join(b'%d;BENEFICIARIO %d;%011d\n' % (i, i, i) for i in range(100))
+ETAG = '0123456789abcdef0123456789abcdef'
+
+EVENTS = {
+    's3_copy_fail_email': {'Records': [{
+        'eventName': 'ObjectCreated:Put',
+        's3': {
+            'bucket': {'name': 'ferj-prod-snowflake-relatorio'},
+            'object': {'key': 'voxis/relatorio.csv.gz', 'size': 1024, 'eTag': ETAG}
+        }
+    }]},
+    's3_csv_to_api_soap': {'Records': [{
+        's3': {'bucket': {'name': 'bench-saudi-voxis'}, 'object': {'key': 'entrada/arquivo.csv', 'eTag': ETAG}}
+    }]}
+}
+
+# Executado em um processo novo para cada medida
+CHILD_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+boto3_at_import = 'boto3' in sys.modules
+response = module.lambda_handler(json.loads(sys.argv[2]), None)
+returned = time.perf_counter()
+import aws_clients
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_return_ms': (returned - start) * 1000,
+    'status_code': response['statusCode'],
+    'boto3_at_import': boto3_at_import,
+    'clients': sorted(aws_clients._clients)
+}))
+'''
+
+
+class StubAwsHandler(BaseHTTPRequestHandler):
+    """Respostas mínimas de S3 (GetObject, CopyObject, DeleteObject) e SES (SendEmail)."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(200, CSV_CONTENT, {'ETag': f'"{ETAG}"', 'Content-Type': 'text/csv'})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = (
+            f'<CopyObjectResult><ETag>"{ETAG}"</ETag>'
+            f'<LastModified>2025-01-01T00:00:00.000Z</LastModified></CopyObjectResult>'
+        ).encode()
+        self._send(200, body, {'Content-Type': 'application/xml'})
+
+    def do_DELETE(self):
+        self._send(204)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = (
+            b'<SendEmailResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">'
+            b'<SendEmailResult><MessageId>stub</MessageId></SendEmailResult>'
+            b'<ResponseMetadata><RequestId>stub</RequestId></ResponseMetadata></SendEmailResponse>'
+        )
+        self._send(200, body, {'Content-Type': 'text/xml'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_child(module_name, env, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', CHILD_SCRIPT, module_name, json.dumps(EVENTS[module_name])]
+    completed = subprocess.run(command, cwd=LAMBDA_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{module_name} falhou:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, completed.stderr
+
+
+def heaviest_imports(importtime_output, module_name, top=10):
+    """Imports com maior tempo cumulativo (µs) abaixo do módulo do Lambda."""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Processos novos por Lambda')
+    parser.add_argument('--importtime', action='store_true', help='Mostra os imports mais pesados (python -X importtime)')
+    parser.add_argument('--update-budget', action='store_true', help='Grava as medianas x --margin como orçamento')
+    parser.add_argument('--margin', type=float, default=2.0, help='Margem sobre a mediana ao gravar o orçamento')
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubAwsHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    failures = []
+    medians = {}
+    with FakeSaudiServer() as saudi:
+        env = dict(
+            os.environ,
+            AWS_ENDPOINT_URL=f"http://127.0.0.1:{stub.server_address[1]}",
+            AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing',
+            WS_URL=saudi.url, WS_LOGIN='bench', WS_PASSWORD='bench', CLIENT_CODE='0000',
+            EMAIL_RECIPIENTS='equipe@empresa.com.br',
+            # O stub responde HEAD com sucesso: sem isso a cópia seria dispensada como idêntica
+            COPY_SKIP_IDENTICAL='false'
+        )
+        for module_name in EVENTS:
+            results = [run_child(module_name, env)[0] for _ in range(args.runs)]
+            medians[module_name] = {
+                name: round(statistics.median(result[name] for result in results), 1)
+                for name in ('import_ms', 'first_return_ms')
+            }
+            last = results[-1]
+            print(f"{module_name}: import {medians[module_name]['import_ms']} ms, "
+                  f"primeiro retorno {medians[module_name]['first_return_ms']} ms "
+                  f"(statusCode {last['status_code']}, clientes criados: {', '.join(last['clients'])})")
+
+            if last['status_code'] != 200:
+                failures.append(f"{module_name}: statusCode {last['status_code']}")
+            if any(result['boto3_at_import'] for result in results):
+                failures.append(f"{module_name}: boto3 importado no import do módulo")
+            if module_name == 's3_copy_fail_email' and 'ses' in last['clients']:
+                failures.append(f"{module_name}: cliente SES criado em uma cópia sem erro")
+
+            if args.importtime:
+                _, output = run_child(module_name, env, importtime=True)
+                for cumulative, name in heaviest_imports(output, module_name):
+                    print(f"    {cumulative / 1000:>8.1f} ms  {name.strip()}")
+
+    stub.shutdown()
+
+    if args.update_budget:
+        budget = {
+            module_name: {name: round(value * args.margin) for name, value in values.items()}
+            for module_name, values in medians.items()
+        }
+        with open(BUDGET_FILE, 'w') as budget_file:
+            json.dump(budget, budget_file, indent=2)
+            budget_file.write('\n')
+        print(f"Orçamento gravado em {BUDGET_FILE}")
+    elif os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as budget_file:
+            budget = json.load(budget_file)
+        for module_name, values in medians.items():
+            for name, value in values.items():
+                limit = budget.get(module_name, {}).get(name)
+                if limit is not None and value > limit:
+                    failures.append(f"{module_name}: {name} {value} ms acima do orçamento de {limit} ms")
+
+    if failures:
+        print('\nREGRESSÃO DE COLD START:')
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print('\nCold start dentro do orçamento')
+
+
+if __name__ == '__main__':
+    main()
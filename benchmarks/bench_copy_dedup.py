@@ -0,0 +1,159 @@
+"""
+Benchmark: reexportações do Lambda de cópia com e sem a dispensa de cópias idênticas (COPY_SKIP_IDENTICAL),
+usando o S3 do moto.
+
+Uma exportação inicial cria --files arquivos na origem; em seguida o mesmo lote é reexportado --rounds vezes,
+cada vez com --changed da fração dos arquivos alterada. Para cada modo são medidos: tempo das reexportações,
+chamadas de cópia ao S3 (CopyObject/UploadPartCopy), HEADs no destino e bytes copiados. O modo "sem cache"
+esvazia o cache de ETags antes de cada reexportação (container novo: só o HEAD condicional).
+Cada chamada ao S3 espera --latency-ms, simulando o tempo de ida e volta de uma requisição ao S3 real.
+
+Falha (código de saída 1) se, com a dispensa ativa, forem copiados arquivos não alterados, se algum arquivo
+alterado não for copiado ou se o destino terminar diferente da origem.
+
+Uso:
+    python benchmarks/bench_copy_dedup.py --files 200 --rounds 3 --changed 0.1 --size-kb 256 --latency-ms 20
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+from s3_copy_dedup import DestinationEtagCache
+
+KB = 1024
+
+
+class CallCounter:
+    """Conta as chamadas ao S3 por operação e aplica a latência simulada."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = {}
+
+    def __call__(self, model, **kwargs):
+        self.calls[model.name] = self.calls.get(model.name, 0) + 1
+        time.sleep(self.latency)
+
+
+def export(s3, module, keys, changed, size):
+    """Grava (ou regrava) os arquivos alterados na origem e monta o evento com todos os arquivos do lote."""
+    records = []
+    for key in keys:
+        if key in changed:
+            s3.put_object(Bucket=module.SOURCE_BUCKET, Key=key, Body=os.urandom(size))
+        head = s3.head_object(Bucket=module.SOURCE_BUCKET, Key=key)
+        records.append({
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': module.SOURCE_BUCKET},
+                'object': {'key': key, 'size': head['ContentLength'], 'eTag': head['ETag'].strip('"')}
+            }
+        })
+    return {'Records': records}
+
+
+def destination_matches(s3, module, keys):
+    routing_table = module.route_loader.get()
+    for key in keys:
+        source = s3.head_object(Bucket=module.SOURCE_BUCKET, Key=key)
+        # Destino pela mesma tabela de rotas do Lambda
+        _, destination_bucket, destination_key = routing_table.match(module.SOURCE_BUCKET, key)
+        destination = s3.head_object(Bucket=destination_bucket, Key=destination_key)
+        if source['ETag'] != destination['ETag']:
+            return False
+    return True
+
+
+def run_mode(module, counter, mode, args):
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket=module.SOURCE_BUCKET)
+    s3.create_bucket(Bucket=module.DESTINATION_BUCKET)
+    module.destination_etags = DestinationEtagCache(module.COPY_ETAG_CACHE_SIZE, module.COPY_ETAG_CACHE_TTL)
+    module.COPY_SKIP_IDENTICAL = mode != 'sem dispensa'
+    rng = random.Random(42)
+    keys = [f"voxis/relatorio_{i:05d}.csv.gz" for i in range(args.files)]
+    size = args.size_kb * KB
+
+    module.lambda_handler(export(s3, module, keys, set(keys), size), None)
+
+    elapsed = 0.0
+    copied = identical = expected = 0
+    counter.calls.clear()
+    for _ in range(args.rounds):
+        changed = set(rng.sample(keys, int(len(keys) * args.changed)))
+        expected += len(changed)
+        event = export(s3, module, keys, changed, size)
+        if mode == 'sem cache':
+            module.destination_etags = DestinationEtagCache(module.COPY_ETAG_CACHE_SIZE, module.COPY_ETAG_CACHE_TTL)
+        start = time.perf_counter()
+        body = json.loads(module.lambda_handler(event, None)['body'])
+        elapsed += time.perf_counter() - start
+        copied += body['copied_files']
+        identical += body['identical_files']
+
+    copy_calls = counter.calls.get('CopyObject', 0) + counter.calls.get('UploadPartCopy', 0)
+    return {
+        'elapsed': elapsed,
+        'copied': copied,
+        'identical': identical,
+        'expected': expected,
+        'copy_calls': copy_calls,
+        'heads': counter.calls.get('HeadObject', 0),
+        'bytes_copied': copied * size,
+        'consistent': destination_matches(s3, module, keys)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200, help='Arquivos por exportação')
+    parser.add_argument('--rounds', type=int, default=3, help='Reexportações do lote')
+    parser.add_argument('--changed', type=float, default=0.1, help='Fração dos arquivos alterada a cada reexportação')
+    parser.add_argument('--size-kb', type=int, default=256, help='Tamanho de cada arquivo (KB)')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Latência simulada por chamada ao S3 (ms)')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    failed = False
+    print(
+        f"{args.files} arquivos de {args.size_kb} KB, {args.rounds} reexportações com {args.changed:.0%} alterados, "
+        f"{args.latency_ms:g} ms por chamada ao S3\n"
+    )
+    print(f"{'modo':<13} {'tempo (s)':>10} {'cópias':>7} {'idênticos':>10} {'chamadas cópia':>15} {'HEADs':>6} {'MB copiados':>12}")
+    for mode in ('sem dispensa', 'sem cache', 'com cache'):
+        with mock_aws():
+            import s3_copy_fail_email as module
+            counter = CallCounter(args.latency_ms / 1000)
+            module.get_s3_client().meta.events.register('before-call.s3.*', counter)
+            result = run_mode(module, counter, mode, args)
+            module.get_s3_client().meta.events.unregister('before-call.s3.*', counter)
+        print(
+            f"{mode:<13} {result['elapsed']:>10.2f} {result['copied']:>7} {result['identical']:>10} "
+            f"{result['copy_calls']:>15} {result['heads']:>6} {result['bytes_copied'] / KB / KB:>12.1f}"
+        )
+        if not result['consistent']:
+            print(f"  ERRO: destino diferente da origem no modo {mode}")
+            failed = True
+        if mode != 'sem dispensa' and result['copied'] != result['expected']:
+            print(f"  ERRO: {result['copied']} cópias, esperadas {result['expected']} (arquivos alterados)")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
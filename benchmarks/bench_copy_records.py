@@ -0,0 +1,104 @@
+"""
+Benchmark: registros por segundo do s3_copy_fail_email.lambda_handler com 1, 10 e 200 registros por evento,
+usando o S3 do moto.
+
+Compara o fluxo anterior (head_object na origem, copy_object e head_object no destino, um registro por vez)
+com o fluxo atual (cópia condicional verificada pelo CopyObjectResult), em série e em paralelo.
+Cada chamada ao S3 espera --latency-ms, simulando o tempo de ida e volta de uma requisição ao S3 real.
+
+Uso:
+    python benchmarks/bench_copy_records.py --records 1,10,200 --latency-ms 20 --concurrency 8
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from urllib.parse import unquote_plus
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+
+def build_event(s3, module, count):
+    """Cria count arquivos .csv.gz na origem e o evento S3 correspondente."""
+    records = []
+    for i in range(count):
+        key = f"voxis/relatorio_{count}_{i:04d}.csv.gz"
+        body = os.urandom(64 * 1024)
+        response = s3.put_object(Bucket=module.SOURCE_BUCKET, Key=key, Body=body)
+        records.append({
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': module.SOURCE_BUCKET},
+                'object': {'key': key, 'size': len(body), 'eTag': response['ETag'].strip('"')}
+            }
+        })
+    return {'Records': records}
+
+
+def legacy_handler(module, event):
+    """Fluxo anterior: três chamadas em série por registro."""
+    s3_client = module.get_s3_client()
+    for record in event['Records']:
+        object_key = unquote_plus(record['s3']['object']['key'])
+        # Destino pela mesma tabela de rotas do Lambda
+        _, destination_bucket, destination_key = module.route_loader.get().match(module.SOURCE_BUCKET, object_key)
+        s3_client.head_object(Bucket=module.SOURCE_BUCKET, Key=object_key)
+        s3_client.copy_object(
+            CopySource={'Bucket': module.SOURCE_BUCKET, 'Key': object_key},
+            Bucket=destination_bucket, Key=destination_key
+        )
+        s3_client.head_object(Bucket=destination_bucket, Key=destination_key)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', default='1,10,200', help='Registros por evento, separados por vírgula')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Latência simulada por chamada ao S3 (ms)')
+    parser.add_argument('--concurrency', type=int, default=8, help='COPY_RECORD_CONCURRENCY do modo paralelo')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    os.environ['COPY_RECORD_CONCURRENCY'] = str(args.concurrency)
+
+    with mock_aws():
+        import s3_copy_fail_email as module
+        # O mesmo evento é copiado em cada modo: mede a cópia, não a verificação de destino idêntico
+        module.COPY_SKIP_IDENTICAL = False
+
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=module.SOURCE_BUCKET)
+        s3.create_bucket(Bucket=module.DESTINATION_BUCKET)
+        module.get_s3_client().meta.events.register(
+            'before-call.s3.*', lambda **kwargs: time.sleep(args.latency_ms / 1000)
+        )
+
+        print(f"{'registros':>9} {'anterior (reg/s)':>17} {'série (reg/s)':>14} {'paralelo (reg/s)':>17}")
+        for count in (int(n) for n in args.records.split(',')):
+            event = build_event(s3, module, count)
+            legacy_time = timed(legacy_handler, module, event)
+
+            module.COPY_RECORD_CONCURRENCY = 1
+            serial_time = timed(module.lambda_handler, event, None)
+            module.COPY_RECORD_CONCURRENCY = args.concurrency
+            parallel_time = timed(module.lambda_handler, event, None)
+
+            print(f"{count:>9} {count / legacy_time:>17.1f} {count / serial_time:>14.1f} {count / parallel_time:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
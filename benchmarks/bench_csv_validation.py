@@ -0,0 +1,73 @@
+"""
+Benchmark da validação de CSV (csv_validation) no caminho de envio em streaming.
+
+Mede a vazão do encode base64 em streaming com e sem o ValidatingStream, sem rede,
+ou seja, o pior caso para o custo relativo da validação (no Lambda o envio ao webservice domina).
+
+Uso:
+    python benchmarks/bench_csv_validation.py --size-mb 200
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+from csv_validation import CsvValidator, preflight
+
+CHUNK_SIZE = 768 * 1024
+
+
+def generate_csv(size_mb):
+    """Gera um CSV sintético de aproximadamente size_mb MB."""
+    header = b'id;nome;cpf;plano;data_nascimento\n'
+    row = b'%08d;BENEFICIARIO TESTE %08d;%011d;PLANO-A;1980-05-17\n'
+    rows_needed = size_mb * 1024 * 1024 // len(row % (0, 0, 0))
+    return header + b''.join(row % (i, i, i) for i in range(rows_needed))
+
+
+def encode(stream):
+    import base64
+    total = 0
+    remainder = b''
+    while True:
+        data = stream.read(CHUNK_SIZE)
+        if not data:
+            break
+        data = remainder + data
+        aligned = len(data) - len(data) % 3
+        remainder = data[aligned:]
+        total += len(base64.b64encode(data[:aligned]))
+    return total
+
+
+def timed(label, data, build_stream, baseline=None):
+    start = time.perf_counter()
+    encode(build_stream(data))
+    elapsed = time.perf_counter() - start
+    size_mb = len(data) / (1024 * 1024)
+    overhead = f"{(elapsed / baseline - 1) * 100:>+9.1f}%" if baseline else f"{'-':>10}"
+    print(f"{label:>34} {elapsed:>9.2f} {size_mb / elapsed:>9.1f} {overhead}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=100)
+    args = parser.parse_args()
+
+    data = generate_csv(args.size_mb)
+    print(f"{'cenário':>34} {'tempo (s)':>9} {'MB/s':>9} {'custo':>10}")
+    baseline = timed('apenas base64', data, io.BytesIO)
+    timed('base64 + validação estrutural', data,
+          lambda d: preflight(io.BytesIO(d), CsvValidator(), 1000), baseline)
+    rules = {'cpf': r'\d{11}', 'data_nascimento': 'date', 'id': 'int'}
+    timed('base64 + validação com regras', data,
+          lambda d: preflight(io.BytesIO(d), CsvValidator(rules=rules), 1000), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: modo delta do Lambda SOAP (soap_delta) com --rows linhas (padrão 10 milhões).
+
+Etapas medidas, com um CSV sintético de beneficiários gerado em streaming (sem disco):
+- índice: leitura do arquivo do dia anterior montando o índice (hashes de 64 bits ordenados), como no primeiro envio;
+- serialização: tamanho do índice gravado no S3 e tempo de to_bytes/from_bytes;
+- diff: arquivo do dia com --changed da fração das linhas alteradas, --inserted novas e --removed removidas,
+  comparado com o índice, gravando o CSV delta em /tmp.
+
+Para cada etapa: tempo, linhas/s e pico de memória do processo (ru_maxrss). Falha (código de saída 1) se as
+contagens de linhas novas, alteradas, inalteradas, removidas ou enviadas divergirem das geradas.
+
+Uso:
+    python benchmarks/bench_delta.py --rows 10000000 --changed 0.02 --inserted 0.001 --removed 0.001
+"""
+import argparse
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+from soap_delta import RowIndex, build_delta
+
+MB = 1024 * 1024
+HEADER = b'id_beneficiario;cpf;nome;data_nascimento;plano;situacao;valor_mensalidade\n'
+
+
+class SyntheticCsv:
+    """
+    CSV sintético lido em blocos: linhas 0..rows-1, exceto as removidas (a cada removed_every), com o valor
+    alterado a cada changed_every e inserted linhas novas no final.
+    """
+
+    def __init__(self, rows, changed_every=0, removed_every=0, inserted=0):
+        self._lines = self._generate(rows, changed_every, removed_every, inserted)
+        self._buffer = bytearray(HEADER)
+        self.bytes = 0
+
+    @staticmethod
+    def _generate(rows, changed_every, removed_every, inserted):
+        for i in range(rows + inserted):
+            if i < rows and removed_every and i % removed_every == removed_every - 1:
+                continue
+            value = i % 997 + (5 if i < rows and changed_every and i % changed_every == 0 else 0)
+            yield (
+                f"{i};{i * 7919 % 10 ** 11:011d};BENEFICIARIO {i};19{i % 90 + 10}-0{i % 9 + 1}-1{i % 9};"
+                f"PLANO {i % 40};ATIVO;{value}.90\n"
+            ).encode()
+
+    def read(self, size=-1):
+        while len(self._buffer) < size:
+            chunk = b''.join(line for _, line in zip(range(4096), self._lines))
+            if not chunk:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.bytes += len(data)
+        return data
+
+
+def expected_counts(rows, changed_every, removed_every, inserted):
+    removed = rows // removed_every if removed_every else 0
+    changed = sum(
+        1 for i in range(0, rows, changed_every)
+        if not (removed_every and i % removed_every == removed_every - 1)
+    ) if changed_every else 0
+    return {
+        'linhas': rows - removed + inserted,
+        'linhas_novas': inserted,
+        'linhas_alteradas': changed,
+        'linhas_inalteradas': rows - removed - changed,
+        'linhas_removidas': removed,
+        'linhas_enviadas': changed + inserted
+    }
+
+
+def peak_memory_mb():
+    # ru_maxrss em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(name, seconds, rows, extra=''):
+    print(f"{name:<14} {seconds:>9.2f} {rows / seconds:>12,.0f} {peak_memory_mb():>13.0f}  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10 ** 7, help='Linhas do arquivo do dia anterior')
+    parser.add_argument('--changed', type=float, default=0.02, help='Fração das linhas alteradas')
+    parser.add_argument('--inserted', type=float, default=0.001, help='Fração de linhas novas')
+    parser.add_argument('--removed', type=float, default=0.001, help='Fração de linhas removidas')
+    parser.add_argument('--key-column', default='id_beneficiario', help='Coluna chave')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    changed_every = round(1 / args.changed) if args.changed else 0
+    removed_every = round(1 / args.removed) if args.removed else 0
+    inserted = int(args.rows * args.inserted)
+
+    print(f"{args.rows:,} linhas, {args.changed:.1%} alteradas, {args.inserted:.1%} novas, {args.removed:.1%} removidas\n")
+    print(f"{'etapa':<14} {'tempo (s)':>9} {'linhas/s':>12} {'pico mem (MB)':>13}")
+
+    previous_file = SyntheticCsv(args.rows)
+    start = time.perf_counter()
+    index, _ = build_delta(previous_file, key_column=args.key_column)
+    report('índice', time.perf_counter() - start, args.rows, f"{previous_file.bytes / MB:,.0f} MB de CSV")
+
+    start = time.perf_counter()
+    data = index.to_bytes()
+    loaded = RowIndex.from_bytes(data)
+    report('serialização', time.perf_counter() - start, args.rows, f"índice de {len(data) / MB:,.0f} MB")
+    del index, data
+
+    current_file = SyntheticCsv(args.rows, changed_every, removed_every, inserted)
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        _, stats = build_delta(current_file, loaded, output, key_column=args.key_column)
+        elapsed = time.perf_counter() - start
+        delta_size = output.tell()
+    report('diff', elapsed, stats['linhas'], (
+        f"delta de {delta_size / MB:,.1f} MB ({delta_size / current_file.bytes:.1%} dos {current_file.bytes / MB:,.0f} MB)"
+    ))
+
+    expected = expected_counts(args.rows, changed_every, removed_every, inserted)
+    print('\n' + ', '.join(f"{name}: {stats[name]:,}" for name in expected))
+    mismatches = {name: (stats[name], value) for name, value in expected.items() if stats[name] != value}
+    if stats['modo'] != 'delta' or mismatches:
+        print(f"ERRO: contagens divergentes (obtido, esperado): {mismatches}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Teste de carga local dos dois Lambdas, sem acessar AWS nem o webservice de produção.
+
+Para cada tamanho de arquivo (CSV sintético de 1 KB a 1 GB), executa o lambda_handler várias vezes
+em um processo Python próprio (como um container reutilizado entre invocações) e mede:
+- latência p50/p99 das invocações;
+- vazão (MB/s, pela mediana);
+- pico de memória do processo (VmHWM, equivalente ao "Max Memory Used" do Lambda).
+
+S3 e SES são servidos pelo moto em modo servidor (AWS_ENDPOINT_URL), para que a memória do moto não
+seja contada no processo do Lambda; o webservice é o fake_saudi_server, com latência, taxa de
+rejeição, taxa de falhas e tamanho de resposta configuráveis. Demais variáveis do Lambda
+(ex: SPLIT_MODE, STREAM_CHUNK_SIZE) são repassadas do ambiente.
+
+Com --output os resultados são gravados em JSON; com --baseline são comparados a uma execução
+anterior (ex: de outro commit).
+
+Uso:
+    python benchmarks/bench_load.py --sizes 1KB,1MB,10MB,100MB --iterations 5
+    python benchmarks/bench_load.py --lambdas soap --sizes 1GB --iterations 3 --latency-per-mb 0.02
+    python benchmarks/bench_load.py --rejection-rate 0.05 --response-size 65536 --output atual.json --baseline anterior.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'buckets_s3'))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, LAMBDA_DIR)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto.server import ThreadedMotoServer
+
+from bench_multipart_copy import install_ranged_part_copy
+from fake_saudi_server import FakeSaudiServer
+from synthetic_csv import format_size, parse_size, write_csv
+
+import s3_copy_fail_email
+
+SOAP_BUCKET = 'bench-saudi-voxis'
+EMAIL_SENDER = 'no-reply@empresa.com.br'
+LAMBDAS = {'soap': 's3_csv_to_api_soap', 'copy': 's3_copy_fail_email'}
+
+# Executado em um processo novo para cada tamanho de arquivo
+CHILD_SCRIPT = '''
+import io, json, logging, resource, sys, time
+logging.disable(logging.CRITICAL)
+
+def peak_rss():
+    # VmHWM é o pico do próprio processo; o ru_maxrss herda o RSS do processo pai no fork/exec
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+module = __import__(sys.argv[1])
+event = json.loads(sys.argv[2])
+warmup, iterations = int(sys.argv[3]), int(sys.argv[4])
+latencies, status_codes, stages = [], [], {}
+for i in range(warmup + iterations):
+    captured = io.StringIO()
+    stdout, sys.stdout = sys.stdout, captured
+    start = time.perf_counter()
+    try:
+        response = module.lambda_handler(event, None)
+    finally:
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - start
+    if i < warmup:
+        continue
+    latencies.append(elapsed)
+    status_codes.append(response.get('statusCode'))
+    for line in captured.getvalue().splitlines():
+        if line.startswith('{') and '"_aws"' in line:
+            for name, value in json.loads(line).items():
+                if name.endswith('.Duration'):
+                    stages.setdefault(name[:-len('.Duration')], []).append(value)
+print(json.dumps({
+    'latencies': latencies,
+    'status_codes': status_codes,
+    'max_rss': peak_rss(),
+    'stages_ms': {name: sum(values) / len(values) for name, values in stages.items()}
+}))
+'''
+
+
+def percentile(values, p):
+    """Percentil pelo método nearest-rank."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_lambda(module_name, event, env, warmup, iterations):
+    command = [sys.executable, '-c', CHILD_SCRIPT, module_name, json.dumps(event), str(warmup), str(iterations)]
+    completed = subprocess.run(command, cwd=LAMBDA_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{module_name} falhou:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def build_events(s3, path, label):
+    """Envia o arquivo para as origens dos dois Lambdas e monta os eventos S3 correspondentes."""
+    soap_key = f"bench/carga_{label}.csv"
+    s3.upload_file(path, SOAP_BUCKET, soap_key)
+
+    # O Lambda de cópia não lê o conteúdo; o mesmo CSV é usado com a extensão esperada
+    copy_key = f"voxis/carga_{label}.csv.gz"
+    s3.upload_file(path, s3_copy_fail_email.SOURCE_BUCKET, copy_key)
+    head = s3.head_object(Bucket=s3_copy_fail_email.SOURCE_BUCKET, Key=copy_key)
+
+    return {
+        'soap': {'Records': [{'s3': {'bucket': {'name': SOAP_BUCKET}, 'object': {'key': soap_key}}}]},
+        'copy': {'Records': [{
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': s3_copy_fail_email.SOURCE_BUCKET},
+                'object': {'key': copy_key, 'size': head['ContentLength'], 'eTag': head['ETag'].strip('"')}
+            }
+        }]}
+    }
+
+
+def summarize(name, label, size, result, requests):
+    latencies = result['latencies']
+    p50 = statistics.median(latencies)
+    return {
+        'lambda': name,
+        'size': label,
+        'bytes': size,
+        'iterations': len(latencies),
+        'p50_s': round(p50, 4),
+        'p99_s': round(percentile(latencies, 99), 4),
+        'mb_per_s': round(size / (1024 * 1024) / p50, 2),
+        'peak_rss_mb': round(result['max_rss'] / (1024 * 1024), 1),
+        'status_codes': result['status_codes'],
+        'ws_requests': requests,
+        'stages_ms': {stage: round(value, 2) for stage, value in sorted(result['stages_ms'].items())}
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {(row['lambda'], row['size']): row for row in baseline['results']}
+    print(f"\nComparação com {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'lambda':>6} {'tamanho':>8} {'p50':>9} {'p99':>9} {'MB/s':>9} {'RSS':>9}")
+    for row in results:
+        old = previous.get((row['lambda'], row['size']))
+        if old is None:
+            continue
+        deltas = [
+            (row[field] - old[field]) / old[field] * 100 if old[field] else 0.0
+            for field in ('p50_s', 'p99_s', 'mb_per_s', 'peak_rss_mb')
+        ]
+        print(f"{row['lambda']:>6} {row['size']:>8} " + ' '.join(f"{delta:>+8.1f}%" for delta in deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lambdas', default='soap,copy', help='Lambdas medidos: soap, copy (separados por vírgula)')
+    parser.add_argument('--sizes', default='1KB,1MB,10MB,100MB', help='Tamanhos dos arquivos (1KB a 1GB), separados por vírgula')
+    parser.add_argument('--iterations', type=int, default=5, help='Invocações medidas por tamanho')
+    parser.add_argument('--warmup', type=int, default=1, help='Invocações iniciais descartadas (cold start)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latência fixa do webservice por requisição (s)')
+    parser.add_argument('--latency-per-mb', type=float, default=0.0, help='Processamento do webservice por MB (s)')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='Latência aleatória adicional do webservice (s)')
+    parser.add_argument('--rejection-rate', type=float, default=0.0, help='Fração dos registros rejeitados pelo webservice')
+    parser.add_argument('--fault-rate', type=float, default=0.0, help='Probabilidade de SOAP Fault (HTTP 500) por requisição')
+    parser.add_argument('--response-size', type=int, default=0, help='Tamanho mínimo da resposta SOAP (bytes)')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do webservice simulado')
+    parser.add_argument('--stages', action='store_true', help='Habilita as métricas EMF e mostra o tempo médio por etapa')
+    parser.add_argument('--output', help='Grava os resultados em JSON')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparação')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    selected = [name.strip() for name in args.lambdas.split(',')]
+    install_ranged_part_copy()
+
+    moto_server = ThreadedMotoServer('127.0.0.1', 0, verbose=False)
+    moto_server.start()
+    endpoint_url = 'http://%s:%d' % moto_server.get_host_and_port()
+    s3 = boto3.client('s3', endpoint_url=endpoint_url)
+    for bucket in (SOAP_BUCKET, s3_copy_fail_email.SOURCE_BUCKET, s3_copy_fail_email.DESTINATION_BUCKET):
+        s3.create_bucket(Bucket=bucket)
+    boto3.client('ses', endpoint_url=endpoint_url).verify_email_identity(EmailAddress=EMAIL_SENDER)
+
+    saudi = FakeSaudiServer(
+        latency=args.latency, latency_per_mb=args.latency_per_mb, latency_jitter=args.latency_jitter,
+        rejection_rate=args.rejection_rate, fault_rate=args.fault_rate,
+        response_size=args.response_size, seed=args.seed
+    ).start()
+
+    env = dict(
+        os.environ,
+        AWS_ENDPOINT_URL=endpoint_url,
+        WS_URL=saudi.url, WS_LOGIN='bench', WS_PASSWORD='bench', CLIENT_CODE='0000',
+        EMAIL_SENDER=EMAIL_SENDER, EMAIL_RECIPIENTS='equipe@empresa.com.br',
+        # O mesmo arquivo é processado em todas as invocações
+        MOVE_PROCESSED='false', MOVE_FAILED='false', DELETE_ORIGINAL='false', COPY_SKIP_IDENTICAL='false'
+    )
+    env.pop('IDEMPOTENCY_BACKEND', None)
+    if args.stages:
+        env['METRICS_ENABLED'] = 'true'
+
+    results = []
+    print(f"{'lambda':>6} {'tamanho':>8} {'p50 (s)':>9} {'p99 (s)':>9} {'MB/s':>9} {'RSS (MB)':>9}  status")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label in (format_size(parse_size(s)) for s in args.sizes.split(',')):
+            path = os.path.join(work_dir, f"carga_{label}.csv")
+            size = write_csv(path, parse_size(label))['size']
+            events = build_events(s3, path, label)
+            os.remove(path)
+
+            for name in selected:
+                requests_before = saudi.requests
+                result = run_lambda(LAMBDAS[name], events[name], env, args.warmup, args.iterations)
+                row = summarize(name, label, size, result, saudi.requests - requests_before)
+                results.append(row)
+                statuses = ','.join(str(code) for code in sorted(set(row['status_codes'])))
+                print(f"{name:>6} {label:>8} {row['p50_s']:>9.3f} {row['p99_s']:>9.3f} {row['mb_per_s']:>9.1f} "
+                      f"{row['peak_rss_mb']:>9.1f}  {statuses}")
+                if args.stages:
+                    for stage, value in row['stages_ms'].items():
+                        print(f"{'':>17} {stage:<20} {value:>10.1f} ms")
+
+            for bucket, key in ((SOAP_BUCKET, events['soap']['Records'][0]['s3']['object']['key']),
+                                (s3_copy_fail_email.SOURCE_BUCKET, events['copy']['Records'][0]['s3']['object']['key'])):
+                s3.delete_object(Bucket=bucket, Key=key)
+
+    saudi.stop()
+    moto_server.stop()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({
+                'commit': git_revision(),
+                'timestamp': int(time.time()),
+                'parameters': vars(args),
+                'results': results
+            }, output_file, indent=2)
+            output_file.write('\n')
+        print(f"\nResultados gravados em {args.output}")
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: volume e custo do log por invocação dos dois Lambdas (structured_logging), com e sem os limites.
+
+Cenários:
+- cópia: s3_copy_fail_email.lambda_handler com um evento de --records registros (S3 do moto);
+- soap: s3_csv_to_api_soap.lambda_handler com um arquivo de --soap-mb MB e uma resposta com milhares
+  de linhas rejeitadas (servidor SOAP local), que era registrada por inteiro em "Resposta completa".
+
+Cada cenário roda sem limites (campos, orçamento e amostragem desabilitados) e com a configuração padrão.
+Falha (código de saída 1) se o volume com limites ultrapassar LOG_MAX_INVOCATION_BYTES + LOG_ERROR_RESERVE_BYTES
+(mais uma margem para a estimativa do tamanho de cada linha).
+
+Uso:
+    python benchmarks/bench_logging.py --records 1000 --soap-mb 20
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+from fake_saudi_server import FakeSaudiServer
+from synthetic_csv import write_csv
+
+SOAP_BUCKET = 'bench-saudi-voxis'
+MB = 1024 * 1024
+
+# Limites desabilitados (equivalente ao log anterior, sem truncamento nem amostragem)
+UNBOUNDED_ENV = {
+    'LOG_MAX_FIELD_CHARS': str(10 ** 12),
+    'LOG_MAX_INVOCATION_BYTES': str(10 ** 12),
+    'LOG_SAMPLE_FIRST': str(10 ** 12)
+}
+
+# Margem sobre o orçamento: o tamanho de cada linha é estimado pela mensagem mais um overhead fixo
+BUDGET_TOLERANCE = 1.10
+
+
+class CountingStream:
+    """Destino do handler de log que apenas conta linhas e bytes (UTF-8)."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode('utf-8'))
+        self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+
+class Context:
+    function_name = 'bench'
+    function_version = '$LATEST'
+    aws_request_id = 'bench-request-id'
+
+
+def build_copy_event(s3, module, count):
+    """Cria count arquivos .csv.gz pequenos na origem e o evento S3 correspondente."""
+    records = []
+    for i in range(count):
+        key = f"voxis/relatorio_{i:05d}.csv.gz"
+        response = s3.put_object(Bucket=module.SOURCE_BUCKET, Key=key, Body=b'x' * 64)
+        records.append({
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': module.SOURCE_BUCKET},
+                'object': {'key': key, 'size': 64, 'eTag': response['ETag'].strip('"')}
+            }
+        })
+    return {'Records': records}
+
+
+def measure(stream, handler, event, limited):
+    import structured_logging
+
+    base_env = {name: os.environ.get(name) for name in UNBOUNDED_ENV}
+    if not limited:
+        os.environ.update(UNBOUNDED_ENV)
+    try:
+        budget = structured_logging.configure(logging.getLogger())
+    finally:
+        for name, value in base_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    stream.bytes = stream.lines = 0
+    start = time.perf_counter()
+    handler(event, Context())
+    elapsed = time.perf_counter() - start
+    limit = budget.max_invocation_bytes + budget.error_reserve_bytes
+    return stream.bytes, stream.lines, elapsed, budget.summary(), limit
+
+
+def report(name, stream, handler, event):
+    failed = False
+    for limited in (False, True):
+        size, lines, elapsed, summary, limit = measure(stream, handler, event, limited)
+        label = 'com limites' if limited else 'sem limites'
+        print(
+            f"{name:<6} {label:<12} {size / 1024:>10.1f} {lines:>7} {elapsed:>9.2f} "
+            f"{summary['descartados_orcamento']:>9} {summary['descartados_amostragem']:>10} {summary['truncados']:>9}"
+        )
+        if limited and size > limit * BUDGET_TOLERANCE:
+            print(f"  ERRO: {size} bytes de log acima do orçamento de {limit} bytes")
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1000, help='Registros no evento do Lambda de cópia')
+    parser.add_argument('--soap-mb', type=int, default=20, help='Tamanho do arquivo enviado ao webservice (MB)')
+    parser.add_argument('--rejection-rate', type=float, default=0.3, help='Fração de linhas rejeitadas pelo webservice')
+    args = parser.parse_args()
+
+    # Handler instalado antes do import dos Lambdas, como o handler do runtime do Lambda
+    stream = CountingStream()
+    logging.getLogger().addHandler(logging.StreamHandler(stream))
+
+    with mock_aws(), FakeSaudiServer(rejection_rate=args.rejection_rate, max_rejection_details=10 ** 7) as server:
+        s3 = boto3.client('s3')
+        boto3.client('ses').verify_email_identity(EmailAddress=os.environ.get('EMAIL_SENDER', 'no-reply@empresa.com.br'))
+        os.environ.update({
+            'WS_URL': server.url, 'WS_LOGIN': 'bench', 'WS_PASSWORD': 'bench', 'CLIENT_CODE': '0000',
+            'REJECTION_REPORT': 'false'
+        })
+
+        import s3_copy_fail_email
+        import s3_csv_to_api_soap
+        # O mesmo evento é copiado com e sem limites de log: as duas execuções devem fazer as cópias
+        s3_copy_fail_email.COPY_SKIP_IDENTICAL = False
+
+        s3.create_bucket(Bucket=s3_copy_fail_email.SOURCE_BUCKET)
+        s3.create_bucket(Bucket=s3_copy_fail_email.DESTINATION_BUCKET)
+        copy_event = build_copy_event(s3, s3_copy_fail_email, args.records)
+
+        s3.create_bucket(Bucket=SOAP_BUCKET)
+        path = f"/tmp/bench_logging_{args.soap_mb}mb.csv"
+        write_csv(path, args.soap_mb * MB)
+        s3.upload_file(path, SOAP_BUCKET, 'entrada/arquivo.csv')
+        os.remove(path)
+        soap_event = {'Records': [{'s3': {'bucket': {'name': SOAP_BUCKET}, 'object': {'key': 'entrada/arquivo.csv'}}}]}
+
+        print(f"{'':<6} {'':<12} {'log (KB)':>10} {'linhas':>7} {'tempo (s)':>9} {'orçamento':>9} {'amostragem':>10} {'truncados':>9}")
+        failed = report('cópia', stream, s3_copy_fail_email.lambda_handler, copy_event)
+        failed = report('soap', stream, s3_csv_to_api_soap.lambda_handler, soap_event) or failed
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
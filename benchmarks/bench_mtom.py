@@ -0,0 +1,90 @@
+"""
+Benchmark: bytes na rede e tempo de envio em base64 inline vs. MTOM/XOP (WS_TRANSFER_MODE=mtom)
+no s3_csv_to_api_soap.lambda_handler, usando S3/SES do moto e o servidor SOAP local.
+
+O servidor local recebe os bytes na vazão de --wire-mb-per-s (0 = sem limite, apenas o custo de CPU
+da codificação), simulando o enlace até o webservice. Com --reject-mtom o servidor responde 415 ao
+MTOM, medindo o custo do fallback automático para base64 (apenas no primeiro envio do container).
+
+Uso:
+    python benchmarks/bench_mtom.py --sizes 10,50,200 --wire-mb-per-s 50
+    python benchmarks/bench_mtom.py --sizes 50 --reject-mtom
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+from fake_saudi_server import FakeSaudiServer
+from synthetic_csv import write_csv
+
+BUCKET = 'bench-saudi-voxis'
+MB = 1024 * 1024
+
+
+def run_handler(module, server, key, mode):
+    os.environ['WS_TRANSFER_MODE'] = mode
+    event = {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}}]}
+    bytes_before = server.bytes_received
+    start = time.perf_counter()
+    response = module.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    body = json.loads(response['body'])
+    return elapsed, server.bytes_received - bytes_before, response['statusCode'], body.get('total_registros')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,50,200', help='Tamanhos dos arquivos em MB, separados por vírgula')
+    parser.add_argument('--wire-mb-per-s', type=float, default=50, help='Vazão simulada da rede até o webservice (MB/s)')
+    parser.add_argument('--reject-mtom', action='store_true', help='Servidor recusa MTOM (mede o fallback para base64)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with mock_aws(), FakeSaudiServer(accept_mtom=not args.reject_mtom, wire_mb_per_s=args.wire_mb_per_s) as server:
+        os.environ.update({'WS_URL': server.url, 'WS_LOGIN': 'bench', 'WS_PASSWORD': 'bench', 'CLIENT_CODE': '0000'})
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        boto3.client('ses').verify_email_identity(EmailAddress=os.environ.get('EMAIL_SENDER', 'no-reply@empresa.com.br'))
+
+        import s3_csv_to_api_soap
+
+        print(f"{'MB':>6} {'modo':>7} {'tempo (s)':>10} {'MB na rede':>11} {'registros':>10}")
+        for size_mb in (int(s) for s in args.sizes.split(',')):
+            key = f"bench/arquivo_{size_mb}mb.csv"
+            path = f"/tmp/bench_mtom_{size_mb}mb.csv"
+            write_csv(path, size_mb * MB)
+            s3.upload_file(path, BUCKET, key)
+            os.remove(path)
+
+            timings = {}
+            for mode in ('base64', 'mtom'):
+                elapsed, wire_bytes, status_code, total = run_handler(s3_csv_to_api_soap, server, key, mode)
+                timings[mode] = (elapsed, wire_bytes)
+                print(f"{size_mb:>6} {mode:>7} {elapsed:>10.2f} {wire_bytes / MB:>11.1f} {total:>10} (HTTP {status_code})")
+
+            (base64_time, base64_bytes), (mtom_time, mtom_bytes) = timings['base64'], timings['mtom']
+            print(f"{'':>6} {'ganho':>7} {1 - mtom_time / base64_time:>10.0%} {1 - mtom_bytes / base64_bytes:>11.0%}")
+            s3.delete_object(Bucket=BUCKET, Key=key)
+
+        if args.reject_mtom:
+            print(f"\nFallback: {len(s3_csv_to_api_soap.mtom_rejected_endpoints)} endpoint(s) marcado(s) sem MTOM; "
+                  f"envios seguintes do container usam base64 direto")
+
+
+if __name__ == '__main__':
+    main()
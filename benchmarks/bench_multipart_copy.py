@@ -0,0 +1,121 @@
+"""
+Benchmark: tempo de cópia por tamanho de objeto, copy_object (uma chamada) vs. cópia multipart
+em paralelo (s3_multipart_copy), usando o S3 do moto.
+
+O moto copia os bytes em memória, sem o limite de vazão por requisição do S3 real. Para que o
+paralelismo seja representativo, cada CopyObject/UploadPartCopy espera o tempo equivalente a
+--copy-mb-per-s (vazão aproximada de uma cópia no próprio S3); use 0 para medir apenas o moto.
+
+O UploadPartCopy do moto lê o objeto de origem inteiro a cada parte (custo partes x tamanho, que o S3
+real não tem); o benchmark faz a leitura apenas do intervalo da parte, exceto com --moto-full-read.
+
+Uso:
+    python benchmarks/bench_multipart_copy.py --sizes 16,64,256 --part-mb 16 --concurrency 8
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+from moto.s3.models import S3Backend
+
+from s3_multipart_copy import MB, copy_object
+
+SOURCE_BUCKET = 'bench-origem'
+DESTINATION_BUCKET = 'bench-destino'
+
+
+def install_copy_throughput(s3, object_sizes, mb_per_s):
+    """Simula a vazão por requisição do S3 nas chamadas de cópia."""
+    if mb_per_s <= 0:
+        return
+
+    def delay(params, model, **kwargs):
+        headers = params.get('headers', {})
+        copy_range = headers.get('x-amz-copy-source-range')
+        if copy_range:
+            first_byte, last_byte = copy_range.split('=')[1].split('-')
+            size = int(last_byte) - int(first_byte) + 1
+        else:
+            size = object_sizes.get(params.get('url_path', '').split('/')[-1], 0)
+        time.sleep(size / (mb_per_s * MB))
+
+    s3.meta.events.register('before-call.s3.CopyObject', delay)
+    s3.meta.events.register('before-call.s3.UploadPartCopy', delay)
+
+
+def install_ranged_part_copy():
+    """Faz o UploadPartCopy do moto ler apenas o intervalo da parte, como o S3 real."""
+
+    def upload_part_copy(self, dest_bucket_name, multipart_id, part_id, src_bucket_name, src_key_name,
+                         src_version_id, start_byte, end_byte):
+        multipart = self.get_bucket(dest_bucket_name).multiparts[multipart_id]
+        src_key = self.get_object(src_bucket_name, src_key_name, version_id=src_version_id)
+        if start_byte is None:
+            return multipart.set_part(part_id, src_key.value)
+        with src_key.lock:
+            src_key._value_buffer.seek(start_byte)
+            src_value = src_key._value_buffer.read(end_byte + 1 - start_byte)
+        return multipart.set_part(part_id, src_value)
+
+    S3Backend.upload_part_copy = upload_part_copy
+
+
+def timed_copy(s3, key, destination_key, **kwargs):
+    start = time.perf_counter()
+    result = copy_object(s3, SOURCE_BUCKET, key, DESTINATION_BUCKET, destination_key, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='16,64,256', help='Tamanhos dos objetos em MB, separados por vírgula')
+    parser.add_argument('--part-mb', type=int, default=16, help='Tamanho de cada parte em MB')
+    parser.add_argument('--concurrency', type=int, default=8, help='Partes copiadas em paralelo')
+    parser.add_argument('--copy-mb-per-s', type=float, default=100, help='Vazão simulada por requisição de cópia (MB/s)')
+    parser.add_argument('--moto-full-read', action='store_true', help='Mantém a leitura do objeto inteiro por parte do moto')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if not args.moto_full_read:
+        install_ranged_part_copy()
+
+    with mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=SOURCE_BUCKET)
+        s3.create_bucket(Bucket=DESTINATION_BUCKET)
+        object_sizes = {}
+        install_copy_throughput(s3, object_sizes, args.copy_mb_per_s)
+
+        print(f"{'MB':>6} {'single (s)':>11} {'multipart (s)':>14} {'partes':>7} {'ganho':>7}")
+        for size_mb in (int(s) for s in args.sizes.split(',')):
+            key = f"bench/arquivo_{size_mb}mb.csv.gz"
+            object_sizes[key.split('/')[-1]] = size_mb * MB
+            s3.put_object(Bucket=SOURCE_BUCKET, Key=key, Body=os.urandom(size_mb * MB))
+            head = s3.head_object(Bucket=SOURCE_BUCKET, Key=key)
+
+            single_time, _ = timed_copy(s3, key, f"single/{key}", head=head, multipart_threshold=float('inf'))
+            multipart_time, result = timed_copy(
+                s3, key, f"multipart/{key}", head=head, multipart_threshold=0,
+                part_size=args.part_mb * MB, concurrency=args.concurrency
+            )
+            print(f"{size_mb:>6} {single_time:>11.2f} {multipart_time:>14.2f} {result['parts']:>7} "
+                  f"{single_time / multipart_time:>6.1f}x")
+
+            s3.delete_object(Bucket=SOURCE_BUCKET, Key=key)
+            s3.delete_object(Bucket=DESTINATION_BUCKET, Key=f"single/{key}")
+            s3.delete_object(Bucket=DESTINATION_BUCKET, Key=f"multipart/{key}")
+
+
+if __name__ == '__main__':
+    main()
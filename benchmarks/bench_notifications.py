@@ -0,0 +1,171 @@
+"""
+Benchmark: emails de erro do Lambda de cópia em uma rajada de falhas, com envio imediato (NOTIFY_DIGEST=false)
+vs. fila agregada (notification_digest).
+
+S3 e SES são servidos por um stand-in local (AWS_ENDPOINT_URL): toda cópia falha (metade com NoSuchKey, metade
+com AccessDenied, gerando dois tipos de erro na mesma pasta) e o SES responde com latência (--ses-latency-ms) e
+limite de envio por segundo (--ses-max-rate, como a cota do SES), devolvendo Throttling acima do limite.
+
+Para cada modo são medidos: tempo do handler, chamadas ao SES, respostas Throttling e emails aceitos.
+Falha (código de saída 1) se o modo agregado não entregar exatamente um email por tipo de erro ou sofrer throttling.
+
+Uso:
+    python benchmarks/bench_notifications.py --records 200 --ses-max-rate 14 --ses-latency-ms 50
+"""
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+class StandInServer:
+    """Stand-in local de S3 (cópias sempre com erro) e SES (SendEmail com latência e limite de envio)."""
+
+    def __init__(self, max_rate, latency):
+        self.max_rate = max_rate
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, body, content_type='application/xml'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_PUT(self):
+                # CopyObject: chaves com número par não existem, ímpares sem permissão
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                number = int(''.join(c for c in self.path.rsplit('_', 1)[-1] if c.isdigit()) or 0)
+                if number % 2 == 0:
+                    self._send(404, b'<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>')
+                else:
+                    self._send(403, b'<Error><Code>AccessDenied</Code><Message>Access Denied</Message></Error>')
+
+            def do_POST(self):
+                form = urllib.parse.parse_qs(self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode())
+                time.sleep(stand_in.latency)
+                accepted = stand_in.admit()
+                if not accepted:
+                    self._send(400, (
+                        b'<ErrorResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/"><Error><Type>Sender</Type>'
+                        b'<Code>Throttling</Code><Message>Maximum sending rate exceeded.</Message></Error>'
+                        b'<RequestId>stand-in</RequestId></ErrorResponse>'
+                    ), 'text/xml')
+                    return
+                with stand_in.lock:
+                    stand_in.subjects.append(form.get('Message.Subject.Data', [''])[0])
+                self._send(200, (
+                    b'<SendEmailResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">'
+                    b'<SendEmailResult><MessageId>stand-in</MessageId></SendEmailResult>'
+                    b'<ResponseMetadata><RequestId>stand-in</RequestId></ResponseMetadata></SendEmailResponse>'
+                ), 'text/xml')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.throttled = 0
+            self.subjects = []
+            self.recent = collections.deque()
+
+    def admit(self):
+        """Conta a chamada e aplica o limite de envios no último segundo."""
+        with self.lock:
+            now = time.monotonic()
+            self.calls += 1
+            while self.recent and now - self.recent[0] >= 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.max_rate:
+                self.throttled += 1
+                return False
+            self.recent.append(now)
+            return True
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+class Context:
+    function_name = 'bench'
+    function_version = '$LATEST'
+    aws_request_id = 'bench-request-id'
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+def build_event(module, count):
+    return {'Records': [
+        {
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': module.SOURCE_BUCKET},
+                'object': {'key': f"voxis/relatorio_{i:05d}.csv.gz", 'size': 1024, 'eTag': 'abc'}
+            }
+        }
+        for i in range(count)
+    ]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=200, help='Registros com falha no evento')
+    parser.add_argument('--ses-max-rate', type=int, default=14, help='Emails aceitos por segundo pelo SES')
+    parser.add_argument('--ses-latency-ms', type=float, default=50, help='Latência de cada chamada ao SES (ms)')
+    args = parser.parse_args()
+
+    with StandInServer(args.ses_max_rate, args.ses_latency_ms / 1000) as stand_in:
+        os.environ['AWS_ENDPOINT_URL'] = stand_in.url
+        os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+        # O stand-in não atende HEAD: só as cópias (com falha) são exercitadas
+        os.environ['COPY_SKIP_IDENTICAL'] = 'false'
+
+        import s3_copy_fail_email
+
+        event = build_event(s3_copy_fail_email, args.records)
+        print(f"{args.records} cópias com falha, SES com {args.ses_max_rate} emails/s e {args.ses_latency_ms:g} ms por chamada\n")
+        print(f"{'modo':<10} {'tempo (s)':>10} {'chamadas SES':>13} {'throttling':>11} {'emails':>7}")
+        failed = False
+        for mode in ('imediato', 'agregado'):
+            os.environ['NOTIFY_DIGEST'] = 'true' if mode == 'agregado' else 'false'
+            stand_in.reset()
+            start = time.perf_counter()
+            s3_copy_fail_email.lambda_handler(event, Context())
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<10} {elapsed:>10.2f} {stand_in.calls:>13} {stand_in.throttled:>11} {len(stand_in.subjects):>7}")
+            if mode == 'agregado' and (len(stand_in.subjects) != 2 or stand_in.throttled):
+                print(f"  ERRO: esperados 2 emails de resumo sem throttling: {stand_in.subjects}")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
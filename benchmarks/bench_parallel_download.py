@@ -0,0 +1,151 @@
+"""
+Benchmark: vazão de download (MB/s) de um objeto S3 grande com GET único vs. faixas paralelas
+(s3_parallel_download.ParallelRangeReader), por tamanho de faixa e concorrência.
+
+O S3 é simulado por um servidor HTTP local em um processo separado, com vazão limitada por conexão
+(--connection-mb-s) e latência até o primeiro byte (--first-byte-ms), como no S3 real, onde uma única
+conexão fica bem abaixo da banda de rede do Lambda. O conteúdo é lido em blocos de 768 KB,
+como no envio ao webservice, e o pico de memória alocada (tracemalloc) mostra o limite da janela de reordenação.
+
+Uso:
+    python benchmarks/bench_parallel_download.py --size-mb 512 --part-sizes 4,8,16 --concurrency 1,4,8,16
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+MB = 1024 * 1024
+ETAG = '"0123456789abcdef0123456789abcdef"'
+PATTERN = b''.join(b'%08d;BENEFICIARIO;%011d\n' % (i, i) for i in range(4096))
+READ_CHUNK = 768 * 1024
+
+
+def serve(size, bytes_per_second, first_byte, port_queue):
+    """Servidor S3 mínimo (GET com Range) com vazão limitada por conexão."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            start, end, status = 0, size - 1, 200
+            byte_range = self.headers.get('Range')
+            if byte_range:
+                first, _, last = byte_range.split('=', 1)[1].partition('-')
+                start, end, status = int(first), min(size - 1, int(last)), 206
+            self.send_response(status)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', 'Wed, 01 Jan 2025 00:00:00 GMT')
+            self.send_header('Content-Type', 'text/csv')
+            if status == 206:
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            time.sleep(first_byte)
+
+            began = time.perf_counter()
+            sent = 0
+            position = start
+            try:
+                while position <= end:
+                    offset = position % len(PATTERN)
+                    chunk = PATTERN[offset:offset + min(64 * 1024, end - position + 1)]
+                    self.wfile.write(chunk)
+                    position += len(chunk)
+                    sent += len(chunk)
+                    delay = sent / bytes_per_second - (time.perf_counter() - began)
+                    if delay > 0:
+                        time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def consume(stream):
+    """Lê o stream inteiro em blocos, retornando (bytes lidos, segundos, pico de memória alocada)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = 0
+    while True:
+        data = stream.read(READ_CHUNK)
+        if not data:
+            break
+        total += len(data)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stream.close()
+    return total, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=512, help='Tamanho do objeto em MB')
+    parser.add_argument('--part-sizes', default='4,8,16', help='Tamanhos de faixa em MB, separados por vírgula')
+    parser.add_argument('--concurrency', default='1,4,8,16', help='Faixas em paralelo, separadas por vírgula')
+    parser.add_argument('--connection-mb-s', type=float, default=40, help='Vazão máxima por conexão (MB/s)')
+    parser.add_argument('--first-byte-ms', type=float, default=20, help='Latência até o primeiro byte (ms)')
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(size, args.connection_mb_s * MB, args.first_byte_ms / 1000, port_queue), daemon=True
+    )
+    server.start()
+    port = port_queue.get(timeout=10)
+
+    import boto3
+    from botocore.config import Config
+    from s3_parallel_download import open_object_stream
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(',')]
+    s3 = boto3.client(
+        's3', endpoint_url=f"http://127.0.0.1:{port}",
+        config=Config(s3={'addressing_style': 'path'}, max_pool_connections=max(10, max(concurrency_levels)))
+    )
+
+    def run(part_size, concurrency):
+        response = s3.get_object(Bucket='bench', Key='arquivo.csv')
+        stream = open_object_stream(
+            s3, 'bench', 'arquivo.csv', response,
+            threshold=None if part_size is None else 0, part_size=part_size or MB, concurrency=concurrency
+        )
+        total, elapsed, peak = consume(stream)
+        if total != size:
+            raise RuntimeError(f"Download incompleto: {total} de {size} bytes")
+        return elapsed, peak
+
+    print(f"Objeto de {args.size_mb} MB, {args.connection_mb_s:g} MB/s por conexão, {args.first_byte_ms:g} ms até o primeiro byte\n")
+    print(f"{'faixa (MB)':>10} {'paralelo':>8} {'tempo (s)':>10} {'MB/s':>8} {'pico (MB)':>10}")
+    elapsed, peak = run(None, 1)
+    print(f"{'GET único':>10} {1:>8} {elapsed:>10.2f} {args.size_mb / elapsed:>8.1f} {peak / MB:>10.1f}")
+    for part_mb in (int(p) for p in args.part_sizes.split(',')):
+        for concurrency in concurrency_levels:
+            if concurrency < 2:
+                continue
+            elapsed, peak = run(part_mb * MB, concurrency)
+            print(f"{part_mb:>10} {concurrency:>8} {elapsed:>10.2f} {args.size_mb / elapsed:>8.1f} {peak / MB:>10.1f}")
+
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
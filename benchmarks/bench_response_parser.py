@@ -0,0 +1,100 @@
+"""
+Micro-benchmark do parser de respostas do webservice SAUDI/VOXIS.
+
+Compara o parse antigo do lambda_handler (ET.fromstring + seis re.search, repetidos sobre a
+resposta bruta no fallback) com soap_response_parser.parse_transmission_response.
+Usa respostas sintéticas de vários tamanhos e, opcionalmente, respostas reais gravadas
+(arquivos .xml em --responses-dir).
+
+Uso:
+    python benchmarks/bench_response_parser.py --sizes 1,100,1000,10000 --responses-dir respostas/
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+from soap_response_parser import parse_transmission_response
+
+RESPONSE_TEMPLATE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><ns2:transmitirArquivoOperadoraResponse xmlns:ns2="http://endpoints.webservice.integration.saudi.acol.com/"><return>{mensagem}
+Número do protocolo : 123456
+Qtd. Total de Registros : {total}
+Qtd. Linhas Aceitas : {aceitas}
+Qtd. Linhas Rejeitadas : {rejeitadas}
+{linhas}</return></ns2:transmitirArquivoOperadoraResponse></soap:Body></soap:Envelope>"""
+
+
+def build_response(rejected_lines):
+    """Gera uma resposta sintética listando rejected_lines linhas rejeitadas."""
+    lines = '\n'.join(
+        f"Linha {i + 2} - Campo: CPF - Motivo: CPF inválido ou não informado" for i in range(rejected_lines)
+    )
+    return RESPONSE_TEMPLATE.format(
+        mensagem='Arquivo inserido, mas com erros' if rejected_lines else 'Arquivo inserido com sucesso!',
+        total=rejected_lines + 1000, aceitas=1000, rejeitadas=rejected_lines, linhas=lines
+    )
+
+
+def legacy_parse(response_data):
+    """Parse equivalente ao código anterior do lambda_handler."""
+    root = ET.fromstring(response_data)
+    namespaces = {
+        'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
+        'ns2': 'http://endpoints.webservice.integration.saudi.acol.com/'
+    }
+    return_element = root.find('.//ns2:transmitirArquivoOperadoraResponse/return', namespaces)
+    text = return_element.text if return_element is not None and return_element.text else response_data
+    success_match = re.search(r'Arquivo inserido com sucesso!', text)
+    error_match = re.search(r'Arquivo inserido, mas com erros', text)
+    protocolo_match = re.search(r'Número do protocolo\s*:\s*(\d+)', text)
+    total_registros_match = re.search(r'Qtd\. Total de Registros\s*:\s*(\d+)', text)
+    linhas_aceitas_match = re.search(r'Qtd\. Linhas Aceitas\s*:\s*(\d+)', text)
+    linhas_rejeitadas_match = re.search(r'Qtd\. Linhas Rejeitadas\s*:\s*(\d+)', text)
+    return {
+        'status': 'Erro' if error_match else 'Sucesso',
+        'mensagem': error_match.group(0) if error_match else (success_match.group(0) if success_match else 'Arquivo processado'),
+        'protocolo': protocolo_match.group(1) if protocolo_match else 'N/A',
+        'total_registros': total_registros_match.group(1) if total_registros_match else '0',
+        'linhas_aceitas': linhas_aceitas_match.group(1) if linhas_aceitas_match else '0',
+        'linhas_rejeitadas': linhas_rejeitadas_match.group(1) if linhas_rejeitadas_match else '0'
+    }
+
+
+def new_parse(response_data):
+    result = parse_transmission_response(response_data).as_dict()
+    del result['resposta_completa']
+    return result
+
+
+def bench(label, response_data, repeat):
+    assert legacy_parse(response_data) == new_parse(response_data), f"Resultados divergentes para {label}"
+    legacy = min(timeit.repeat(lambda: legacy_parse(response_data), number=1, repeat=repeat))
+    new = min(timeit.repeat(lambda: new_parse(response_data), number=1, repeat=repeat))
+    size_kb = len(response_data.encode('utf-8')) / 1024
+    print(f"{label:>24} {size_kb:>10.1f} {legacy * 1000:>12.3f} {new * 1000:>12.3f} {legacy / new:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='0,100,1000,10000,100000', help='Linhas rejeitadas nas respostas sintéticas')
+    parser.add_argument('--responses-dir', help='Diretório com respostas reais gravadas (*.xml)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'resposta':>24} {'KB':>10} {'antigo (ms)':>12} {'novo (ms)':>12} {'ganho':>9}")
+    for rejected in (int(s) for s in args.sizes.split(',')):
+        bench(f"sintética {rejected} rej.", build_response(rejected), args.repeat)
+    if args.responses_dir:
+        for path in sorted(glob.glob(os.path.join(args.responses_dir, '*.xml'))):
+            with open(path, encoding='utf-8') as f:
+                bench(os.path.basename(path)[:24], f.read(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: busca da rota do Lambda de cópia (s3_copy_routes.RoutingTable, trie de prefixos + índice de
+extensões) vs. varredura linear das rotas, com --keys chaves e --routes rotas.
+
+As rotas simulam dezenas de schemas com centenas de relatórios (prefixos aninhados, extensões diferentes e
+algumas regex); parte das chaves não atende nenhuma rota. Os resultados das duas buscas são comparados
+chave a chave: falha (código de saída 1) se houver divergência.
+
+Uso:
+    python benchmarks/bench_routing.py --keys 100000 --routes 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+from s3_copy_routes import Route, RoutingTable
+
+BUCKET = 'bench-origem'
+SUFFIXES = ('.csv.gz', '.csv', '.csv.zst', '')
+
+
+def build_routes(count, schemas):
+    """Rotas por schema (schemaNN/relatorioNNN/), com extensão e, em parte delas, uma regex de data."""
+    rng = random.Random(42)
+    routes = []
+    for index in range(count):
+        schema = f"schema{index % schemas:02d}"
+        report = f"relatorio{index // schemas:03d}"
+        route = {
+            'name': f"{schema}-{report}",
+            'source_bucket': BUCKET,
+            'prefix': f"{schema}/{report}/",
+            'suffix': rng.choice(SUFFIXES),
+            'destination_bucket': 'bench-destino',
+            'destination_key': f"{schema.upper()}/{{NAME}}/{{filename}}"
+        }
+        if index % 10 == 0:
+            route['regex'] = r'_(?P<data>\d{8})\.'
+            route['destination_key'] = f"{schema.upper()}/{{NAME}}/{{data}}/{{filename}}"
+        routes.append(route)
+    # Rotas genéricas por schema (prefixo curto, sem extensão), atendidas quando a específica não atende
+    routes += [
+        {'name': f"schema{s:02d}-geral", 'source_bucket': BUCKET, 'prefix': f"schema{s:02d}/",
+         'destination_bucket': 'bench-destino', 'destination_key': 'GERAL/{relative}'}
+        for s in range(0, schemas, 3)
+    ]
+    return routes
+
+
+def build_keys(count, routes, schemas):
+    rng = random.Random(7)
+    keys = []
+    for _ in range(count):
+        route = rng.choice(routes)
+        choice = rng.random()
+        if choice < 0.7:
+            extension = route.get('suffix') or rng.choice(('.csv', '.txt'))
+            keys.append(f"{route['prefix']}arquivo_{rng.randrange(20240101, 20241231)}{extension}")
+        elif choice < 0.85:
+            keys.append(f"{route['prefix']}subpasta/arquivo{rng.randrange(10 ** 6)}.json")
+        else:
+            keys.append(f"outro/schema{rng.randrange(schemas):02d}/arquivo{rng.randrange(10 ** 6)}.csv.gz")
+    return keys
+
+
+def linear_match(routes, bucket, key):
+    """Referência: avalia todas as rotas (mesma precedência da RoutingTable)."""
+    best = None
+    for route in routes:
+        if route.source_bucket != bucket or not key.startswith(route.prefix):
+            continue
+        if route.suffix and not key.lower().endswith(route.suffix):
+            continue
+        match = route.regex.search(key) if route.regex is not None else None
+        if route.regex is not None and match is None:
+            continue
+        rank = (-len(route.prefix), 0 if route.suffix else 1, route.order)
+        if best is None or rank < best[0]:
+            best = (rank, route, match)
+    if best is None:
+        return None
+    _, route, match = best
+    return (route,) + route.destination(key, match)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=100000, help='Chaves buscadas')
+    parser.add_argument('--routes', type=int, default=1000, help='Rotas específicas na tabela')
+    parser.add_argument('--schemas', type=int, default=40, help='Schemas (primeiro nível dos prefixos)')
+    args = parser.parse_args()
+
+    definitions = build_routes(args.routes, args.schemas)
+    start = time.perf_counter()
+    table = RoutingTable(definitions)
+    compile_seconds = time.perf_counter() - start
+    keys = build_keys(args.keys, definitions, args.schemas)
+    routes = [Route(definition, order) for order, definition in enumerate(definitions)]
+
+    start = time.perf_counter()
+    indexed = [table.match(BUCKET, key) for key in keys]
+    indexed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear = [linear_match(routes, BUCKET, key) for key in keys]
+    linear_seconds = time.perf_counter() - start
+
+    mismatches = [
+        key for key, a, b in zip(keys, indexed, linear)
+        if (a and (a[0].name,) + a[1:]) != (b and (b[0].name,) + b[1:])
+    ]
+    matched = sum(1 for result in indexed if result is not None)
+
+    print(f"{len(definitions)} rotas (compiladas em {compile_seconds * 1000:.1f} ms), {len(keys)} chaves, {matched} com rota\n")
+    print(f"{'busca':<10} {'tempo (s)':>10} {'chaves/s':>12} {'µs/chave':>9}")
+    for name, seconds in (('trie', indexed_seconds), ('linear', linear_seconds)):
+        print(f"{name:<10} {seconds:>10.3f} {len(keys) / seconds:>12,.0f} {seconds * 1e6 / len(keys):>9.2f}")
+    print(f"\nGanho: {linear_seconds / indexed_seconds:.1f}x")
+
+    if mismatches:
+        print(f"ERRO: {len(mismatches)} chaves com rota diferente da varredura linear (ex: {mismatches[:3]})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: latência ponta a ponta do envio único vs. envio em partes (SPLIT_MODE)
+no s3_csv_to_api_soap.lambda_handler, usando S3/SES do moto e o servidor SOAP local.
+
+Uso:
+    python benchmarks/bench_split_upload.py --sizes 10,50,200 --latency-per-mb 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'buckets_s3'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+from fake_saudi_server import FakeSaudiServer
+
+BUCKET = 'bench-saudi-voxis'
+
+
+def generate_csv(size_mb):
+    """Gera um CSV sintético de aproximadamente size_mb MB."""
+    header = b'id;nome;cpf;plano;data_inicio\n'
+    row_template = b'%08d;BENEFICIARIO %08d;%011d;PLANO-A;2025-01-01\n'
+    rows = []
+    total = len(header)
+    i = 0
+    while total < size_mb * 1024 * 1024:
+        row = row_template % (i, i, i)
+        rows.append(row)
+        total += len(row)
+        i += 1
+    return header + b''.join(rows)
+
+
+def run_handler(module, key):
+    event = {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}}]}
+    start = time.perf_counter()
+    response = module.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    body = json.loads(response['body'])
+    return elapsed, response['statusCode'], body.get('total_registros')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,50,100', help='Tamanhos dos arquivos em MB, separados por vírgula')
+    parser.add_argument('--part-mb', type=int, default=10, help='Tamanho de cada parte em MB')
+    parser.add_argument('--concurrency', type=int, default=4, help='Partes enviadas em paralelo')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latência fixa do servidor por requisição (s)')
+    parser.add_argument('--latency-per-mb', type=float, default=0.05, help='Tempo de processamento do servidor por MB (s)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with mock_aws(), FakeSaudiServer(args.latency, args.latency_per_mb) as server:
+        os.environ.update({
+            'WS_URL': server.url, 'WS_LOGIN': 'bench', 'WS_PASSWORD': 'bench', 'CLIENT_CODE': '0000',
+            'SPLIT_THRESHOLD_MB': '0', 'SPLIT_MAX_MB': str(args.part_mb),
+            'SPLIT_CONCURRENCY': str(args.concurrency)
+        })
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        boto3.client('ses').verify_email_identity(EmailAddress=os.environ.get('EMAIL_SENDER', 'no-reply@empresa.com.br'))
+
+        import s3_csv_to_api_soap
+
+        print(f"{'MB':>6} {'modo':>8} {'tempo (s)':>10} {'MB/s':>8} {'registros':>10}")
+        for size_mb in (int(s) for s in args.sizes.split(',')):
+            key = f"bench/arquivo_{size_mb}mb.csv"
+            s3.put_object(Bucket=BUCKET, Key=key, Body=generate_csv(size_mb))
+            for mode in ('unico', 'partes'):
+                os.environ['SPLIT_MODE'] = 'true' if mode == 'partes' else 'false'
+                elapsed, status_code, total = run_handler(s3_csv_to_api_soap, key)
+                print(f"{size_mb:>6} {mode:>8} {elapsed:>10.2f} {size_mb / elapsed:>8.1f} {total:>10} (HTTP {status_code})")
+
+
+if __name__ == '__main__':
+    main()
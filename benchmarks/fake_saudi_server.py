@@ -0,0 +1,325 @@
+"""
+Servidor SOAP local que imita o webservice SAUDI/VOXIS (transmitirArquivoOperadora).
+Usado apenas pelos benchmarks, para medir os Lambdas sem acessar o webservice de produção.
+"""
+import base64
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_TEMPLATE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><ns2:transmitirArquivoOperadoraResponse xmlns:ns2="http://endpoints.webservice.integration.saudi.acol.com/"><return>{mensagem}
+Número do protocolo : {protocolo}
+Qtd. Total de Registros : {total}
+Qtd. Linhas Aceitas : {aceitas}
+Qtd. Linhas Rejeitadas : {rejeitadas}{detalhes}</return></ns2:transmitirArquivoOperadoraResponse></soap:Body></soap:Envelope>"""
+
+FAULT_TEMPLATE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><soap:Fault><faultcode>soap:Server</faultcode><faultstring>{mensagem}</faultstring></soap:Fault></soap:Body></soap:Envelope>"""
+
+UNSUPPORTED_MEDIA_TEMPLATE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><soap:Fault><faultcode>soap:Client</faultcode><faultstring>Unsupported Content-Type: {content_type} Supported ones are: [text/xml]</faultstring></soap:Fault></soap:Body></soap:Envelope>"""
+
+REJECTED_LINE_TEMPLATE = '\nLinha {linha} - Campo: CPF - Motivo: CPF inválido'
+FILLER_LINE = '\nAviso: registro processado com ressalvas pelo validador do webservice'
+
+ARQUIVO_START = b'<arquivo>'
+ARQUIVO_END = b'</arquivo>'
+
+# Tamanho dos blocos lidos do corpo da requisição (o conteúdo não é mantido em memória)
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class ContentStats:
+    """Contagem incremental do conteúdo base64 de <arquivo>, sem decodificar o arquivo inteiro em memória."""
+
+    __slots__ = ('size', 'newlines', 'last_byte', '_pending')
+
+    def __init__(self):
+        self.size = 0
+        self.newlines = 0
+        self.last_byte = b''
+        self._pending = b''
+
+    def feed(self, encoded):
+        data = self._pending + encoded
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            self.feed_raw(base64.b64decode(data[:usable]))
+
+    def feed_raw(self, decoded):
+        self.size += len(decoded)
+        self.newlines += decoded.count(b'\n')
+        self.last_byte = decoded[-1:] or self.last_byte
+
+    @property
+    def records(self):
+        """Quantidade de registros do CSV recebido (sem o cabeçalho)."""
+        lines = self.newlines + (0 if self.last_byte in (b'', b'\n') else 1)
+        return max(0, lines - 1)
+
+
+def read_content_stats(rfile, length):
+    """
+    Lê o corpo da requisição em blocos e conta o conteúdo de <arquivo>.
+
+    Args:
+        rfile: Stream da requisição
+        length (int): Content-Length
+
+    Returns:
+        ContentStats: Tamanho, quebras de linha e último byte do arquivo decodificado
+    """
+    stats = ContentStats()
+    buffer = b''
+    inside = False
+    remaining = length
+    while remaining > 0:
+        chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        buffer += chunk
+        if not inside:
+            start = buffer.find(ARQUIVO_START)
+            if start < 0:
+                buffer = buffer[-len(ARQUIVO_START):]
+                continue
+            inside = True
+            buffer = buffer[start + len(ARQUIVO_START):]
+        end = buffer.find(ARQUIVO_END)
+        if end >= 0:
+            stats.feed(buffer[:end])
+            inside = None
+            buffer = b''
+            break
+        # Mantém o final do bloco, que pode conter o início de </arquivo>
+        keep = len(ARQUIVO_END) - 1
+        stats.feed(buffer[:-keep])
+        buffer = buffer[-keep:]
+    # Descarta o restante do envelope
+    while remaining > 0:
+        chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+    return stats
+
+
+def read_mtom_stats(rfile, length, boundary):
+    """
+    Lê uma requisição multipart/related (MTOM) em blocos e conta o conteúdo binário do anexo
+    (a parte seguinte ao envelope).
+
+    Args:
+        rfile: Stream da requisição
+        length (int): Content-Length
+        boundary (bytes): Delimitador das partes
+
+    Returns:
+        ContentStats: Tamanho, quebras de linha e último byte do anexo
+    """
+    stats = ContentStats()
+    delimiter = b'--' + boundary
+    end_marker = b'\r\n' + delimiter
+    buffer = b''
+    parts = 0
+    remaining = length
+    while remaining > 0:
+        chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        buffer += chunk
+        # Avança até o início do conteúdo da segunda parte (o anexo)
+        while parts < 2:
+            index = buffer.find(delimiter)
+            headers_end = buffer.find(b'\r\n\r\n', index) if index >= 0 else -1
+            if headers_end < 0:
+                break
+            parts += 1
+            buffer = buffer[headers_end + 4:]
+        if parts < 2:
+            continue
+        end = buffer.find(end_marker)
+        if end >= 0:
+            stats.feed_raw(buffer[:end])
+            break
+        # Mantém o final do bloco, que pode conter o início do delimitador
+        keep = len(end_marker) - 1
+        stats.feed_raw(buffer[:-keep])
+        buffer = buffer[-keep:]
+    # Descarta o restante da requisição
+    while remaining > 0:
+        chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+    return stats
+
+
+class ThrottledReader:
+    """Leitura do corpo da requisição limitada a uma vazão, simulando o enlace de rede até o webservice."""
+
+    def __init__(self, rfile, bytes_per_second):
+        self._rfile = rfile
+        self._bytes_per_second = bytes_per_second
+
+    def read(self, size):
+        data = self._rfile.read(size)
+        time.sleep(len(data) / self._bytes_per_second)
+        return data
+
+
+class FakeSaudiServer:
+    """
+    Servidor HTTP em thread que responde como o webservice SAUDI/VOXIS.
+
+    Args:
+        latency (float): Latência fixa por requisição em segundos
+        latency_per_mb (float): Tempo de "processamento" por MB recebido, simulando o servidor remoto
+        latency_jitter (float): Latência adicional aleatória (uniforme entre 0 e o valor) em segundos
+        rejection_rate (float): Fração dos registros rejeitados (resposta "Arquivo inserido, mas com erros")
+        fault_rate (float): Probabilidade de responder com SOAP Fault (HTTP 500)
+        response_size (int): Tamanho mínimo da resposta em bytes (completada com linhas de aviso)
+        max_rejection_details (int): Máximo de linhas rejeitadas detalhadas no texto de retorno
+        seed (int): Semente do gerador aleatório, para execuções reproduzíveis
+        accept_mtom (bool): Aceitar requisições MTOM (multipart/related); se False, responde 415
+        wire_mb_per_s (float): Vazão de recebimento em MB/s (0 = sem limite), simulando a rede
+    """
+
+    def __init__(self, latency=0.0, latency_per_mb=0.0, latency_jitter=0.0, rejection_rate=0.0,
+                 fault_rate=0.0, response_size=0, max_rejection_details=1000, seed=None,
+                 accept_mtom=True, wire_mb_per_s=0.0):
+        self.latency = latency
+        self.latency_per_mb = latency_per_mb
+        self.latency_jitter = latency_jitter
+        self.rejection_rate = rejection_rate
+        self.fault_rate = fault_rate
+        self.response_size = response_size
+        self.max_rejection_details = max_rejection_details
+        self.accept_mtom = accept_mtom
+        self.wire_mb_per_s = wire_mb_per_s
+        self.mtom_requests = 0
+        self.requests = 0
+        self.faults = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/webservice/transmiteArquivoService"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_request(self):
+        """Numera a requisição e sorteia a latência adicional e se ela falha."""
+        with self._lock:
+            self.requests += 1
+            jitter = self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0
+            fault = self._random.random() < self.fault_rate
+            if fault:
+                self.faults += 1
+            return 100000 + self.requests, jitter, fault
+
+    def build_response(self, total, protocolo):
+        """
+        Monta a resposta SOAP para um CSV com total registros (sem o cabeçalho).
+
+        Args:
+            total (int): Quantidade de registros recebidos
+            protocolo (int): Número do protocolo
+
+        Returns:
+            str: Corpo da resposta
+        """
+        rejeitadas = round(total * self.rejection_rate)
+        detalhes = ''
+        if rejeitadas:
+            # Linhas rejeitadas distribuídas pelo arquivo (a linha 1 é o cabeçalho)
+            step = total / rejeitadas
+            detalhes = ''.join(
+                REJECTED_LINE_TEMPLATE.format(linha=2 + int(i * step))
+                for i in range(min(rejeitadas, self.max_rejection_details))
+            )
+        fields = {
+            'mensagem': 'Arquivo inserido, mas com erros' if rejeitadas else 'Arquivo inserido com sucesso!',
+            'protocolo': protocolo, 'total': total, 'aceitas': total - rejeitadas, 'rejeitadas': rejeitadas
+        }
+        response = RESPONSE_TEMPLATE.format(detalhes=detalhes, **fields)
+        missing = self.response_size - len(response.encode('utf-8'))
+        if missing > 0:
+            detalhes += FILLER_LINE * (missing // len(FILLER_LINE.encode('utf-8')) + 1)
+            response = RESPONSE_TEMPLATE.format(detalhes=detalhes, **fields)
+        return response
+
+    def _build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Cabeçalhos e corpo da resposta são escritos separadamente; sem Nagle o cliente
+            # não espera o ACK atrasado (~40 ms) para receber o corpo
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                content_type = self.headers.get('Content-Type', '')
+                rfile = self.rfile
+                if server.wire_mb_per_s:
+                    rfile = ThrottledReader(rfile, server.wire_mb_per_s * 1024 * 1024)
+                with server._lock:
+                    server.bytes_received += length
+
+                if content_type.startswith('multipart/related'):
+                    if not server.accept_mtom:
+                        # Como um endpoint JAX-WS sem MTOM: 415 com SOAP Fault
+                        read_content_stats(rfile, length)
+                        payload = UNSUPPORTED_MEDIA_TEMPLATE.format(content_type=content_type.split(';')[0])
+                        self._respond(415, payload.encode('utf-8'))
+                        return
+                    boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode('utf-8')
+                    stats = read_mtom_stats(rfile, length, boundary)
+                    with server._lock:
+                        server.mtom_requests += 1
+                else:
+                    stats = read_content_stats(rfile, length)
+                protocolo, jitter, fault = server._next_request()
+
+                time.sleep(server.latency + jitter + server.latency_per_mb * stats.size / (1024 * 1024))
+
+                if fault:
+                    status = 500
+                    payload = FAULT_TEMPLATE.format(mensagem='Erro interno ao processar o arquivo').encode('utf-8')
+                else:
+                    status = 200
+                    payload = server.build_response(stats.records, protocolo).encode('utf-8')
+                self._respond(status, payload)
+
+            def _respond(self, status, payload):
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml;charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
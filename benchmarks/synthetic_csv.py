@@ -0,0 +1,85 @@
+"""
+Gerador de CSVs sintéticos no layout de beneficiários (1 KB a 1 GB), gravados em disco em blocos,
+sem montar o arquivo inteiro em memória.
+
+Uso:
+    python benchmarks/synthetic_csv.py 100MB /tmp/arquivo_100mb.csv
+"""
+import re
+import sys
+
+HEADER = b'id;nome;cpf;plano;data_inicio\n'
+ROW_TEMPLATE = b'%08d;BENEFICIARIO %08d;%011d;PLANO-A;2025-01-01\n'
+
+# Linhas formatadas por bloco gravado
+ROWS_PER_BLOCK = 20000
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*$', re.I)
+
+
+def parse_size(text):
+    """
+    Converte um tamanho como '1KB', '10MB' ou '1GB' em bytes.
+
+    Args:
+        text (str): Tamanho com unidade opcional (B, KB, MB, GB; base 1024)
+
+    Returns:
+        int: Tamanho em bytes
+    """
+    match = SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Tamanho inválido: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def format_size(size):
+    """Formata um tamanho em bytes com a maior unidade exata (ex: 1048576 -> '1MB')."""
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def iter_csv_blocks(size):
+    """
+    Gera os blocos de um CSV com cabeçalho e linhas completas, totalizando até size bytes.
+
+    Args:
+        size (int): Tamanho máximo do arquivo em bytes (ao menos o cabeçalho e uma linha)
+
+    Yields:
+        bytes: Blocos do arquivo
+    """
+    yield HEADER
+    written = len(HEADER)
+    row_size = len(ROW_TEMPLATE % (0, 0, 0))
+    total_rows = max(1, (size - written) // row_size)
+    for first in range(0, total_rows, ROWS_PER_BLOCK):
+        yield b''.join(ROW_TEMPLATE % (i, i, i) for i in range(first, min(first + ROWS_PER_BLOCK, total_rows)))
+
+
+def write_csv(path, size):
+    """
+    Grava um CSV sintético de aproximadamente size bytes.
+
+    Args:
+        path (str): Caminho do arquivo
+        size (int): Tamanho desejado em bytes
+
+    Returns:
+        dict: Tamanho gravado e quantidade de registros (sem o cabeçalho)
+    """
+    written = 0
+    with open(path, 'wb') as csv_file:
+        for block in iter_csv_blocks(size):
+            csv_file.write(block)
+            written += len(block)
+    return {'size': written, 'records': (written - len(HEADER)) // len(ROW_TEMPLATE % (0, 0, 0))}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    print(write_csv(sys.argv[2], parse_size(sys.argv[1])))
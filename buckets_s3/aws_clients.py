@@ -0,0 +1,44 @@
+import threading
+
+# Clientes criados sob demanda e mantidos entre invocações do mesmo container
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service_name, **config):
+    """
+    Retorna o cliente boto3 do serviço, criado no primeiro uso.
+
+    O boto3 só é importado quando o primeiro cliente é necessário, e cada cliente só é criado
+    no caminho que o utiliza (ex: SES apenas ao enviar uma notificação), reduzindo o cold start.
+    O cliente é thread-safe e compartilhado pelas threads da invocação.
+
+    Args:
+        service_name (str): Nome do serviço AWS (ex: 's3', 'ses')
+        **config: Opções do botocore.config.Config usadas na criação (ex: max_pool_connections);
+                  ignoradas se o cliente já existir
+
+    Returns:
+        Cliente boto3 do serviço
+    """
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(service_name)
+        if client is None:
+            import boto3
+
+            client_config = None
+            if config:
+                from botocore.config import Config
+                client_config = Config(**config)
+            client = boto3.client(service_name, config=client_config)
+            _clients[service_name] = client
+    return client
+
+
+def reset_clients():
+    """Descarta os clientes criados (ex: após alterar variáveis de ambiente em testes locais)."""
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,378 @@
+import codecs
+import csv
+import datetime
+import json
+import re
+import sys
+
+
+# Máximo de linhas físicas de um registro com campo entre aspas
+MAX_RECORD_LINES = 1000
+
+# Quantificador possessivo do caminho rápido de feed (suportado pelo re a partir do Python 3.11; nas versões
+# anteriores o padrão equivalente sem possessivo é usado, ~2x mais lento)
+POSSESSIVE = b'+' if sys.version_info >= (3, 11) else b''
+
+
+class CsvValidationError(Exception):
+    """
+    Erro de validação que interrompe o envio do arquivo.
+
+    Attributes:
+        validator (CsvValidator): Validador com contagem de linhas e amostras de erros
+    """
+
+    def __init__(self, message, validator):
+        super().__init__(message)
+        self.validator = validator
+
+
+def _is_date(value):
+    try:
+        datetime.date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+# Regras de tipo disponíveis em VALIDATION_RULES; qualquer outro valor é tratado como expressão regular
+TYPE_RULES = {
+    'int': re.compile(r'-?\d+').fullmatch,
+    'decimal': re.compile(r'-?\d+(?:[.,]\d+)?').fullmatch,
+    'date': _is_date,
+    'nonempty': lambda value: bool(value.strip())
+}
+
+
+def compile_rules(rules):
+    """
+    Compila as regras por coluna.
+
+    Args:
+        rules (dict): Coluna (nome no cabeçalho ou índice) -> tipo ('int', 'decimal', 'date', 'nonempty') ou regex
+
+    Returns:
+        list: Tuplas (coluna, descrição da regra, função de verificação)
+    """
+    compiled = []
+    for column, rule in (rules or {}).items():
+        check = TYPE_RULES.get(rule) or re.compile(rule).fullmatch
+        compiled.append((column, rule, check))
+    return compiled
+
+
+class CsvValidator:
+    """
+    Validação incremental de CSV: cabeçalho, quantidade de colunas, codificação e regras por coluna.
+    Recebe o conteúdo em blocos (feed) à medida que é lido do S3, sem manter o arquivo em memória.
+
+    Args:
+        delimiter (str): Separador de colunas
+        encoding (str): Codificação esperada do arquivo
+        expected_header (str): Cabeçalho esperado (None = não verificar)
+        rules (dict): Regras por coluna (ver compile_rules)
+        max_error_rate (float): Fração máxima de linhas com erro (0.01 = 1%)
+        min_rows (int): Linhas mínimas antes de avaliar a taxa de erros durante a leitura
+        max_samples (int): Quantidade de erros guardados como exemplo para a notificação
+    """
+
+    def __init__(self, delimiter=';', encoding='utf-8', expected_header=None, rules=None,
+                 max_error_rate=0.01, min_rows=100, max_samples=20):
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.expected_header = expected_header
+        self.rules = compile_rules(rules)
+        self.max_error_rate = max_error_rate
+        self.min_rows = min_rows
+        self.max_samples = max_samples
+
+        self.rows = 0
+        self.errors = 0
+        self.samples = []
+        self.fatal = None
+
+        self._delimiter_bytes = delimiter.encode(encoding)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._header = None
+        self._columns = None
+        self._column_checks = []
+        self._valid_lines_pattern = None
+        self._pending = b''
+        self._pending_unchecked = False
+        self._record = []
+        self._in_quotes = False
+        self._line = 0
+        self._record_line = 0
+
+    @property
+    def error_rate(self):
+        return self.errors / self.rows if self.rows else 0.0
+
+    def exceeded(self, final=False):
+        """Verifica se a validação deve interromper o envio."""
+        if self.fatal:
+            return True
+        if not final and self.rows < self.min_rows:
+            return False
+        return self.error_rate > self.max_error_rate
+
+    def summary(self):
+        """Resumo da validação para o resultado e a notificação."""
+        return {
+            'registros_locais': self.rows,
+            'linhas_invalidas': self.errors,
+            'erros_validacao': [f"Linha {line}: {message}" for line, message in self.samples]
+        }
+
+    def _error(self, line, message):
+        self.errors += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append((line, message))
+
+    def feed(self, data):
+        """Valida o próximo bloco do arquivo."""
+        if not data:
+            return
+        # Verificação de codificação do bloco inteiro (rápida); linha a linha apenas se o bloco falhar
+        try:
+            self._decoder.decode(data)
+            check_encoding = False
+        except UnicodeDecodeError:
+            self._decoder.reset()
+            check_encoding = True
+
+        if self._pending:
+            # Linha incompleta de um bloco com erro de codificação: verificada linha a linha ao ser concluída
+            check_encoding = check_encoding or self._pending_unchecked
+            data = self._pending + data
+        start = 0
+        end = data.rfind(b'\n') + 1
+        while self._valid_lines_pattern is not None and not check_encoding and not self._in_quotes and start < end:
+            # Caminho rápido: a sequência de linhas válidas (colunas certas, sem aspas) é reconhecida em C;
+            # somente a linha onde o padrão para é validada individualmente
+            valid_end = self._valid_lines_pattern.match(data, start, end).end()
+            lines = data.count(b'\n', start, valid_end)
+            self.rows += lines
+            self._line += lines
+            if valid_end == end:
+                self._pending = data[end:]
+                self._pending_unchecked = False
+                return
+            line_end = data.index(b'\n', valid_end)
+            self._feed_line(data[valid_end:line_end], check_encoding)
+            start = line_end + 1
+
+        lines = data[start:].split(b'\n') if start else data.split(b'\n')
+        self._pending = lines.pop()
+        self._pending_unchecked = check_encoding
+        for line in lines:
+            self._feed_line(line, check_encoding)
+
+    def finish(self):
+        """Valida a última linha (sem quebra de linha final)."""
+        if self._pending:
+            self._feed_line(self._pending, True)
+            self._pending = b''
+        if self._record:
+            self._check_record(b'\n'.join(self._record), True)
+            self._record = []
+        if self._header is None:
+            self.fatal = 'Arquivo vazio'
+
+    def _feed_line(self, line, check_encoding):
+        self._line += 1
+        if not self._record:
+            self._record_line = self._line
+        self._record.append(line)
+        # Registros com quebra de linha dentro de campo entre aspas continuam na próxima linha
+        if line.count(b'"') % 2:
+            self._in_quotes = not self._in_quotes
+        if self._in_quotes:
+            # Aspas não fechadas: evita acumular o restante do arquivo como um único registro
+            if len(self._record) > MAX_RECORD_LINES:
+                self.rows += 1
+                self._error(self._record_line, 'aspas não fechadas')
+                self._record = []
+                self._in_quotes = False
+            return
+        record = self._record[0] if len(self._record) == 1 else b'\n'.join(self._record)
+        self._record = []
+        self._check_record(record, check_encoding)
+
+    def _split(self, text):
+        return next(csv.reader([text], delimiter=self.delimiter))
+
+    def _check_record(self, record, check_encoding):
+        record = record.rstrip(b'\r')
+        if self._header is None:
+            self._check_header(record)
+            return
+        if not record:
+            return
+
+        self.rows += 1
+        line = self._record_line
+        if check_encoding:
+            try:
+                record.decode(self.encoding)
+            except UnicodeDecodeError as e:
+                self._error(line, f"codificação inválida ({self.encoding}): {e.reason}")
+                return
+
+        fields = None
+        if b'"' in record:
+            fields = self._split(record.decode(self.encoding, 'replace'))
+            columns = len(fields)
+        else:
+            columns = record.count(self._delimiter_bytes) + 1
+        if columns != self._columns:
+            self._error(line, f"{columns} colunas (esperado {self._columns})")
+            return
+
+        if self._column_checks:
+            if fields is None:
+                fields = record.decode(self.encoding, 'replace').split(self.delimiter)
+            for index, name, rule, check in self._column_checks:
+                if not check(fields[index]):
+                    self._error(line, f"coluna {name} inválida ({rule}): {fields[index][:50]!r}")
+                    return
+
+    def _check_header(self, record):
+        try:
+            header = record.decode(self.encoding).lstrip('\ufeff')
+        except UnicodeDecodeError:
+            self.fatal = f"Cabeçalho com codificação inválida ({self.encoding})"
+            return
+        self._header = self._split(header) if header else []
+        self._columns = len(self._header)
+
+        if self.expected_header is not None:
+            expected = self._split(self.expected_header)
+            if [name.strip().lower() for name in self._header] != [name.strip().lower() for name in expected]:
+                self.fatal = f"Cabeçalho inesperado: {header[:200]!r} (esperado {self.expected_header[:200]!r})"
+                return
+        if self._columns <= 1 and self.delimiter not in header and len(header) > 0:
+            # Cabeçalho sem o separador configurado costuma indicar delimitador errado
+            for candidate in (';', ',', '\t', '|'):
+                if candidate != self.delimiter and candidate in header:
+                    self.fatal = f"Delimitador inválido: cabeçalho usa {candidate!r}, esperado {self.delimiter!r}"
+                    return
+
+        if self._columns > 1 and not self.rules:
+            # Sequência de linhas com exatamente as colunas do cabeçalho, sem aspas (caminho rápido de feed).
+            # Os campos não contêm o separador nem a quebra de linha: sem o possessivo, o retrocesso em uma
+            # linha inválida é linear e o resultado é o mesmo
+            delimiter = re.escape(self._delimiter_bytes)
+            field = rb'[^\n"' + delimiter + rb']*' + POSSESSIVE
+            self._valid_lines_pattern = re.compile(
+                rb'(?:' + field + rb'(?:' + delimiter + field + rb'){' + str(self._columns - 1).encode() + rb'}\n)*' + POSSESSIVE
+            )
+
+        names = [name.strip().lower() for name in self._header]
+        for column, rule, check in self.rules:
+            if isinstance(column, int) or str(column).isdigit():
+                index = int(column)
+            elif str(column).strip().lower() in names:
+                index = names.index(str(column).strip().lower())
+            else:
+                self.fatal = f"Coluna {column!r} das regras de validação não existe no cabeçalho"
+                return
+            if index >= self._columns:
+                self.fatal = f"Coluna {column!r} das regras de validação fora do cabeçalho"
+                return
+            self._column_checks.append((index, self._header[index], rule, check))
+
+
+class ValidatingStream:
+    """
+    Repassa o conteúdo do stream validando cada bloco lido.
+    Interrompe a leitura (CsvValidationError) assim que a taxa de erros ultrapassa o limite,
+    antes do envelope SOAP ser concluído, para que o webservice não processe o arquivo.
+    """
+
+    def __init__(self, stream, validator, prefix=b''):
+        self._stream = stream
+        self._prefix = prefix
+        self.validator = validator
+        self._finished = False
+
+    def read(self, size=-1):
+        if self._prefix:
+            # Conteúdo já validado na pré-validação é devolvido antes do restante do stream
+            data = self._prefix if size is None or size < 0 else self._prefix[:size]
+            self._prefix = self._prefix[len(data):]
+            return data
+        data = self._stream.read(size)
+        if data:
+            self.validator.feed(data)
+            if self.validator.exceeded():
+                raise CsvValidationError(describe_failure(self.validator), self.validator)
+        elif not self._finished:
+            self._finished = True
+            self.validator.finish()
+            if self.validator.exceeded(final=True):
+                raise CsvValidationError(describe_failure(self.validator), self.validator)
+        return data
+
+    def close(self):
+        self._stream.close()
+
+
+def describe_failure(validator):
+    """Mensagem de erro da validação para logs e notificação."""
+    if validator.fatal:
+        return f"Validação do CSV falhou: {validator.fatal}"
+    return (
+        f"Validação do CSV falhou: {validator.errors} de {validator.rows} linhas inválidas "
+        f"({validator.error_rate:.2%}, limite {validator.max_error_rate:.2%})"
+    )
+
+
+def preflight(stream, validator, max_rows, chunk_size=64 * 1024):
+    """
+    Pré-validação: lê e valida o início do arquivo antes de abrir a conexão com o webservice.
+    O conteúdo lido é mantido e devolvido pelo ValidatingStream, sem uma segunda leitura do S3.
+
+    Args:
+        stream: Stream com o conteúdo do CSV
+        validator (CsvValidator): Validador
+        max_rows (int): Quantidade de linhas validadas antes do envio
+
+    Returns:
+        ValidatingStream: Stream que devolve o conteúdo completo e continua a validação durante o envio
+
+    Raises:
+        CsvValidationError: Se o início do arquivo já ultrapassa o limite de erros
+    """
+    chunks = []
+    at_eof = False
+    while validator.rows < max_rows and not validator.fatal:
+        data = stream.read(chunk_size)
+        if not data:
+            at_eof = True
+            validator.finish()
+            break
+        chunks.append(data)
+        validator.feed(data)
+
+    if validator.exceeded(final=at_eof):
+        raise CsvValidationError(describe_failure(validator), validator)
+    validating_stream = ValidatingStream(stream, validator, prefix=b''.join(chunks))
+    validating_stream._finished = at_eof
+    return validating_stream
+
+
+def create_validator_from_env(environ):
+    """
+    Cria o validador a partir das variáveis de ambiente, ou None se a validação estiver desabilitada.
+    """
+    if environ.get('VALIDATION_ENABLED') != 'true':
+        return None
+    return CsvValidator(
+        delimiter=environ.get('CSV_DELIMITER', ';'),
+        encoding=environ.get('CSV_ENCODING', 'utf-8'),
+        expected_header=environ.get('VALIDATION_EXPECTED_HEADER') or None,
+        rules=json.loads(environ.get('VALIDATION_RULES', '{}')),
+        max_error_rate=float(environ.get('VALIDATION_MAX_ERROR_RATE', '0.01')),
+        min_rows=int(environ.get('VALIDATION_MIN_ROWS', '100'))
+    )
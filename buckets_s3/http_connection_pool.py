@@ -0,0 +1,135 @@
+import select
+import threading
+import time
+
+
+class HTTPConnectionPool:
+    """
+    Pool de conexões HTTP/HTTPS keep-alive reaproveitado entre invocações "quentes" do Lambda.
+
+    As conexões ociosas são agrupadas por (scheme, host, verify_ssl). O contexto SSL é criado
+    uma única vez por valor de verify_ssl. Antes de reutilizar uma conexão ociosa, o pool verifica
+    se ela ainda está viva e descarta as que passaram de idle_timeout ou foram fechadas pelo servidor.
+
+    Args:
+        max_idle_per_key (int): Máximo de conexões ociosas mantidas por destino
+        idle_timeout (float): Tempo máximo em segundos que uma conexão pode ficar ociosa
+    """
+
+    def __init__(self, max_idle_per_key=8, idle_timeout=50.0):
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._ssl_contexts = {}
+        self._counters = {'reutilizadas': 0, 'novas': 0, 'descartadas': 0}
+
+    def get_ssl_context(self, verify_ssl):
+        """Retorna o contexto SSL em cache para o valor de verify_ssl."""
+        with self._lock:
+            ssl_context = self._ssl_contexts.get(verify_ssl)
+            if ssl_context is None:
+                import ssl
+                ssl_context = ssl.create_default_context()
+                if not verify_ssl:
+                    ssl_context.check_hostname = False
+                    ssl_context.verify_mode = ssl.CERT_NONE
+                self._ssl_contexts[verify_ssl] = ssl_context
+            return ssl_context
+
+    def acquire(self, scheme, host, verify_ssl, timeout):
+        """
+        Obtém uma conexão para o destino, reutilizando uma conexão ociosa viva quando possível.
+
+        Args:
+            scheme (str): 'http' ou 'https'
+            host (str): Host (e porta, se houver) do destino
+            verify_ssl (bool): Se o certificado do servidor deve ser verificado
+            timeout (float): Timeout do socket em segundos
+        """
+        pool_key = (scheme, host, verify_ssl)
+        now = time.monotonic()
+
+        while True:
+            with self._lock:
+                idle = self._idle.get(pool_key)
+                if not idle:
+                    break
+                conn, last_used = idle.pop()
+            if now - last_used <= self.idle_timeout and self._is_alive(conn):
+                conn.timeout = timeout
+                conn.sock.settimeout(timeout)
+                self._count('reutilizadas')
+                return conn
+            conn.close()
+            self._count('descartadas')
+
+        # Importado apenas quando uma conexão nova é necessária (reduz o cold start)
+        import http.client
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, context=self.get_ssl_context(verify_ssl), timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(host, timeout=timeout)
+        conn.pool_key = pool_key
+        self._count('novas')
+        return conn
+
+    def release(self, conn, reusable=True):
+        """
+        Devolve a conexão ao pool após a resposta ter sido lida por completo.
+
+        Args:
+            conn: Conexão obtida por acquire
+            reusable (bool): False quando o servidor pediu para fechar a conexão ou houve erro
+        """
+        if not reusable or conn.sock is None:
+            conn.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(conn.pool_key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def reset_counters(self):
+        """Zera os contadores (chamado no início de cada invocação)."""
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def counters(self):
+        """Retorna uma cópia dos contadores de conexões reutilizadas, novas e descartadas."""
+        with self._lock:
+            return dict(self._counters)
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas."""
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle.clear()
+        for idle in idle_lists:
+            for conn, _ in idle:
+                conn.close()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _is_alive(conn):
+        """
+        Verifica se uma conexão ociosa ainda está aberta.
+        Uma conexão ociosa saudável não tem nada para ler: se o socket está legível,
+        o servidor fechou a conexão (EOF) ou enviou dados inesperados.
+        """
+        sock = conn.sock
+        if sock is None:
+            return False
+        try:
+            if hasattr(sock, 'pending') and sock.pending():
+                return False
+            readable, _, _ = select.select([sock], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
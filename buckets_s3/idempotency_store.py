@@ -0,0 +1,277 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from aws_clients import get_client
+
+STATUS_IN_PROGRESS = 'IN_PROGRESS'
+STATUS_COMPLETED = 'COMPLETED'
+STATUS_UNKNOWN = 'UNKNOWN'
+
+
+def build_idempotency_key(bucket, key, etag=None, version_id=None):
+    """
+    Monta a chave de idempotência de um objeto S3: (bucket, key, versionId ou ETag).
+    Retorna None quando o evento não traz nem ETag nem versionId.
+    """
+    identity = version_id or (etag.strip('"') if etag else None)
+    if not identity:
+        return None
+    return f"{bucket}/{key}@{identity}"
+
+
+class SQLiteIdempotencyBackend:
+    """
+    Backend durável em SQLite, para testes locais e execução fora da AWS.
+
+    Args:
+        path (str): Caminho do arquivo SQLite (':memory:' para um banco temporário)
+    """
+
+    def __init__(self, path):
+        import sqlite3
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS idempotency ('
+            'id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, expires_at REAL NOT NULL)'
+        )
+
+    def get(self, item_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, result, expires_at FROM idempotency WHERE id = ? AND expires_at > ?',
+                (item_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return {'status': row[0], 'result': json.loads(row[1]) if row[1] else None, 'expires_at': row[2]}
+
+    def put_if_absent(self, item_id, record):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM idempotency WHERE id = ? AND expires_at <= ?', (item_id, time.time()))
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO idempotency (id, status, result, expires_at) VALUES (?, ?, ?, ?)',
+                    (item_id, record['status'], json.dumps(record.get('result')), record['expires_at'])
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return cursor.rowcount == 1
+
+    def put(self, item_id, record):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO idempotency (id, status, result, expires_at) VALUES (?, ?, ?, ?)',
+                (item_id, record['status'], json.dumps(record.get('result')), record['expires_at'])
+            )
+
+    def delete(self, item_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM idempotency WHERE id = ?', (item_id,))
+
+
+class DynamoDBIdempotencyBackend:
+    """
+    Backend durável em DynamoDB. A tabela usa a chave de partição 'id' (String)
+    e o atributo 'expires_at' (Number) pode ser configurado como TTL da tabela.
+
+    Args:
+        table_name (str): Nome da tabela DynamoDB
+        client: Cliente boto3 do DynamoDB (padrão: cliente compartilhado de aws_clients, criado no primeiro uso)
+    """
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Cliente compartilhado do container (mesmo cache dos clientes S3 e SES)
+            self._client = get_client('dynamodb')
+        return self._client
+
+    @staticmethod
+    def _to_item(item_id, record):
+        item = {
+            'id': {'S': item_id},
+            'status': {'S': record['status']},
+            'expires_at': {'N': str(int(record['expires_at']))}
+        }
+        if record.get('result') is not None:
+            item['result'] = {'S': json.dumps(record['result'])}
+        return item
+
+    def get(self, item_id):
+        item = self.client.get_item(TableName=self.table_name, Key={'id': {'S': item_id}}, ConsistentRead=True).get('Item')
+        # O TTL do DynamoDB remove itens com atraso; itens expirados são ignorados aqui
+        if item is None or float(item['expires_at']['N']) <= time.time():
+            return None
+        return {
+            'status': item['status']['S'],
+            'result': json.loads(item['result']['S']) if 'result' in item else None,
+            'expires_at': float(item['expires_at']['N'])
+        }
+
+    def put_if_absent(self, item_id, record):
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item=self._to_item(item_id, record),
+                ConditionExpression='attribute_not_exists(id) OR expires_at <= :now',
+                ExpressionAttributeValues={':now': {'N': str(int(time.time()))}}
+            )
+            return True
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def put(self, item_id, record):
+        self.client.put_item(TableName=self.table_name, Item=self._to_item(item_id, record))
+
+    def delete(self, item_id):
+        self.client.delete_item(TableName=self.table_name, Key={'id': {'S': item_id}})
+
+
+class IdempotencyStore:
+    """
+    Registro de arquivos já transmitidos, com cache LRU em memória (mantido entre invocações
+    do mesmo container) na frente de um backend durável.
+
+    Apenas registros concluídos ou com resultado desconhecido são mantidos no cache; a reserva de
+    processamento (IN_PROGRESS) sempre consulta o backend, para que invocações concorrentes não
+    transmitam o mesmo arquivo.
+
+    Args:
+        backend: Backend durável (SQLiteIdempotencyBackend, DynamoDBIdempotencyBackend ou compatível),
+                 ou None para usar apenas o cache em memória
+        cache_size (int): Máximo de registros no cache LRU
+        cache_ttl (float): Tempo máximo em segundos de um registro no cache
+    """
+
+    def __init__(self, backend=None, cache_size=1024, cache_ttl=300.0):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def _cache_get(self, item_id):
+        with self._lock:
+            entry = self._cache.get(item_id)
+            if entry is None:
+                return None
+            record, cached_until = entry
+            if cached_until <= time.time():
+                del self._cache[item_id]
+                return None
+            self._cache.move_to_end(item_id)
+            return record
+
+    def _cache_put(self, item_id, record):
+        with self._lock:
+            self._cache[item_id] = (record, min(record['expires_at'], time.time() + self.cache_ttl))
+            self._cache.move_to_end(item_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get_completed(self, item_id):
+        """
+        Retorna o resultado registrado de um arquivo já transmitido, ou None.
+        """
+        record = self._cache_get(item_id)
+        if record is None and self.backend is not None:
+            record = self.backend.get(item_id)
+            if record is not None and record['status'] == STATUS_COMPLETED:
+                self._cache_put(item_id, record)
+        if record is not None and record['status'] == STATUS_COMPLETED:
+            return record['result']
+        return None
+
+    def get_unknown(self, item_id):
+        """
+        Retorna o resultado registrado de um arquivo com resultado desconhecido (aguardando conferência), ou None.
+        """
+        record = self._cache_get(item_id)
+        if record is None and self.backend is not None:
+            record = self.backend.get(item_id)
+            if record is not None and record['status'] == STATUS_UNKNOWN:
+                self._cache_put(item_id, record)
+        if record is not None and record['status'] == STATUS_UNKNOWN:
+            return record['result']
+        return None
+
+    def claim(self, item_id, ttl):
+        """
+        Reserva o arquivo para transmissão. Retorna False se outra invocação já o está processando
+        (ou já o concluiu). A reserva expira após ttl segundos, caso a invocação seja interrompida.
+        """
+        record = {'status': STATUS_IN_PROGRESS, 'result': None, 'expires_at': time.time() + ttl}
+        if self.backend is not None:
+            return self.backend.put_if_absent(item_id, record)
+        with self._lock:
+            claimed_until = self._claims.get(item_id, 0)
+            if claimed_until > time.time() or item_id in self._cache:
+                return False
+            self._claims[item_id] = record['expires_at']
+            return True
+
+    def complete(self, item_id, result, ttl):
+        """
+        Registra a transmissão concluída com o resultado (protocolo, contadores) por ttl segundos.
+        """
+        record = {'status': STATUS_COMPLETED, 'result': result, 'expires_at': time.time() + ttl}
+        if self.backend is not None:
+            self.backend.put(item_id, record)
+        with self._lock:
+            self._claims.pop(item_id, None)
+        self._cache_put(item_id, record)
+
+    def mark_unknown(self, item_id, result, ttl):
+        """
+        Mantém a reserva com resultado desconhecido (requisição enviada sem resposta) por ttl segundos:
+        novas entregas do evento não retransmitem o arquivo até a conferência manual, que remove o registro
+        (para reenviar) ou o substitui pelo resultado concluído.
+        """
+        record = {'status': STATUS_UNKNOWN, 'result': result, 'expires_at': time.time() + ttl}
+        if self.backend is not None:
+            self.backend.put(item_id, record)
+        with self._lock:
+            self._claims.pop(item_id, None)
+        self._cache_put(item_id, record)
+
+    def release(self, item_id):
+        """
+        Libera a reserva após uma falha, para que uma nova tentativa possa transmitir o arquivo.
+        """
+        if self.backend is not None:
+            self.backend.delete(item_id)
+        with self._lock:
+            self._claims.pop(item_id, None)
+
+
+def create_idempotency_store(backend_name, table_name=None, sqlite_path=None, cache_size=1024, cache_ttl=300.0):
+    """
+    Cria o IdempotencyStore para o backend configurado.
+
+    Args:
+        backend_name (str): 'dynamodb', 'sqlite' ou 'memory' (apenas cache do container)
+        table_name (str): Tabela DynamoDB (backend 'dynamodb')
+        sqlite_path (str): Arquivo SQLite (backend 'sqlite')
+    """
+    if backend_name == 'dynamodb':
+        if not table_name:
+            raise ValueError("IDEMPOTENCY_TABLE é obrigatório para o backend dynamodb")
+        backend = DynamoDBIdempotencyBackend(table_name)
+    elif backend_name == 'sqlite':
+        backend = SQLiteIdempotencyBackend(sqlite_path or '/tmp/idempotency.sqlite3')
+    elif backend_name == 'memory':
+        backend = None
+    else:
+        raise ValueError(f"Backend de idempotência desconhecido: {backend_name}")
+    return IdempotencyStore(backend, cache_size=cache_size, cache_ttl=cache_ttl)
@@ -0,0 +1,147 @@
+import os
+
+
+class DeadlineExceededError(Exception):
+    """
+    Tempo restante da invocação insuficiente para concluir uma etapa.
+
+    Attributes:
+        stage (str): Etapa interrompida (ex: 'request_write', 'server_wait')
+        request_sent (bool): Se a requisição já havia sido enviada por completo ao webservice
+                             (o arquivo pode ter sido processado mesmo sem resposta)
+    """
+
+    def __init__(self, stage, request_sent=False):
+        super().__init__(f"Tempo da invocação esgotado na etapa {stage}")
+        self.stage = stage
+        self.request_sent = request_sent
+
+
+class _UnboundedDeadline:
+    """Sem prazo (execução fora do Lambda): os orçamentos são os próprios limites configurados."""
+
+    enabled = False
+
+    def remaining(self):
+        return None
+
+    def expired(self):
+        return False
+
+    def check(self, stage, needed=0.0):
+        pass
+
+    def budget(self, stage, limit):
+        return limit
+
+
+UNBOUNDED = _UnboundedDeadline()
+
+
+class InvocationDeadline:
+    """
+    Prazo da invocação, obtido de context.get_remaining_time_in_millis, descontada uma reserva
+    para as etapas finais (notificação, organização do arquivo no bucket e checkpoint).
+
+    Cada etapa recebe como orçamento o menor valor entre o seu limite configurado e o tempo restante;
+    uma etapa sem o tempo mínimo é interrompida com DeadlineExceededError, antes que o runtime
+    encerre a função no meio da requisição.
+
+    Args:
+        remaining_millis: Função que retorna o tempo restante da invocação em ms
+        reserve (float): Segundos reservados para as etapas finais
+        min_stage (float): Tempo mínimo em segundos para iniciar uma etapa
+    """
+
+    enabled = True
+
+    def __init__(self, remaining_millis, reserve=10.0, min_stage=1.0):
+        self._remaining_millis = remaining_millis
+        self.reserve = reserve
+        self.min_stage = min_stage
+
+    def remaining(self):
+        """Segundos disponíveis até a reserva final."""
+        return self._remaining_millis() / 1000 - self.reserve
+
+    def expired(self):
+        """Verifica se o tempo restante é menor que o mínimo de uma etapa."""
+        return self.remaining() < self.min_stage
+
+    def check(self, stage, needed=0.0):
+        """
+        Interrompe a etapa se não houver o tempo mínimo (ou needed segundos) antes da reserva.
+
+        Raises:
+            DeadlineExceededError: Tempo insuficiente para a etapa
+        """
+        if self.remaining() < max(needed, self.min_stage):
+            raise DeadlineExceededError(stage)
+
+    def budget(self, stage, limit):
+        """
+        Orçamento em segundos da etapa: o menor entre limit e o tempo restante antes da reserva.
+
+        Raises:
+            DeadlineExceededError: Tempo insuficiente para a etapa
+        """
+        remaining = self.remaining()
+        if remaining < self.min_stage:
+            raise DeadlineExceededError(stage)
+        return min(limit, remaining)
+
+
+# Prazo da invocação em andamento (um container processa uma invocação por vez)
+_current = UNBOUNDED
+
+
+def start_invocation(context=None, environ=None):
+    """
+    Inicia o prazo da invocação a partir do contexto do Lambda, com a reserva de
+    DEADLINE_RESERVE_SECONDS (padrão: 10) e o mínimo por etapa de DEADLINE_MIN_STAGE_SECONDS (padrão: 1).
+    Sem contexto (execução local), as etapas usam apenas os seus limites configurados.
+
+    Args:
+        context: Contexto do Lambda (get_remaining_time_in_millis)
+        environ (dict): Variáveis de ambiente (padrão: os.environ)
+
+    Returns:
+        InvocationDeadline, ou UNBOUNDED sem contexto
+    """
+    global _current
+    environ = os.environ if environ is None else environ
+    remaining_millis = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining_millis is None:
+        _current = UNBOUNDED
+        return _current
+    _current = InvocationDeadline(
+        remaining_millis,
+        reserve=float(environ.get('DEADLINE_RESERVE_SECONDS', '10')),
+        min_stage=float(environ.get('DEADLINE_MIN_STAGE_SECONDS', '1'))
+    )
+    return _current
+
+
+def current():
+    """Retorna o prazo da invocação em andamento."""
+    return _current
+
+
+def remaining():
+    """Segundos disponíveis na invocação em andamento (None sem prazo)."""
+    return _current.remaining()
+
+
+def expired():
+    """Verifica se a invocação em andamento não tem mais tempo para uma etapa."""
+    return _current.expired()
+
+
+def check(stage, needed=0.0):
+    """Interrompe a etapa sem tempo suficiente na invocação em andamento (ver InvocationDeadline.check)."""
+    _current.check(stage, needed)
+
+
+def budget(stage, limit):
+    """Orçamento da etapa na invocação em andamento (ver InvocationDeadline.budget)."""
+    return _current.budget(stage, limit)
@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Unidades aceitas pelo CloudWatch usadas nas métricas
+UNIT_MILLISECONDS = 'Milliseconds'
+UNIT_BYTES = 'Bytes'
+UNIT_COUNT = 'Count'
+
+# Limite de métricas por diretiva EMF
+MAX_METRICS_PER_DIRECTIVE = 100
+
+
+class _NullStage:
+    """Etapa sem efeito, usada com as métricas desabilitadas (custo de uma chamada de método)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _NullMetrics:
+    """Métricas desabilitadas: todas as operações são ignoradas."""
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def add(self, name, value, unit=UNIT_COUNT):
+        pass
+
+    def set_property(self, name, value):
+        pass
+
+    def emit(self):
+        return None
+
+
+NULL_METRICS = _NullMetrics()
+
+
+class _Stage:
+    """Cronometra uma etapa e acumula a duração (e, se habilitado, a memória) em InvocationMetrics."""
+
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        if self._metrics.track_memory:
+            import tracemalloc
+            # Pico medido a partir do início da etapa (e não o acumulado da invocação)
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics._finish_stage(self._name, (time.perf_counter() - self._start) * 1000)
+        return False
+
+
+class InvocationMetrics:
+    """
+    Métricas de uma invocação, emitidas em uma única linha de log no formato CloudWatch
+    Embedded Metric Format (EMF): o CloudWatch extrai as métricas do log, sem chamadas à API.
+
+    Cada etapa registra a duração somada (em ms, somando as threads que executam a mesma etapa)
+    e a quantidade de execuções. Com track_memory, registra também o pico de memória alocada pelo
+    Python durante a etapa (tracemalloc, reiniciado no início de cada etapa; etapas aninhadas ou
+    simultâneas em threads compartilham o pico) e o pico de RSS do processo ao final de cada etapa.
+
+    Args:
+        namespace (str): Namespace das métricas no CloudWatch
+        function_name (str): Nome da função (dimensão FunctionName)
+        request_id (str): Id da requisição, incluído como propriedade (não é dimensão)
+        track_memory (bool): Registrar memória por etapa (tracemalloc tem custo relevante; apenas sob demanda)
+        stream: Destino da linha EMF (padrão: stdout, capturado pelo CloudWatch Logs)
+    """
+
+    enabled = True
+
+    def __init__(self, namespace, function_name, request_id=None, track_memory=False, stream=None):
+        self.namespace = namespace
+        self.function_name = function_name
+        self.track_memory = track_memory
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._values = {}
+        self._units = {}
+        self._properties = {'RequestId': request_id} if request_id else {}
+        self._start = time.perf_counter()
+        if track_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Pico medido a partir do início desta invocação (o container é reutilizado entre invocações)
+            tracemalloc.reset_peak()
+
+    def stage(self, name):
+        """
+        Context manager que cronometra uma etapa (ex: with metrics.stage('s3_read'): ...).
+        """
+        return _Stage(self, name)
+
+    def add(self, name, value, unit=UNIT_COUNT):
+        """Soma value à métrica name (ex: bytes lidos do S3)."""
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+            self._units[name] = unit
+
+    def set_property(self, name, value):
+        """Inclui um valor na linha EMF sem criar métrica (ex: nome do arquivo)."""
+        with self._lock:
+            self._properties[name] = value
+
+    def _finish_stage(self, name, elapsed_ms):
+        memory = self._memory_snapshot() if self.track_memory else None
+        with self._lock:
+            self._values[f"{name}.Duration"] = self._values.get(f"{name}.Duration", 0) + elapsed_ms
+            self._units[f"{name}.Duration"] = UNIT_MILLISECONDS
+            self._values[f"{name}.Count"] = self._values.get(f"{name}.Count", 0) + 1
+            self._units[f"{name}.Count"] = UNIT_COUNT
+            if memory is not None:
+                for metric, value in memory.items():
+                    key = f"{name}.{metric}"
+                    self._values[key] = max(self._values.get(key, 0), value)
+                    self._units[key] = UNIT_BYTES
+
+    @staticmethod
+    def _memory_snapshot():
+        import resource
+        import tracemalloc
+        # ru_maxrss está em KB no Linux
+        snapshot = {'MaxRSS': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+        if tracemalloc.is_tracing():
+            snapshot['PeakTracedMemory'] = tracemalloc.get_traced_memory()[1]
+        return snapshot
+
+    def to_emf(self):
+        """
+        Monta o documento EMF da invocação.
+
+        Returns:
+            dict: Documento com _aws (metadados das métricas), dimensões, valores e propriedades
+        """
+        with self._lock:
+            values = dict(self._values)
+            units = dict(self._units)
+            properties = dict(self._properties)
+        values['Invocation.Duration'] = (time.perf_counter() - self._start) * 1000
+        units['Invocation.Duration'] = UNIT_MILLISECONDS
+
+        names = sorted(values)
+        directives = [
+            {
+                'Namespace': self.namespace,
+                'Dimensions': [['FunctionName']],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in names[start:start + MAX_METRICS_PER_DIRECTIVE]]
+            }
+            for start in range(0, len(names), MAX_METRICS_PER_DIRECTIVE)
+        ]
+        document = dict(properties)
+        document.update({name: round(values[name], 3) for name in names})
+        document['FunctionName'] = self.function_name
+        document['_aws'] = {'Timestamp': int(time.time() * 1000), 'CloudWatchMetrics': directives}
+        return document
+
+    def emit(self):
+        """
+        Escreve a linha EMF. É escrita diretamente no stdout (e não pelo logging), pois o CloudWatch
+        só reconhece o EMF quando a linha inteira é o documento JSON.
+
+        Returns:
+            dict: Documento emitido
+        """
+        document = self.to_emf()
+        stream = self._stream or sys.stdout
+        stream.write(json.dumps(document, ensure_ascii=False) + '\n')
+        stream.flush()
+        return document
+
+
+# Métricas da invocação em andamento (um container processa uma invocação por vez)
+_current = NULL_METRICS
+
+
+def start_invocation(function_name, context=None, environ=None, stream=None):
+    """
+    Inicia as métricas da invocação conforme METRICS_ENABLED (padrão: desabilitado) e
+    METRICS_TRACK_MEMORY. As funções stage e add deste módulo passam a registrar nesta invocação.
+
+    Args:
+        function_name (str): Nome usado quando o contexto do Lambda não está disponível
+        context: Contexto do Lambda (function_name e aws_request_id)
+        environ (dict): Variáveis de ambiente (padrão: os.environ)
+
+    Returns:
+        InvocationMetrics, ou NULL_METRICS se desabilitado
+    """
+    global _current
+    environ = os.environ if environ is None else environ
+    if environ.get('METRICS_ENABLED', 'false') != 'true':
+        _current = NULL_METRICS
+        return _current
+    _current = InvocationMetrics(
+        namespace=environ.get('METRICS_NAMESPACE', 'LambdaIntegration'),
+        function_name=getattr(context, 'function_name', None) or function_name,
+        request_id=getattr(context, 'aws_request_id', None),
+        track_memory=environ.get('METRICS_TRACK_MEMORY', 'false') == 'true',
+        stream=stream
+    )
+    return _current
+
+
+def current():
+    """Retorna as métricas da invocação em andamento."""
+    return _current
+
+
+def stage(name):
+    """Cronometra uma etapa da invocação em andamento (ver InvocationMetrics.stage)."""
+    return _current.stage(name)
+
+
+def add(name, value, unit=UNIT_COUNT):
+    """Soma value à métrica name da invocação em andamento."""
+    _current.add(name, value, unit)
@@ -0,0 +1,348 @@
+import logging
+import os
+import threading
+import time
+
+import lambda_metrics
+from aws_clients import get_client
+
+logger = logging.getLogger()
+
+# Tamanho máximo do detalhe da primeira notificação incluído no resumo
+DIGEST_DETAIL_MAX_CHARS = 4000
+
+# Margem de segurança (s) entre o fim do envio dos emails e o fim da invocação
+INVOCATION_SAFETY_SECONDS = 1.0
+
+
+def build_group(category, bucket, key):
+    """
+    Monta o grupo de agregação de uma notificação: (categoria, bucket, pasta do arquivo).
+    Ex: ('COPY_ERROR', 'bucket', 'voxis/relatorio.csv.gz') -> ('COPY_ERROR', 'bucket', 'voxis/')
+    """
+    prefix = key.rsplit('/', 1)[0] + '/' if key and '/' in key else ''
+    return (category, bucket or '', prefix)
+
+
+def send_email(message):
+    """
+    Envia um email via SES (cliente criado no primeiro envio, com novas tentativas adaptativas
+    em caso de throttling).
+
+    Args:
+        message (dict): source, to, cc, subject, text e html (opcional)
+
+    Returns:
+        str: MessageId do SES
+    """
+    body = {'Text': {'Data': message['text'], 'Charset': 'UTF-8'}}
+    if message.get('html'):
+        body['Html'] = {'Data': message['html'], 'Charset': 'UTF-8'}
+    destination = {'ToAddresses': list(message['to'])}
+    if message.get('cc'):
+        destination['CcAddresses'] = list(message['cc'])
+    with lambda_metrics.stage('ses_send'):
+        response = get_client('ses', retries={'max_attempts': 4, 'mode': 'adaptive'}).send_email(
+            Source=message['source'],
+            Destination=destination,
+            Message={'Subject': {'Data': message['subject'], 'Charset': 'UTF-8'}, 'Body': body}
+        )
+    return response['MessageId']
+
+
+class NotificationDigest:
+    """
+    Fila de notificações da invocação: os handlers enfileiram os emails (sem chamar o SES) e o envio
+    acontece no final da invocação (flush) ou quando a janela de agregação fecha.
+
+    Notificações do mesmo grupo (categoria, bucket, pasta) e destinatários são agregadas em um único
+    email de resumo com uma tabela dos arquivos; um grupo com uma única notificação mantém o email
+    original. Notificações repetidas (mesmo arquivo e mesma mensagem) viram uma linha com a contagem.
+    O envio é limitado por flush_budget segundos e pelo tempo restante da invocação; os emails que
+    não cabem no prazo são descartados e registrados no log.
+
+    Args:
+        window_seconds (float): Janela de agregação a partir da primeira notificação (0 = apenas no flush)
+        max_items (int): Linhas da tabela de cada resumo (as demais são apenas contadas)
+        flush_budget (float): Tempo máximo de envio dos emails em cada flush (segundos)
+        enabled (bool): False envia cada notificação imediatamente (sem agregação)
+        remaining_time: Função que retorna o tempo restante da invocação em segundos (opcional)
+        sender: Função que envia um email (padrão: send_email)
+    """
+
+    def __init__(self, window_seconds=60.0, max_items=50, flush_budget=10.0, enabled=True,
+                 remaining_time=None, sender=None):
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self.flush_budget = flush_budget
+        self.enabled = enabled
+        self._remaining_time = remaining_time
+        self._sender = sender or send_email
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def enqueue(self, source, to, subject, text, html=None, cc=(), group=None, item=None):
+        """
+        Enfileira uma notificação.
+
+        Args:
+            source (str): Remetente
+            to (list): Destinatários
+            subject (str): Assunto do email individual
+            text (str): Corpo em texto do email individual
+            html (str): Corpo em HTML do email individual (opcional)
+            cc (list): Destinatários em cópia
+            group (tuple): Grupo de agregação retornado por build_group
+            item (dict): Linha da tabela do resumo (ex: {'arquivo': ..., 'mensagem': ...}); um campo
+                         '<nome>_url' vira o link do campo '<nome>' (ex: relatorio_rejeicoes_url)
+
+        Returns:
+            bool: True se enfileirada (ou enviada, sem agregação)
+        """
+        message = {
+            'source': source, 'to': tuple(to), 'cc': tuple(cc or ()), 'subject': subject,
+            'text': text, 'html': html, 'group': group or (subject, '', ''), 'item': item or {'assunto': subject}
+        }
+        lambda_metrics.add('Notifications.Queued', 1)
+        if not self.enabled:
+            return self._send([message], time.monotonic() + self._budget()) > 0
+
+        with self._lock:
+            self._pending.append(message)
+            if self._timer is None and self.window_seconds > 0:
+                # Janela fechada em uma thread própria, fora do caminho do envio dos arquivos
+                self._timer = threading.Timer(self.window_seconds, self.flush, kwargs={'reason': 'janela'})
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def pending(self):
+        """Quantidade de notificações aguardando o envio."""
+        with self._lock:
+            return len(self._pending)
+
+    def _budget(self):
+        budget = self.flush_budget
+        if self._remaining_time is not None:
+            remaining = self._remaining_time()
+            if remaining is not None:
+                budget = min(budget, remaining - INVOCATION_SAFETY_SECONDS)
+        return max(0.0, budget)
+
+    def flush(self, reason='fim da invocação'):
+        """
+        Envia as notificações pendentes (agregadas por grupo) dentro do orçamento de tempo.
+
+        Returns:
+            dict: notificacoes, emails, enviados, falhas e descartados
+        """
+        with self._flush_lock:
+            with self._lock:
+                messages, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not messages:
+                return {'notificacoes': 0, 'emails': 0, 'enviados': 0, 'falhas': 0, 'descartados': 0}
+
+            emails = self.build_emails(messages)
+            deadline = time.monotonic() + self._budget()
+            sent = self._send(emails, deadline)
+            failed = sum(1 for email in emails if email.get('falha'))
+            dropped = len(emails) - sent - failed
+            summary = {
+                'notificacoes': len(messages), 'emails': len(emails), 'enviados': sent,
+                'falhas': failed, 'descartados': dropped
+            }
+            logger.info(
+                "Notificações (%s): %d agregadas em %d email(s), %d enviado(s), %d com falha, %d descartado(s) pelo prazo",
+                reason, len(messages), len(emails), sent, failed, dropped
+            )
+            lambda_metrics.add('Notifications.Emails', sent)
+            if dropped or failed:
+                lambda_metrics.add('Notifications.Dropped', dropped + failed)
+            return summary
+
+    def _send(self, emails, deadline):
+        sent = 0
+        for index, email in enumerate(emails):
+            if time.monotonic() >= deadline:
+                logger.error(
+                    "Prazo de envio das notificações esgotado: %d email(s) não enviados (%s)",
+                    len(emails) - index, '; '.join(pending['subject'] for pending in emails[index:])
+                )
+                break
+            try:
+                message_id = self._sender(email)
+                sent += 1
+                logger.info("Email enviado: %s (MessageId: %s)", email['subject'], message_id)
+            except Exception as e:
+                email['falha'] = True
+                logger.error("Erro ao enviar email '%s': %s", email['subject'], e)
+        return sent
+
+    def build_emails(self, messages):
+        """
+        Agrupa as notificações por grupo e destinatários: uma notificação mantém o email original,
+        duas ou mais geram um email de resumo.
+
+        Returns:
+            list: Emails (dicts no formato de send_email)
+        """
+        groups = {}
+        for message in messages:
+            group_key = (message['group'], message['source'], message['to'], message['cc'])
+            groups.setdefault(group_key, []).append(message)
+
+        emails = []
+        for (group, source, to, cc), group_messages in groups.items():
+            if len(group_messages) == 1:
+                emails.append(group_messages[0])
+            else:
+                emails.append(self._build_digest(group, source, to, cc, group_messages))
+        return emails
+
+    def _build_digest(self, group, source, to, cc, messages):
+        import html as html_lib
+
+        category, bucket, prefix = group
+        # Notificações repetidas (mesmo conteúdo na linha do resumo) viram uma linha com a contagem
+        rows = {}
+        for message in messages:
+            row_key = tuple(sorted((name, str(value)) for name, value in message['item'].items()))
+            if row_key in rows:
+                rows[row_key]['ocorrencias'] += 1
+            else:
+                rows[row_key] = dict(message['item'], ocorrencias=1)
+        rows = list(rows.values())
+        columns = list(dict.fromkeys(name for row in rows for name in row))
+        # Campos '<nome>_url' não viram coluna: são o link do campo '<nome>'
+        links = {column[:-len('_url')]: column for column in columns
+                 if column.endswith('_url') and column[:-len('_url')] in columns}
+        columns = [column for column in columns if column not in links.values()]
+        shown = rows[:self.max_items]
+        omitted = len(rows) - len(shown)
+
+        location = f"s3://{bucket}/{prefix}" if bucket else (prefix or '-')
+        subject = f"[RESUMO] {len(messages)} notificações {category} - {location}"
+        detail = messages[0]['text'].strip()
+        if len(detail) > DIGEST_DETAIL_MAX_CHARS:
+            detail = detail[:DIGEST_DETAIL_MAX_CHARS] + '\n... (detalhe truncado)'
+
+        text_lines = [
+            f"Resumo de {len(messages)} notificações {category} em {location}",
+            f"({len(rows)} distintas)",
+            '',
+            ' | '.join(columns)
+        ]
+        text_lines += [' | '.join(self._text_cell(row, column, links) for column in columns) for row in shown]
+        if omitted:
+            text_lines.append(f"... e mais {omitted} linha(s)")
+        text_lines += ['', 'Detalhe da primeira notificação:', detail, '', 'Este é um email automático. Por favor, não responda.']
+
+        header_html = ''.join(f"<th>{html_lib.escape(column)}</th>" for column in columns)
+        rows_html = ''.join(
+            '<tr>' + ''.join(f"<td>{self._html_cell(row, column, links)}</td>" for column in columns) + '</tr>'
+            for row in shown
+        )
+        omitted_html = f"<p>... e mais {omitted} linha(s)</p>" if omitted else ''
+        body_html = f"""
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; }}
+                table {{ border-collapse: collapse; width: 100%; }}
+                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                th {{ background-color: #f2f2f2; }}
+            </style>
+        </head>
+        <body>
+            <h2>Resumo de {len(messages)} notificações {html_lib.escape(category)}</h2>
+            <p>{html_lib.escape(location)} ({len(rows)} distintas)</p>
+            <table>
+                <tr>{header_html}</tr>
+                {rows_html}
+            </table>
+            {omitted_html}
+            <h3>Detalhe da primeira notificação:</h3>
+            <pre>{html_lib.escape(detail)}</pre>
+            <p>Este é um email automático. Por favor, não responda.</p>
+        </body>
+        </html>
+        """
+        return {
+            'source': source, 'to': to, 'cc': cc, 'subject': subject,
+            'text': '\n'.join(text_lines), 'html': body_html, 'group': group
+        }
+
+    @staticmethod
+    def _text_cell(row, column, links):
+        value = str(row.get(column, ''))
+        url = row.get(links[column]) if column in links else None
+        return f"{value} ({url})" if value and url else value
+
+    @staticmethod
+    def _html_cell(row, column, links):
+        import html as html_lib
+
+        value = html_lib.escape(str(row.get(column, '')))
+        url = row.get(links[column]) if column in links else None
+        return f'<a href="{html_lib.escape(str(url))}">{value}</a>' if value and url else value
+
+
+# Fila da invocação em andamento (um container processa uma invocação por vez)
+_current = None
+_current_lock = threading.Lock()
+
+
+def start_invocation(context=None, environ=None, sender=None):
+    """
+    Inicia a fila de notificações da invocação conforme NOTIFY_DIGEST (padrão: true),
+    NOTIFY_DIGEST_WINDOW_SECONDS, NOTIFY_DIGEST_MAX_ITEMS e NOTIFY_FLUSH_BUDGET_SECONDS.
+    Notificações pendentes de uma invocação anterior são enviadas antes.
+
+    Args:
+        context: Contexto do Lambda (get_remaining_time_in_millis limita o envio)
+        environ (dict): Variáveis de ambiente (padrão: os.environ)
+        sender: Função de envio (padrão: send_email)
+
+    Returns:
+        NotificationDigest: Fila da invocação
+    """
+    global _current
+    environ = os.environ if environ is None else environ
+    remaining_time = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining_time = lambda: context.get_remaining_time_in_millis() / 1000.0
+    digest = NotificationDigest(
+        window_seconds=float(environ.get('NOTIFY_DIGEST_WINDOW_SECONDS', '60')),
+        max_items=int(environ.get('NOTIFY_DIGEST_MAX_ITEMS', '50')),
+        flush_budget=float(environ.get('NOTIFY_FLUSH_BUDGET_SECONDS', '10')),
+        enabled=environ.get('NOTIFY_DIGEST', 'true') == 'true',
+        remaining_time=remaining_time,
+        sender=sender
+    )
+    with _current_lock:
+        previous, _current = _current, digest
+    if previous is not None and previous.pending():
+        previous.flush()
+    return digest
+
+
+def current():
+    """Retorna a fila da invocação em andamento (criada a partir do ambiente se nenhuma foi iniciada)."""
+    if _current is None:
+        start_invocation()
+    return _current
+
+
+def enqueue(source, to, subject, text, html=None, cc=(), group=None, item=None):
+    """Enfileira uma notificação na invocação em andamento (ver NotificationDigest.enqueue)."""
+    return current().enqueue(source, to, subject, text, html=html, cc=cc, group=group, item=item)
+
+
+def flush(reason='fim da invocação'):
+    """Envia as notificações pendentes da invocação em andamento (ver NotificationDigest.flush)."""
+    return current().flush(reason)
@@ -0,0 +1,189 @@
+import io
+import logging
+import struct
+
+from s3_parallel_download import MB, open_object_stream
+
+logger = logging.getLogger()
+
+# Extensões aceitas pelo envio ao webservice
+SUPPORTED_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst', '.zip')
+
+
+def is_supported_key(key):
+    """
+    Verifica se a chave é um CSV, puro ou compactado (.csv.gz, .csv.zst ou .zip).
+    """
+    return key.lower().endswith(SUPPORTED_SUFFIXES)
+
+
+class CsvSource:
+    """
+    Conteúdo CSV descompactado de um objeto S3, lido em streaming.
+
+    Attributes:
+        stream: Objeto com read(n) que retorna o CSV já descompactado
+        size (int): Tamanho do CSV descompactado em bytes
+        filename (str): Nome do CSV a ser informado em <nomArquivo>
+        compressed (bool): Se o objeto no S3 está compactado
+    """
+
+    def __init__(self, stream, size, filename, compressed=False, resources=()):
+        self.stream = stream
+        self.size = size
+        self.filename = filename
+        self.compressed = compressed
+        self._resources = resources
+
+    def close(self):
+        """Fecha o stream e os recursos abertos (corpo do S3, arquivo zip, etc.)."""
+        for resource in (self.stream,) + tuple(self._resources):
+            try:
+                resource.close()
+            except Exception:
+                pass
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Leitor "seekable" sobre um objeto S3, usado para ler arquivos zip sem baixar o objeto inteiro.
+    Mantém um GET aberto a partir da posição atual; somente um seek para outra posição abre um novo GET com Range.
+    """
+
+    def __init__(self, s3_client, bucket, key, size):
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._size = size
+        self._pos = 0
+        self._body = None
+        self._body_pos = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._size + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._pos >= self._size:
+            return 0
+        if self._body is None or self._body_pos != self._pos:
+            self._close_body()
+            response = self._s3.get_object(Bucket=self._bucket, Key=self._key, Range=f"bytes={self._pos}-")
+            self._body = response['Body']
+            self._body_pos = self._pos
+        data = self._body.read(len(buffer))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        self._body_pos = self._pos
+        return len(data)
+
+    def close(self):
+        self._close_body()
+        super().close()
+
+    def _close_body(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+
+def _strip_suffix(filename, suffix):
+    return filename[:-len(suffix)] if filename.lower().endswith(suffix) else filename
+
+
+def _read_range(s3_client, bucket, key, byte_range):
+    response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={byte_range}")
+    return response['Body'].read()
+
+
+def open_csv_source(s3_client, bucket, key, buffer_size=1024 * 1024, parallel_threshold=None,
+                    part_size=8 * MB, concurrency=8):
+    """
+    Abre o objeto do S3 como um stream de CSV descompactado, sem manter o arquivo inteiro em memória.
+
+    O tamanho descompactado precisa ser conhecido antes do envio (Content-Length do envelope SOAP):
+    - .csv.gz: campo ISIZE do trailer gzip (últimos 4 bytes; arquivos de um único membro, até 4 GB)
+    - .csv.zst: Frame_Content_Size do cabeçalho do frame zstd (requer o pacote zstandard)
+    - .zip: tamanho do primeiro membro .csv no diretório central do zip
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket de origem
+        key (str): Chave do objeto
+        buffer_size (int): Tamanho do buffer de leitura para arquivos zip
+        parallel_threshold (int): Tamanho (compactado) a partir do qual o objeto é baixado em faixas
+                                  paralelas (None = GET único; não se aplica a .zip)
+        part_size (int): Tamanho de cada faixa do download paralelo
+        concurrency (int): Faixas baixadas ao mesmo tempo
+
+    Returns:
+        CsvSource: Stream descompactado, tamanho e nome do CSV
+    """
+    filename = key.split('/')[-1]
+    lower_key = key.lower()
+
+    # Módulos de descompactação importados apenas para o formato do arquivo (reduz o cold start)
+    if lower_key.endswith('.zip'):
+        import zipfile
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        raw = S3RangeReader(s3_client, bucket, key, head['ContentLength'])
+        archive = zipfile.ZipFile(io.BufferedReader(raw, buffer_size=buffer_size))
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        csv_members = [info for info in members if info.filename.lower().endswith('.csv')] or members
+        if not csv_members:
+            archive.close()
+            raise ValueError(f"Arquivo zip sem conteúdo: {key}")
+        member = csv_members[0]
+        if len(members) > 1:
+            logger.warning("Zip %s contém %s arquivos; enviando apenas %s", key, len(members), member.filename)
+        return CsvSource(
+            archive.open(member), member.file_size, member.filename.split('/')[-1],
+            compressed=True, resources=(archive, raw)
+        )
+
+    s3_object = s3_client.get_object(Bucket=bucket, Key=key)
+    compressed_size = s3_object['ContentLength']
+    # Objetos grandes: faixas paralelas entregues em ordem (o GET aberto fornece a primeira faixa)
+    body = open_object_stream(s3_client, bucket, key, s3_object, parallel_threshold, part_size, concurrency)
+
+    if lower_key.endswith('.gz'):
+        # ISIZE: tamanho descompactado módulo 2^32, gravado nos últimos 4 bytes do gzip
+        if compressed_size < 18:
+            body.close()
+            raise ValueError(f"Arquivo gzip inválido: {key}")
+        import gzip
+        size = struct.unpack('<I', _read_range(s3_client, bucket, key, '-4'))[0]
+        return CsvSource(gzip.GzipFile(fileobj=body, mode='rb'), size, _strip_suffix(filename, '.gz'),
+                         compressed=True, resources=(body,))
+
+    if lower_key.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:  # Dependência opcional, necessária apenas para arquivos .csv.zst
+            zstandard = None
+        if zstandard is None:
+            body.close()
+            raise ImportError("Pacote zstandard não instalado: necessário para arquivos .csv.zst")
+        size = zstandard.frame_content_size(_read_range(s3_client, bucket, key, '0-17'))
+        if size < 0:
+            body.close()
+            raise ValueError(f"Arquivo zstd sem tamanho no cabeçalho do frame (use zstd com --content-size): {key}")
+        reader = zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True)
+        return CsvSource(reader, size, _strip_suffix(filename, '.zst'), compressed=True, resources=(body,))
+
+    return CsvSource(body, compressed_size, filename)
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DestinationEtagCache:
+    """
+    Cache LRU (mantido entre invocações do mesmo container) dos ETags e tamanhos recentes no destino,
+    gravados após cada cópia ou consulta: reexportações idênticas logo em seguida são identificadas
+    sem nenhuma chamada ao S3.
+
+    Args:
+        max_entries (int): Máximo de objetos no cache
+        ttl (float): Tempo máximo em segundos de um objeto no cache (limita o efeito de alterações
+                     no destino feitas fora desta função)
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bucket, key):
+        """
+        Returns:
+            tuple: (ETag sem aspas, tamanho) do objeto no destino, ou None se ausente/expirado
+        """
+        with self._lock:
+            entry = self._entries.get((bucket, key))
+            if entry is None:
+                return None
+            etag, size, cached_until = entry
+            if cached_until <= self._clock():
+                del self._entries[(bucket, key)]
+                return None
+            self._entries.move_to_end((bucket, key))
+            return etag, size
+
+    def put(self, bucket, key, etag, size):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(bucket, key)] = (etag.strip('"'), size, self._clock() + self.ttl)
+            self._entries.move_to_end((bucket, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, bucket, key):
+        with self._lock:
+            self._entries.pop((bucket, key), None)
+
+
+def find_identical_destination(s3_client, cache, destination_bucket, destination_key, etag, size):
+    """
+    Verifica se o destino já tem o mesmo conteúdo da origem (mesmo ETag e tamanho), para pular a cópia.
+
+    Primeiro consulta o cache; sem o objeto no cache, faz um HEAD condicional ao ETag da origem
+    (IfMatch): 200 com o mesmo tamanho indica conteúdo idêntico, 412 conteúdo diferente e 404 destino
+    ausente. Origens com ETag multipart ("<md5>-<partes>") só são comparadas pelo cache, pois a cópia
+    multipart recalcula o ETag no destino.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        cache (DestinationEtagCache): Cache dos ETags do destino
+        destination_bucket (str): Bucket de destino
+        destination_key (str): Chave de destino
+        etag (str): ETag da origem (com ou sem aspas)
+        size (int): Tamanho da origem em bytes
+
+    Returns:
+        str: 'cache' ou 'consulta' (como o destino idêntico foi identificado), ou None se a cópia é necessária
+    """
+    if not etag or size is None:
+        return None
+    etag = etag.strip('"')
+    cached = cache.get(destination_bucket, destination_key)
+    if cached is not None:
+        return 'cache' if cached == (etag, size) else None
+    if '-' in etag:
+        return None
+    try:
+        head = s3_client.head_object(Bucket=destination_bucket, Key=destination_key, IfMatch=f'"{etag}"')
+    except Exception as e:
+        error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+        if error_code in ('404', 'NoSuchKey', 'NotFound', '412', 'PreconditionFailed'):
+            return None
+        raise
+    if head['ContentLength'] != size:
+        return None
+    cache.put(destination_bucket, destination_key, etag, size)
+    return 'consulta'
@@ -1,26 +1,80 @@
-import boto3
 import logging
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote_plus
 from datetime import datetime
 
+import lambda_metrics
+import notification_digest
+import structured_logging
+from aws_clients import get_client
+from s3_copy_dedup import DestinationEtagCache, find_identical_destination
+from s3_copy_routes import RouteTableLoader
+from s3_multipart_copy import MB, copy_object
+
 # Configurar logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+structured_logging.configure(logger)
 
-# Inicializar clientes AWS
-s3_client = boto3.client('s3')
-ses_client = boto3.client('ses')
+# Definir buckets
+SOURCE_BUCKET = 'ferj-prod-snowflake-relatorio'
+DESTINATION_BUCKET = 'ferj-prod-integracao'
 
 # Configurações de email
 EMAIL_SOURCE = os.environ.get('EMAIL_SOURCE', 'no-reply@domain.com.br')
 EMAIL_DESTINATION = os.environ.get('EMAIL_DESTINATION', 'admin@domain.com.br')
 EMAIL_SUBJECT_PREFIX = '[LAMBDA ERROR] Falha na cópia de arquivos S3'
 
+# Configurações da cópia (objetos a partir do limite são copiados em partes paralelas)
+COPY_MULTIPART_THRESHOLD_MB = int(os.environ.get('COPY_MULTIPART_THRESHOLD_MB', '256'))
+COPY_PART_SIZE_MB = int(os.environ.get('COPY_PART_SIZE_MB', '128'))
+COPY_CONCURRENCY = int(os.environ.get('COPY_CONCURRENCY', '8'))
+COPY_MAX_ATTEMPTS = int(os.environ.get('COPY_MAX_ATTEMPTS', '3'))
+COPY_RECORD_CONCURRENCY = int(os.environ.get('COPY_RECORD_CONCURRENCY', '8'))
+
+# Reexportações idênticas (mesmo ETag e tamanho já no destino) não são copiadas novamente
+COPY_SKIP_IDENTICAL = os.environ.get('COPY_SKIP_IDENTICAL', 'true').lower() == 'true'
+COPY_ETAG_CACHE_SIZE = int(os.environ.get('COPY_ETAG_CACHE_SIZE', '10000'))
+COPY_ETAG_CACHE_TTL = float(os.environ.get('COPY_ETAG_CACHE_TTL', '300'))
+
+# Rota padrão, usada sem COPY_ROUTES: voxis/*.csv.gz -> voxis/VIEWS_VOXIS_SAUDI_UNIMED_FERJ_SCHEMA/{NOME}/
+DEFAULT_ROUTES = [{
+    'name': 'voxis',
+    'source_bucket': SOURCE_BUCKET,
+    'prefix': 'voxis/',
+    'suffix': '.csv.gz',
+    'destination_bucket': DESTINATION_BUCKET,
+    'destination_key': 'voxis/VIEWS_VOXIS_SAUDI_UNIMED_FERJ_SCHEMA/{NAME}/{filename}'
+}]
+
+def get_s3_client():
+    """
+    Cliente S3 criado no primeiro uso: um único cliente compartilhado pelas threads, com pool de conexões
+    suficiente para os arquivos e as partes copiados em paralelo.
+    """
+    return get_client(
+        's3',
+        max_pool_connections=max(10, COPY_RECORD_CONCURRENCY * COPY_CONCURRENCY),
+        retries={'max_attempts': 5, 'mode': 'adaptive'}
+    )
+
+# Tabela de rotas (arquivo JSON/YAML ou s3://bucket/chave em COPY_ROUTES), carregada uma vez por container
+# e recarregada quando a origem muda
+route_loader = RouteTableLoader(
+    os.environ.get('COPY_ROUTES'),
+    DEFAULT_ROUTES,
+    reload_seconds=float(os.environ.get('COPY_ROUTES_RELOAD_SECONDS', '60')),
+    s3_client_factory=get_s3_client
+)
+
+# ETags recentes no destino (mantidos entre invocações do mesmo container)
+destination_etags = DestinationEtagCache(COPY_ETAG_CACHE_SIZE, COPY_ETAG_CACHE_TTL)
+
 def send_error_email(error_message, context_info=None):
     """
-    Envia email de notificação em caso de erro
+    Enfileira o email de notificação de um erro (enviado no final da invocação por notification_digest)
     """
     try:
         # Preparar o corpo do email
@@ -42,179 +96,208 @@ def send_error_email(error_message, context_info=None):
         Por favor, verifique os logs do CloudWatch para mais detalhes.
         """
         
-        # Enviar email
-        response = ses_client.send_email(
-            Source=EMAIL_SOURCE,
-            Destination={
-                'ToAddresses': [EMAIL_DESTINATION]
-            },
-            Message={
-                'Subject': {
-                    'Data': f"{EMAIL_SUBJECT_PREFIX} - {timestamp}",
-                    'Charset': 'UTF-8'
-                },
-                'Body': {
-                    'Text': {
-                        'Data': email_body,
-                        'Charset': 'UTF-8'
-                    }
-                }
-            }
+        # Enfileirar o email: o envio pelo SES acontece no final da invocação, com os erros do mesmo tipo
+        # e pasta agregados em um único email de resumo
+        context_info = context_info or {}
+        return notification_digest.enqueue(
+            EMAIL_SOURCE, [EMAIL_DESTINATION], f"{EMAIL_SUBJECT_PREFIX} - {timestamp}", email_body,
+            group=notification_digest.build_group(
+                context_info.get('error_type', 'ERROR'), context_info.get('source_bucket'), context_info.get('object_key')
+            ),
+            item={'arquivo': context_info.get('object_key', 'N/A'), 'erro': str(error_message)[:300]}
         )
         
-        logger.info(f"✅ Email de erro enviado com sucesso. MessageId: {response['MessageId']}")
-        return True
-        
     except Exception as email_error:
-        logger.error(f"❌ Falha ao enviar email de notificação: {str(email_error)}")
-        logger.error(f"   Email origem: {EMAIL_SOURCE}")
-        logger.error(f"   Email destino: {EMAIL_DESTINATION}")
+        logger.error("❌ Falha ao preparar email de notificação: %s", email_error)
+        logger.error("   Email origem: %s", EMAIL_SOURCE)
+        logger.error("   Email destino: %s", EMAIL_DESTINATION)
         return False
 
-def lambda_handler(event, context):
+def notify_record_error(context_info, error_type, error_msg, **details):
+    """
+    Envia o email de erro de um arquivo com o contexto da execução e os detalhes do arquivo.
+    """
+    email_context = context_info.copy()
+    email_context['error_type'] = error_type
+    email_context.update(details)
+    return send_error_email(error_msg, email_context)
+
+def process_record(record, context_info):
+    """
+    Copia o arquivo de um registro do evento S3 para o destino da rota que atende a chave
+    (tabela de rotas de COPY_ROUTES, ou a rota padrão voxis/*.csv.gz).
+    
+    A cópia usa o tamanho e o ETag informados no evento: é condicional ao ETag da origem
+    (CopySourceIfMatch, dispensando o head_object de verificação da origem) e verificada pelo
+    ETag retornado no CopyObjectResult (dispensando o head_object no destino).
+    
+    Com COPY_SKIP_IDENTICAL, a cópia é dispensada (status 'identico') quando o destino já tem o mesmo
+    ETag e tamanho da origem: verificado pelo cache de ETags do container ou por um HEAD condicional.
+    
+    Args:
+        record (dict): Registro do evento S3
+        context_info (dict): Informações da execução para o email de erro
+    
+    Returns:
+        dict: Resumo do registro (arquivo, status e detalhes da cópia ou do erro)
     """
-    Função Lambda para copiar arquivos CSV entre buckets
-    Trigger: Criação de arquivos .csv em s3://ferj-prod-snowflake-relatorio/voxis/
-    Destino: s3://ferj-prod-integracao/voxis/VIEWS_VOXIS_SAUDI_UNIMED_FERJ_SCHEMA/
+    source_bucket = record['s3']['bucket']['name']
+    object_key = unquote_plus(record['s3']['object']['key'])
+    event_name = record['eventName']
+    summary = {'object_key': object_key, 'source_bucket': source_bucket}
+    
+    logger.info(
+        "Processando arquivo: %s no bucket: %s (evento %s)", object_key, source_bucket, event_name,
+        extra=structured_logging.sampled('copy_record')
+    )
+    
+    # Verificar se há rotas para o bucket
+    routing_table = route_loader.get()
+    if not routing_table.has_bucket(source_bucket):
+        logger.warning("Bucket %s sem rotas configuradas - ignorado", source_bucket)
+        return dict(summary, status='ignorado', motivo='bucket inesperado')
+    
+    # Verificar se é um evento de criação/put
+    if not event_name.startswith('ObjectCreated'):
+        logger.info("Evento %s ignorado - não é criação de objeto", event_name, extra=structured_logging.sampled('copy_skip'))
+        return dict(summary, status='ignorado', motivo='evento não é de criação')
+    
+    # Rota do arquivo (prefixo, extensão e regex) e destino da cópia
+    routed = routing_table.match(source_bucket, object_key)
+    if routed is None:
+        logger.info("Arquivo %s não atende nenhuma rota - ignorado", object_key, extra=structured_logging.sampled('copy_skip'))
+        return dict(summary, status='ignorado', motivo='sem rota')
+    route, destination_bucket, destination_key = routed
+    summary.update(route=route.name, destination_bucket=destination_bucket, destination_key=destination_key)
+    logger.info(
+        "Cópia (rota %s): s3://%s/%s -> s3://%s/%s", route.name, source_bucket, object_key, destination_bucket,
+        destination_key, extra=structured_logging.sampled('copy_record')
+    )
+    
+    source_size = record['s3']['object'].get('size')
+    source_etag = record['s3']['object'].get('eTag')
+    if COPY_SKIP_IDENTICAL:
+        try:
+            with lambda_metrics.stage('dedup'):
+                identical = find_identical_destination(
+                    get_s3_client(), destination_etags, destination_bucket, destination_key, source_etag, source_size
+                )
+        except Exception as e:
+            # Falha na consulta não impede a cópia
+            logger.warning("Falha ao consultar o destino s3://%s/%s (cópia mantida): %s", destination_bucket, destination_key, e)
+            identical = None
+        if identical:
+            lambda_metrics.add('S3.BytesCopySkipped', source_size, lambda_metrics.UNIT_BYTES)
+            logger.info(
+                "Destino já idêntico à origem (ETag %s, verificado por %s) - cópia dispensada: %s",
+                source_etag, identical, object_key, extra=structured_logging.sampled('copy_record')
+            )
+            return dict(summary, status='identico', size=source_size, etag=source_etag, verificado_por=identical)
+    
+    try:
+        with lambda_metrics.stage('copy'):
+            copy_result = copy_object(
+                get_s3_client(), source_bucket, object_key, destination_bucket, destination_key,
+                multipart_threshold=COPY_MULTIPART_THRESHOLD_MB * MB,
+                part_size=COPY_PART_SIZE_MB * MB,
+                concurrency=COPY_CONCURRENCY,
+                max_attempts=COPY_MAX_ATTEMPTS,
+                size=source_size,
+                etag=source_etag
+            )
+    except Exception as e:
+        error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+        if error_code in ('NoSuchKey', '404', 'PreconditionFailed', '412'):
+            # Origem removida ou substituída depois do evento
+            error_type = 'SOURCE_FILE_NOT_FOUND'
+            error_msg = f"Erro ao verificar arquivo de origem: {str(e)}"
+        else:
+            error_type = 'COPY_OPERATION_ERROR'
+            error_msg = f"Erro ao copiar arquivo: {str(e)}"
+        logger.error("❌ %s", error_msg)
+        logger.error("   Origem: s3://%s/%s", source_bucket, object_key)
+        logger.error("   Destino: s3://%s/%s", destination_bucket, destination_key)
+        
+        email_sent = notify_record_error(
+            context_info, error_type, error_msg,
+            object_key=object_key, source_bucket=source_bucket, route=route.name,
+            destination_bucket=destination_bucket, destination_key=destination_key
+        )
+        logger.error("Status do email de erro de cópia: %s", 'Enfileirado' if email_sent else 'Falha')
+        return dict(summary, status='erro', error_type=error_type, erro=str(e))
+    
+    if copy_result['verified'] is False:
+        # Conteúdo copiado difere da origem informada no evento
+        if copy_result['verified_by'] == 'ETag':
+            error_msg = (
+                f"ETag de destino ({copy_result['ETag']}) diferente da origem "
+                f"({source_etag}) após a cópia de {object_key}"
+            )
+        else:
+            error_msg = f"{copy_result['verified_by']} de destino diferente da origem após a cópia de {object_key}"
+        logger.error("❌ %s", error_msg)
+        destination_etags.discard(destination_bucket, destination_key)
+        email_sent = notify_record_error(
+            context_info, 'COPY_VERIFICATION_ERROR', error_msg,
+            object_key=object_key, source_bucket=source_bucket, route=route.name,
+            destination_bucket=destination_bucket, destination_key=destination_key
+        )
+        logger.error("Status do email de erro de verificação: %s", 'Enfileirado' if email_sent else 'Falha')
+        return dict(summary, status='erro', error_type='COPY_VERIFICATION_ERROR', erro=error_msg)
+    
+    lambda_metrics.add('S3.BytesCopied', copy_result['size'], lambda_metrics.UNIT_BYTES)
+    if source_etag:
+        destination_etags.put(destination_bucket, destination_key, source_etag, copy_result['size'])
+    logger.info(
+        "✅ Arquivo copiado com sucesso! (%s, %.1f MB, %s parte(s)): %s",
+        copy_result['method'], copy_result['size'] / MB, copy_result['parts'], object_key,
+        extra=structured_logging.sampled('copy_record')
+    )
+    return dict(
+        summary, status='copiado', method=copy_result['method'], size=copy_result['size'],
+        etag=copy_result['ETag'], verified=copy_result['verified']
+    )
+
+def lambda_handler(event, context):
     """
+    Função Lambda para copiar arquivos entre buckets conforme a tabela de rotas (COPY_ROUTES)
+    Trigger: Criação de arquivos nos buckets de origem das rotas
+    Rota padrão (sem COPY_ROUTES): arquivos .csv.gz em s3://ferj-prod-snowflake-relatorio/voxis/
+    -> s3://ferj-prod-integracao/voxis/VIEWS_VOXIS_SAUDI_UNIMED_FERJ_SCHEMA/{NOME}/
     
-    # Definir buckets
-    SOURCE_BUCKET = 'ferj-prod-snowflake-relatorio'
-    DESTINATION_BUCKET = 'ferj-prod-integracao'
+    Os registros do evento são copiados em paralelo (COPY_RECORD_CONCURRENCY arquivos por vez).
+    """
     
-    # Informações do contexto para email
+    # Informações do contexto para email (os buckets de cada arquivo vêm da rota resolvida em process_record)
     context_info = {
         'function_name': context.function_name if context else 'N/A',
         'function_version': context.function_version if context else 'N/A',
         'request_id': context.aws_request_id if context else 'N/A',
-        'source_bucket': SOURCE_BUCKET,
-        'destination_bucket': DESTINATION_BUCKET
+        'routes': route_loader.source or 'padrão (voxis/*.csv.gz)'
     }
     
-    logger.info(f"Iniciando execução da Lambda. Event: {json.dumps(event)}")
-    logger.info(f"Bucket origem: {SOURCE_BUCKET}")
-    logger.info(f"Bucket destino: {DESTINATION_BUCKET}")
-    logger.info(f"Email configurado - Origem: {EMAIL_SOURCE}, Destino: {EMAIL_DESTINATION}")
+    structured_logging.start_invocation(context)
+    metrics = lambda_metrics.start_invocation('s3_copy_fail_email', context)
+    notification_digest.start_invocation(context)
+    
+    # O evento completo só é serializado com LOG_LEVEL=DEBUG (lotes grandes geram centenas de KB)
+    logger.info("Iniciando execução da Lambda: %s registro(s) no evento", len(event.get('Records', [])))
+    logger.debug("Event: %s", structured_logging.LazyJson(event))
+    logger.info("Rotas: %s", route_loader.source or 'padrão (voxis/*.csv.gz)')
+    logger.info("Email configurado - Origem: %s, Destino: %s", EMAIL_SOURCE, EMAIL_DESTINATION)
     
     try:
-        # Processar cada registro do evento S3
-        for record in event['Records']:
-            
-            # Extrair informações do evento
-            source_bucket = record['s3']['bucket']['name']
-            object_key = unquote_plus(record['s3']['object']['key'])
-            event_name = record['eventName']
-            
-            logger.info(f"Processando arquivo: {object_key} no bucket: {source_bucket}")
-            logger.info(f"Tipo de evento: {event_name}")
-            
-            # Verificar se é o bucket correto
-            if source_bucket != SOURCE_BUCKET:
-                logger.warning(f"Bucket {source_bucket} não é o esperado ({SOURCE_BUCKET}) - ignorado")
-                continue
-            
-            # Verificar se é um evento de criação/put
-            if not event_name.startswith('ObjectCreated'):
-                logger.info(f"Evento {event_name} ignorado - não é criação de objeto")
-                continue
-            
-            # Verificar se o arquivo está no caminho correto
-            if not object_key.startswith('voxis/'):
-                logger.info(f"Arquivo {object_key} não está no path voxis/ - ignorado")
-                continue
-            
-            # Verificar se é um arquivo CSV
-            if not object_key.lower().endswith('.csv.gz'):
-                logger.info(f"Arquivo {object_key} não é CSV.GZIP - ignorado")
-                continue
-            
-            # Extrair apenas o nome do arquivo (sem extensão)
-            file_path_parts = object_key.split('/')
-            if len(file_path_parts) < 2:
-                error_msg = f"Estrutura de path inválida: {object_key}"
-                logger.warning(error_msg)
-                
-                # Enviar email de notificação
-                email_context = context_info.copy()
-                email_context['error_type'] = 'PATH_STRUCTURE_ERROR'
-                email_context['object_key'] = object_key
-                
-                email_sent = send_error_email(error_msg, email_context)
-                logger.info(f"Status envio email para erro de estrutura: {'Sucesso' if email_sent else 'Falha'}")
-                continue
-                
-            filename_with_ext = file_path_parts[-1]  # último elemento
-            filename_without_ext = filename_with_ext.replace('.csv.gz', '').replace('.CSV.GZ', '')
-            
-            logger.info(f"Nome do arquivo extraído: {filename_without_ext}")
-            
-            # Construir o path de destino
-            destination_key = f"voxis/VIEWS_VOXIS_SAUDI_UNIMED_FERJ_SCHEMA/{filename_without_ext.upper()}/{filename_with_ext}"
-            
-            logger.info(f"Path de origem: s3://{source_bucket}/{object_key}")
-            logger.info(f"Path de destino: s3://{DESTINATION_BUCKET}/{destination_key}")
-            
-            # Verificar se o arquivo de origem existe
-            try:
-                s3_client.head_object(Bucket=source_bucket, Key=object_key)
-                logger.info(f"Arquivo de origem confirmado: s3://{source_bucket}/{object_key}")
-            except Exception as e:
-                error_msg = f"Erro ao verificar arquivo de origem: {str(e)}"
-                logger.error(error_msg)
-                
-                # Enviar email de notificação
-                email_context = context_info.copy()
-                email_context['error_type'] = 'SOURCE_FILE_NOT_FOUND'
-                email_context['object_key'] = object_key
-                email_context['source_bucket'] = source_bucket
-                
-                email_sent = send_error_email(error_msg, email_context)
-                logger.error(f"Status envio email para erro de verificação: {'Sucesso' if email_sent else 'Falha'}")
-                continue
-            
-            # Realizar a cópia entre buckets
-            copy_source = {
-                'Bucket': source_bucket,
-                'Key': object_key
-            }
-            
-            try:
-                s3_client.copy_object(
-                    CopySource=copy_source,
-                    Bucket=DESTINATION_BUCKET,
-                    Key=destination_key
-                )
-                
-                logger.info(f"✅ Arquivo copiado com sucesso!")
-                logger.info(f"   Origem: s3://{source_bucket}/{object_key}")
-                logger.info(f"   Destino: s3://{DESTINATION_BUCKET}/{destination_key}")
-                
-                # Verificar se a cópia foi bem-sucedida
-                s3_client.head_object(Bucket=DESTINATION_BUCKET, Key=destination_key)
-                logger.info(f"✅ Cópia verificada no destino")
-                
-            except Exception as e:
-                error_msg = f"Erro ao copiar arquivo: {str(e)}"
-                logger.error(f"❌ {error_msg}")
-                logger.error(f"   Origem: s3://{source_bucket}/{object_key}")
-                logger.error(f"   Destino: s3://{DESTINATION_BUCKET}/{destination_key}")
-                
-                # Enviar email de notificação
-                email_context = context_info.copy()
-                email_context['error_type'] = 'COPY_OPERATION_ERROR'
-                email_context['object_key'] = object_key
-                email_context['source_bucket'] = source_bucket
-                email_context['destination_bucket'] = DESTINATION_BUCKET
-                email_context['destination_key'] = destination_key
-                
-                email_sent = send_error_email(error_msg, email_context)
-                logger.error(f"Status envio email para erro de cópia: {'Sucesso' if email_sent else 'Falha'}")
-                continue
+        records = event['Records']
+        if len(records) > 1 and COPY_RECORD_CONCURRENCY > 1:
+            with ThreadPoolExecutor(max_workers=min(COPY_RECORD_CONCURRENCY, len(records))) as executor:
+                results = list(executor.map(lambda record: process_record(record, context_info), records))
+        else:
+            results = [process_record(record, context_info) for record in records]
     
     except Exception as e:
         error_msg = f"Erro geral na execução da Lambda: {str(e)}"
-        logger.error(f"❌ {error_msg}")
-        logger.error(f"Event completo: {json.dumps(event)}")
+        logger.error("❌ %s", error_msg)
+        logger.error("Event completo: %s", structured_logging.LazyJson(event))
         
         # Enviar email de notificação para erro geral
         email_context = context_info.copy()
@@ -222,16 +305,37 @@ def lambda_handler(event, context):
         email_context['event'] = event
         
         email_sent = send_error_email(error_msg, email_context)
-        logger.error(f"Status envio email para erro geral: {'Sucesso' if email_sent else 'Falha'}")
+        logger.error("Status do email de erro geral: %s", 'Enfileirado' if email_sent else 'Falha')
         
+        metrics.add('Files.Error', 1)
+        notification_digest.flush()
+        structured_logging.finish_invocation(logger)
+        metrics.emit()
         raise
     
-    logger.info("🏁 Execução da Lambda finalizada com sucesso")
+    counts = {status: sum(1 for result in results if result['status'] == status)
+              for status in ('copiado', 'identico', 'ignorado', 'erro')}
+    logger.info(
+        "🏁 Execução da Lambda finalizada: %s copiado(s), %s idêntico(s) ao destino, %s ignorado(s), %s com erro",
+        counts['copiado'], counts['identico'], counts['ignorado'], counts['erro']
+    )
+    metrics.add('Files.Copied', counts['copiado'])
+    metrics.add('Files.Identical', counts['identico'])
+    metrics.add('Files.Skipped', counts['ignorado'])
+    metrics.add('Files.Error', counts['erro'])
+    notification_digest.flush()
+    structured_logging.finish_invocation(logger)
+    metrics.emit()
     
     return {
         'statusCode': 200,
         'body': json.dumps({
             'message': 'Processamento concluído com sucesso',
-            'processed_files': len(event['Records'])
+            'processed_files': len(records),
+            'copied_files': counts['copiado'],
+            'identical_files': counts['identico'],
+            'skipped_files': counts['ignorado'],
+            'failed_files': counts['erro'],
+            'records': results
         })
     }
@@ -0,0 +1,414 @@
+"""
+Reconciliação entre o bucket de origem e os destinos do Lambda de cópia (s3_copy_fail_email): lista a
+origem e os destinos, aplica a tabela de rotas do Lambda a cada arquivo de origem e copia apenas os
+arquivos ausentes ou desatualizados no destino.
+
+As listagens não são mantidas em memória: a listagem de cada destino (já ordenada pelo S3) é gravada em
+disco enquanto a origem é listada em paralelo; os arquivos de origem, com a chave de destino da rota, são
+ordenados em disco em blocos (ordenação externa) e as duas sequências ordenadas são comparadas em um
+merge. O relatório (JSON Lines) traz uma linha por diferença e o resumo ao final.
+
+Uso:
+    python s3_copy_reconcile.py --source-prefix voxis/ --report reconciliacao.jsonl
+    python s3_copy_reconcile.py --source-prefix voxis/2025/ --dry-run --report diferencas.jsonl
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger()
+
+# Entradas ordenadas em memória antes de cada gravação em disco (ordenação externa)
+DEFAULT_RUN_SIZE = 100000
+
+# Situações de um arquivo na comparação
+STATUS_OK = 'ok'
+STATUS_MISSING = 'ausente'
+STATUS_STALE = 'desatualizado'
+STATUS_EXTRA = 'extra'
+STATUS_UNROUTED = 'sem_rota'
+
+
+def list_objects(s3_client, bucket, prefix=''):
+    """
+    Percorre os objetos de um prefixo página a página (list_objects_v2), em ordem de chave.
+
+    Returns:
+        Iterador de dicts com key, size, etag e last_modified (ISO 8601)
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            yield {
+                'key': item['Key'],
+                'size': item['Size'],
+                'etag': item['ETag'].strip('"'),
+                'last_modified': item['LastModified'].isoformat()
+            }
+
+
+def _read_lines(path):
+    with open(path, encoding='utf-8') as lines_file:
+        for line in lines_file:
+            yield json.loads(line)
+
+
+class ExternalSorter:
+    """
+    Ordena uma sequência de entradas maior que a memória: blocos de run_size entradas são ordenados
+    e gravados em disco, e a leitura combina os blocos em ordem (heapq.merge).
+
+    Args:
+        directory (str): Diretório dos blocos temporários
+        sort_key: Função de ordenação das entradas (JSON serializáveis)
+        run_size (int): Entradas por bloco
+    """
+
+    def __init__(self, directory, sort_key, run_size=DEFAULT_RUN_SIZE):
+        self.directory = directory
+        self.sort_key = sort_key
+        self.run_size = max(1, run_size)
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, entry):
+        self._buffer.append(entry)
+        self.count += 1
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        if not self._buffer:
+            return
+        self._buffer.sort(key=self.sort_key)
+        path = os.path.join(self.directory, f"origem-{len(self._runs):05d}.jsonl")
+        with open(path, 'w', encoding='utf-8') as run_file:
+            for entry in self._buffer:
+                run_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._runs.append(path)
+        self._buffer = []
+
+    def __iter__(self):
+        if not self._runs:
+            # Tudo coube em um bloco: ordenado em memória, sem gravar em disco
+            self._buffer.sort(key=self.sort_key)
+            return iter(self._buffer)
+        self._spill()
+        return heapq.merge(*(_read_lines(path) for path in self._runs), key=self.sort_key)
+
+
+def spool_listing(s3_client, bucket, prefix, path):
+    """
+    Grava a listagem de um prefixo em disco (JSON Lines, na ordem do S3).
+
+    Returns:
+        int: Objetos listados
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as listing_file:
+        for item in list_objects(s3_client, bucket, prefix):
+            listing_file.write(json.dumps(item, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def compare_objects(source, destination):
+    """
+    Compara o arquivo de origem com o de destino.
+
+    Tamanhos diferentes indicam destino desatualizado. Com ETags comparáveis (ambos de uma parte), ETags
+    diferentes também; com ETag multipart em um dos lados (recalculado na cópia), o destino modificado
+    antes da origem é considerado desatualizado.
+
+    Returns:
+        str: STATUS_OK ou STATUS_STALE
+    """
+    if source['size'] != destination['size']:
+        return STATUS_STALE
+    if '-' not in source['etag'] and '-' not in destination['etag']:
+        return STATUS_OK if source['etag'] == destination['etag'] else STATUS_STALE
+    return STATUS_STALE if destination['last_modified'] < source['last_modified'] else STATUS_OK
+
+
+def merge_diff(sources, destinations):
+    """
+    Compara duas sequências ordenadas pela chave de destino (merge, sem carregar nenhuma em memória).
+
+    Args:
+        sources: Entradas de origem com destination_key, ordenadas por destination_key
+        destinations: Objetos do destino (list_objects), ordenados por key
+
+    Returns:
+        Iterador de (situação, entrada de origem ou None, objeto de destino ou None)
+    """
+    sources = iter(sources)
+    destinations = iter(destinations)
+    source = next(sources, None)
+    destination = next(destinations, None)
+    while source is not None or destination is not None:
+        if destination is None or (source is not None and source['destination_key'] < destination['key']):
+            yield STATUS_MISSING, source, None
+            source = next(sources, None)
+        elif source is None or destination['key'] < source['destination_key']:
+            yield STATUS_EXTRA, None, destination
+            destination = next(destinations, None)
+        else:
+            yield compare_objects(source, destination), source, destination
+            # Várias origens mapeadas para a mesma chave de destino: as seguintes comparam com o mesmo objeto
+            source = next(sources, None)
+            if source is None or source['destination_key'] != destination['key']:
+                destination = next(destinations, None)
+
+
+def destination_prefixes(routing_table, source_bucket, source_prefix=''):
+    """
+    Prefixos de destino a listar, por bucket de destino: a parte fixa comum dos templates de destino
+    (texto antes do primeiro campo) das rotas do bucket de origem que podem atender o prefixo.
+
+    Returns:
+        dict: {bucket de destino: prefixo}
+    """
+    heads = {}
+    for route in routing_table.routes:
+        if route.source_bucket != source_bucket:
+            continue
+        if not (route.prefix.startswith(source_prefix) or source_prefix.startswith(route.prefix)):
+            continue
+        head = route.destination_key.split('{', 1)[0]
+        heads.setdefault(route.destination_bucket, []).append(head)
+    return {bucket: os.path.commonprefix(bucket_heads) for bucket, bucket_heads in heads.items()}
+
+
+class ReconcileStats:
+    """Contadores da reconciliação (compartilhados pelas threads de cópia)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.counts = {status: 0 for status in (STATUS_OK, STATUS_MISSING, STATUS_STALE, STATUS_EXTRA, STATUS_UNROUTED)}
+        self.listed_source = 0
+        self.listed_destination = 0
+        self.copied = 0
+        self.copy_errors = 0
+        self.bytes_copied = 0
+
+    def copy_finished(self, size, error):
+        with self._lock:
+            if error:
+                self.copy_errors += 1
+            else:
+                self.copied += 1
+                self.bytes_copied += size
+
+    def summary(self):
+        """
+        Returns:
+            dict: Objetos listados e comparados por situação, cópias, duração e vazão
+        """
+        elapsed = time.perf_counter() - self.started
+        listed = self.listed_source + self.listed_destination
+        return dict(
+            self.counts,
+            listados_origem=self.listed_source,
+            listados_destino=self.listed_destination,
+            copiados=self.copied,
+            erros_copia=self.copy_errors,
+            mb_copiados=round(self.bytes_copied / (1024 * 1024), 2),
+            duracao_s=round(elapsed, 2),
+            objetos_por_segundo=round(listed / elapsed, 1) if elapsed else 0.0,
+            copias_por_segundo=round(self.copied / elapsed, 2) if elapsed else 0.0
+        )
+
+
+def reconcile(s3_client, routing_table, source_bucket, source_prefix='', copy=None, report=None,
+              concurrency=8, dry_run=False, destination_prefix=None, run_size=DEFAULT_RUN_SIZE, temp_dir=None):
+    """
+    Compara a origem com os destinos das rotas e copia os arquivos ausentes ou desatualizados.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        routing_table (RoutingTable): Tabela de rotas do Lambda de cópia
+        source_bucket (str): Bucket de origem
+        source_prefix (str): Prefixo da origem
+        copy: Função (source_bucket, entrada de origem) que copia o arquivo para o destino da rota
+        report: Arquivo aberto para o relatório JSON Lines (opcional)
+        concurrency (int): Cópias simultâneas
+        dry_run (bool): Apenas compara (relatório sem cópias)
+        destination_prefix (str): Prefixo de destino a listar (padrão: derivado dos templates das rotas)
+        run_size (int): Entradas por bloco da ordenação externa
+        temp_dir (str): Diretório dos arquivos temporários
+
+    Returns:
+        ReconcileStats: Contadores da reconciliação
+    """
+    stats = ReconcileStats()
+    report_lock = threading.Lock()
+
+    def write_report(entry):
+        if report is not None:
+            with report_lock:
+                report.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    prefixes = destination_prefixes(routing_table, source_bucket, source_prefix)
+    if destination_prefix is not None:
+        prefixes = {bucket: destination_prefix for bucket in prefixes}
+    logger.info("Destinos a comparar: %s", ', '.join(f"s3://{b}/{p}" for b, p in prefixes.items()) or 'nenhum')
+
+    with tempfile.TemporaryDirectory(prefix='reconciliacao-', dir=temp_dir) as directory:
+        # Destinos listados em paralelo com a origem, gravados em disco na ordem do S3
+        listing_paths = {bucket: os.path.join(directory, f"destino-{index}.jsonl") for index, bucket in enumerate(prefixes)}
+        with ThreadPoolExecutor(max_workers=max(1, len(prefixes)), thread_name_prefix='listagem') as listing_executor:
+            listings = {
+                bucket: listing_executor.submit(spool_listing, s3_client, bucket, prefix, listing_paths[bucket])
+                for bucket, prefix in prefixes.items()
+            }
+            sorter = ExternalSorter(directory, lambda entry: (entry['destination_bucket'], entry['destination_key']), run_size)
+            for item in list_objects(s3_client, source_bucket, source_prefix):
+                stats.listed_source += 1
+                routed = routing_table.match(source_bucket, item['key'])
+                if routed is None:
+                    stats.counts[STATUS_UNROUTED] += 1
+                    continue
+                route, destination_bucket, destination_key = routed
+                if destination_bucket not in prefixes or not destination_key.startswith(prefixes[destination_bucket]):
+                    # Destino fora do prefixo listado (ex: --destination-prefix mais restrito)
+                    stats.counts[STATUS_UNROUTED] += 1
+                    continue
+                sorter.add(dict(item, route=route.name, destination_bucket=destination_bucket, destination_key=destination_key))
+            for bucket, listing in listings.items():
+                stats.listed_destination += listing.result()
+        logger.info(
+            "Listagem concluída: %s objetos na origem (%s com rota), %s nos destinos",
+            stats.listed_source, sorter.count, stats.listed_destination
+        )
+
+        copy_executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='reconciliacao')
+        pending = set()
+
+        def run_copy(entry, diff):
+            try:
+                copy(source_bucket, entry)
+                diff['copia'] = 'copiado'
+                stats.copy_finished(entry['size'], None)
+            except Exception as e:
+                logger.error("Erro ao copiar %s: %s", entry['key'], e)
+                diff['copia'] = f"erro: {e}"
+                stats.copy_finished(entry['size'], e)
+            write_report(diff)
+
+        try:
+            sources = iter(sorter)
+            source = next(sources, None)
+            for bucket in sorted(prefixes):
+                def bucket_sources():
+                    nonlocal source
+                    while source is not None and source['destination_bucket'] == bucket:
+                        yield source
+                        source = next(sources, None)
+
+                for status, entry, destination in merge_diff(bucket_sources(), _read_lines(listing_paths[bucket])):
+                    stats.counts[status] += 1
+                    if status == STATUS_OK:
+                        continue
+                    diff = {
+                        'situacao': status,
+                        'origem': entry['key'] if entry else None,
+                        'rota': entry['route'] if entry else None,
+                        'bucket_destino': bucket,
+                        'destino': entry['destination_key'] if entry else destination['key'],
+                        'tamanho_origem': entry['size'] if entry else None,
+                        'tamanho_destino': destination['size'] if destination else None,
+                        'etag_origem': entry['etag'] if entry else None,
+                        'etag_destino': destination['etag'] if destination else None
+                    }
+                    if status == STATUS_EXTRA or dry_run:
+                        # Arquivos apenas no destino são reportados, nunca removidos
+                        write_report(diff)
+                        continue
+                    while len(pending) >= 2 * max(1, concurrency):
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(copy_executor.submit(run_copy, entry, diff))
+            for future in pending:
+                future.result()
+        finally:
+            copy_executor.shutdown(wait=True, cancel_futures=True)
+
+    summary = stats.summary()
+    write_report({'resumo': summary})
+    return stats
+
+
+def main(argv=None):
+    import s3_copy_fail_email
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source-bucket', default=s3_copy_fail_email.SOURCE_BUCKET, help='Bucket de origem')
+    parser.add_argument('--source-prefix', default='', help='Prefixo da origem')
+    parser.add_argument('--destination-prefix', help='Prefixo de destino a listar (padrão: derivado das rotas)')
+    parser.add_argument(
+        '--concurrency', type=int, default=s3_copy_fail_email.COPY_RECORD_CONCURRENCY, help='Cópias simultâneas'
+    )
+    parser.add_argument('--report', help='Relatório das diferenças (JSON Lines)')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE, help='Entradas por bloco da ordenação em disco')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas compara, sem copiar')
+    args = parser.parse_args(argv)
+
+    s3_client = s3_copy_fail_email.get_s3_client()
+
+    def copy(source_bucket, entry):
+        # Mesmo caminho de cópia do Lambda: condicional ao ETag listado e verificada pelo ETag de destino
+        from s3_multipart_copy import copy_object
+
+        result = copy_object(
+            s3_client, source_bucket, entry['key'], entry['destination_bucket'], entry['destination_key'],
+            multipart_threshold=s3_copy_fail_email.COPY_MULTIPART_THRESHOLD_MB * s3_copy_fail_email.MB,
+            part_size=s3_copy_fail_email.COPY_PART_SIZE_MB * s3_copy_fail_email.MB,
+            concurrency=s3_copy_fail_email.COPY_CONCURRENCY,
+            max_attempts=s3_copy_fail_email.COPY_MAX_ATTEMPTS,
+            size=entry['size'],
+            etag=entry['etag']
+        )
+        if result['verified'] is False:
+            raise IOError(
+                f"{result['verified_by']} de destino diferente da origem (ETag da origem {entry['etag']}, "
+                f"do destino {result['ETag']})"
+            )
+
+    report = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        stats = reconcile(
+            s3_client, s3_copy_fail_email.route_loader.get(), args.source_bucket, args.source_prefix, copy,
+            report=report, concurrency=args.concurrency, dry_run=args.dry_run,
+            destination_prefix=args.destination_prefix, run_size=args.run_size
+        )
+    finally:
+        if report is not None:
+            report.close()
+
+    summary = stats.summary()
+    print(
+        f"Origem: {summary['listados_origem']} objetos, destinos: {summary['listados_destino']} objetos "
+        f"em {summary['duracao_s']} s ({summary['objetos_por_segundo']} objetos/s)\n"
+        f"  ok: {summary[STATUS_OK]}, ausentes: {summary[STATUS_MISSING]}, desatualizados: {summary[STATUS_STALE]}, "
+        f"apenas no destino: {summary[STATUS_EXTRA]}, sem rota: {summary[STATUS_UNROUTED]}"
+    )
+    if not args.dry_run:
+        print(
+            f"  copiados: {summary['copiados']} ({summary['mb_copiados']} MB, {summary['copias_por_segundo']} cópias/s), "
+            f"erros: {summary['erros_copia']}"
+        )
+    return 1 if summary['erros_copia'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Campos obrigatórios de cada rota
+REQUIRED_FIELDS = ('source_bucket', 'destination_bucket', 'destination_key')
+
+
+class RouteConfigError(ValueError):
+    """Tabela de rotas inválida (campos ausentes, regex ou template inválidos)."""
+
+
+class Route:
+    """
+    Rota de cópia: arquivos de source_bucket com o prefixo, a extensão (sem diferenciar maiúsculas) e
+    a regex informados são copiados para destination_bucket, na chave montada por destination_key.
+
+    O template destination_key aceita: {key} (chave completa), {filename} (nome do arquivo),
+    {name} e {NAME} (nome sem a extensão da rota, em maiúsculas no segundo), {relative} (chave
+    sem o prefixo da rota) e os grupos nomeados da regex (ex: (?P<schema>[^/]+) -> {schema}).
+
+    Args:
+        definition (dict): Rota da tabela (name, source_bucket, prefix, suffix, regex,
+                           destination_bucket, destination_key)
+        order (int): Posição na tabela (desempate entre rotas igualmente específicas)
+    """
+
+    __slots__ = ('name', 'source_bucket', 'prefix', 'suffix', 'regex', 'destination_bucket',
+                 'destination_key', 'order')
+
+    def __init__(self, definition, order):
+        missing = [field for field in REQUIRED_FIELDS if not definition.get(field)]
+        if missing:
+            raise RouteConfigError(f"Rota {order} ({definition.get('name', 'sem nome')}) sem {', '.join(missing)}")
+        self.name = definition.get('name') or f"rota-{order}"
+        self.source_bucket = definition['source_bucket']
+        self.prefix = definition.get('prefix', '')
+        self.suffix = (definition.get('suffix') or '').lower()
+        try:
+            self.regex = re.compile(definition['regex']) if definition.get('regex') else None
+        except re.error as e:
+            raise RouteConfigError(f"Rota {self.name}: regex inválida: {e}")
+        self.destination_bucket = definition['destination_bucket']
+        self.destination_key = definition['destination_key']
+        self.order = order
+
+    def destination(self, key, match=None):
+        """
+        Monta o destino de uma chave que atende a rota.
+
+        Returns:
+            tuple: (bucket de destino, chave de destino)
+        """
+        filename = key.split('/')[-1]
+        name = filename[:len(filename) - len(self.suffix)] if self.suffix else filename
+        values = {
+            'key': key,
+            'filename': filename,
+            'name': name,
+            'NAME': name.upper(),
+            'relative': key[len(self.prefix):]
+        }
+        if match is not None:
+            values.update({group: value or '' for group, value in match.groupdict().items()})
+        try:
+            return self.destination_bucket, self.destination_key.format_map(values)
+        except (KeyError, IndexError, ValueError) as e:
+            raise RouteConfigError(f"Rota {self.name}: template de destino inválido ({e})")
+
+
+class _TrieNode:
+    __slots__ = ('children', 'by_suffix', 'any_suffix', 'has_routes')
+
+    def __init__(self):
+        self.children = {}
+        self.has_routes = False
+        # Rotas cujo prefixo termina neste nó, indexadas pela extensão (em ordem da tabela)
+        self.by_suffix = {}
+        self.any_suffix = []
+
+
+class RoutingTable:
+    """
+    Tabela de rotas compilada para busca em O(tamanho da chave), independente da quantidade de rotas:
+
+    - por bucket de origem, uma trie dos prefixos: percorrer a chave uma vez encontra todos os prefixos
+      que ela atende (do mais curto ao mais longo);
+    - por bucket, uma trie das extensões invertidas: percorrer a chave de trás para frente encontra todas
+      as extensões que ela atende;
+    - em cada nó da trie de prefixos, as rotas ficam indexadas pela extensão, então apenas as rotas que
+      atendem prefixo e extensão são avaliadas (a regex, quando existe, só nessas).
+
+    Com várias rotas atendendo a chave vence o prefixo mais longo; com o mesmo prefixo, a rota com
+    extensão vence a rota sem extensão e, depois, a ordem na tabela.
+
+    Args:
+        definitions (list): Rotas (dicts no formato de Route)
+        version (str): Identificação da versão carregada (ETag ou mtime)
+    """
+
+    def __init__(self, definitions, version=None):
+        self.routes = [Route(definition, order) for order, definition in enumerate(definitions)]
+        self.version = version
+        self._prefixes = {}
+        self._suffixes = {}
+        for route in self.routes:
+            node = self._prefixes.setdefault(route.source_bucket, _TrieNode())
+            for char in route.prefix:
+                node = node.children.setdefault(char, _TrieNode())
+            node.has_routes = True
+            if route.suffix:
+                node.by_suffix.setdefault(route.suffix, []).append(route)
+                suffix_node = self._suffixes.setdefault(route.source_bucket, {})
+                for char in reversed(route.suffix):
+                    suffix_node = suffix_node.setdefault(char, {})
+                suffix_node[None] = route.suffix
+            else:
+                node.any_suffix.append(route)
+
+    def has_bucket(self, bucket):
+        """Verifica se há alguma rota para o bucket de origem."""
+        return bucket in self._prefixes
+
+    def _matching_suffixes(self, bucket, key):
+        suffixes = []
+        node = self._suffixes.get(bucket)
+        if node is None:
+            return suffixes
+        lower_key = key.lower()
+        for index in range(len(lower_key) - 1, -1, -1):
+            node = node.get(lower_key[index])
+            if node is None:
+                break
+            if None in node:
+                suffixes.append(node[None])
+        return suffixes
+
+    def match(self, bucket, key):
+        """
+        Encontra a rota de uma chave.
+
+        Returns:
+            tuple: (Route, bucket de destino, chave de destino), ou None se nenhuma rota atende a chave
+        """
+        node = self._prefixes.get(bucket)
+        if node is None:
+            return None
+        # Nós da trie com rotas ao longo da chave (prefixos atendidos, do mais curto ao mais longo)
+        candidates = [node] if node.has_routes else []
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.has_routes:
+                candidates.append(node)
+        if not candidates:
+            return None
+
+        suffixes = self._matching_suffixes(bucket, key)
+        for node in reversed(candidates):
+            routes = [route for suffix in suffixes for route in node.by_suffix.get(suffix, ())]
+            if len(routes) > 1:
+                routes.sort(key=lambda route: route.order)
+            for route in routes + node.any_suffix:
+                match = None
+                if route.regex is not None:
+                    match = route.regex.search(key)
+                    if match is None:
+                        continue
+                destination_bucket, destination_key = route.destination(key, match)
+                return route, destination_bucket, destination_key
+        return None
+
+
+def parse_route_document(content, source_name=''):
+    """
+    Interpreta a tabela de rotas em JSON ou YAML (pela extensão .yaml/.yml da origem; YAML requer PyYAML).
+    Aceita uma lista de rotas ou um objeto com a chave "routes".
+
+    Returns:
+        list: Definições das rotas
+    """
+    if source_name.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:  # Dependência opcional, necessária apenas para tabelas em YAML
+            yaml = None
+        if yaml is None:
+            raise ImportError("Pacote PyYAML não instalado: necessário para tabelas de rotas em YAML")
+        document = yaml.safe_load(content)
+    else:
+        document = json.loads(content)
+    routes = document.get('routes') if isinstance(document, dict) else document
+    if not isinstance(routes, list):
+        raise RouteConfigError(f"Tabela de rotas {source_name} sem lista de rotas")
+    return routes
+
+
+class RouteTableLoader:
+    """
+    Carrega a tabela de rotas de um arquivo local ou de um objeto S3 (s3://bucket/chave) uma vez por
+    container e a recarrega quando a origem muda, verificando no máximo a cada reload_seconds:
+    no S3 por GET condicional ao ETag (If-None-Match, sem baixar a tabela quando não mudou) e no
+    arquivo local pela data de modificação.
+
+    Sem origem configurada, usa as rotas padrão (default_routes). Uma falha ao recarregar mantém a
+    tabela anterior.
+
+    Args:
+        source (str): Caminho local ou s3://bucket/chave (None = rotas padrão)
+        default_routes (list): Rotas usadas sem origem configurada
+        reload_seconds (float): Intervalo mínimo entre verificações da origem
+        s3_client_factory: Função que retorna o cliente S3 (origens s3://)
+    """
+
+    def __init__(self, source=None, default_routes=None, reload_seconds=60.0, s3_client_factory=None,
+                 clock=time.monotonic):
+        self.source = source
+        self.default_routes = default_routes or []
+        self.reload_seconds = reload_seconds
+        self._s3_client_factory = s3_client_factory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._table = None
+        self._checked_at = None
+
+    def get(self):
+        """
+        Returns:
+            RoutingTable: Tabela atual (carregada ou recarregada se necessário)
+        """
+        table = self._table
+        if table is not None and (
+            not self.source or self._clock() - self._checked_at < self.reload_seconds
+        ):
+            return table
+        with self._lock:
+            if self._table is not None and self.source and self._clock() - self._checked_at < self.reload_seconds:
+                return self._table
+            try:
+                self._table = self._load(self._table)
+            except Exception as e:
+                if self._table is None:
+                    raise
+                logger.warning("Falha ao recarregar a tabela de rotas %s (mantida a versão %s): %s",
+                               self.source, self._table.version, e)
+            self._checked_at = self._clock()
+            return self._table
+
+    def _load(self, current):
+        if not self.source:
+            return RoutingTable(self.default_routes, version='padrão')
+
+        if self.source.startswith('s3://'):
+            bucket, _, key = self.source[len('s3://'):].partition('/')
+            params = {'Bucket': bucket, 'Key': key}
+            if current is not None:
+                params['IfNoneMatch'] = current.version
+            try:
+                response = self._s3_client_factory().get_object(**params)
+            except Exception as e:
+                error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+                if current is not None and error_code in ('304', 'NotModified'):
+                    return current
+                raise
+            content = response['Body'].read()
+            version = response['ETag']
+        else:
+            version = str(os.path.getmtime(self.source))
+            if current is not None and current.version == version:
+                return current
+            with open(self.source, 'rb') as routes_file:
+                content = routes_file.read()
+
+        table = RoutingTable(parse_route_document(content, self.source), version=version)
+        logger.info("Tabela de rotas carregada de %s: %s rota(s) (versão %s)", self.source, len(table.routes), version)
+        return table
@@ -1,39 +1,112 @@
 import base64
+import io
+import threading
 import urllib.parse
-import urllib.request
-import http.client
-import boto3
 import os
 import datetime
-import xml.etree.ElementTree as ET
-import ssl
 import socket
 import json
 import logging
-import re
+from concurrent.futures import ThreadPoolExecutor
+
+import invocation_deadline
+import lambda_metrics
+import notification_digest
+import structured_logging
+from aws_clients import get_client
+from csv_validation import CsvValidationError, ValidatingStream, create_validator_from_env, preflight
+from http_connection_pool import HTTPConnectionPool
+from idempotency_store import build_idempotency_key, create_idempotency_store
+from invocation_deadline import DeadlineExceededError
+from s3_compressed_source import is_supported_key, open_csv_source
+from s3_parallel_download import MB
+from soap_delta import DeltaTransmission
+from soap_rejection_report import build_report_key, is_report_key, write_rejection_report
+from soap_mtom import build_mtom_request_parts, is_mtom_rejected
+from soap_response_parser import REJECTED_LINE_PATTERN, parse_fault_message, parse_transmission_response
+from transmission_checkpoint import (
+    build_checkpoint_key, checkpoint_matches, delete_checkpoint, load_checkpoint, new_checkpoint, save_checkpoint
+)
+from ws_flow_control import (
+    EndpointUnavailableError, LocalTransferError, RetryPolicy, call_with_retry, create_flow_control
+)
 
 # Configuração do logger
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+structured_logging.configure(logger)
+
+# Clientes AWS criados no primeiro uso (aws_clients.get_client) e reutilizados entre invocações
+
+# Registro de idempotência (criado sob demanda, mantido entre invocações do mesmo container)
+idempotency_store = None
+idempotency_store_lock = threading.Lock()
+
+# Limite de concorrência e circuit breaker do webservice (criado sob demanda, mantido entre invocações)
+endpoint_flow_control = None
+endpoint_flow_control_lock = threading.Lock()
+
+# Webservices que recusaram MTOM neste container (os envios seguintes usam base64 direto)
+mtom_rejected_endpoints = set()
+
+# Mensagem de resultado quando a requisição foi enviada, mas a resposta não chegou dentro do prazo da invocação
+TIMEOUT_AFTER_SEND_MESSAGE = (
+    "Tempo da invocação esgotado aguardando a resposta do webservice; o arquivo pode ter sido processado "
+    "(confira o protocolo no SAUDI/VOXIS antes de reenviar)"
+)
+
+# Timeouts de socket (no Python 3.9, socket.timeout não é subclasse de TimeoutError)
+SOCKET_TIMEOUTS = (socket.timeout, TimeoutError)
 
-# Clientes AWS inicializados fora do handler para reutilização
-s3 = boto3.client('s3')
-ses = boto3.client('ses')
+# Status de um arquivo enviado sem resposta (resultado desconhecido): a reserva de idempotência é mantida,
+# a mensagem SQS não volta para a fila e o arquivo é encaminhado para conferência manual
+UNKNOWN_OUTCOME_STATUS = 504
 
-def send_notification_email(filename, result, is_error=False):
+# Status de arquivos adiados (webservice indisponível, prazo da invocação esgotado antes do envio, envio em
+# andamento em outra invocação): somente esses voltam para a fila SQS; erros definitivos (ex: validação)
+# confirmam a mensagem, evitando reentregas com novo email de erro e nova cópia para erros/
+TRANSIENT_STATUSES = (409, 503)
+
+# Validade máxima do link assinado do relatório de rejeições com credenciais temporárias (AWS_SESSION_TOKEN, como
+# as da role do Lambda): o link deixa de funcionar quando as credenciais que o assinaram expiram, antes do
+# ExpiresIn pedido
+SESSION_URL_MAX_EXPIRES = 3600
+
+# Pool de conexões com o webservice, mantido entre invocações do mesmo container
+ws_connection_pool = HTTPConnectionPool(
+    max_idle_per_key=int(os.environ.get('WS_POOL_MAX_IDLE', '8')),
+    idle_timeout=float(os.environ.get('WS_POOL_IDLE_TIMEOUT', '50'))
+)
+
+def get_s3_client():
     """
-    Envia um email de notificação via AWS SES com o resultado do processamento.
+    Cliente S3 criado no primeiro uso: um único cliente compartilhado pelas threads, com pool de conexões
+    suficiente para os arquivos do evento e as faixas do download paralelo.
+    """
+    return get_client(
+        's3',
+        max_pool_connections=max(
+            10, int(os.environ.get('BATCH_CONCURRENCY', '4')) * int(os.environ.get('DOWNLOAD_CONCURRENCY', '8'))
+        )
+    )
+
+
+def send_notification_email(filename, result, is_error=False, bucket=None):
+    """
+    Enfileira um email de notificação (AWS SES) com o resultado do processamento. Os emails são enviados
+    no final da invocação por notification_digest, agregados por tipo (sucesso/erro) e pasta do arquivo.
     
     Args:
         filename (str): Nome do arquivo processado
         result (dict): Resultado do processamento contendo detalhes
         is_error (bool): Flag para indicar se é uma notificação de erro ou sucesso
+        bucket (str): Bucket do arquivo (grupo de agregação)
     """
     try:
         # Configurações do email obtidas de variáveis de ambiente
         sender = os.environ.get('EMAIL_SENDER', 'no-reply@empresa.com.br')                                    # Email remetente (verificado no SES)
-        recipients = os.environ.get('EMAIL_RECIPIENTS', 'admin@empresa.com.br,equipe@empresa.com.br)          # Emails destinatários
-        cc = os.environ.get('EMAIL_RECIPIENTS','supervisor@empresa.com.br)                                    # Emails em cópia (opcional)
+        recipients = os.environ.get('EMAIL_RECIPIENTS', 'admin@empresa.com.br,equipe@empresa.com.br').split(',')  # Emails destinatários
+        cc = [e for e in os.environ.get('EMAIL_CC', 'supervisor@empresa.com.br').split(',') if e]                  # Emails em cópia (opcional)
 
         
         # Definir tipo de notificação e estilo conforme status
@@ -48,6 +121,58 @@ def send_notification_email(filename, result, is_error=False):
             status_bg_color = "#DFF2BF"
             status_color = "#4F8A10"
         
+        # Resposta limitada para manter o tamanho do email constante (os detalhes ficam no relatório de rejeições)
+        max_chars = int(os.environ.get('EMAIL_RESPONSE_MAX_CHARS', '2000'))
+        resposta = str(result.get('resposta_completa', 'N/A'))
+        if len(resposta) > max_chars:
+            resposta = resposta[:max_chars] + '\n... (resposta truncada)'
+        
+        # Resumo do relatório de linhas rejeitadas, quando gerado
+        report_html = ''
+        report_text = ''
+        if result.get('relatorio_rejeicoes'):
+            reasons_html = ''.join(
+                f"<tr><td>{reason or 'N/A'}</td><td>{count}</td></tr>" for reason, count in result.get('principais_motivos', [])
+            )
+            reasons_text = ''.join(
+                f"\n        - {reason or 'N/A'}: {count}" for reason, count in result.get('principais_motivos', [])
+            )
+            report_html = f"""
+            <h3>Principais Motivos de Rejeição:</h3>
+            <table>
+                <tr>
+                    <th>Motivo</th>
+                    <th>Linhas</th>
+                </tr>
+                {reasons_html}
+            </table>
+            <p>Relatório completo: <a href="{result.get('relatorio_rejeicoes_url', '')}">{result['relatorio_rejeicoes']}</a></p>
+            <p>Link temporário, válido até {result.get('relatorio_rejeicoes_url_expira', 'N/A')}; depois, acesse o relatório pelo caminho no S3.</p>
+            """
+            report_text = f"""
+        Principais Motivos de Rejeição:{reasons_text}
+        
+        Relatório completo: {result['relatorio_rejeicoes']}
+        {result.get('relatorio_rejeicoes_url', '')}
+        (link temporário, válido até {result.get('relatorio_rejeicoes_url_expira', 'N/A')}; depois, acesse o relatório pelo caminho no S3)
+        """
+        
+        # Linhas enviadas no modo delta
+        delta_html = ''
+        delta_text = ''
+        if result.get('modo_envio') == 'delta':
+            delta_summary = (
+                f"{result.get('linhas_enviadas')} de {result.get('linhas')} linhas "
+                f"({result.get('linhas_novas')} novas, {result.get('linhas_alteradas')} alteradas; "
+                f"{result.get('linhas_removidas')} removidas não enviadas)"
+            )
+            delta_html = f"""
+                <tr>
+                    <td>Envio Delta</td>
+                    <td>{delta_summary}</td>
+                </tr>"""
+            delta_text = f"\n        - Envio Delta: {delta_summary}"
+        
         # Cria o assunto do email
         subject = f"{notification_type} no processamento do arquivo {filename.split('/')[-1]} - Protocolo: {result['protocolo']}"
         
@@ -88,6 +213,10 @@ def send_notification_email(filename, result, is_error=False):
                     <td>Total de Registros</td>
                     <td>{result.get('total_registros', 'N/A')}</td>
                 </tr>
+                <tr>
+                    <td>Registros no Arquivo (validação local)</td>
+                    <td>{result.get('registros_locais', 'N/A')}</td>
+                </tr>
                 <tr>
                     <td>Linhas Aceitas</td>
                     <td>{result.get('linhas_aceitas', 'N/A')}</td>
@@ -95,15 +224,15 @@ def send_notification_email(filename, result, is_error=False):
                 <tr>
                     <td>Linhas Rejeitadas</td>
                     <td>{result.get('linhas_rejeitadas', 'N/A')}</td>
-                </tr>
+                </tr>{delta_html}
                 <tr>
                     <td>Data e Hora</td>
                     <td>{datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</td>
                 </tr>
             </table>
-            
+            {report_html}
             <h3>Resposta Completa:</h3>
-            <pre>{result.get('resposta_completa', 'N/A')}</pre>
+            <pre>{resposta}</pre>
             
             <p>Este é um email automático. Por favor, não responda.</p>
         </body>
@@ -120,97 +249,117 @@ def send_notification_email(filename, result, is_error=False):
         - Nome do arquivo: {filename.split('/')[-1]}
         - Protocolo: {result['protocolo']}
         - Total de Registros: {result.get('total_registros', 'N/A')}
+        - Registros no Arquivo (validação local): {result.get('registros_locais', 'N/A')}
         - Linhas Aceitas: {result.get('linhas_aceitas', 'N/A')}
-        - Linhas Rejeitadas: {result.get('linhas_rejeitadas', 'N/A')}
+        - Linhas Rejeitadas: {result.get('linhas_rejeitadas', 'N/A')}{delta_text}
         - Data e Hora: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}
-        
+        {report_text}
         Resposta Completa: 
-        {result.get('resposta_completa', 'N/A')}
+        {resposta}
         
         Este é um email automático. Por favor, não responda.
         """
         
-        # Envia o email usando o AWS SES
-        response = ses.send_email(
-            Source=sender,
-            Destination={
-                'ToAddresses': recipients,
-                'CcAddresses': cc
-            },
-            Message={
-                'Subject': {
-                    'Data': subject,
-                    'Charset': 'UTF-8'
-                },
-                'Body': {
-                    'Text': {
-                        'Data': body_text,
-                        'Charset': 'UTF-8'
-                    },
-                    'Html': {
-                        'Data': body_html,
-                        'Charset': 'UTF-8'
-                    }
-                }
-            }
-        )
+        # Linha do arquivo no email de resumo, com o link do relatório de rejeições quando gerado
+        item = {
+            'arquivo': filename.split('/')[-1],
+            'protocolo': result['protocolo'],
+            'total_registros': result.get('total_registros', 'N/A'),
+            'linhas_rejeitadas': result.get('linhas_rejeitadas', 'N/A'),
+            'mensagem': str(result['mensagem'])[:300]
+        }
+        if result.get('relatorio_rejeicoes'):
+            item['relatorio_rejeicoes'] = result['relatorio_rejeicoes']
+            item['relatorio_rejeicoes_url'] = result.get('relatorio_rejeicoes_url', '')
         
-        logger.info(f"Email de notificação de {notification_type} enviado com sucesso. MessageId: {response['MessageId']}")
-        return True
+        # Enfileira o email: o envio pelo SES acontece no final da invocação, agregando os arquivos da mesma pasta
+        return notification_digest.enqueue(
+            sender, recipients, subject, body_text, html=body_html, cc=cc,
+            group=notification_digest.build_group(notification_type, bucket, filename),
+            item=item
+        )
     except Exception as e:
-        logger.error(f"Erro ao enviar email de notificação: {str(e)}")
+        logger.error("Erro ao preparar email de notificação: %s", e)
         return False
 
 
-# Função antiga mantida para compatibilidade com código existente
-def send_error_notification_email(filename, result):
+def get_stream_chunk_size():
     """
-    Função legada para manter compatibilidade. Agora chama a função genérica.
+    Retorna o tamanho dos blocos lidos do S3 no envio em streaming.
+    O valor é alinhado em múltiplos de 3 bytes para que cada bloco gere base64 sem padding intermediário.
     """
-    return send_notification_email(filename, result, is_error=True)
+    chunk_size = int(os.environ.get('STREAM_CHUNK_SIZE', str(768 * 1024)))
+    return max(3, chunk_size - chunk_size % 3)
 
 
-def lambda_handler(event, context):
+def base64_encoded_length(size):
     """
-    Função Lambda otimizada para enviar arquivos CSV do S3 para o webservice SAUDI/VOXIS.
-    Usa formato SOAP específico com senha em base64 conforme exemplo.
-    Implementado apenas com bibliotecas padrão do Python.
+    Calcula o tamanho em bytes do conteúdo codificado em base64 (com padding).
+
+    Args:
+        size (int): Tamanho do conteúdo original em bytes
     """
-    try:
-        # Extrair informações do evento
-        record = event['Records'][0]
-        bucket = record['s3']['bucket']['name']
-        key = urllib.parse.unquote_plus(record['s3']['object']['key'])
+    return 4 * ((size + 2) // 3)
 
-        logger.info(f"Iniciando processamento do arquivo: {key} do bucket: {bucket}")
-        
-        # Verificação rápida se é um arquivo CSV
-        if not key.lower().endswith('.csv'):
-            return {'statusCode': 200, 'body': 'Arquivo ignorado: não é CSV'}
-        
-        # Obter o arquivo do S3
-        response = s3.get_object(Bucket=bucket, Key=key)
-        file_content = response['Body'].read()
-        
-        # Configurações do webservice (valores reais armazenados em variáveis de ambiente)
-        ws_url=https://exemplo.donain.com.br/webservice/transmiteArquivoService   # URL do webservice SOAP
-        ws_login=usuario_webservice                                               # Login para autenticação
-        ws_password=senha_webservice                                              # Senha para autenticação
-        client_code=codigo_cliente                                                # Código do cliente no sistema
-        service_id=BNFC                                                           # ID do serviço (ex: BNFC)
-        file_type = os.environ.get('FILE_TYPE', 'CSV')
-        
-        # Usar o nome original do arquivo (extrair somente o nome do arquivo sem o caminho)
-        filename = key.split('/')[-1]
-        
-        # Codificar senha em base64
-        password_base64 = base64.b64encode(ws_password.encode()).decode()
-        
-        # Codificar conteúdo do arquivo em base64
-        file_content_base64 = base64.b64encode(file_content).decode()
-        
-        # Construir envelope SOAP conforme exemplo fornecido
-        soap_envelope = f"""
+
+def iter_base64_chunks(stream, chunk_size):
+    """
+    Lê o stream em blocos e gera o conteúdo codificado em base64 de forma incremental.
+    Apenas o último bloco pode conter padding, então a concatenação dos blocos é idêntica
+    a base64.b64encode do conteúdo completo.
+
+    Args:
+        stream: Objeto com método read(n) (ex: StreamingBody do S3)
+        chunk_size (int): Tamanho dos blocos lidos (múltiplo de 3)
+    """
+    metrics = lambda_metrics.current()
+    remainder = b''
+    while True:
+        with metrics.stage('s3_read'):
+            data = stream.read(chunk_size)
+        if not data:
+            break
+        metrics.add('S3.BytesRead', len(data), lambda_metrics.UNIT_BYTES)
+        if remainder:
+            data = remainder + data
+        # Codificar somente a parte alinhada em 3 bytes; o restante segue para o próximo bloco
+        aligned = len(data) - len(data) % 3
+        remainder = data[aligned:]
+        if aligned:
+            with metrics.stage('base64_encode'):
+                encoded = base64.b64encode(data[:aligned])
+            yield encoded
+    if remainder:
+        yield base64.b64encode(remainder)
+
+
+def iter_raw_chunks(stream, chunk_size):
+    """
+    Lê o stream em blocos para o envio binário (MTOM), sem codificação.
+
+    Args:
+        stream: Objeto com método read(n) (ex: StreamingBody do S3)
+        chunk_size (int): Tamanho dos blocos lidos
+    """
+    metrics = lambda_metrics.current()
+    while True:
+        with metrics.stage('s3_read'):
+            data = stream.read(chunk_size)
+        if not data:
+            break
+        metrics.add('S3.BytesRead', len(data), lambda_metrics.UNIT_BYTES)
+        yield data
+
+
+def build_soap_envelope_parts(ws_login, password_base64, client_code, service_id, file_type, filename):
+    """
+    Constrói o envelope SOAP separado em prefixo e sufixo, em torno do conteúdo do elemento <arquivo>.
+    O conteúdo em base64 é enviado entre as duas partes sem montar o envelope completo em memória.
+
+    Returns:
+        tuple: (prefixo, sufixo) do envelope em bytes UTF-8
+    """
+    envelope_prefix = f"""
         <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:end="http://endpoints.webservice.integration.saudi.acol.com/">
             <soapenv:Header/>
             <soapenv:Body>
@@ -221,200 +370,1089 @@ def lambda_handler(event, context):
                     <idtServico>{service_id}</idtServico>
                     <tipArquivo>{file_type}</tipArquivo>
                     <nomArquivo>{filename}</nomArquivo>
-                    <arquivo>{file_content_base64}</arquivo>
+                    <arquivo>"""
+    envelope_suffix = """</arquivo>
                 </end:transmitirArquivoOperadora>
             </soapenv:Body>
         </soapenv:Envelope>
-        """.encode('utf-8')
+        """
+    return envelope_prefix.encode('utf-8'), envelope_suffix.encode('utf-8')
+
+
+def send_soap_streaming(conn, path, headers, envelope_prefix, body_stream, content_size, envelope_suffix, binary=False):
+    """
+    Envia a requisição SOAP escrevendo o envelope diretamente na conexão HTTP.
+    O Content-Length é calculado antecipadamente a partir do tamanho do objeto no S3,
+    mantendo o uso de memória limitado ao tamanho de um bloco, independente do tamanho do arquivo.
+
+    Args:
+        conn: Conexão http.client (HTTP ou HTTPS)
+        path (str): Caminho do webservice
+        headers (dict): Cabeçalhos da requisição (sem Content-Length)
+        envelope_prefix (bytes): Início do envelope SOAP até <arquivo>
+        body_stream: Stream com o conteúdo do arquivo (ex: StreamingBody do S3)
+        content_size (int): Tamanho do conteúdo do arquivo em bytes (ContentLength do S3)
+        envelope_suffix (bytes): Final do envelope SOAP a partir de </arquivo>
+        binary (bool): Enviar o conteúdo sem codificação (anexo MTOM, entre o início e o final do multipart)
+
+    Returns:
+        int: Total de bytes enviados no corpo da requisição
+    """
+    encoded_size = content_size if binary else base64_encoded_length(content_size)
+    content_length = len(envelope_prefix) + encoded_size + len(envelope_suffix)
+
+    metrics = lambda_metrics.current()
+    with metrics.stage('request_write'):
+        conn.putrequest('POST', path)
+        for name, value in headers.items():
+            conn.putheader(name, value)
+        conn.putheader('Content-Length', str(content_length))
+        conn.endheaders(message_body=envelope_prefix)
+
+    sent = 0
+    chunks = (iter_raw_chunks if binary else iter_base64_chunks)(body_stream, get_stream_chunk_size())
+    while True:
+        try:
+            chunk = next(chunks, None)
+        except OSError as e:
+            # Falha na leitura da origem: não indica problema no webservice
+            conn.close()
+            raise LocalTransferError(f"Erro na leitura do arquivo durante o envio: {e}") from e
+        if chunk is None:
+            break
+        sent += len(chunk)
+        # Enviar mais bytes que o Content-Length anunciado corromperia a requisição
+        if sent > encoded_size:
+            conn.close()
+            raise LocalTransferError(f"Conteúdo maior que o tamanho anunciado: esperado {encoded_size} bytes no envio")
+        # O socket recebe o tempo restante da invocação; sem o mínimo, o envio é interrompido
+        # antes de concluir o corpo (o webservice descarta a requisição incompleta)
+        conn.sock.settimeout(invocation_deadline.budget('request_write', conn.timeout))
+        with metrics.stage('request_write'):
+            conn.send(chunk)
+
+    # Um corpo menor que o anunciado deixaria o servidor aguardando até o timeout
+    if sent != encoded_size:
+        conn.close()
+        raise LocalTransferError(
+            f"Tamanho do conteúdo divergente do S3: esperado {encoded_size} bytes no envio, lidos {sent}"
+        )
+
+    with metrics.stage('request_write'):
+        conn.send(envelope_suffix)
+    metrics.add('Webservice.BytesSent', content_length, lambda_metrics.UNIT_BYTES)
+    return content_length
+
+
+# Função antiga mantida para compatibilidade com código existente
+def send_error_notification_email(filename, result):
+    """
+    Função legada para manter compatibilidade. Agora chama a função genérica.
+    """
+    return send_notification_email(filename, result, is_error=True)
+
+
+def get_ws_config():
+    """
+    Lê as configurações do webservice SAUDI/VOXIS a partir das variáveis de ambiente.
+    """
+    return {
+        'url': os.environ['WS_URL'],                                    # URL do webservice SOAP
+        'login': os.environ['WS_LOGIN'],                                # Login para autenticação
+        'password': os.environ['WS_PASSWORD'],                          # Senha para autenticação
+        'client_code': os.environ['CLIENT_CODE'],                       # Código do cliente no sistema
+        'service_id': os.environ.get('SERVICE_ID', 'BNFC'),             # ID do serviço (ex: BNFC)
+        'file_type': os.environ.get('FILE_TYPE', 'CSV'),
+        'timeout': int(os.environ.get('WS_TIMEOUT', '550')),            # Timeout em segundos
+        'transfer_mode': os.environ.get('WS_TRANSFER_MODE', 'base64'),  # base64 (inline) ou mtom (anexo binário)
+        'verify_ssl': os.environ.get('VERIFY_SSL', '1') != '0'
+    }
+
+
+def get_flow_control(ws_config):
+    """
+    Retorna o limite de concorrência adaptativo e circuit breaker do webservice, criado na primeira
+    chamada. Retorna None quando WS_FLOW_CONTROL_BACKEND não está configurado.
+    """
+    global endpoint_flow_control
+    backend_name = os.environ.get('WS_FLOW_CONTROL_BACKEND')
+    if not backend_name:
+        return None
+    with endpoint_flow_control_lock:
+        if endpoint_flow_control is None:
+            endpoint_flow_control = create_flow_control(
+                backend_name,
+                urllib.parse.urlparse(ws_config['url']).netloc,
+                table_name=os.environ.get('WS_FLOW_CONTROL_TABLE'),
+                path=os.environ.get('WS_FLOW_CONTROL_PATH'),
+                initial_limit=float(os.environ.get('WS_LIMIT_INITIAL', '4')),
+                min_limit=int(os.environ.get('WS_LIMIT_MIN', '1')),
+                max_limit=int(os.environ.get('WS_LIMIT_MAX', '32')),
+                latency_tolerance=float(os.environ.get('WS_LATENCY_TOLERANCE', '2')),
+                max_wait=float(os.environ.get('WS_LIMIT_MAX_WAIT', '30')),
+                failure_threshold=int(os.environ.get('WS_BREAKER_FAILURES', '5')),
+                open_seconds=float(os.environ.get('WS_BREAKER_OPEN_SECONDS', '60')),
+                # A vaga de uma invocação interrompida expira após o timeout da requisição
+                lease_ttl=ws_config['timeout'] + 60
+            )
+    return endpoint_flow_control
+
+
+def get_retry_policy():
+    """
+    Política de repetição dos envios ao webservice: erros de conexão e status em WS_RETRY_STATUSES
+    (padrão 503), com backoff exponencial e jitter.
+    """
+    return RetryPolicy(
+        max_attempts=int(os.environ.get('WS_MAX_ATTEMPTS', '3')),
+        base_delay=float(os.environ.get('WS_RETRY_BASE_DELAY', '1')),
+        max_delay=float(os.environ.get('WS_RETRY_MAX_DELAY', '20')),
+        retry_statuses=[int(status) for status in os.environ.get('WS_RETRY_STATUSES', '503').split(',') if status.strip()]
+    )
+
+
+def build_retry_logger(filename):
+    """
+    Callback de call_with_retry que registra cada nova tentativa de envio de filename.
+    Sem tempo na invocação para a espera e a nova tentativa, o envio é interrompido (DeadlineExceededError).
+    """
+    def log_retry(attempt, reason, wait):
+        invocation_deadline.check('retry_wait', needed=wait + 1)
+        logger.warning("Tentativa %s de envio de %s falhou (%s); nova tentativa em %.1fs", attempt, filename, reason, wait)
+        lambda_metrics.add('Webservice.Retries', 1)
+    return log_retry
+
+
+def release_flow_control(flow_control, lease, success, size):
+    """Devolve a vaga do limite de concorrência; falhas do backend de coordenação não interrompem o envio."""
+    try:
+        state = flow_control.release(lease, success, size)
+    except Exception as e:
+        logger.error("Erro ao atualizar o limite de concorrência do webservice: %s", e)
+        return
+    if state is not None and state['breaker'] != 'closed':
+        logger.warning("Circuito do webservice %s (limite de concorrência %.1f)", state['breaker'], state['limit'])
+
+
+def transmit_content(open_stream, file_size, filename, ws_config):
+    """
+    Envia um arquivo no modo configurado em WS_TRANSFER_MODE. Se o webservice recusar o MTOM,
+    o arquivo é reenviado em base64 e os envios seguintes do container usam base64 diretamente.
+
+    Args:
+        open_stream: Função que retorna um stream com o conteúdo do arquivo (chamada a cada envio)
+        file_size (int): Tamanho do conteúdo em bytes
+        filename (str): Nome do arquivo informado em <nomArquivo>
+        ws_config (dict): Configurações retornadas por get_ws_config
+
+    Returns:
+        tuple: (status HTTP, corpo da resposta decodificado)
+    """
+    if ws_config['transfer_mode'] != 'mtom' or ws_config['url'] in mtom_rejected_endpoints:
+        return transmit_file(open_stream(), file_size, filename, ws_config)
+
+    status_code, response_data = transmit_file(open_stream(), file_size, filename, ws_config, transfer_mode='mtom')
+    if not is_mtom_rejected(status_code, response_data):
+        return status_code, response_data
+
+    logger.warning(
+        "Webservice recusou o envio MTOM de %s (HTTP %s): reenviando em base64 (%s)",
+        filename, status_code, parse_fault_message(status_code, response_data)
+    )
+    mtom_rejected_endpoints.add(ws_config['url'])
+    lambda_metrics.add('Webservice.MtomFallback', 1)
+    return transmit_file(open_stream(), file_size, filename, ws_config)
+
+
+def transmit_file(body_stream, file_size, filename, ws_config, transfer_mode='base64'):
+    """
+    Envia um arquivo ao webservice, respeitando o limite de concorrência e o circuit breaker
+    (quando WS_FLOW_CONTROL_BACKEND está configurado).
+
+    Args:
+        body_stream: Stream com o conteúdo do arquivo
+        file_size (int): Tamanho do conteúdo em bytes
+        filename (str): Nome do arquivo informado em <nomArquivo>
+        ws_config (dict): Configurações retornadas por get_ws_config
+        transfer_mode (str): 'base64' (conteúdo inline em <arquivo>) ou 'mtom' (anexo binário)
+
+    Returns:
+        tuple: (status HTTP, corpo da resposta decodificado)
+
+    Raises:
+        EndpointUnavailableError: Circuito aberto ou nenhuma vaga liberada a tempo
+    """
+    flow_control = get_flow_control(ws_config)
+    if flow_control is None:
+        return send_transmission_request(body_stream, file_size, filename, ws_config, transfer_mode)
+
+    with lambda_metrics.stage('ws_limiter_wait'):
+        lease = flow_control.acquire(max_wait=invocation_deadline.budget('ws_limiter_wait', flow_control.max_wait))
+    try:
+        status_code, response_data = send_transmission_request(body_stream, file_size, filename, ws_config, transfer_mode)
+    except LocalTransferError:
+        # Falha local (leitura da origem, tamanho divergente): não conta contra o webservice
+        release_flow_control(flow_control, lease, None, file_size)
+        raise
+    except OSError:
+        # Timeout ou erro de conexão: sinal de sobrecarga do webservice
+        release_flow_control(flow_control, lease, False, file_size)
+        raise
+    except Exception:
+        # Falha do próprio arquivo (ex: validação interrompendo o envio)
+        release_flow_control(flow_control, lease, None, file_size)
+        raise
+    release_flow_control(flow_control, lease, status_code < 500, file_size)
+    return status_code, response_data
+
+
+def send_transmission_request(body_stream, file_size, filename, ws_config, transfer_mode='base64'):
+    """
+    Envia um arquivo ao webservice via transmitirArquivoOperadora, em streaming.
+
+    Args:
+        body_stream: Stream com o conteúdo do arquivo
+        file_size (int): Tamanho do conteúdo em bytes
+        filename (str): Nome do arquivo informado em <nomArquivo>
+        ws_config (dict): Configurações retornadas por get_ws_config
+        transfer_mode (str): 'base64' ou 'mtom'
+
+    Returns:
+        tuple: (status HTTP, corpo da resposta decodificado)
+    """
+    # Codificar senha em base64
+    password_base64 = base64.b64encode(ws_config['password'].encode()).decode()
+
+    # Construir envelope SOAP conforme exemplo fornecido (o conteúdo do arquivo é inserido no envio)
+    envelope_prefix, envelope_suffix = build_soap_envelope_parts(
+        ws_config['login'], password_base64, ws_config['client_code'],
+        ws_config['service_id'], ws_config['file_type'], filename
+    )
+
+    # Extrair o hostname e caminho da URL
+    url_parts = urllib.parse.urlparse(ws_config['url'])
+    
+    # Obter conexão do pool (reaproveita conexões keep-alive entre invocações)
+    timeout = invocation_deadline.budget('ws_connect', ws_config['timeout'])
+    conn = ws_connection_pool.acquire(url_parts.scheme, url_parts.netloc, ws_config['verify_ssl'], timeout)
+
+    # Configurar cabeçalhos
+    headers = {
+        'Content-Type': 'text/xml;charset=UTF-8',
+        'SOAPAction': '',
+        'Connection': 'Keep-Alive'
+    }
+    binary = transfer_mode == 'mtom'
+    if binary:
+        # MTOM: envelope com xop:Include como parte raiz e o CSV como anexo binário (sem base64)
+        envelope_prefix, envelope_suffix, headers['Content-Type'] = build_mtom_request_parts(envelope_prefix, envelope_suffix)
+        headers['MIME-Version'] = '1.0'
+
+    try:
+        # Enviar requisição SOAP em streaming (S3 -> base64 ou anexo binário -> conexão HTTP)
+        try:
+            request_size = send_soap_streaming(
+                conn, url_parts.path, headers, envelope_prefix, body_stream, file_size, envelope_suffix, binary=binary
+            )
+        except SOCKET_TIMEOUTS as e:
+            if not invocation_deadline.expired():
+                raise
+            raise DeadlineExceededError('request_write') from e
+        logger.info(
+            "Arquivo %s enviado (%s): %s bytes (%s bytes na requisição)", filename, transfer_mode, file_size, request_size
+        )
+
+        # Obter resposta (espera pelo processamento no servidor e leitura do corpo medidas separadamente),
+        # limitada ao tempo restante da invocação
+        try:
+            with lambda_metrics.stage('server_wait'):
+                conn.sock.settimeout(invocation_deadline.budget('server_wait', ws_config['timeout']))
+                response = conn.getresponse()
+            with lambda_metrics.stage('response_read'):
+                response_body = response.read()
+        except (DeadlineExceededError,) + SOCKET_TIMEOUTS as e:
+            if isinstance(e, SOCKET_TIMEOUTS) and not invocation_deadline.expired():
+                raise
+            # Requisição já enviada por completo: o webservice pode ter processado o arquivo
+            raise DeadlineExceededError('server_wait', request_sent=True) from e
+        except OSError as e:
+            # Conexão encerrada após o envio completo (ex: RemoteDisconnected): não é repetida
+            e.request_sent = True
+            raise
+        lambda_metrics.add('Webservice.BytesReceived', len(response_body), lambda_metrics.UNIT_BYTES)
+        response_data = response_body.decode('utf-8')
+    except Exception:
+        # Conexão em estado indefinido não volta para o pool
+        conn.close()
+        raise
+
+    ws_connection_pool.release(conn, reusable=not response.will_close)
+    return response.status, response_data
+
+
+def build_transmission_result(status_code, response_data):
+    """
+    Interpreta a resposta do webservice e monta o resultado usado na notificação.
+
+    Args:
+        status_code (int): Status HTTP da resposta
+        response_data (str): Corpo da resposta
+
+    Returns:
+        dict: Resultado com status, mensagem, protocolo e contadores
+    """
+    if status_code in (200, 202):
+        # Extrair informações detalhadas da resposta SOAP
+        try:
+            # Registrar resposta completa para debug (limitada a LOG_MAX_FIELD_CHARS)
+            logger.info("Resposta completa: %s", response_data)
+            with lambda_metrics.stage('response_parse'):
+                return parse_transmission_response(response_data).as_dict()
+        except Exception as xml_error:
+            logger.error("Erro ao processar XML: %s", xml_error)
+            return {
+                'status': 'Erro de processamento',
+                'mensagem': f"Erro ao processar resposta XML: {str(xml_error)}",
+                'protocolo': 'N/A',
+                'resposta_completa': response_data[:500]
+            }
+
+    # Criar objeto de resultado para erro de comunicação
+    return {
+        'status': 'Erro',
+        'mensagem': parse_fault_message(status_code, response_data),
+        'protocolo': 'N/A',
+        'resposta_completa': response_data[:500]
+    }
+
+
+def get_split_config(file_size):
+    """
+    Retorna a configuração do modo de envio em partes, ou None se o arquivo deve ser enviado de uma vez.
+    O modo é habilitado com SPLIT_MODE=true e aplicado somente a arquivos a partir de SPLIT_THRESHOLD_MB.
+
+    Args:
+        file_size (int): Tamanho do arquivo em bytes
+    """
+    if os.environ.get('SPLIT_MODE') != 'true':
+        return None
+    if file_size < int(os.environ.get('SPLIT_THRESHOLD_MB', '100')) * 1024 * 1024:
+        return None
+    return {
+        'max_rows': int(os.environ.get('SPLIT_MAX_ROWS', '0')),                       # Linhas por parte (0 = sem limite)
+        'max_bytes': int(os.environ.get('SPLIT_MAX_MB', '50')) * 1024 * 1024,         # Tamanho máximo de cada parte
+        'concurrency': max(1, int(os.environ.get('SPLIT_CONCURRENCY', '4')))         # Partes enviadas em paralelo
+    }
+
+
+def get_delta_config():
+    """
+    Retorna a configuração do modo delta (envio somente das linhas novas ou alteradas desde o último envio
+    com protocolo), ou None se desabilitado. O modo é habilitado com DELTA_MODE=true.
+    """
+    if os.environ.get('DELTA_MODE') != 'true':
+        return None
+    return {
+        'key_column': os.environ.get('DELTA_KEY_COLUMN') or None,                    # Coluna chave (vazio = primeira coluna)
+        'delimiter': os.environ.get('CSV_DELIMITER', ';'),
+        'encoding': os.environ.get('CSV_ENCODING', 'utf-8'),
+        'index_prefix': os.environ.get('DELTA_INDEX_PREFIX', 'delta/'),              # Pasta dos índices no bucket
+        'name_pattern': os.environ.get('DELTA_NAME_PATTERN') or None                 # Regex removida do nome (ex: data)
+    }
+
+
+def build_part_filename(filename, index):
+    """
+    Gera o nome determinístico de uma parte (ex: arquivo.csv -> arquivo.part0003.csv).
+
+    Args:
+        filename (str): Nome do arquivo original
+        index (int): Número da parte (iniciando em 1)
+    """
+    stem, dot, extension = filename.rpartition('.')
+    if not dot:
+        return f"{filename}.part{index:04d}"
+    return f"{stem}.part{index:04d}.{extension}"
+
+
+def iter_stream_lines(stream, chunk_size):
+    """
+    Lê o stream em blocos e gera as linhas mantendo o terminador de linha.
+    """
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk if pending else chunk
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            yield data[start:end + 1]
+            start = end + 1
+        pending = data[start:]
+    if pending:
+        yield pending
+
+
+def iter_csv_parts(stream, max_rows, max_bytes):
+    """
+    Divide o CSV em partes nas fronteiras de registro, repetindo a linha de cabeçalho em cada parte.
+    Registros com quebra de linha dentro de campos entre aspas nunca são separados entre partes.
+
+    Args:
+        stream: Stream com o conteúdo do CSV
+        max_rows (int): Máximo de registros por parte (0 = sem limite)
+        max_bytes (int): Tamanho máximo aproximado de cada parte em bytes (0 = sem limite)
+
+    Yields:
+        bytes: Conteúdo de cada parte, incluindo o cabeçalho
+    """
+    header = None
+    part = bytearray()
+    rows = 0
+    in_quotes = False
+    yielded = False
+
+    for line in iter_stream_lines(stream, get_stream_chunk_size()):
+        if header is None:
+            header = line if line.endswith(b'\n') else line + b'\n'
+            part += header
+            continue
+
+        # Só corta a parte quando o registro anterior terminou (fora de campo entre aspas)
+        if rows and not in_quotes and (
+            (max_rows and rows >= max_rows) or (max_bytes and len(part) + len(line) > max_bytes)
+        ):
+            yield bytes(part)
+            yielded = True
+            part = bytearray(header)
+            rows = 0
+
+        part += line
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            rows += 1
+
+    if header is not None and (rows or in_quotes or not yielded):
+        yield bytes(part)
+
+
+def transmit_split(body_stream, filename, ws_config, split_config, completed_parts=None):
+    """
+    Envia o arquivo em várias partes com concorrência limitada e consolida os resultados.
+    No máximo `concurrency` partes ficam em memória ao mesmo tempo (mais a parte em montagem).
+
+    Sem tempo na invocação para a próxima parte, o envio é interrompido: as partes em andamento
+    terminam (ou são interrompidas antes de concluir o envio) e completed_parts guarda somente as
+    concluídas com sucesso (200/202), que não são reenviadas quando o envio é retomado com o mesmo
+    dicionário (checkpoint); as demais são reenviadas a partir da primeira incompleta. Uma parte
+    enviada sem resposta (resultado desconhecido) não é reenviada: o envio não é interrompido e o
+    resultado consolidado fica com UNKNOWN_OUTCOME_STATUS, para conferência manual.
+
+    Args:
+        body_stream: Stream com o conteúdo do CSV
+        filename (str): Nome do arquivo original
+        ws_config (dict): Configurações retornadas por get_ws_config
+        split_config (dict): Configurações retornadas por get_split_config
+        completed_parts (dict): Partes concluídas com sucesso por índice (atualizado durante o envio)
+
+    Returns:
+        tuple: (status HTTP consolidado, resultado consolidado, lista de (parte, texto de retorno))
+
+    Raises:
+        DeadlineExceededError: Prazo da invocação esgotado antes de enviar todas as partes
+    """
+    completed_parts = {} if completed_parts is None else completed_parts
+    concurrency = split_config['concurrency']
+    slots = threading.BoundedSemaphore(concurrency)
+    futures = []
+    sent_parts = {}
+    interrupted = None
+
+    def send_part(part, part_name):
+        try:
+            return call_with_retry(
+                lambda attempt: transmit_content(lambda: io.BytesIO(part), len(part), part_name, ws_config),
+                get_retry_policy(), on_retry=build_retry_logger(part_name)
+            )
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        parts = iter_csv_parts(body_stream, split_config['max_rows'], split_config['max_bytes'])
+        for index, part in enumerate(parts, start=1):
+            part_name = build_part_filename(filename, index)
+            if index in completed_parts:
+                # Parte concluída em uma invocação anterior: lida do S3 apenas para localizar as seguintes
+                logger.info(
+                    "Parte %s já enviada (protocolo %s)", part_name, completed_parts[index]['resultado'].get('protocolo'),
+                    extra=structured_logging.sampled('split_part')
+                )
+                continue
+            # Aguarda uma parte terminar antes de ler a próxima do S3
+            slots.acquire()
+            try:
+                invocation_deadline.check('split_part')
+            except DeadlineExceededError as e:
+                slots.release()
+                interrupted = e
+                break
+            logger.info("Enviando parte %s (%s bytes)", part_name, len(part), extra=structured_logging.sampled('split_part'))
+            futures.append((index, part_name, executor.submit(send_part, part, part_name)))
+            del part
+
+    for index, part_name, future in futures:
+        try:
+            status_code, response_data = future.result()
+            result = build_transmission_result(status_code, response_data)
+        except DeadlineExceededError as e:
+            if not e.request_sent:
+                # Envio interrompido antes de concluir a parte: reenviada quando o envio for retomado
+                interrupted = interrupted or e
+                continue
+            logger.error("Sem resposta do webservice para a parte %s dentro do prazo da invocação", part_name)
+            status_code = UNKNOWN_OUTCOME_STATUS
+            result = {'status': 'Erro', 'mensagem': TIMEOUT_AFTER_SEND_MESSAGE, 'protocolo': 'N/A'}
+        except Exception as e:
+            logger.error("Erro ao enviar parte %s: %s", part_name, e)
+            status_code = 500
+            result = {'status': 'Erro', 'mensagem': str(e), 'protocolo': 'N/A'}
+        sent_parts[index] = {'arquivo': part_name, 'status_code': status_code, 'resultado': result}
+        if status_code in (200, 202):
+            completed_parts[index] = sent_parts[index]
+
+    unknown = any(part['status_code'] == UNKNOWN_OUTCOME_STATUS for part in sent_parts.values())
+    if interrupted is not None and not unknown:
+        raise interrupted
+
+    part_results = [
+        (part['arquivo'], part['status_code'], part['resultado'])
+        for _, part in sorted({**completed_parts, **sent_parts}.items())
+    ]
+
+    status_code, combined = combine_part_results(part_results)
+    sections = [(name, result.get('resposta_completa')) for name, _, result in part_results]
+    return status_code, combined, sections
+
+
+def open_split_checkpoint(bucket, key, etag, version_id, size, split_config):
+    """
+    Lê o checkpoint de um envio em partes interrompido pelo prazo de uma invocação anterior.
+
+    Args:
+        bucket (str): Bucket do arquivo de origem
+        key (str): Chave do arquivo de origem
+        etag (str): ETag do objeto informado no evento
+        version_id (str): versionId do objeto informado no evento
+        size (int): Tamanho do CSV em bytes
+        split_config (dict): Configurações retornadas por get_split_config
+
+    Returns:
+        tuple: (chave do checkpoint, checkpoint, se o envio está sendo retomado)
+    """
+    checkpoint_key = build_checkpoint_key(key, os.environ.get('CHECKPOINT_PREFIX', 'checkpoints/'))
+    try:
+        checkpoint = load_checkpoint(get_s3_client(), bucket, checkpoint_key)
+    except Exception as e:
+        logger.error("Erro ao ler checkpoint s3://%s/%s: %s", bucket, checkpoint_key, e)
+        checkpoint = None
+    if checkpoint is not None:
+        if checkpoint_matches(checkpoint, etag, version_id, size, split_config):
+            logger.info(
+                "Retomando envio de %s do checkpoint (%s partes concluídas, interrompido em %s)",
+                key, len(checkpoint['partes']), checkpoint.get('etapa')
+            )
+            lambda_metrics.add('Files.Resumed', 1)
+            return checkpoint_key, checkpoint, True
+        logger.warning("Checkpoint de %s é de outra versão do arquivo ou divisão em partes - ignorado", key)
+    return checkpoint_key, new_checkpoint(etag, version_id, size, split_config), checkpoint is not None
+
+
+def as_int(value):
+    """Converte contadores da resposta (strings) para int, considerando 0 quando ausentes ou inválidos."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def combine_part_results(part_results):
+    """
+    Consolida os resultados das partes em um único resultado para a notificação.
+
+    Args:
+        part_results (list): Tuplas (nome da parte, status HTTP, resultado da parte)
+
+    Returns:
+        tuple: (status HTTP consolidado, resultado consolidado)
+    """
+    failed = [status_code for _, status_code, _ in part_results if status_code not in (200, 202)]
+    if UNKNOWN_OUTCOME_STATUS in failed:
+        # Parte com resultado desconhecido: o arquivo inteiro segue para conferência manual
+        failed.insert(0, UNKNOWN_OUTCOME_STATUS)
+    with_errors = [name for name, _, result in part_results if result['status'] != 'Sucesso']
+
+    message = f"Arquivo enviado em {len(part_results)} partes"
+    if with_errors:
+        message += f", {len(with_errors)} com erros: {', '.join(with_errors)}"
+
+    combined = {
+        'status': 'Erro' if with_errors else 'Sucesso',
+        'mensagem': message,
+        'protocolo': ', '.join(result.get('protocolo', 'N/A') for _, _, result in part_results),
+        'total_registros': str(sum(as_int(result.get('total_registros')) for _, _, result in part_results)),
+        'linhas_aceitas': str(sum(as_int(result.get('linhas_aceitas')) for _, _, result in part_results)),
+        'linhas_rejeitadas': str(sum(as_int(result.get('linhas_rejeitadas')) for _, _, result in part_results)),
+        'resposta_completa': '\n'.join(
+            f"{name}: [{result['status']}] Protocolo {result.get('protocolo', 'N/A')} - {result['mensagem']}"
+            for name, _, result in part_results
+        ),
+        'partes': [
+            {'arquivo': name, 'status_code': status_code, 'status': result['status'], 'protocolo': result.get('protocolo', 'N/A')}
+            for name, status_code, result in part_results
+        ]
+    }
+    return (failed[0] if failed else 200), combined
+
+
+def attach_rejection_report(bucket, key, result, sections):
+    """
+    Grava o relatório de linhas rejeitadas ao lado do arquivo no S3 e adiciona ao resultado
+    o link do relatório e os principais motivos de rejeição.
+
+    Args:
+        bucket (str): Bucket do arquivo de origem
+        key (str): Chave do arquivo de origem
+        result (dict): Resultado do processamento (atualizado com os dados do relatório)
+        sections (list): Tuplas (nome do arquivo enviado, texto de retorno do webservice)
+    """
+    report_format = os.environ.get('REJECTION_REPORT_FORMAT', 'jsonl')
+    report_key = build_report_key(key, report_format, os.environ.get('REJECTION_REPORT_PREFIX', ''))
+    try:
+        with lambda_metrics.stage('rejection_report'):
+            summary = write_rejection_report(
+                get_s3_client(), bucket, report_key, sections,
+                report_format=report_format,
+                top_n=int(os.environ.get('REJECTION_TOP_N', '10')),
+                pattern=os.environ.get('REJECTION_LINE_PATTERN', REJECTED_LINE_PATTERN)
+            )
+        expires_in = int(os.environ.get('REJECTION_REPORT_URL_EXPIRES', str(SESSION_URL_MAX_EXPIRES)))
+        if os.environ.get('AWS_SESSION_TOKEN'):
+            expires_in = min(expires_in, SESSION_URL_MAX_EXPIRES)
+        result['relatorio_rejeicoes'] = f"s3://{bucket}/{report_key}"
+        result['relatorio_rejeicoes_url'] = get_s3_client().generate_presigned_url(
+            'get_object', Params={'Bucket': bucket, 'Key': report_key}, ExpiresIn=expires_in
+        )
+        result['relatorio_rejeicoes_url_expira'] = (
+            datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=expires_in)
+        ).strftime('%Y-%m-%d %H:%M UTC')
+        result['principais_motivos'] = summary['principais_motivos']
+        logger.info("Relatório de rejeições gravado: s3://%s/%s (%s linhas)", bucket, report_key, summary['linhas'])
+    except Exception as e:
+        logger.error("Erro ao gravar relatório de rejeições: %s", e)
+
+
+def get_idempotency_store():
+    """
+    Retorna o registro de idempotência do container, criado na primeira chamada.
+    Retorna None quando IDEMPOTENCY_BACKEND não está configurado.
+    """
+    global idempotency_store
+    backend_name = os.environ.get('IDEMPOTENCY_BACKEND')
+    if not backend_name:
+        return None
+    with idempotency_store_lock:
+        if idempotency_store is None:
+            idempotency_store = create_idempotency_store(
+                backend_name,
+                table_name=os.environ.get('IDEMPOTENCY_TABLE'),
+                sqlite_path=os.environ.get('IDEMPOTENCY_SQLITE_PATH'),
+                cache_size=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024')),
+                cache_ttl=float(os.environ.get('IDEMPOTENCY_CACHE_TTL', '300'))
+            )
+    return idempotency_store
+
+
+def open_s3_csv_source(bucket, key):
+    """Abre o CSV no S3 (descompactado e lido em faixas paralelas, conforme o tamanho, em streaming)."""
+    with lambda_metrics.stage('s3_open'):
+        return open_csv_source(
+            get_s3_client(), bucket, key,
+            parallel_threshold=int(os.environ.get('DOWNLOAD_PARALLEL_THRESHOLD_MB', '64')) * MB,
+            part_size=int(os.environ.get('DOWNLOAD_PART_SIZE_MB', '8')) * MB,
+            concurrency=int(os.environ.get('DOWNLOAD_CONCURRENCY', '8'))
+        )
+
+
+def open_transmission_stream(bucket, key, delta=None):
+    """
+    Abre o arquivo no S3 para o envio (lido e descompactado em streaming durante o envio),
+    com a pré-validação opcional do CSV.
+
+    Args:
+        bucket (str): Bucket de origem
+        key (str): Chave do arquivo
+        delta (DeltaTransmission): Envio delta do arquivo (None = arquivo completo)
+
+    Returns:
+        tuple: (origem aberta, stream a enviar, validador ou None)
+
+    Raises:
+        CsvValidationError: Se a pré-validação rejeitar o início do arquivo
+    """
+    if delta is not None:
+        return open_delta_stream(bucket, key, delta)
+    source = open_s3_csv_source(bucket, key)
+    validator = create_validator_from_env(os.environ)
+    stream = source.stream
+    if validator is not None:
+        try:
+            # Pré-validação do início do arquivo antes de abrir a conexão com o webservice
+            with lambda_metrics.stage('csv_preflight'):
+                stream = preflight(stream, validator, int(os.environ.get('VALIDATION_PREFLIGHT_ROWS', '1000')))
+        except Exception:
+            source.close()
+            raise
+    return source, stream, validator
+
+
+def open_delta_stream(bucket, key, delta):
+    """
+    Abre o envio no modo delta. Na primeira chamada o arquivo é lido do S3, validado por completo (com
+    VALIDATION_ENABLED, antes de qualquer envio) e comparado com o índice do último envio: as linhas novas
+    ou alteradas são gravadas em /tmp. As chamadas seguintes (novas tentativas, fallback do MTOM) reabrem
+    o delta gravado. Sem índice anterior, o arquivo completo é gravado em /tmp na mesma leitura (ou, sem
+    espaço em /tmp, lido novamente do S3 para o envio).
+
+    Returns:
+        tuple: (origem aberta, stream a enviar, validador ou None)
+    """
+    if not delta.prepared:
+        invocation_deadline.check('delta_diff')
+        source = open_s3_csv_source(bucket, key)
+        try:
+            validator = create_validator_from_env(os.environ)
+            stream = ValidatingStream(source.stream, validator) if validator is not None else source.stream
+            with lambda_metrics.stage('delta_diff'):
+                delta.prepare(stream, source.filename, validator, source.size)
+        finally:
+            source.close()
+        lambda_metrics.add('Delta.RowsSent', delta.stats['linhas_enviadas'])
+        lambda_metrics.add('Delta.RowsUnchanged', delta.stats['linhas_inalteradas'])
+    source = delta.open_source() or open_s3_csv_source(bucket, key)
+    return source, source.stream, delta.validator
+
+
+def release_idempotency_claim(store, idempotency_key):
+    """Libera a reserva de idempotência após uma falha, sem interromper o tratamento do erro."""
+    try:
+        store.release(idempotency_key)
+    except Exception as release_error:
+        logger.error("Erro ao liberar reserva de idempotência: %s", release_error)
+
+
+def process_record(record):
+    """
+    Processa um registro retornado por parse_event_records.
+    """
+    return process_file(record['bucket'], record['key'], record.get('etag'), record.get('version_id'))
+
+
+def process_file(bucket, key, etag=None, version_id=None):
+    """
+    Processa um arquivo: download do S3, envio ao webservice, notificação e organização no bucket.
+
+    Args:
+        bucket (str): Bucket de origem
+        key (str): Chave do arquivo (já decodificada)
+        etag (str): ETag do objeto informado no evento (usado na idempotência)
+        version_id (str): versionId do objeto informado no evento (usado na idempotência)
+
+    Returns:
+        dict: Resposta no formato do Lambda (statusCode e body)
+    """
+    store = None
+    idempotency_key = None
+    delta = None
+    try:
+        logger.info("Iniciando processamento do arquivo: %s do bucket: %s", key, bucket)
         
-        # Extrair o hostname e caminho da URL
-        url_parts = urllib.parse.urlparse(ws_url)
-        hostname = url_parts.netloc
-        path = url_parts.path
+        # Verificação rápida se é um arquivo CSV (puro ou compactado)
+        if not is_supported_key(key) or is_report_key(key):
+            return {'statusCode': 200, 'body': 'Arquivo ignorado: não é CSV'}
         
-        # Definir contexto SSL
-        ssl_context = ssl.create_default_context()
-        if os.environ.get('VERIFY_SSL', '1') == '0':
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
+        # Idempotência: eventos reentregues do mesmo objeto não são retransmitidos (verificado antes de ler o S3)
+        store = get_idempotency_store()
+        if store is not None:
+            idempotency_key = build_idempotency_key(bucket, key, etag, version_id)
+            if idempotency_key is None:
+                logger.warning("Evento sem ETag/versionId para %s - verificação de duplicidade ignorada", key)
+        if idempotency_key:
+            with lambda_metrics.stage('idempotency'):
+                previous_result = store.get_completed(idempotency_key)
+            if previous_result is not None:
+                logger.info(
+                    "Arquivo %s já transmitido (protocolo %s) - envio ignorado", key, previous_result.get('protocolo')
+                )
+                return {'statusCode': 200, 'body': json.dumps(dict(previous_result, duplicado=True))}
+            if not store.claim(idempotency_key, ttl=int(os.environ.get('IDEMPOTENCY_CLAIM_TTL', '900'))):
+                unknown_result = store.get_unknown(idempotency_key)
+                idempotency_key = None
+                if unknown_result is not None:
+                    logger.warning("Arquivo %s com resultado desconhecido aguardando conferência - envio ignorado", key)
+                    return {
+                        'statusCode': UNKNOWN_OUTCOME_STATUS,
+                        'body': json.dumps(dict(unknown_result, duplicado=True))
+                    }
+                logger.warning("Arquivo %s já está sendo transmitido por outra invocação - envio ignorado", key)
+                return {
+                    'statusCode': 409,
+                    'body': json.dumps({'status': 'Em processamento', 'mensagem': f"Arquivo {key} já está sendo transmitido"})
+                }
         
-        # Configurar timeout - Aumentado para 10 minutos (600 segundos)
-        timeout = int(os.environ.get('WS_TIMEOUT', '550'))
+        # Configurações do webservice (valores reais armazenados em variáveis de ambiente)
+        ws_config = get_ws_config()
         
-        # Criar conexão HTTP/HTTPS
-        if url_parts.scheme == 'https':
-            conn = http.client.HTTPSConnection(hostname, context=ssl_context, timeout=timeout)
-        else:
-            conn = http.client.HTTPConnection(hostname, timeout=timeout)
+        # Com o circuito do webservice aberto, o arquivo é adiado antes de ler o S3
+        flow_control = get_flow_control(ws_config)
+        if flow_control is not None:
+            flow_control.check()
         
-        # Configurar cabeçalhos
-        headers = {
-            'Content-Type': 'text/xml;charset=UTF-8',
-            'SOAPAction': '',
-            'Connection': 'Keep-Alive',
-            'Content-Length': str(len(soap_envelope))
-        }
+        # Sem tempo na invocação para iniciar o envio, o arquivo é repassado antes de ler o S3
+        invocation_deadline.check('s3_open')
         
-        # Enviar requisição SOAP
-        conn.request('POST', path, body=soap_envelope, headers=headers)
+        # Modo delta: somente as linhas novas ou alteradas desde o último envio com protocolo são enviadas
+        delta_config = get_delta_config()
+        if delta_config:
+            delta = DeltaTransmission(get_s3_client(), bucket, key, **delta_config)
         
-        # Obter resposta
-        response = conn.getresponse()
-        response_data = response.read().decode('utf-8')
-        status_code = response.status
+        source = validator = None
+        try:
+            # Obter o arquivo do S3, com a validação opcional do CSV feita durante a leitura
+            source, stream, validator = open_transmission_stream(bucket, key, delta)
+            if source.compressed:
+                logger.info("Arquivo compactado: enviando %s (%s bytes descompactado)", source.filename, source.size)
+            
+            split_config = get_split_config(source.size)
+            if delta is not None and delta.unchanged:
+                # Nenhuma linha nova ou alterada: nada a transmitir (o índice do último envio continua válido)
+                logger.info("Arquivo %s sem alterações desde o último envio - envio ignorado", key)
+                status_code = 200
+                result = delta.unchanged_result()
+                sections = []
+            elif split_config:
+                # Arquivos grandes podem ser enviados em partes, cada uma com seu protocolo (e repetida individualmente);
+                # interrompido pelo prazo da invocação, o envio é retomado do checkpoint pela invocação seguinte
+                checkpoint_key, checkpoint, has_checkpoint = open_split_checkpoint(
+                    bucket, key, etag, version_id, source.size, split_config
+                )
+                try:
+                    status_code, result, sections = transmit_split(
+                        stream, source.filename, ws_config, split_config, checkpoint['partes']
+                    )
+                except DeadlineExceededError as deadline_error:
+                    if checkpoint['partes']:
+                        try:
+                            save_checkpoint(get_s3_client(), bucket, checkpoint_key, checkpoint, deadline_error.stage)
+                            logger.info(
+                                "Checkpoint gravado: s3://%s/%s (%s partes concluídas)",
+                                bucket, checkpoint_key, len(checkpoint['partes'])
+                            )
+                        except Exception as e:
+                            logger.error("Erro ao gravar checkpoint s3://%s/%s: %s", bucket, checkpoint_key, e)
+                    raise
+                if has_checkpoint:
+                    # Todas as partes já foram enviadas: uma falha aqui não muda o resultado do arquivo
+                    # (o checkpoint remanescente só é usado por um novo evento do mesmo ETag)
+                    try:
+                        delete_checkpoint(get_s3_client(), bucket, checkpoint_key)
+                    except Exception as e:
+                        logger.warning("Erro ao remover checkpoint s3://%s/%s: %s", bucket, checkpoint_key, e)
+            else:
+                streams_opened = 0
+
+                def next_stream():
+                    nonlocal source, stream, validator, streams_opened
+                    streams_opened += 1
+                    if streams_opened > 1:
+                        # O conteúdo foi consumido no envio anterior (nova tentativa ou fallback do MTOM):
+                        # o arquivo é lido novamente do S3
+                        source.close()
+                        source, stream, validator = open_transmission_stream(bucket, key, delta)
+                    return stream
+
+                status_code, response_data = call_with_retry(
+                    lambda attempt: transmit_content(next_stream, source.size, source.filename, ws_config),
+                    get_retry_policy(), on_retry=build_retry_logger(key)
+                )
+                result = build_transmission_result(status_code, response_data)
+                sections = [(source.filename, result.get('resposta_completa'))]
+        except DeadlineExceededError as deadline_error:
+            if not deadline_error.request_sent:
+                raise
+            # Arquivo enviado sem resposta dentro do prazo: resultado desconhecido, encaminhado para conferência manual
+            logger.error("Sem resposta do webservice para %s dentro do prazo da invocação", key)
+            status_code = UNKNOWN_OUTCOME_STATUS
+            result = {
+                'status': 'Resultado desconhecido',
+                'mensagem': TIMEOUT_AFTER_SEND_MESSAGE,
+                'protocolo': 'N/A',
+                'resposta_completa': 'Sem resposta do webservice'
+            }
+            sections = []
+        except CsvValidationError as validation_error:
+            # Envio interrompido antes de concluir o envelope: o webservice não processa o arquivo
+            logger.error("Arquivo %s rejeitado na validação: %s", key, validation_error)
+            summary = validation_error.validator.summary()
+            status_code = 422
+            result = {
+                'status': 'Erro de validação',
+                'mensagem': str(validation_error),
+                'protocolo': 'N/A',
+                'registros_locais': str(summary['registros_locais']),
+                'linhas_invalidas': str(summary['linhas_invalidas']),
+                'resposta_completa': '\n'.join(summary['erros_validacao'])
+            }
+            sections = []
+        finally:
+            if source is not None:
+                source.close()
+            if delta is not None:
+                delta.cleanup()
         
-        # Processar a resposta
-        if status_code in (200, 202):
-            # Extrair informações detalhadas da resposta SOAP
+        if delta is not None and delta.stats is not None:
+            result.update(delta.result_fields())
+        
+        # Conferir a quantidade de registros lida localmente com a informada pelo webservice
+        # (no modo delta, as linhas enviadas; o validador conta o arquivo completo)
+        if validator is not None and status_code in (200, 202) and not (delta is not None and delta.unchanged):
+            local_rows = int(delta.stats['linhas_enviadas']) if delta is not None else validator.rows
+            result['registros_locais'] = str(local_rows)
+            if as_int(result.get('total_registros')) != local_rows:
+                logger.warning(
+                    "Divergência de registros em %s: %s no arquivo, %s informados pelo webservice",
+                    key, local_rows, result.get('total_registros')
+                )
+                result['divergencia_registros'] = True
+        
+        # Linhas rejeitadas vão para um relatório no S3; o email leva apenas o resumo e o link
+        if as_int(result.get('linhas_rejeitadas')) > 0 and os.environ.get('REJECTION_REPORT', 'true') == 'true':
+            attach_rejection_report(bucket, key, result, sections)
+        
+        # Registrar o resultado (com o protocolo) para que reentregas do evento não retransmitam o arquivo;
+        # com resultado desconhecido a reserva é mantida até a conferência manual
+        if idempotency_key:
             try:
-                # Registrar resposta completa para debug
-                logger.info(f"Resposta completa: {response_data}")
-                
-                # Método 1: Usando XML ElementTree
-                root = ET.fromstring(response_data)
-                # Definir namespaces conforme resposta da imagem
-                namespaces = {
-                    'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
-                    'ns2': 'http://endpoints.webservice.integration.saudi.acol.com/'
-                }
-                
-                # Localizar o elemento de retorno
-                return_element = root.find('.//ns2:transmitirArquivoOperadoraResponse/return', namespaces)
-                
-                if return_element is not None and return_element.text:
-                    # Extrai as informações específicas da resposta
-                    response_text = return_element.text
-                    
-                    # Extrair informações usando regex para maior robustez
-                    success_match = re.search(r'Arquivo inserido com sucesso!', response_text)
-                    error_match = re.search(r'Arquivo inserido, mas com erros', response_text)
-                    protocolo_match = re.search(r'Número do protocolo\s*:\s*(\d+)', response_text)
-                    total_registros_match = re.search(r'Qtd\. Total de Registros\s*:\s*(\d+)', response_text)
-                    linhas_aceitas_match = re.search(r'Qtd\. Linhas Aceitas\s*:\s*(\d+)', response_text)
-                    linhas_rejeitadas_match = re.search(r'Qtd\. Linhas Rejeitadas\s*:\s*(\d+)', response_text)
-                    
-                    # Verificar se a resposta indica erro
-                    has_error = error_match is not None
-                    status_message = error_match.group(0) if error_match else (success_match.group(0) if success_match else 'Arquivo processado')
-                    
-                    # Construir objeto de resposta estruturado
-                    result = {
-                        'status': 'Erro' if has_error else 'Sucesso',
-                        'mensagem': status_message,
-                        'protocolo': protocolo_match.group(1) if protocolo_match else 'N/A',
-                        'total_registros': total_registros_match.group(1) if total_registros_match else '0',
-                        'linhas_aceitas': linhas_aceitas_match.group(1) if linhas_aceitas_match else '0',
-                        'linhas_rejeitadas': linhas_rejeitadas_match.group(1) if linhas_rejeitadas_match else '0',
-                        'resposta_completa': response_text
-                    }
-                    
-                    # Enviar email conforme o resultado (erro ou sucesso)
-                    if has_error:
-                        send_notification_email(key, result, is_error=True)
-                    else:
-                        send_notification_email(key, result, is_error=False)
+                if status_code in (200, 202):
+                    store.complete(
+                        idempotency_key,
+                        {name: value for name, value in result.items() if name != 'resposta_completa'},
+                        ttl=int(os.environ.get('IDEMPOTENCY_TTL_DAYS', '30')) * 86400
+                    )
+                elif status_code == UNKNOWN_OUTCOME_STATUS:
+                    store.mark_unknown(
+                        idempotency_key,
+                        {name: value for name, value in result.items() if name != 'resposta_completa'},
+                        ttl=int(os.environ.get('IDEMPOTENCY_TTL_DAYS', '30')) * 86400
+                    )
                 else:
-                    # Método 2: Extração direta por regex se ElementTree falhar
-                    success_match = re.search(r'Arquivo inserido com sucesso!', response_data)
-                    error_match = re.search(r'Arquivo inserido, mas com erros', response_data)
-                    protocolo_match = re.search(r'Número do protocolo\s*:\s*(\d+)', response_data)
-                    total_registros_match = re.search(r'Qtd\. Total de Registros\s*:\s*(\d+)', response_data)
-                    linhas_aceitas_match = re.search(r'Qtd\. Linhas Aceitas\s*:\s*(\d+)', response_data)
-                    linhas_rejeitadas_match = re.search(r'Qtd\. Linhas Rejeitadas\s*:\s*(\d+)', response_data)
-                    
-                    # Verificar se a resposta indica erro
-                    has_error = error_match is not None
-                    status_message = error_match.group(0) if error_match else (success_match.group(0) if success_match else 'Arquivo processado')
-                    
-                    result = {
-                        'status': 'Erro' if has_error else 'Sucesso',
-                        'mensagem': status_message,
-                        'protocolo': protocolo_match.group(1) if protocolo_match else 'N/A',
-                        'total_registros': total_registros_match.group(1) if total_registros_match else '0',
-                        'linhas_aceitas': linhas_aceitas_match.group(1) if linhas_aceitas_match else '0',
-                        'linhas_rejeitadas': linhas_rejeitadas_match.group(1) if linhas_rejeitadas_match else '0',
-                        'resposta_completa': response_data[:500]  # Limita o tamanho para não sobrecarregar logs
-                    }
-                    
-                    # Enviar email conforme o resultado (erro ou sucesso)
-                    if has_error:
-                        send_notification_email(key, result, is_error=True)
-                    else:
-                        send_notification_email(key, result, is_error=False)
-            except Exception as xml_error:
-                logger.error(f"Erro ao processar XML: {str(xml_error)}")
-                result = {
-                    'status': 'Erro de processamento',
-                    'mensagem': f"Erro ao processar resposta XML: {str(xml_error)}",
-                    'resposta_completa': response_data[:500]
-                }
-                # Enviar email de erro para problemas no processamento do XML
-                send_notification_email(key, result, is_error=True)
-            
+                    store.release(idempotency_key)
+            except Exception as e:
+                # O arquivo já foi enviado: o resultado é mantido e a reserva expira pelo IDEMPOTENCY_CLAIM_TTL
+                # (até lá, reentregas do evento são ignoradas como envio em andamento)
+                logger.error("Erro ao registrar o resultado de %s no registro de idempotência: %s", key, e)
+                lambda_metrics.add('Idempotency.Errors', 1)
+            idempotency_key = None
+        
+        # Índice do modo delta substituído somente após um envio com protocolo, sem linhas rejeitadas e sem
+        # divergência de registros (caso contrário, as linhas não aceitas seriam dadas como enviadas)
+        if delta is not None and delta.index is not None and status_code in (200, 202) and not delta.unchanged:
+            if as_int(result.get('linhas_rejeitadas')) > 0 or result.get('divergencia_registros'):
+                logger.warning("Índice delta de %s mantido: envio com linhas rejeitadas ou divergência de registros", key)
+            elif result.get('protocolo', 'N/A') != 'N/A':
+                with lambda_metrics.stage('delta_index'):
+                    delta.save_index(result['protocolo'])
+        
+        # Enviar email conforme o resultado (erro ou sucesso)
+        send_notification_email(key, result, is_error=result['status'] != 'Sucesso', bucket=bucket)
+        if status_code in (200, 202):
+            lambda_metrics.add('Files.Success', 1)
+        else:
+            lambda_metrics.add('Files.Unknown' if status_code == UNKNOWN_OUTCOME_STATUS else 'Files.Error', 1)
+        
+        # Processar a resposta
+        if status_code in (200, 202):
             # Em caso de sucesso, opcionalmente move o arquivo para pasta de processados
             if os.environ.get('MOVE_PROCESSED') == 'true':
                 processed_path = os.environ.get('PROCESSED_PATH', 'processados/')
                 processed_key = processed_path + key.split('/')[-1]
                 
-                s3.copy_object(
+                get_s3_client().copy_object(
                     Bucket=bucket,
                     CopySource={'Bucket': bucket, 'Key': key},
                     Key=processed_key
                 )
                 
                 if os.environ.get('DELETE_ORIGINAL') == 'true':
-                    s3.delete_object(Bucket=bucket, Key=key)
+                    get_s3_client().delete_object(Bucket=bucket, Key=key)
             
             return {
                 'statusCode': 200,
                 'body': json.dumps(result)
             }
         else:
-            # Em caso de erro, tenta extrair mensagem de erro da resposta
-            try:
-                root = ET.fromstring(response_data)
-                namespaces = {
-                    'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
-                    'ns2': 'http://endpoints.webservice.integration.saudi.acol.com/'
-                }
-                fault = root.find('.//soap:Fault', namespaces)
-                if fault is not None:
-                    fault_string = fault.find('faultstring')
-                    error_msg = fault_string.text if fault_string is not None else response_data[:200]
-                else:
-                    error_msg = f"Erro de comunicação. Status: {status_code}. Resposta: {response_data[:200]}"
-            except Exception as e:
-                error_msg = f"Erro de comunicação. Status: {status_code}. Resposta: {response_data[:200]}"
-            
-            # Criar objeto de resultado para erro de comunicação
-            error_result = {
-                'status': 'Erro',
-                'mensagem': error_msg,
-                'protocolo': 'N/A',
-                'resposta_completa': response_data[:500]
-            }
-            
-            # Enviar email de notificação para erro de comunicação
-            send_notification_email(key, error_result, is_error=True)
-            
-            # Em caso de erro, opcionalmente move o arquivo para pasta de erros
+            # Em caso de erro, opcionalmente move o arquivo para pasta de erros (ou de conferência, se o
+            # resultado é desconhecido)
             if os.environ.get('MOVE_FAILED') == 'true':
-                error_path = os.environ.get('ERROR_PATH', 'erros/')
+                if status_code == UNKNOWN_OUTCOME_STATUS:
+                    error_path = os.environ.get('RECONCILIATION_PATH', 'conferencia/')
+                else:
+                    error_path = os.environ.get('ERROR_PATH', 'erros/')
                 error_key = error_path + key.split('/')[-1]
                 
-                s3.copy_object(
+                get_s3_client().copy_object(
                     Bucket=bucket,
                     CopySource={'Bucket': bucket, 'Key': key},
                     Key=error_key
                 )
             
             return {
-                'statusCode': 500,
-                'body': json.dumps(error_result)
+                'statusCode': UNKNOWN_OUTCOME_STATUS if status_code == UNKNOWN_OUTCOME_STATUS else 500,
+                'body': json.dumps(result)
             }
     
+    except EndpointUnavailableError as e:
+        # Webservice indisponível ou sobrecarregado: o arquivo é adiado (nova entrega do evento), sem email de erro
+        logger.warning("Envio de %s adiado: %s", key, e)
+        lambda_metrics.add('Files.Deferred', 1)
+        if idempotency_key:
+            release_idempotency_claim(store, idempotency_key)
+        return {
+            'statusCode': 503,
+            'body': json.dumps({'status': 'Adiado', 'mensagem': str(e), 'retry_after': e.retry_after})
+        }
+    
+    except DeadlineExceededError as e:
+        # Prazo da invocação esgotado antes de concluir o envio: o arquivo é repassado para uma nova
+        # invocação (nova entrega do evento), sem email de erro
+        logger.warning("Envio de %s interrompido na etapa %s: repassado para uma nova invocação", key, e.stage)
+        lambda_metrics.add('Files.DeadlineHandoff', 1)
+        if idempotency_key:
+            release_idempotency_claim(store, idempotency_key)
+        return {
+            'statusCode': 503,
+            'body': json.dumps({'status': 'Adiado', 'mensagem': str(e), 'etapa': e.stage})
+        }
+    
     except Exception as e:
-        logger.error(f"Erro geral: {str(e)}")
+        logger.error("Erro geral: %s", e)
+        lambda_metrics.add('Files.Error', 1)
+        if idempotency_key:
+            release_idempotency_claim(store, idempotency_key)
         error_result = {
             'status': 'Erro',
             'mensagem': str(e),
@@ -424,9 +1462,7 @@ def lambda_handler(event, context):
         
         # Tentar enviar email mesmo em caso de erro geral
         try:
-            # Usa o nome do arquivo do evento, se disponível
-            filename = event['Records'][0]['s3']['object']['key'] if 'Records' in event and len(event['Records']) > 0 else 'unknown_file'
-            send_notification_email(filename, error_result, is_error=True)
+            send_notification_email(key, error_result, is_error=True, bucket=bucket)
         except:
             logger.error("Não foi possível enviar email de notificação para o erro geral")
         
@@ -437,3 +1473,189 @@ def lambda_handler(event, context):
                 'mensagem': str(e)
             })
         }
+
+
+def parse_event_records(event):
+    """
+    Extrai os arquivos a processar de um evento S3 direto ou de um lote SQS com eventos S3.
+
+    Returns:
+        tuple: (lista de dicts com message_id, bucket, key, etag e version_id; messageIds SQS com corpo inválido)
+    """
+    records = []
+    invalid_messages = []
+    for record in event.get('Records', []):
+        if record.get('eventSource') == 'aws:sqs':
+            try:
+                s3_event = json.loads(record['body'])
+                # Eventos de teste do S3 (s3:TestEvent) não possuem Records
+                for s3_record in s3_event.get('Records', []):
+                    records.append({
+                        'message_id': record['messageId'],
+                        'bucket': s3_record['s3']['bucket']['name'],
+                        'key': urllib.parse.unquote_plus(s3_record['s3']['object']['key']),
+                        'etag': s3_record['s3']['object'].get('eTag'),
+                        'version_id': s3_record['s3']['object'].get('versionId')
+                    })
+            except Exception as e:
+                logger.error("Mensagem SQS %s inválida: %s", record.get('messageId'), e)
+                invalid_messages.append(record.get('messageId'))
+        else:
+            records.append({
+                'message_id': None,
+                'bucket': record['s3']['bucket']['name'],
+                'key': urllib.parse.unquote_plus(record['s3']['object']['key']),
+                'etag': record['s3']['object'].get('eTag'),
+                'version_id': record['s3']['object'].get('versionId')
+            })
+    return records, invalid_messages
+
+
+def lambda_handler(event, context):
+    """
+    Função Lambda otimizada para enviar arquivos CSV do S3 para o webservice SAUDI/VOXIS.
+    Usa formato SOAP específico com senha em base64 conforme exemplo.
+    Implementado apenas com bibliotecas padrão do Python.
+
+    Processa todos os registros do evento (S3 direto ou lote SQS com eventos S3) em paralelo,
+    limitado por BATCH_CONCURRENCY. Para lotes SQS retorna batchItemFailures, para que apenas
+    as mensagens de arquivos adiados sejam reprocessadas.
+    """
+    ws_connection_pool.reset_counters()
+    structured_logging.start_invocation(context)
+    metrics = lambda_metrics.start_invocation('s3_csv_to_api_soap', context)
+    invocation_deadline.start_invocation(context)
+    notification_digest.start_invocation(context)
+    try:
+        return handle_event(event)
+    finally:
+        notification_digest.flush()
+        counters = ws_connection_pool.counters()
+        logger.info(
+            "Conexões com o webservice: %s reutilizadas, %s novas, %s descartadas",
+            counters['reutilizadas'], counters['novas'], counters['descartadas']
+        )
+        metrics.add('Webservice.ConnectionsReused', counters['reutilizadas'])
+        metrics.add('Webservice.ConnectionsNew', counters['novas'])
+        structured_logging.finish_invocation(logger)
+        metrics.emit()
+
+
+def requeue_deferred_records(records):
+    """
+    Reenfileira os arquivos adiados de um evento S3 direto em DEFERRED_QUEUE_URL (fila SQS do trigger
+    alternativo), em uma mensagem no formato de notificação S3 entregue após DEFERRED_QUEUE_DELAY_SECONDS.
+
+    Args:
+        records (list): Registros adiados (retornados por parse_event_records)
+
+    Returns:
+        bool: True se reenfileirados; False sem fila configurada ou com erro no envio
+    """
+    queue_url = os.environ.get('DEFERRED_QUEUE_URL')
+    if not queue_url:
+        return False
+    s3_event = {'Records': [
+        {
+            'eventSource': 'aws:s3',
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': record['bucket']},
+                'object': {
+                    key: value for key, value in (
+                        ('key', urllib.parse.quote_plus(record['key'], safe='/')),
+                        ('eTag', record['etag']),
+                        ('versionId', record['version_id'])
+                    ) if value
+                }
+            }
+        }
+        for record in records
+    ]}
+    try:
+        get_client('sqs').send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(s3_event),
+            DelaySeconds=min(900, int(os.environ.get('DEFERRED_QUEUE_DELAY_SECONDS', '60')))
+        )
+    except Exception as e:
+        logger.error("Erro ao reenfileirar arquivos adiados em %s: %s", queue_url, e)
+        return False
+    logger.warning("Arquivos adiados reenfileirados em %s: %s", queue_url, ', '.join(r['key'] for r in records))
+    lambda_metrics.add('Files.Requeued', len(records))
+    return True
+
+
+def handle_event(event):
+    """
+    Processa os registros do evento e monta a resposta do Lambda (ver lambda_handler).
+    """
+    is_sqs = any(record.get('eventSource') == 'aws:sqs' for record in event.get('Records', []))
+    try:
+        records, invalid_messages = parse_event_records(event)
+    except Exception as e:
+        logger.error("Erro ao interpretar o evento: %s", e)
+        send_notification_email('unknown_file', {
+            'status': 'Erro',
+            'mensagem': f"Evento inválido: {str(e)}",
+            'protocolo': 'N/A',
+            'resposta_completa': 'Exceção não tratada'
+        }, is_error=True)
+        if is_sqs:
+            # Sem conseguir interpretar o lote, todas as mensagens voltam para a fila
+            return {'batchItemFailures': [
+                {'itemIdentifier': record['messageId']} for record in event['Records'] if 'messageId' in record
+            ]}
+        return {'statusCode': 500, 'body': json.dumps({'status': 'Erro', 'mensagem': str(e)})}
+
+    logger.info("Arquivos no evento: %s", len(records))
+
+    # Processar cada arquivo com concorrência limitada
+    concurrency = max(1, int(os.environ.get('BATCH_CONCURRENCY', '4')))
+    if len(records) <= 1 or concurrency == 1:
+        responses = [process_record(record) for record in records]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(records))) as executor:
+            responses = list(executor.map(process_record, records))
+
+    if is_sqs:
+        failed_messages = list(dict.fromkeys(
+            invalid_messages + [
+                record['message_id'] for record, response in zip(records, responses)
+                if response['statusCode'] in TRANSIENT_STATUSES
+            ]
+        ))
+        if failed_messages:
+            logger.warning("Mensagens adiadas devolvidas para a fila: %s", failed_messages)
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_messages]}
+
+    deferred = [record for record, response in zip(records, responses) if response['statusCode'] == 503]
+    if deferred:
+        deferred_keys = ', '.join(record['key'] for record in deferred)
+        # Arquivos adiados em evento S3 direto: o erro faz o Lambda entregar o evento novamente (invocação
+        # assíncrona, com espera entre as tentativas). A nova entrega reprocessa todos os registros do evento,
+        # então só é usada quando não há outros arquivos ou quando a idempotência ignora os já enviados
+        if len(records) == 1 or get_idempotency_store() is not None:
+            raise EndpointUnavailableError(
+                f"Envio adiado (webservice indisponível ou prazo da invocação esgotado): {deferred_keys}"
+            )
+        if not requeue_deferred_records(deferred):
+            logger.error(
+                "Arquivos adiados não reenfileirados (configure DEFERRED_QUEUE_URL ou IDEMPOTENCY_BACKEND): "
+                "permanecem no bucket para reenvio (soap_backfill.py): %s", deferred_keys
+            )
+            lambda_metrics.add('Files.DeferredDropped', len(deferred))
+
+    # Evento S3 com um único arquivo mantém o formato de resposta original
+    if len(responses) == 1:
+        return responses[0]
+
+    return {
+        'statusCode': 200 if all(response['statusCode'] == 200 for response in responses) else 500,
+        'body': json.dumps({
+            'resultados': [
+                {'bucket': record['bucket'], 'arquivo': record['key'], 'statusCode': response['statusCode'], 'body': response['body']}
+                for record, response in zip(records, responses)
+            ]
+        })
+    }
@@ -0,0 +1,313 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+
+# Limites do S3: copy_object aceita até 5 GB; multipart aceita partes de 5 MB a 5 GB e até 10.000 partes
+MAX_SINGLE_COPY_SIZE = 5 * 1024 * MB
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10000
+
+# Criptografias em que o ETag não é o MD5 do conteúdo (SSE-C é identificada por SSECustomerAlgorithm)
+NON_MD5_ETAG_ENCRYPTIONS = ('aws:kms', 'aws:kms:dsse')
+
+# Metadados do objeto de origem repassados ao create_multipart_upload (o copy_object os copia automaticamente)
+COPIED_HEAD_FIELDS = (
+    'ContentType', 'ContentEncoding', 'ContentDisposition', 'ContentLanguage', 'CacheControl', 'Metadata'
+)
+
+
+class MultipartCopyError(Exception):
+    """
+    Falha na cópia multipart. O upload já foi abortado no destino quando a exceção é lançada.
+
+    Attributes:
+        upload_id (str): Id do upload multipart abortado
+        part_number (int): Parte que falhou após todas as tentativas
+    """
+
+    def __init__(self, message, upload_id=None, part_number=None):
+        super().__init__(message)
+        self.upload_id = upload_id
+        self.part_number = part_number
+
+
+def choose_part_size(object_size, part_size=128 * MB):
+    """
+    Escolhe o tamanho das partes: o configurado, aumentado (em múltiplos de 1 MB)
+    quando necessário para o objeto caber em MAX_PARTS partes.
+
+    Args:
+        object_size (int): Tamanho do objeto em bytes
+        part_size (int): Tamanho de parte preferido em bytes
+
+    Returns:
+        int: Tamanho de parte entre MIN_PART_SIZE e MAX_PART_SIZE
+    """
+    size = max(MIN_PART_SIZE, part_size)
+    minimum_for_limit = -(-object_size // MAX_PARTS)
+    if size < minimum_for_limit:
+        size = -(-minimum_for_limit // MB) * MB
+    return min(size, MAX_PART_SIZE)
+
+
+def iter_part_ranges(object_size, part_size):
+    """
+    Gera (número da parte, primeiro byte, último byte) de cada parte, com o último byte inclusivo
+    como esperado em CopySourceRange.
+    """
+    part_number = 1
+    for start in range(0, object_size, part_size):
+        yield part_number, start, min(start + part_size, object_size) - 1
+        part_number += 1
+
+
+def _copy_part(s3_client, upload, source, etag, part_number, first_byte, last_byte, max_attempts, abort_event):
+    extra_args = {'CopySourceIfMatch': etag} if etag else {}
+    for attempt in range(1, max_attempts + 1):
+        if abort_event.is_set():
+            return None
+        try:
+            response = s3_client.upload_part_copy(
+                Bucket=upload['Bucket'],
+                Key=upload['Key'],
+                UploadId=upload['UploadId'],
+                PartNumber=part_number,
+                CopySource=source,
+                CopySourceRange=f"bytes={first_byte}-{last_byte}",
+                **extra_args
+            )
+            return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+        except Exception as e:
+            error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            # Origem alterada durante a cópia (ETag diferente): novas tentativas não resolvem
+            if error_code == 'PreconditionFailed' or attempt == max_attempts:
+                raise
+            delay = min(2 ** attempt, 20) * random.uniform(0.5, 1.0)
+            logger.warning(
+                "Falha na parte %s (tentativa %s/%s): %s. Nova tentativa em %.1fs",
+                part_number, attempt, max_attempts, e, delay
+            )
+            time.sleep(delay)
+    return None
+
+
+def multipart_copy(s3_client, source_bucket, source_key, destination_bucket, destination_key, head,
+                   part_size=128 * MB, concurrency=8, max_attempts=3):
+    """
+    Copia o objeto no próprio S3 (sem trafegar pelo Lambda) com create_multipart_upload + upload_part_copy,
+    com as partes copiadas em paralelo. Em caso de falha o upload é abortado, sem deixar partes órfãs.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        source_bucket (str): Bucket de origem
+        source_key (str): Chave de origem
+        destination_bucket (str): Bucket de destino
+        destination_key (str): Chave de destino
+        head (dict): Resposta do head_object da origem (tamanho, ETag e metadados)
+        part_size (int): Tamanho de parte preferido em bytes (ver choose_part_size)
+        concurrency (int): Partes copiadas em paralelo
+        max_attempts (int): Tentativas por parte
+
+    Returns:
+        dict: ETag do objeto de destino, quantidade e tamanho das partes
+
+    Raises:
+        MultipartCopyError: Se alguma parte falhar após todas as tentativas
+    """
+    object_size = head['ContentLength']
+    part_size = choose_part_size(object_size, part_size)
+    ranges = list(iter_part_ranges(object_size, part_size))
+    source = {'Bucket': source_bucket, 'Key': source_key}
+    if head.get('VersionId'):
+        source['VersionId'] = head['VersionId']
+
+    create_args = {field: head[field] for field in COPIED_HEAD_FIELDS if head.get(field)}
+    upload = s3_client.create_multipart_upload(Bucket=destination_bucket, Key=destination_key, **create_args)
+    upload_id = upload['UploadId']
+    logger.info(
+        "Cópia multipart iniciada: %s partes de %s MB, %s em paralelo (UploadId %s)",
+        len(ranges), part_size // MB, concurrency, upload_id
+    )
+
+    abort_event = threading.Event()
+    parts = []
+    failed_part = None
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges)))) as executor:
+            futures = {
+                executor.submit(
+                    _copy_part, s3_client, upload, source, head.get('ETag'), part_number,
+                    first_byte, last_byte, max_attempts, abort_event
+                ): part_number
+                for part_number, first_byte, last_byte in ranges
+            }
+            for future in as_completed(futures):
+                try:
+                    part = future.result()
+                except Exception:
+                    # Interrompe as partes que ainda não começaram; as em andamento terminam
+                    failed_part = futures[future]
+                    abort_event.set()
+                    raise
+                if part is not None:
+                    parts.append(part)
+
+        parts.sort(key=lambda part: part['PartNumber'])
+        response = s3_client.complete_multipart_upload(
+            Bucket=destination_bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception as e:
+        try:
+            s3_client.abort_multipart_upload(Bucket=destination_bucket, Key=destination_key, UploadId=upload_id)
+            logger.warning("Upload multipart %s abortado", upload_id)
+        except Exception as abort_error:
+            logger.error("Falha ao abortar o upload multipart %s: %s", upload_id, abort_error)
+        part_info = f" na parte {failed_part}" if failed_part else ''
+        raise MultipartCopyError(f"Falha na cópia multipart{part_info}: {str(e)}", upload_id, failed_part) from e
+
+    return {'ETag': response.get('ETag'), 'parts': len(parts), 'part_size': part_size}
+
+
+def copy_object(s3_client, source_bucket, source_key, destination_bucket, destination_key, head=None,
+                multipart_threshold=256 * MB, part_size=128 * MB, concurrency=8, max_attempts=3,
+                size=None, etag=None):
+    """
+    Copia um objeto entre buckets escolhendo o caminho pelo tamanho:
+    copy_object (uma chamada) abaixo de multipart_threshold e cópia multipart em paralelo a partir dele.
+    Objetos acima de 5 GB sempre usam multipart, limite do copy_object.
+
+    Com size e etag informados (ex: do evento S3), a cópia de uma chamada dispensa o head_object:
+    é condicional ao ETag (CopySourceIfMatch) e verificada pelo ETag do CopyObjectResult. Com SSE-KMS
+    ou SSE-C na origem ou no destino o ETag não é o MD5 do conteúdo: a verificação compara o tamanho e
+    o ChecksumSHA256 (calculado no destino com ChecksumAlgorithm) dos dois objetos.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        source_bucket (str): Bucket de origem
+        source_key (str): Chave de origem
+        destination_bucket (str): Bucket de destino
+        destination_key (str): Chave de destino
+        head (dict): Resposta do head_object da origem (consultada se não informada e necessária)
+        multipart_threshold (int): Tamanho a partir do qual a cópia é multipart, em bytes
+        part_size (int): Tamanho de parte preferido em bytes
+        concurrency (int): Partes copiadas em paralelo
+        max_attempts (int): Tentativas por parte
+        size (int): Tamanho da origem em bytes, se já conhecido
+        etag (str): ETag esperado da origem, se já conhecido
+
+    Returns:
+        dict: Método usado ('single' ou 'multipart'), tamanho, ETag de destino, partes, se o destino
+              confere com a origem ('verified'; None quando não é comparável) e o atributo comparado
+              ('verified_by': 'ETag', 'ChecksumSHA256', 'ContentLength' ou None)
+    """
+    if head is None and size is None:
+        head = s3_client.head_object(Bucket=source_bucket, Key=source_key)
+    object_size = head['ContentLength'] if head is not None else size
+    source_etag = etag or (head.get('ETag') if head is not None else None)
+    if source_etag:
+        # O evento S3 traz o ETag sem aspas; as condições If-Match usam o formato do header ETag
+        source_etag = f'"{source_etag.strip(chr(34))}"'
+
+    if object_size < min(multipart_threshold, MAX_SINGLE_COPY_SIZE) or object_size == 0:
+        copy_source = {'Bucket': source_bucket, 'Key': source_key}
+        if head is not None and head.get('VersionId'):
+            copy_source['VersionId'] = head['VersionId']
+        extra_args = {'CopySourceIfMatch': source_etag} if source_etag else {}
+        response = s3_client.copy_object(
+            CopySource=copy_source, Bucket=destination_bucket, Key=destination_key, ChecksumAlgorithm='SHA256',
+            **extra_args
+        )
+        destination_etag = response.get('CopyObjectResult', {}).get('ETag')
+        verified = etags_match(source_etag, destination_etag)
+        verified_by = 'ETag' if verified is not None else None
+        if verified is False or not etag_is_md5(response):
+            # ETag diferente ou destino com SSE-KMS/SSE-C: a origem é consultada para saber se os ETags são comparáveis
+            source_head = s3_client.head_object(Bucket=source_bucket, Key=source_key, ChecksumMode='ENABLED')
+            if not (etag_is_md5(source_head) and etag_is_md5(response)):
+                verified, verified_by = verify_by_checksum(
+                    s3_client, source_head, destination_bucket, destination_key, response
+                )
+        return {
+            'method': 'single',
+            'size': object_size,
+            'ETag': destination_etag,
+            'parts': 1,
+            'verified': verified,
+            'verified_by': verified_by
+        }
+
+    if head is None:
+        head = s3_client.head_object(
+            Bucket=source_bucket, Key=source_key, **({'IfMatch': source_etag} if source_etag else {})
+        )
+
+    result = multipart_copy(
+        s3_client, source_bucket, source_key, destination_bucket, destination_key, head,
+        part_size=part_size, concurrency=concurrency, max_attempts=max_attempts
+    )
+    # O ETag de um objeto multipart depende do tamanho das partes; a integridade é garantida
+    # pelo CopySourceIfMatch de cada parte e pelo complete_multipart_upload
+    result.update({'method': 'multipart', 'size': object_size, 'verified': None, 'verified_by': None})
+    return result
+
+
+def etag_is_md5(response):
+    """
+    Verifica se o ETag de um objeto (resposta de head_object ou copy_object) é o MD5 do conteúdo:
+    não é com SSE-KMS (ServerSideEncryption 'aws:kms' ou 'aws:kms:dsse') nem com SSE-C.
+    """
+    return response.get('ServerSideEncryption') not in NON_MD5_ETAG_ENCRYPTIONS and not response.get('SSECustomerAlgorithm')
+
+
+def verify_by_checksum(s3_client, source_head, destination_bucket, destination_key, copy_response):
+    """
+    Verifica uma cópia de objeto criptografado (ETag não comparável) pelo tamanho e pelo ChecksumSHA256.
+    O checksum só é comparado quando a origem tem um SHA256 do objeto inteiro (checksums compostos de
+    uploads multipart, "<base64>-<partes>", não são comparáveis com o da cópia).
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        source_head (dict): head_object da origem com ChecksumMode='ENABLED'
+        destination_bucket (str): Bucket de destino
+        destination_key (str): Chave de destino
+        copy_response (dict): Resposta do copy_object (ChecksumAlgorithm='SHA256')
+
+    Returns:
+        tuple: (True/False, ou None sem atributo comparável; atributo comparado ou None)
+    """
+    destination_head = s3_client.head_object(Bucket=destination_bucket, Key=destination_key, ChecksumMode='ENABLED')
+    if source_head['ContentLength'] != destination_head['ContentLength']:
+        return False, 'ContentLength'
+    source_checksum = source_head.get('ChecksumSHA256')
+    destination_checksum = (
+        copy_response.get('CopyObjectResult', {}).get('ChecksumSHA256') or destination_head.get('ChecksumSHA256')
+    )
+    if not source_checksum or '-' in source_checksum or not destination_checksum:
+        logger.info("Cópia de objeto criptografado sem ChecksumSHA256 na origem: verificada apenas pelo tamanho")
+        return None, 'ContentLength'
+    return source_checksum == destination_checksum, 'ChecksumSHA256'
+
+
+def etags_match(source_etag, destination_etag):
+    """
+    Compara os ETags de origem e destino de uma cópia de uma chamada.
+    Retorna None quando a comparação não é possível: origem multipart (ETag "<md5>-<partes>",
+    recalculado na cópia) ou ETag ausente. Com SSE-KMS ou SSE-C os ETags também não são comparáveis
+    (ver etag_is_md5 e verify_by_checksum).
+    """
+    if not source_etag or not destination_etag:
+        return None
+    source_etag = source_etag.strip('"')
+    if '-' in source_etag:
+        return None
+    return source_etag == destination_etag.strip('"')
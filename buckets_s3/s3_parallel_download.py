@@ -0,0 +1,165 @@
+import collections
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lambda_metrics
+
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+
+
+class ParallelRangeReader(io.RawIOBase):
+    """
+    Leitor de um objeto S3 grande em faixas de bytes baixadas em paralelo e entregues em ordem.
+
+    Uma única conexão do S3 fica bem abaixo da banda de rede do Lambda; com as faixas em paralelo,
+    o envio ao webservice não espera o download. As faixas concluídas fora de ordem aguardam em uma
+    janela de no máximo `concurrency` faixas (buffer de reordenação), então a memória fica limitada
+    a cerca de concurrency x part_size, independente do tamanho do objeto.
+
+    A primeira faixa é lida do GET já aberto (sem requisição adicional); as demais usam GET com Range
+    e IfMatch no ETag do objeto, para que uma substituição do objeto durante o download gere erro
+    em vez de misturar versões.
+
+    Args:
+        s3_client: Cliente boto3 do S3 (compartilhado pelas threads)
+        bucket (str): Bucket do objeto
+        key (str): Chave do objeto
+        size (int): Tamanho do objeto em bytes
+        etag (str): ETag do objeto (condição das faixas)
+        first_body: Corpo do GET já aberto, usado na primeira faixa (opcional)
+        part_size (int): Tamanho de cada faixa em bytes
+        concurrency (int): Faixas baixadas ao mesmo tempo (e tamanho da janela de reordenação)
+        max_attempts (int): Tentativas por faixa (erros durante a leitura do corpo não são repetidos pelo botocore)
+    """
+
+    def __init__(self, s3_client, bucket, key, size, etag=None, first_body=None, part_size=8 * MB,
+                 concurrency=8, max_attempts=3):
+        super().__init__()
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._size = size
+        self._etag = etag
+        self._first_body = first_body
+        self._part_size = max(1, part_size)
+        self._concurrency = max(1, concurrency)
+        self._max_attempts = max(1, max_attempts)
+        self._part_count = (size + self._part_size - 1) // self._part_size
+        self._executor = ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix='s3-range')
+        self._window = collections.deque()
+        self._next_part = 0
+        self._current = memoryview(b'')
+        self._offset = 0
+        self._fill_window()
+
+    def readable(self):
+        return True
+
+    def _fill_window(self):
+        while len(self._window) < self._concurrency and self._next_part < self._part_count:
+            self._window.append(self._executor.submit(self._download_part, self._next_part))
+            self._next_part += 1
+
+    def _download_part(self, index):
+        start = index * self._part_size
+        end = min(self._size, start + self._part_size) - 1
+        expected = end - start + 1
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                if index == 0 and self._first_body is not None:
+                    body, self._first_body = self._first_body, None
+                    try:
+                        data = body.read(expected)
+                    finally:
+                        # O restante do GET inicial é baixado pelas outras faixas
+                        body.close()
+                else:
+                    params = {'Bucket': self._bucket, 'Key': self._key, 'Range': f"bytes={start}-{end}"}
+                    if self._etag:
+                        params['IfMatch'] = self._etag
+                    data = self._s3.get_object(**params)['Body'].read()
+                    lambda_metrics.add('S3.RangeRequests', 1)
+                if len(data) != expected:
+                    raise IOError(f"Faixa {start}-{end} de {self._key} incompleta: {len(data)} de {expected} bytes")
+                return data
+            except Exception as e:
+                error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+                if attempt == self._max_attempts or error_code in ('PreconditionFailed', '412', 'NoSuchKey'):
+                    raise
+                logger.warning("Falha na faixa %s-%s de %s (tentativa %s): %s", start, end, self._key, attempt, e)
+                time.sleep(0.2 * 2 ** (attempt - 1))
+
+    def _next_chunk(self):
+        """Avança para a próxima faixa em ordem; retorna False no final do objeto."""
+        if not self._window:
+            return False
+        future = self._window.popleft()
+        self._current = memoryview(future.result())
+        self._offset = 0
+        self._fill_window()
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size
+        pieces = []
+        remaining = size
+        while remaining > 0:
+            if self._offset >= len(self._current) and not self._next_chunk():
+                break
+            piece = self._current[self._offset:self._offset + remaining]
+            self._offset += len(piece)
+            remaining -= len(piece)
+            pieces.append(piece)
+        if len(pieces) == 1:
+            return pieces[0].tobytes()
+        return b''.join(pieces)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            # Faixas ainda não iniciadas são canceladas; as em andamento terminam e são descartadas
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._window.clear()
+            self._current = memoryview(b'')
+            if self._first_body is not None:
+                self._first_body.close()
+        super().close()
+
+
+def open_object_stream(s3_client, bucket, key, response, threshold=None, part_size=8 * MB, concurrency=8):
+    """
+    Retorna o stream do corpo de um get_object: o próprio corpo para objetos pequenos (GET único)
+    ou um ParallelRangeReader a partir de threshold bytes.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket do objeto
+        key (str): Chave do objeto
+        response (dict): Resposta do get_object já aberto
+        threshold (int): Tamanho mínimo para o download em faixas paralelas (None = sempre GET único)
+        part_size (int): Tamanho de cada faixa em bytes
+        concurrency (int): Faixas baixadas ao mesmo tempo
+
+    Returns:
+        Stream com read(n) sobre o conteúdo do objeto
+    """
+    size = response['ContentLength']
+    if threshold is None or concurrency <= 1 or size < max(threshold, 2 * part_size):
+        return response['Body']
+    logger.info(
+        "Download de %s em faixas paralelas: %.1f MB, faixas de %.0f MB, %s em paralelo",
+        key, size / MB, part_size / MB, concurrency
+    )
+    return ParallelRangeReader(
+        s3_client, bucket, key, size, etag=response.get('ETag'), first_body=response['Body'],
+        part_size=part_size, concurrency=concurrency
+    )
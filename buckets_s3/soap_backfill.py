@@ -0,0 +1,350 @@
+"""
+Reenvio em lote (backfill) dos arquivos de um prefixo S3 ao webservice SAUDI/VOXIS, pelo mesmo caminho
+de envio do Lambda (s3_csv_to_api_soap.process_file): idempotência, notificação por email e organização
+no bucket funcionam como em um evento S3.
+
+Usado após uma indisponibilidade do webservice, no lugar de reenviar os arquivos ao S3 um a um para disparar
+o Lambda. Lê a mesma configuração (variáveis de ambiente) do Lambda.
+
+Uso:
+    python soap_backfill.py --bucket meu-bucket --prefix voxis/2025/ --modified-after 2025-03-01 \\
+        --concurrency 4 --max-files-per-minute 30 --checkpoint-file backfill-voxis.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Versão do formato do checkpoint local (checkpoints de outra versão são ignorados)
+CHECKPOINT_VERSION = 1
+
+logger = logging.getLogger()
+
+
+class RateLimiter:
+    """
+    Limita o início dos envios a max_per_minute por minuto, espaçados igualmente entre as threads.
+
+    Args:
+        max_per_minute (float): Envios iniciados por minuto (0 = sem limite)
+    """
+
+    def __init__(self, max_per_minute=0, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        """Aguarda a vez do próximo envio."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+class BackfillCheckpoint:
+    """
+    Checkpoint local do reenvio: resultado de cada arquivo concluído, gravado a cada arquivo (com
+    substituição atômica do arquivo), para que uma execução interrompida seja retomada de onde parou.
+    Arquivos enviados com sucesso na mesma versão (ETag) são ignorados na retomada; os demais são reenviados.
+
+    Args:
+        path (str): Caminho do arquivo JSON (None = sem checkpoint)
+        bucket (str): Bucket do reenvio
+        prefix (str): Prefixo do reenvio
+    """
+
+    def __init__(self, path, bucket, prefix):
+        self.path = path
+        self._lock = threading.Lock()
+        self.document = {'versao': CHECKPOINT_VERSION, 'bucket': bucket, 'prefixo': prefix, 'arquivos': {}}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as checkpoint_file:
+                document = json.load(checkpoint_file)
+            if document.get('versao') != CHECKPOINT_VERSION:
+                logger.warning("Checkpoint %s de outra versão ignorado", path)
+            elif document.get('bucket') != bucket or document.get('prefixo') != prefix:
+                raise ValueError(
+                    f"Checkpoint {path} pertence a s3://{document.get('bucket')}/{document.get('prefixo')}; "
+                    "use outro --checkpoint-file"
+                )
+            else:
+                self.document = document
+
+    def is_completed(self, key, etag):
+        """Verifica se o arquivo já foi enviado com sucesso nesta versão."""
+        entry = self.document['arquivos'].get(key)
+        return entry is not None and entry.get('statusCode') == 200 and entry.get('etag') == etag
+
+    def record(self, key, etag, response):
+        """Registra o resultado de um arquivo e grava o checkpoint."""
+        try:
+            body = json.loads(response.get('body') or '{}')
+        except ValueError:
+            body = {}
+        entry = {
+            'etag': etag,
+            'statusCode': response['statusCode'],
+            'status': body.get('status'),
+            'protocolo': body.get('protocolo'),
+            'concluido_em': datetime.datetime.now().isoformat()
+        }
+        with self._lock:
+            self.document['arquivos'][key] = entry
+            if self.path:
+                temporary_path = f"{self.path}.tmp"
+                with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+                    json.dump(self.document, checkpoint_file, ensure_ascii=False)
+                os.replace(temporary_path, self.path)
+
+
+def parse_datetime(value):
+    """Converte uma data/hora ISO 8601 (ex: 2025-03-01 ou 2025-03-01T12:00) em datetime com fuso (UTC se omitido)."""
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def iter_source_objects(s3_client, bucket, prefix='', suffixes=None, modified_after=None, modified_before=None,
+                        exclude_prefixes=()):
+    """
+    Percorre o prefixo página a página (list_objects_v2), sem carregar a listagem inteira em memória.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket de origem
+        prefix (str): Prefixo dos arquivos
+        suffixes (tuple): Extensões aceitas (padrão: CSV puro ou compactado)
+        modified_after (datetime): Apenas objetos com LastModified a partir desta data
+        modified_before (datetime): Apenas objetos com LastModified anterior a esta data
+        exclude_prefixes (tuple): Prefixos ignorados (ex: pasta de processados)
+
+    Returns:
+        Iterador de dicts com key, etag, size e last_modified
+    """
+    from s3_compressed_source import SUPPORTED_SUFFIXES
+    from soap_rejection_report import is_report_key
+
+    suffixes = tuple(suffix.lower() for suffix in (suffixes or SUPPORTED_SUFFIXES))
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            key = item['Key']
+            if not key.lower().endswith(suffixes) or is_report_key(key):
+                continue
+            if any(key.startswith(excluded) for excluded in exclude_prefixes if excluded):
+                continue
+            if modified_after and item['LastModified'] < modified_after:
+                continue
+            if modified_before and item['LastModified'] >= modified_before:
+                continue
+            yield {
+                'key': key,
+                'etag': item['ETag'].strip('"'),
+                'size': item['Size'],
+                'last_modified': item['LastModified']
+            }
+
+
+class BackfillStats:
+    """Contadores do reenvio (compartilhados pelas threads) e resumo de vazão."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.sent = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.deferred = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.failures = []
+
+    def add(self, item, response):
+        with self._lock:
+            self.sent += 1
+            self.bytes_sent += item['size']
+            if response['statusCode'] == 200:
+                self.succeeded += 1
+            elif response['statusCode'] in (409, 503):
+                # Webservice indisponível, prazo esgotado ou envio em andamento em outra invocação: retomável
+                self.deferred += 1
+                self.failures.append(item['key'])
+            else:
+                self.failed += 1
+                self.failures.append(item['key'])
+
+    def summary(self):
+        """
+        Returns:
+            dict: Arquivos enviados, com sucesso, com erro, adiados e ignorados (checkpoint), MB, duração e vazão
+        """
+        elapsed = time.perf_counter() - self.started
+        megabytes = self.bytes_sent / (1024 * 1024)
+        return {
+            'arquivos_enviados': self.sent,
+            'sucesso': self.succeeded,
+            'erro': self.failed,
+            'adiados': self.deferred,
+            'ignorados_checkpoint': self.skipped,
+            'mb_enviados': round(megabytes, 2),
+            'duracao_s': round(elapsed, 1),
+            'arquivos_por_minuto': round(self.sent * 60 / elapsed, 2) if elapsed else 0.0,
+            'mb_por_segundo': round(megabytes / elapsed, 2) if elapsed else 0.0,
+            'falhas': self.failures
+        }
+
+
+def run_backfill(bucket, objects, process, checkpoint, concurrency=4, rate_limiter=None, dry_run=False):
+    """
+    Envia os objetos com no máximo `concurrency` envios simultâneos e no máximo 2 x concurrency
+    objetos da listagem em espera (a listagem é consumida conforme os envios terminam).
+
+    Args:
+        bucket (str): Bucket de origem
+        objects: Iterador retornado por iter_source_objects
+        process: Função de envio (bucket, key, etag) -> resposta no formato do Lambda
+        checkpoint (BackfillCheckpoint): Checkpoint local
+        concurrency (int): Envios simultâneos
+        rate_limiter (RateLimiter): Limite de envios por minuto (opcional)
+        dry_run (bool): Apenas lista os arquivos que seriam enviados
+
+    Returns:
+        BackfillStats: Contadores do reenvio
+    """
+    stats = BackfillStats()
+
+    def send(item):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            response = process(bucket, item['key'], item['etag'])
+        except Exception as e:
+            # process_file trata os erros de envio e retorna a resposta: uma exceção aqui é inesperada e conta
+            # como erro (não como adiado); como todo arquivo sem sucesso, é reenviado na retomada pelo checkpoint
+            logger.exception("Erro inesperado ao reenviar %s: %s", item['key'], e)
+            response = {'statusCode': 500, 'body': json.dumps({'status': 'Erro', 'mensagem': str(e)})}
+        checkpoint.record(item['key'], item['etag'], response)
+        stats.add(item, response)
+        print(f"[{response['statusCode']}] {item['key']} ({item['size'] / (1024 * 1024):.1f} MB)", flush=True)
+
+    pending = set()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='backfill')
+    try:
+        for item in objects:
+            if checkpoint.is_completed(item['key'], item['etag']):
+                stats.skipped += 1
+                continue
+            if dry_run:
+                print(f"{item['key']} ({item['size']} bytes, {item['last_modified'].isoformat()})")
+                stats.sent += 1
+                stats.bytes_sent += item['size']
+                continue
+            while len(pending) >= 2 * max(1, concurrency):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(send, item))
+        for future in pending:
+            future.result()
+    except KeyboardInterrupt:
+        # Envios em andamento terminam (e são gravados no checkpoint); os demais ficam para a retomada
+        print("Interrompido: aguardando os envios em andamento", file=sys.stderr, flush=True)
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    return stats
+
+
+def print_summary(summary, dry_run=False):
+    if dry_run:
+        print(f"\n{summary['arquivos_enviados']} arquivos ({summary['mb_enviados']} MB) seriam enviados, "
+              f"{summary['ignorados_checkpoint']} já concluídos no checkpoint")
+        return
+    print(
+        f"\nResumo: {summary['arquivos_enviados']} arquivos em {summary['duracao_s']} s "
+        f"({summary['arquivos_por_minuto']} arquivos/min, {summary['mb_por_segundo']} MB/s, {summary['mb_enviados']} MB)\n"
+        f"  sucesso: {summary['sucesso']}, erro: {summary['erro']}, adiados: {summary['adiados']}, "
+        f"ignorados (checkpoint): {summary['ignorados_checkpoint']}"
+    )
+    if summary['falhas']:
+        print("  Falhas (reexecute com o mesmo --checkpoint-file para reenviar):")
+        for key in summary['falhas']:
+            print(f"    {key}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', required=True, help='Bucket de origem')
+    parser.add_argument('--prefix', default='', help='Prefixo dos arquivos a reenviar')
+    parser.add_argument('--suffix', action='append', help='Extensão aceita (repetível; padrão: .csv, .csv.gz, .csv.zst, .zip)')
+    parser.add_argument('--modified-after', type=parse_datetime, help='LastModified a partir de (ISO 8601, UTC se sem fuso)')
+    parser.add_argument('--modified-before', type=parse_datetime, help='LastModified anterior a (ISO 8601, UTC se sem fuso)')
+    parser.add_argument(
+        '--exclude-prefix', action='append',
+        help='Prefixo ignorado (repetível; padrão: PROCESSED_PATH e CHECKPOINT_PREFIX)'
+    )
+    parser.add_argument(
+        '--concurrency', type=int, default=int(os.environ.get('BATCH_CONCURRENCY', '4')), help='Envios simultâneos'
+    )
+    parser.add_argument('--max-files-per-minute', type=float, default=0, help='Limite de envios iniciados por minuto (0 = sem limite)')
+    parser.add_argument('--checkpoint-file', help='Checkpoint local para retomar uma execução interrompida')
+    parser.add_argument('--output', help='Grava o resumo em JSON neste arquivo')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas lista os arquivos que seriam enviados')
+    args = parser.parse_args(argv)
+
+    # Mesma configuração do Lambda; o log da execução inteira (uma "invocação" longa) vai para stderr em texto
+    import invocation_deadline
+    import notification_digest
+    import structured_logging
+    import s3_csv_to_api_soap
+
+    structured_logging.configure(logger, {
+        'LOG_FORMAT': 'text', 'LOG_MAX_INVOCATION_BYTES': str(64 * 1024 * 1024), **os.environ
+    })
+    structured_logging.start_invocation()
+    # Sem contexto do Lambda: envios sem prazo de invocação
+    invocation_deadline.start_invocation(None)
+    # Emails agregados por janela (NOTIFY_DIGEST_WINDOW_SECONDS) durante a execução
+    notification_digest.start_invocation()
+
+    exclude_prefixes = args.exclude_prefix
+    if exclude_prefixes is None:
+        exclude_prefixes = [
+            os.environ.get('PROCESSED_PATH', 'processados/'), os.environ.get('CHECKPOINT_PREFIX', 'checkpoints/')
+        ]
+    objects = iter_source_objects(
+        s3_csv_to_api_soap.get_s3_client(), args.bucket, args.prefix, args.suffix,
+        args.modified_after, args.modified_before, tuple(exclude_prefixes)
+    )
+    checkpoint = BackfillCheckpoint(args.checkpoint_file, args.bucket, args.prefix)
+    stats = run_backfill(
+        args.bucket, objects, s3_csv_to_api_soap.process_file, checkpoint,
+        concurrency=args.concurrency, rate_limiter=RateLimiter(args.max_files_per_minute), dry_run=args.dry_run
+    )
+
+    notification_digest.flush()
+    summary = stats.summary()
+    print_summary(summary, args.dry_run)
+    structured_logging.finish_invocation(logger)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(summary, output_file, ensure_ascii=False, indent=2)
+    return 1 if summary['erro'] or summary['adiados'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
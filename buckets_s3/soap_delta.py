@@ -0,0 +1,480 @@
+import csv
+import datetime
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from s3_compressed_source import CsvSource
+
+logger = logging.getLogger()
+
+# Formato do índice: assinatura, tamanho do cabeçalho JSON, cabeçalho JSON e os dois arrays de hashes
+INDEX_MAGIC = b'SDLT'
+INDEX_VERSION = 1
+INDEX_PREAMBLE = struct.Struct('<4sI')
+
+MB = 1024 * 1024
+
+
+def hash64(data):
+    """Hash de 64 bits (blake2b) estável entre execuções, usado nas chaves e nas linhas do índice."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def build_index_key(key, filename, prefix='delta/', name_pattern=None):
+    """
+    Monta a chave do índice de um arquivo, por pasta e nome do CSV: arquivos diários com o mesmo nome
+    compartilham o índice. name_pattern (regex) remove a parte variável do nome, como a data.
+    Ex: pasta/beneficiarios_20250102.csv.gz com name_pattern '_\\d{8}' -> delta/pasta/beneficiarios.csv.idx
+
+    Args:
+        key (str): Chave do arquivo de origem
+        filename (str): Nome do CSV (descompactado)
+        prefix (str): Pasta dos índices no mesmo bucket
+        name_pattern (str): Regex removida do nome do arquivo (opcional)
+    """
+    name = re.sub(name_pattern, '', filename) if name_pattern else filename
+    folder = posixpath.dirname(key)
+    prefix = prefix.rstrip('/')
+    return '/'.join(part for part in (prefix, folder, f"{name}.idx") if part)
+
+
+def sort_hashes(values, buckets=256):
+    """
+    Ordena um array('Q') de hashes no próprio array, sem materializar uma lista com todos os valores
+    (cada inteiro em lista ocupa ~36 bytes, contra 8 no array: ~1 GB a mais com 10 milhões de linhas).
+
+    Os hashes são distribuídos em `buckets` arrays pelos bits mais altos (uniformes no blake2b); cada
+    um é ordenado e copiado de volta em sequência. Pico adicional: uma cópia compacta do array mais a
+    lista de um bucket (len(values) / buckets inteiros).
+
+    Args:
+        values (array): Hashes de 64 bits (ordenados no próprio array)
+        buckets (int): Quantidade de buckets (potência de 2)
+    """
+    shift = 64 - (buckets.bit_length() - 1)
+    parts = [array('Q') for _ in range(buckets)]
+    appends = [part.append for part in parts]
+    for value in values:
+        appends[value >> shift](value)
+    position = 0
+    for number in range(buckets):
+        part = parts[number]
+        parts[number] = None
+        values[position:position + len(part)] = array('Q', sorted(part))
+        position += len(part)
+
+
+def _contains(sorted_hashes, value):
+    position = bisect_left(sorted_hashes, value)
+    return position < len(sorted_hashes) and sorted_hashes[position] == value
+
+
+class RowIndex:
+    """
+    Índice compacto das linhas do último envio com protocolo: hashes de 64 bits da coluna chave e da
+    linha completa, cada um em um array ordenado (16 bytes por linha, busca binária).
+
+    Com 64 bits, a chance de uma linha alterada coincidir com o hash de outra linha do índice é da
+    ordem de linhas / 2^64 (desprezível mesmo com dezenas de milhões de linhas).
+
+    Args:
+        key_hashes (array): Hashes das chaves, ordenados
+        row_hashes (array): Hashes das linhas, ordenados
+        header_hash (int): Hash da linha de cabeçalho (cabeçalho diferente invalida o índice)
+        metadata (dict): Informações do envio (coluna chave, protocolo, arquivo, data)
+    """
+
+    def __init__(self, key_hashes, row_hashes, header_hash, metadata=None):
+        self.key_hashes = key_hashes
+        self.row_hashes = row_hashes
+        self.header_hash = header_hash
+        self.metadata = metadata or {}
+
+    def __len__(self):
+        return len(self.row_hashes)
+
+    def has_key(self, key_hash):
+        return _contains(self.key_hashes, key_hash)
+
+    def has_row(self, row_hash):
+        return _contains(self.row_hashes, row_hash)
+
+    def to_bytes(self):
+        """Serializa o índice (arrays em little-endian)."""
+        header = json.dumps(dict(
+            self.metadata, versao=INDEX_VERSION, linhas=len(self.row_hashes), cabecalho=f"{self.header_hash:016x}"
+        ), ensure_ascii=False).encode('utf-8')
+        key_hashes, row_hashes = self.key_hashes, self.row_hashes
+        if sys.byteorder == 'big':
+            key_hashes, row_hashes = array('Q', key_hashes), array('Q', row_hashes)
+            key_hashes.byteswap()
+            row_hashes.byteswap()
+        return b''.join((
+            INDEX_PREAMBLE.pack(INDEX_MAGIC, len(header)), header, key_hashes.tobytes(), row_hashes.tobytes()
+        ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns:
+            RowIndex: Índice lido, ou None se o conteúdo não for um índice desta versão
+        """
+        if len(data) < INDEX_PREAMBLE.size:
+            return None
+        magic, header_size = INDEX_PREAMBLE.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            return None
+        offset = INDEX_PREAMBLE.size
+        metadata = json.loads(bytes(data[offset:offset + header_size]))
+        if metadata.get('versao') != INDEX_VERSION:
+            return None
+        offset += header_size
+        rows = metadata['linhas']
+        view = memoryview(data)
+        if len(view) != offset + rows * 16:
+            return None
+        key_hashes = array('Q')
+        key_hashes.frombytes(view[offset:offset + rows * 8])
+        row_hashes = array('Q')
+        row_hashes.frombytes(view[offset + rows * 8:])
+        if sys.byteorder == 'big':
+            key_hashes.byteswap()
+            row_hashes.byteswap()
+        return cls(key_hashes, row_hashes, int(metadata['cabecalho'], 16), metadata)
+
+
+def load_index(s3_client, bucket, index_key):
+    """
+    Lê o índice do S3.
+
+    Returns:
+        tuple: (RowIndex ou None se ausente/inválido, ETag do objeto ou None se ausente)
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=index_key)
+    except s3_client.exceptions.NoSuchKey:
+        return None, None
+    index = RowIndex.from_bytes(response['Body'].read())
+    if index is None:
+        logger.warning("Índice delta s3://%s/%s em formato desconhecido - ignorado", bucket, index_key)
+    return index, response['ETag']
+
+
+def iter_records(stream, chunk_size):
+    """
+    Lê o CSV em blocos e gera os registros sem o terminador de linha. Registros com quebra de linha
+    dentro de campos entre aspas são mantidos inteiros.
+    """
+    pending = b''
+    record = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if record is not None:
+                # Continuação de um campo entre aspas
+                record += b'\n' + line
+                if line.count(b'"') % 2:
+                    yield record
+                    record = None
+            elif b'"' in line and line.count(b'"') % 2:
+                record = line
+            else:
+                yield line
+    if record is not None:
+        yield record + (b'\n' + pending if pending else b'')
+    elif pending:
+        yield pending
+
+
+def resolve_key_column(header, key_column, delimiter, encoding):
+    """
+    Retorna a posição da coluna chave no cabeçalho (sem key_column, a primeira coluna).
+
+    Raises:
+        ValueError: Se a coluna não existir no cabeçalho
+    """
+    if not key_column:
+        return 0
+    columns = [
+        column.strip().lower()
+        for column in next(csv.reader([header.decode(encoding, 'replace').lstrip('\ufeff')], delimiter=delimiter))
+    ]
+    try:
+        return columns.index(key_column.strip().lower())
+    except ValueError:
+        raise ValueError(f"Coluna chave {key_column} (DELTA_KEY_COLUMN) não encontrada no cabeçalho do CSV")
+
+
+def build_delta(stream, previous=None, output=None, key_column=None, delimiter=';', encoding='utf-8', chunk_size=MB):
+    """
+    Compara o CSV com o índice do último envio em uma única leitura e monta o índice do arquivo atual.
+
+    Linhas cujo hash não está no índice (novas ou alteradas) são gravadas em output, após o cabeçalho.
+    Sem índice anterior, ou com o cabeçalho diferente do indexado, todas as linhas são gravadas: o
+    arquivo é enviado completo (estatística 'modo' = 'completo'), sem uma nova leitura da origem.
+    Linhas vazias são ignoradas.
+
+    Args:
+        stream: Stream com o conteúdo do CSV
+        previous (RowIndex): Índice do último envio com protocolo (None = primeiro envio)
+        output: Arquivo binário que recebe o CSV delta ou completo (None = apenas monta o índice)
+        key_column (str): Nome da coluna chave (None = primeira coluna)
+        delimiter (str): Separador de colunas
+        encoding (str): Codificação do arquivo
+        chunk_size (int): Tamanho dos blocos lidos do stream
+
+    Returns:
+        tuple: (RowIndex do arquivo atual, dict com as estatísticas da comparação)
+    """
+    stats = {
+        'modo': 'completo', 'linhas': 0, 'linhas_enviadas': 0, 'linhas_novas': 0,
+        'linhas_alteradas': 0, 'linhas_inalteradas': 0, 'linhas_removidas': 0
+    }
+    records = iter_records(stream, chunk_size)
+    raw_header = next(records, b'')
+    header = raw_header.rstrip(b'\r')
+    header_hash = hash64(header)
+    key_position = resolve_key_column(header, key_column, delimiter, encoding) if header else 0
+
+    if previous is not None and previous.header_hash != header_hash:
+        logger.info("Cabeçalho diferente do último envio: arquivo enviado completo e índice recriado")
+        previous = None
+    if previous is not None:
+        stats['modo'] = 'delta'
+    if output is not None and raw_header:
+        output.write(raw_header + b'\n')
+
+    separator = delimiter.encode(encoding)
+    split_limit = key_position + 1
+    key_hashes = array('Q')
+    row_hashes = array('Q')
+    add_key = key_hashes.append
+    add_row = row_hashes.append
+    blake2b = hashlib.blake2b
+    from_bytes = int.from_bytes
+    previous_rows = previous.row_hashes if previous is not None else None
+    previous_keys = previous.key_hashes if previous is not None else None
+    total = unchanged = changed = inserted = 0
+
+    for record in records:
+        content = record.rstrip(b'\r')
+        if not content:
+            continue
+        total += 1
+        if b'"' in content:
+            fields = next(csv.reader([content.decode(encoding, 'replace')], delimiter=delimiter))
+            key = fields[key_position].encode(encoding) if len(fields) > key_position else content
+        else:
+            fields = content.split(separator, split_limit)
+            key = fields[key_position] if len(fields) > key_position else content
+        row_hash = from_bytes(blake2b(content, digest_size=8).digest(), 'little')
+        key_hash = from_bytes(blake2b(key.strip(), digest_size=8).digest(), 'little')
+        add_row(row_hash)
+        add_key(key_hash)
+        if previous_rows is None:
+            if output is not None:
+                output.write(record)
+                output.write(b'\n')
+            continue
+
+        position = bisect_left(previous_rows, row_hash)
+        if position < len(previous_rows) and previous_rows[position] == row_hash:
+            unchanged += 1
+            continue
+        position = bisect_left(previous_keys, key_hash)
+        if position < len(previous_keys) and previous_keys[position] == key_hash:
+            changed += 1
+        else:
+            inserted += 1
+        if output is not None:
+            output.write(record)
+            output.write(b'\n')
+
+    sort_hashes(key_hashes)
+    sort_hashes(row_hashes)
+    index = RowIndex(key_hashes, row_hashes, header_hash, {
+        'coluna_chave': key_column or '',
+        'atualizado_em': datetime.datetime.now().isoformat()
+    })
+    stats.update(linhas=total, linhas_inalteradas=unchanged, linhas_alteradas=changed, linhas_novas=inserted)
+    if previous is not None:
+        stats['linhas_enviadas'] = changed + inserted
+        # Chaves do último envio ausentes hoje (não transmitidas: o webservice não recebe exclusões)
+        stats['linhas_removidas'] = max(0, len(previous) - unchanged - changed)
+    else:
+        stats['linhas_enviadas'] = total
+    return index, stats
+
+
+class DeltaTransmission:
+    """
+    Envio delta de um arquivo: na primeira leitura o CSV é comparado com o índice do último envio com
+    protocolo (em delta/ no mesmo bucket) e as linhas novas ou alteradas são gravadas em um arquivo
+    temporário, reaberto a cada tentativa de envio. Sem índice utilizável, o arquivo completo é gravado
+    no temporário (se couber em tmp_dir), evitando uma segunda leitura do S3. O índice só é substituído
+    após o sucesso do envio.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket do arquivo de origem (e do índice)
+        key (str): Chave do arquivo de origem
+        key_column (str): Coluna chave (None = primeira coluna)
+        delimiter (str): Separador de colunas
+        encoding (str): Codificação do arquivo
+        index_prefix (str): Pasta dos índices
+        name_pattern (str): Regex removida do nome do arquivo na chave do índice
+        tmp_dir (str): Pasta do arquivo delta (None = pasta temporária do sistema, /tmp no Lambda)
+    """
+
+    def __init__(self, s3_client, bucket, key, key_column=None, delimiter=';', encoding='utf-8',
+                 index_prefix='delta/', name_pattern=None, tmp_dir=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.key_column = key_column
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.index_prefix = index_prefix
+        self.name_pattern = name_pattern
+        self.tmp_dir = tmp_dir
+        self.prepared = False
+        self.validator = None
+        self.filename = None
+        self.index_key = None
+        self.index = None
+        self.stats = None
+        self._previous_etag = None
+        self._previous_protocol = None
+        self._path = None
+
+    @property
+    def unchanged(self):
+        """Se nenhuma linha mudou desde o último envio (nada a enviar)."""
+        return self.stats is not None and self.stats['modo'] == 'delta' and self.stats['linhas_enviadas'] == 0
+
+    def prepare(self, stream, filename, validator=None, size=None):
+        """
+        Compara o CSV (stream já descompactado, validado durante a leitura quando há validador) com o
+        índice do último envio e grava o delta (ou o arquivo completo, sem índice utilizável).
+
+        Args:
+            stream: Stream com o conteúdo do CSV
+            filename (str): Nome do CSV (chave do índice e <nomArquivo> do envio)
+            validator: Validador que acompanha a leitura (mantido para a conferência de registros)
+            size (int): Tamanho do CSV descompactado (sem índice, o arquivo completo só é gravado em
+                        tmp_dir se houver espaço livre; None = não gravado)
+        """
+        self.filename = filename
+        self.validator = validator
+        self.index_key = build_index_key(self.key, filename, self.index_prefix, self.name_pattern)
+        previous, self._previous_etag = load_index(self.s3_client, self.bucket, self.index_key)
+        if previous is not None and (previous.metadata.get('coluna_chave') or '') != (self.key_column or ''):
+            logger.info("Coluna chave diferente da indexada: arquivo enviado completo e índice recriado")
+            previous = None
+
+        output = None
+        if previous is not None:
+            self._previous_protocol = previous.metadata.get('protocolo')
+        if previous is not None or self._fits_tmp(size):
+            descriptor, self._path = tempfile.mkstemp(prefix='delta_', suffix='.csv', dir=self.tmp_dir)
+            output = os.fdopen(descriptor, 'wb', buffering=MB)
+        try:
+            self.index, self.stats = build_delta(
+                stream, previous, output, self.key_column, self.delimiter, self.encoding
+            )
+        except Exception:
+            self.cleanup()
+            raise
+        finally:
+            if output is not None:
+                output.close()
+        self.prepared = True
+        logger.info(
+            "Delta de %s (índice s3://%s/%s): %s de %s linhas a enviar (%s novas, %s alteradas, %s removidas)",
+            filename, self.bucket, self.index_key, self.stats['linhas_enviadas'], self.stats['linhas'],
+            self.stats['linhas_novas'], self.stats['linhas_alteradas'], self.stats['linhas_removidas']
+        )
+
+    def _fits_tmp(self, size):
+        """Se o arquivo completo cabe na pasta temporária (com folga para o restante da invocação)."""
+        if size is None:
+            return False
+        return shutil.disk_usage(self.tmp_dir or tempfile.gettempdir()).free > 2 * size
+
+    def open_source(self):
+        """
+        Returns:
+            CsvSource: CSV delta (ou completo) gravado na leitura, ou None se o arquivo deve ser lido
+                       novamente da origem
+        """
+        if self._path is None:
+            return None
+        return CsvSource(open(self._path, 'rb'), os.path.getsize(self._path), self.filename)
+
+    def result_fields(self):
+        """Estatísticas do delta incluídas no resultado do envio (e na notificação)."""
+        return {'modo_envio': self.stats['modo'], **{
+            name: str(value) for name, value in self.stats.items() if name.startswith('linhas')
+        }}
+
+    def unchanged_result(self):
+        """Resultado de um arquivo sem alterações desde o último envio (não transmitido)."""
+        return dict(
+            self.result_fields(),
+            status='Sucesso',
+            mensagem='Nenhuma linha nova ou alterada desde o último envio: arquivo não transmitido',
+            protocolo=self._previous_protocol or 'N/A'
+        )
+
+    def save_index(self, protocol):
+        """
+        Substitui o índice pelo do arquivo atual, após um envio com protocolo. A gravação é atômica e
+        condicional ao ETag do índice lido: se outro envio do mesmo arquivo gravou o índice nesse meio
+        tempo (ou a gravação falha), o índice é removido e o próximo envio é completo, evitando um
+        índice que não corresponde ao último conteúdo recebido pelo webservice.
+
+        Args:
+            protocol (str): Protocolo do envio
+        """
+        self.index.metadata.update(protocolo=protocol, arquivo=self.key)
+        condition = {'IfMatch': self._previous_etag} if self._previous_etag else {'IfNoneMatch': '*'}
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=self.index_key, Body=self.index.to_bytes(),
+                ContentType='application/octet-stream', **condition
+            )
+            logger.info("Índice delta gravado: s3://%s/%s (%s linhas)", self.bucket, self.index_key, len(self.index))
+            return True
+        except Exception as e:
+            logger.warning(
+                "Falha ao gravar o índice delta s3://%s/%s (removido; próximo envio completo): %s",
+                self.bucket, self.index_key, e
+            )
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=self.index_key)
+        except Exception as e:
+            logger.error("Erro ao remover o índice delta s3://%s/%s: %s", self.bucket, self.index_key, e)
+        return False
+
+    def cleanup(self):
+        """Remove o arquivo delta temporário."""
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
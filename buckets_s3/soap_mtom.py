@@ -0,0 +1,72 @@
+import re
+import uuid
+
+from soap_response_parser import parse_fault_message
+
+XOP_NS = 'http://www.w3.org/2004/08/xop/include'
+
+# Content-IDs do envelope (parte raiz) e do arquivo anexado
+ROOT_CONTENT_ID = 'envelope@saudi.voxis'
+ATTACHMENT_CONTENT_ID = 'arquivo@saudi.voxis'
+
+# Mensagens de falha que recusam a requisição multipart/related (MTOM/XOP): citam XOP/MTOM ou um tipo de
+# conteúdo não suportado (uma falha de validação do arquivo não cita nenhum dos dois)
+MTOM_REJECTION_PATTERN = re.compile(
+    r'\b(?:xop|mtom)\b'
+    r'|(?:unsupported|not\s+supported|n[ãa]o\s+suportad[oa])\W+(?:\w+\W+){0,2}?(?:content|media).?type'
+    r'|(?:content|media).?type\W+(?:\S+\W+){0,4}?(?:unsupported|not\s+(?:supported|allowed|accepted)|n[ãa]o\s+suportad[oa])',
+    re.I
+)
+
+
+def build_mtom_request_parts(envelope_prefix, envelope_suffix, boundary=None):
+    """
+    Monta o corpo multipart/related (MTOM/XOP) em torno do conteúdo binário do arquivo.
+
+    O envelope é a parte raiz, com <arquivo> referenciando o anexo por xop:Include; o anexo
+    leva os bytes do CSV sem codificação, enviados entre o início e o final retornados.
+
+    Args:
+        envelope_prefix (bytes): Início do envelope SOAP até <arquivo>
+        envelope_suffix (bytes): Final do envelope SOAP a partir de </arquivo>
+        boundary (str): Delimitador das partes (padrão: uuid aleatório)
+
+    Returns:
+        tuple: (início do corpo até o conteúdo do anexo, final do corpo, Content-Type da requisição)
+    """
+    boundary = boundary or f"uuid:{uuid.uuid4()}"
+    include = f'<xop:Include xmlns:xop="{XOP_NS}" href="cid:{ATTACHMENT_CONTENT_ID}"/>'.encode('utf-8')
+    head = b''.join([
+        f'--{boundary}\r\n'
+        f'Content-Type: application/xop+xml; charset=UTF-8; type="text/xml"\r\n'
+        f'Content-Transfer-Encoding: 8bit\r\n'
+        f'Content-ID: <{ROOT_CONTENT_ID}>\r\n\r\n'.encode('utf-8'),
+        envelope_prefix, include, envelope_suffix,
+        f'\r\n--{boundary}\r\n'
+        f'Content-Type: application/octet-stream\r\n'
+        f'Content-Transfer-Encoding: binary\r\n'
+        f'Content-ID: <{ATTACHMENT_CONTENT_ID}>\r\n\r\n'.encode('utf-8')
+    ])
+    tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    content_type = (
+        f'multipart/related; type="application/xop+xml"; boundary="{boundary}"; '
+        f'start="<{ROOT_CONTENT_ID}>"; start-info="text/xml"'
+    )
+    return head, tail, content_type
+
+
+def is_mtom_rejected(status_code, response_data):
+    """
+    Indica se a resposta é uma recusa do formato MTOM (e não do arquivo): 415, ou 400/500 cuja mensagem
+    de falha (faultstring) cita XOP/MTOM ou um tipo de conteúdo não suportado. Outras falhas 400/500
+    (ex: validação do arquivo) não são recusas do formato: o arquivo não é reenviado em base64.
+
+    Args:
+        status_code (int): Status HTTP da resposta
+        response_data (str): Corpo da resposta
+    """
+    if status_code == 415:
+        return True
+    if status_code not in (400, 500):
+        return False
+    return MTOM_REJECTION_PATTERN.search(parse_fault_message(status_code, response_data or '')) is not None
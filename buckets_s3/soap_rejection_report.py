@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from collections import Counter
+
+from s3_compressed_source import SUPPORTED_SUFFIXES
+from soap_response_parser import REJECTED_LINE_PATTERN, iter_rejected_lines
+
+# Marcador usado no nome dos relatórios, para que não sejam reenviados ao webservice
+REPORT_MARKER = '.rejeicoes.'
+
+
+class _GeneratorStream(io.RawIOBase):
+    """
+    Adapta um gerador de bytes para a interface de arquivo esperada por upload_fileobj,
+    permitindo enviar o relatório ao S3 à medida que as linhas são geradas.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def is_report_key(key):
+    """Verifica se a chave é de um relatório de rejeições gerado por esta função."""
+    return REPORT_MARKER in key.split('/')[-1]
+
+
+def build_report_key(key, report_format='jsonl', prefix=''):
+    """
+    Monta a chave do relatório ao lado do arquivo de origem (ex: pasta/arquivo.csv -> pasta/arquivo.rejeicoes.jsonl).
+    Apenas a extensão suportada é removida do nome (ex: pasta/carga.2025.03.csv.gz -> pasta/carga.2025.03.rejeicoes.jsonl),
+    para que arquivos com pontos no nome não gerem o mesmo relatório.
+
+    Args:
+        key (str): Chave do arquivo de origem
+        report_format (str): 'jsonl' ou 'csv'
+        prefix (str): Pasta alternativa para os relatórios (vazio = mesma pasta do arquivo)
+    """
+    folder, _, filename = key.rpartition('/')
+    suffix = next((suffix for suffix in sorted(SUPPORTED_SUFFIXES, key=len, reverse=True)
+                   if filename.lower().endswith(suffix)), '')
+    stem = filename[:len(filename) - len(suffix)] or filename
+    if prefix:
+        folder = prefix.rstrip('/')
+    report_name = f"{stem}{REPORT_MARKER}{report_format}"
+    return f"{folder}/{report_name}" if folder else report_name
+
+
+def _iter_report_rows(sections, pattern, reasons):
+    for filename, text in sections:
+        for line_number, field, reason in iter_rejected_lines(text or '', pattern):
+            reasons[reason] += 1
+            yield filename, line_number, field, reason
+
+
+def _iter_jsonl(rows):
+    for filename, line_number, field, reason in rows:
+        record = {'arquivo': filename, 'linha': line_number, 'campo': field, 'motivo': reason}
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(('arquivo', 'linha', 'campo', 'motivo'))
+    for row in rows:
+        writer.writerow(row)
+        # Esvazia o buffer a cada ~64 KB para manter a memória constante
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_rejection_report(s3_client, bucket, report_key, sections, report_format='jsonl',
+                           top_n=10, pattern=REJECTED_LINE_PATTERN):
+    """
+    Extrai as linhas rejeitadas das respostas e grava o relatório no S3 em streaming.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket onde o relatório será gravado
+        report_key (str): Chave do relatório
+        sections (list): Tuplas (nome do arquivo enviado, texto de retorno do webservice)
+        report_format (str): 'jsonl' (uma linha JSON por rejeição) ou 'csv' (separado por ';')
+        top_n (int): Quantidade de motivos mais frequentes retornados no resumo
+        pattern (str): Expressão para reconhecer as linhas rejeitadas (ver REJECTED_LINE_PATTERN)
+
+    Returns:
+        dict: total de linhas no relatório e lista [(motivo, quantidade)] dos principais motivos
+    """
+    reasons = Counter()
+    rows = _iter_report_rows(sections, pattern, reasons)
+    chunks = _iter_csv(rows) if report_format == 'csv' else _iter_jsonl(rows)
+    content_type = 'text/csv; charset=utf-8' if report_format == 'csv' else 'application/x-ndjson; charset=utf-8'
+
+    s3_client.upload_fileobj(
+        io.BufferedReader(_GeneratorStream(chunks)), bucket, report_key,
+        ExtraArgs={'ContentType': content_type}
+    )
+    return {
+        'linhas': sum(reasons.values()),
+        'principais_motivos': reasons.most_common(top_n)
+    }
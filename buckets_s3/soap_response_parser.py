@@ -0,0 +1,236 @@
+import html
+import re
+
+SOAP_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+SAUDI_NS = 'http://endpoints.webservice.integration.saudi.acol.com/'
+
+RESPONSE_TAG = f'{{{SAUDI_NS}}}transmitirArquivoOperadoraResponse'
+FAULT_TAG = f'{{{SOAP_NS}}}Fault'
+
+# Tamanho dos blocos entregues ao parser incremental
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Todos os campos do texto de retorno em uma única expressão, para extrair tudo em uma só varredura
+RESULT_FIELDS_PATTERN = re.compile(
+    r'(?P<sucesso>Arquivo inserido com sucesso!)'
+    r'|(?P<erro>Arquivo inserido, mas com erros)'
+    r'|Número do protocolo\s*:\s*(?P<protocolo>\d+)'
+    r'|Qtd\. Total de Registros\s*:\s*(?P<total_registros>\d+)'
+    r'|Qtd\. Linhas Aceitas\s*:\s*(?P<linhas_aceitas>\d+)'
+    r'|Qtd\. Linhas Rejeitadas\s*:\s*(?P<linhas_rejeitadas>\d+)'
+)
+
+# Abertura do <return> logo após transmitirArquivoOperadoraResponse (caminho rápido, sem parser XML)
+RETURN_START_PATTERN = re.compile(r'<(?:[\w.-]+:)?transmitirArquivoOperadoraResponse\b[^>]*>\s*<return>')
+
+# Detalhe de linha rejeitada no texto de retorno (ex: "Linha 15 - Campo: CPF - Motivo: CPF inválido").
+# Pode ser substituído por REJECTION_LINE_PATTERN, mantendo os grupos linha, campo e motivo.
+REJECTED_LINE_PATTERN = (
+    r'Linha\s*:?\s*(?P<linha>\d+)\s*[-;|]\s*'
+    r'(?:Campo\s*:?\s*(?P<campo>[^-;|\n]*?)\s*[-;|]\s*)?'
+    r'(?:Motivo\s*:?\s*)?(?P<motivo>[^\n]*?)\s*$'
+)
+
+NUMERIC_FIELDS = ('protocolo', 'total_registros', 'linhas_aceitas', 'linhas_rejeitadas')
+
+
+class TransmissionResult:
+    """
+    Resultado estruturado da resposta de transmitirArquivoOperadora.
+
+    Attributes:
+        has_error (bool): Se o webservice indicou "Arquivo inserido, mas com erros"
+        mensagem (str): Mensagem de status encontrada na resposta
+        protocolo (str): Número do protocolo, ou None se ausente
+        total_registros (int): Quantidade total de registros
+        linhas_aceitas (int): Quantidade de linhas aceitas
+        linhas_rejeitadas (int): Quantidade de linhas rejeitadas
+        resposta_completa (str): Texto do elemento <return> (ou início da resposta bruta)
+    """
+
+    __slots__ = ('has_error', 'mensagem', 'protocolo', 'total_registros',
+                 'linhas_aceitas', 'linhas_rejeitadas', 'resposta_completa')
+
+    def __init__(self, has_error, mensagem, protocolo, total_registros, linhas_aceitas,
+                 linhas_rejeitadas, resposta_completa):
+        self.has_error = has_error
+        self.mensagem = mensagem
+        self.protocolo = protocolo
+        self.total_registros = total_registros
+        self.linhas_aceitas = linhas_aceitas
+        self.linhas_rejeitadas = linhas_rejeitadas
+        self.resposta_completa = resposta_completa
+
+    @property
+    def status(self):
+        return 'Erro' if self.has_error else 'Sucesso'
+
+    def as_dict(self):
+        """Retorna o resultado no formato usado pelas notificações e pela resposta do Lambda."""
+        return {
+            'status': self.status,
+            'mensagem': self.mensagem,
+            'protocolo': self.protocolo or 'N/A',
+            'total_registros': str(self.total_registros),
+            'linhas_aceitas': str(self.linhas_aceitas),
+            'linhas_rejeitadas': str(self.linhas_rejeitadas),
+            'resposta_completa': self.resposta_completa
+        }
+
+
+def extract_fields(text):
+    """
+    Extrai status, protocolo e contadores do texto de retorno em uma única varredura.
+    A varredura termina assim que o erro e todos os contadores foram encontrados.
+
+    Returns:
+        dict: Primeira ocorrência de cada campo encontrado
+    """
+    fields = {}
+    for match in RESULT_FIELDS_PATTERN.finditer(text):
+        name = match.lastgroup
+        if name not in fields:
+            fields[name] = match.group(name)
+            if 'erro' in fields and all(field in fields for field in NUMERIC_FIELDS):
+                break
+    return fields
+
+
+def build_result(text, resposta_completa):
+    """
+    Monta o TransmissionResult a partir do texto de retorno.
+    """
+    fields = extract_fields(text)
+    has_error = 'erro' in fields
+    return TransmissionResult(
+        has_error=has_error,
+        mensagem=fields['erro'] if has_error else fields.get('sucesso', 'Arquivo processado'),
+        protocolo=fields.get('protocolo'),
+        total_registros=int(fields.get('total_registros', 0)),
+        linhas_aceitas=int(fields.get('linhas_aceitas', 0)),
+        linhas_rejeitadas=int(fields.get('linhas_rejeitadas', 0)),
+        resposta_completa=resposta_completa
+    )
+
+
+def iter_rejected_lines(text, pattern=REJECTED_LINE_PATTERN):
+    """
+    Gera os detalhes das linhas rejeitadas listadas no texto de retorno, sem montar uma lista em memória.
+
+    Args:
+        text (str): Texto do elemento <return>
+        pattern (str): Expressão com os grupos linha, motivo e (opcional) campo
+
+    Yields:
+        tuple: (número da linha, campo ou '', motivo)
+    """
+    compiled = re.compile(pattern, re.MULTILINE)
+    for match in compiled.finditer(text):
+        groups = match.groupdict()
+        yield int(groups['linha']), (groups.get('campo') or '').strip(), (groups.get('motivo') or '').strip()
+
+
+def _iter_events(response_data, events=('end',)):
+    """
+    Alimenta um XMLPullParser em blocos e gera os eventos à medida que os elementos são lidos,
+    sem construir o documento inteiro antes de começar a procurar.
+    """
+    # Parser XML importado apenas fora do caminho rápido (reduz o cold start)
+    import xml.etree.ElementTree as ET
+    parser = ET.XMLPullParser(events=events)
+    for start in range(0, len(response_data), FEED_CHUNK_SIZE):
+        parser.feed(response_data[start:start + FEED_CHUNK_SIZE])
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def find_return_text_fast(response_data):
+    """
+    Caminho rápido: recorta o texto do <return> diretamente da resposta e decodifica as entidades XML.
+    Retorna None quando o texto não é simples (CDATA, elementos filhos) e o parser XML é necessário.
+    """
+    match = RETURN_START_PATTERN.search(response_data)
+    if match is None:
+        return None
+    end = response_data.find('</return>', match.end())
+    if end < 0:
+        return None
+    text = response_data[match.end():end]
+    if '<' in text:
+        return None
+    if '\r' in text:
+        # Mesma normalização de fim de linha feita pelo parser XML
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return html.unescape(text) if '&' in text else text
+
+
+def find_return_text(response_data):
+    """
+    Localiza o texto do elemento <return> filho de transmitirArquivoOperadoraResponse.
+    O parse é interrompido assim que o elemento é fechado; o restante da resposta não é lido.
+
+    Returns:
+        str: Texto do elemento, ou None se não existir
+
+    Raises:
+        xml.etree.ElementTree.ParseError: Se o XML estiver malformado antes do <return>
+    """
+    depth = 0
+    response_depth = None
+    for event, element in _iter_events(response_data, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if element.tag == RESPONSE_TAG and response_depth is None:
+                response_depth = depth
+            continue
+        if element.tag == 'return' and response_depth is not None and depth == response_depth + 1:
+            return element.text
+        if depth == response_depth:
+            response_depth = None
+        depth -= 1
+    return None
+
+
+def parse_transmission_response(response_data):
+    """
+    Interpreta a resposta de sucesso (HTTP 200/202) do webservice.
+    Usa o texto do elemento <return> e, na sua ausência, a resposta bruta.
+    O texto simples do <return> é recortado sem parser XML; os demais casos usam o parser incremental.
+
+    Args:
+        response_data (str): Corpo da resposta SOAP
+
+    Returns:
+        TransmissionResult: Resultado estruturado
+
+    Raises:
+        xml.etree.ElementTree.ParseError: Se o XML estiver malformado
+    """
+    return_text = find_return_text_fast(response_data)
+    if return_text is None:
+        return_text = find_return_text(response_data)
+    if return_text:
+        return build_result(return_text, return_text)
+    # Extração direta sobre a resposta bruta se o elemento <return> não existir
+    return build_result(response_data, response_data[:500])
+
+
+def parse_fault_message(status_code, response_data):
+    """
+    Extrai a mensagem de erro de uma resposta de falha (SOAP Fault ou erro HTTP).
+
+    Args:
+        status_code (int): Status HTTP da resposta
+        response_data (str): Corpo da resposta
+    """
+    import xml.etree.ElementTree as ET
+    default_message = f"Erro de comunicação. Status: {status_code}. Resposta: {response_data[:200]}"
+    try:
+        for _, element in _iter_events(response_data):
+            if element.tag == FAULT_TAG:
+                fault_string = element.find('faultstring')
+                return fault_string.text if fault_string is not None else response_data[:200]
+    except ET.ParseError:
+        pass
+    return default_message
@@ -0,0 +1,293 @@
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+
+# Marcadores incluídos no lugar do conteúdo descartado
+TRUNCATION_MARKER = '... [truncado: {} caracteres]'
+
+# Bytes estimados de cada linha além da mensagem (timestamp, nível, request_id e chaves do JSON)
+RECORD_OVERHEAD = 120
+
+
+class LazyJson:
+    """
+    Serializa um objeto em JSON apenas se o registro de log for emitido
+    (ex: logger.debug("Evento: %s", LazyJson(event))), limitado a max_chars caracteres.
+    """
+
+    __slots__ = ('_value', '_max_chars')
+
+    def __init__(self, value, max_chars=None):
+        self._value = value
+        self._max_chars = max_chars
+
+    def __str__(self):
+        text = json.dumps(self._value, ensure_ascii=False, default=str)
+        return truncate(text, self._max_chars) if self._max_chars else text
+
+
+def truncate(text, max_chars):
+    """Limita text a max_chars caracteres, indicando quantos foram descartados."""
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + TRUNCATION_MARKER.format(len(text) - max_chars)
+
+
+def sampled(key):
+    """
+    Marca um registro repetitivo (ex: uma linha por arquivo em lotes grandes) para amostragem:
+    logger.info("Processando %s", key, extra=structured_logging.sampled('copy_record')).
+    """
+    return {'sample_key': key}
+
+
+class InvocationLogBudget(logging.Filter):
+    """
+    Limita o volume de log de uma invocação.
+
+    - Cada mensagem é formatada uma única vez e limitada a max_field_chars (argumentos longos são
+      truncados antes da formatação, sem montar a mensagem inteira).
+    - Registros marcados com sampled(key) abaixo de WARNING: os primeiros sample_first de cada
+      chave são emitidos e, depois, um a cada sample_every.
+    - Após max_invocation_bytes, registros abaixo de WARNING são descartados; WARNING e ERROR
+      continuam até error_reserve_bytes adicionais.
+
+    Args:
+        max_field_chars (int): Tamanho máximo da mensagem e de cada campo extra
+        max_invocation_bytes (int): Volume de log por invocação (aproximado)
+        error_reserve_bytes (int): Volume adicional reservado para WARNING e ERROR
+        sample_first (int): Registros emitidos por chave de amostragem antes de amostrar
+        sample_every (int): Intervalo de amostragem após sample_first (0 = descartar os demais)
+    """
+
+    def __init__(self, max_field_chars=4096, max_invocation_bytes=256 * 1024, error_reserve_bytes=64 * 1024,
+                 sample_first=20, sample_every=100):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+        self.max_invocation_bytes = max_invocation_bytes
+        self.error_reserve_bytes = error_reserve_bytes
+        self.sample_first = sample_first
+        self.sample_every = sample_every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zera os contadores (início de uma invocação)."""
+        with self._lock:
+            self.bytes_emitted = 0
+            self.records_emitted = 0
+            self.dropped_budget = 0
+            self.dropped_sampling = 0
+            self.truncated = 0
+            self._samples = {}
+
+    def filter(self, record):
+        # Registro já avaliado por outro handler com o mesmo limite, ou isento (resumo da invocação)
+        if getattr(record, 'budget_checked', False) or getattr(record, 'budget_exempt', False):
+            return True
+
+        sample_key = getattr(record, 'sample_key', None)
+        if sample_key is not None and record.levelno < logging.WARNING:
+            with self._lock:
+                seen = self._samples.get(sample_key, 0) + 1
+                self._samples[sample_key] = seen
+                keep = seen <= self.sample_first or (
+                    self.sample_every > 0 and (seen - self.sample_first) % self.sample_every == 0
+                )
+                if not keep:
+                    self.dropped_sampling += 1
+                    return False
+
+        message = self._bounded_message(record)
+        size = len(message) + RECORD_OVERHEAD
+        limit = self.max_invocation_bytes
+        if record.levelno >= logging.WARNING:
+            limit += self.error_reserve_bytes
+        with self._lock:
+            if self.bytes_emitted + size > limit:
+                self.dropped_budget += 1
+                return False
+            self.bytes_emitted += size
+            self.records_emitted += 1
+
+        # Mensagem já formatada e limitada: o formatter não repete a formatação
+        record.msg = message
+        record.args = None
+        record.budget_checked = True
+        return True
+
+    def _bounded_message(self, record):
+        args = record.args
+        bounded = args
+        truncated = False
+        if args:
+            if isinstance(args, tuple):
+                bounded = tuple(self._bounded_arg(arg) for arg in args)
+            elif isinstance(args, dict):
+                bounded = {name: self._bounded_arg(value) for name, value in args.items()}
+            truncated = bounded is not args and bounded != args
+        record.args = bounded
+        try:
+            message = record.getMessage()
+        except Exception:
+            # Formato incompatível com os argumentos: o erro não chega a quem chamou o logger,
+            # e a mensagem é emitida sem formatação, seguida dos argumentos
+            message = f"{record.msg} {bounded!r}" if bounded else str(record.msg)
+        finally:
+            record.args = args
+        if len(message) > self.max_field_chars:
+            truncated = True
+            message = truncate(message, self.max_field_chars)
+        if truncated:
+            with self._lock:
+                self.truncated += 1
+        return message
+
+    def _bounded_arg(self, arg):
+        if not isinstance(arg, (str, bytes)) or len(arg) <= self.max_field_chars:
+            return arg
+        omitted = TRUNCATION_MARKER.format(len(arg) - self.max_field_chars)
+        if isinstance(arg, bytes):
+            return arg[:self.max_field_chars].decode('utf-8', 'replace') + omitted
+        return arg[:self.max_field_chars] + omitted
+
+    def summary(self):
+        """
+        Returns:
+            dict: Registros e bytes emitidos, descartados (orçamento e amostragem) e truncados na invocação
+        """
+        with self._lock:
+            return {
+                'registros': self.records_emitted,
+                'bytes': self.bytes_emitted,
+                'descartados_orcamento': self.dropped_budget,
+                'descartados_amostragem': self.dropped_sampling,
+                'truncados': self.truncated
+            }
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formata cada registro como uma linha JSON (CloudWatch Logs Insights extrai os campos automaticamente),
+    com o request_id da invocação para correlacionar os registros das threads de um mesmo evento.
+    Campos adicionais podem ser passados em extra={'fields': {...}}.
+    """
+
+    def __init__(self, max_field_chars=4096):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record):
+        document = {
+            'timestamp': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'request_id': _request_id,
+            'function': _function_name,
+            'thread': record.threadName
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            for name, value in fields.items():
+                if isinstance(value, str):
+                    value = truncate(value, self.max_field_chars)
+                document.setdefault(name, value)
+        if record.exc_info:
+            document['exception'] = truncate(self.formatException(record.exc_info), self.max_field_chars)
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato texto (LOG_FORMAT=text), com o request_id da invocação em cada linha."""
+
+    def format(self, record):
+        line = f"[{record.levelname}]\t{_request_id or '-'}\t{record.getMessage()}"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+# Estado do módulo: um container processa uma invocação por vez
+_budget = None
+_request_id = None
+_function_name = None
+_configure_lock = threading.Lock()
+
+
+def configure(logger=None, environ=None, stream=None):
+    """
+    Instala o formato e o limite de volume nos handlers do logger (padrão: root). Sem handlers
+    (execução local), adiciona um StreamHandler em stderr, separado da linha EMF escrita no stdout.
+
+    Variáveis: LOG_LEVEL, LOG_FORMAT (json ou text), LOG_MAX_FIELD_CHARS, LOG_MAX_INVOCATION_BYTES,
+    LOG_ERROR_RESERVE_BYTES, LOG_SAMPLE_FIRST e LOG_SAMPLE_EVERY.
+
+    Returns:
+        InvocationLogBudget: Limite instalado (compartilhado pelos handlers)
+    """
+    global _budget
+    environ = os.environ if environ is None else environ
+    logger = logger or logging.getLogger()
+    with _configure_lock:
+        if environ.get('LOG_LEVEL'):
+            logger.setLevel(environ['LOG_LEVEL'].upper())
+        max_field_chars = int(environ.get('LOG_MAX_FIELD_CHARS', '4096'))
+        budget = InvocationLogBudget(
+            max_field_chars=max_field_chars,
+            max_invocation_bytes=int(environ.get('LOG_MAX_INVOCATION_BYTES', str(256 * 1024))),
+            error_reserve_bytes=int(environ.get('LOG_ERROR_RESERVE_BYTES', str(64 * 1024))),
+            sample_first=int(environ.get('LOG_SAMPLE_FIRST', '20')),
+            sample_every=int(environ.get('LOG_SAMPLE_EVERY', '100'))
+        )
+        if environ.get('LOG_FORMAT', 'json') == 'text':
+            formatter = TextFormatter()
+        else:
+            formatter = JsonFormatter(max_field_chars)
+
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler(stream or sys.stderr))
+        for handler in logger.handlers:
+            # Reconfiguração (ex: testes locais) substitui o limite instalado anteriormente
+            for existing in [f for f in handler.filters if isinstance(f, InvocationLogBudget)]:
+                handler.removeFilter(existing)
+            handler.addFilter(budget)
+            handler.setFormatter(formatter)
+        _budget = budget
+    return budget
+
+
+def start_invocation(context=None):
+    """
+    Inicia o log de uma invocação: request_id e nome da função do contexto do Lambda e
+    contadores de volume zerados.
+    """
+    global _request_id, _function_name
+    _request_id = getattr(context, 'aws_request_id', None)
+    _function_name = getattr(context, 'function_name', None)
+    if _budget is not None:
+        _budget.reset()
+
+
+def finish_invocation(logger=None):
+    """
+    Registra o resumo do volume de log da invocação quando houve descarte ou truncamento
+    (o resumo não é afetado pelo limite).
+
+    Returns:
+        dict: Resumo retornado por InvocationLogBudget.summary, ou None sem configure
+    """
+    if _budget is None:
+        return None
+    summary = _budget.summary()
+    if summary['descartados_orcamento'] or summary['descartados_amostragem'] or summary['truncados']:
+        (logger or logging.getLogger()).warning(
+            "Log limitado nesta invocação: %d registros emitidos (%d bytes), %d descartados pelo orçamento, "
+            "%d pela amostragem, %d truncados",
+            summary['registros'], summary['bytes'], summary['descartados_orcamento'],
+            summary['descartados_amostragem'], summary['truncados'],
+            extra={'budget_exempt': True, 'fields': {'log_summary': summary}}
+        )
+    return summary
@@ -0,0 +1,95 @@
+import datetime
+import json
+
+# Versão do formato do checkpoint (checkpoints de outra versão são ignorados)
+CHECKPOINT_VERSION = 1
+
+
+def build_checkpoint_key(key, prefix='checkpoints/'):
+    """
+    Monta a chave do checkpoint de um arquivo (ex: pasta/arquivo.csv -> checkpoints/pasta/arquivo.csv.json).
+    A extensão .json impede que o checkpoint seja tratado como um CSV a enviar.
+
+    Args:
+        key (str): Chave do arquivo de origem
+        prefix (str): Pasta dos checkpoints no mesmo bucket
+    """
+    prefix = prefix.rstrip('/')
+    return f"{prefix}/{key}.json" if prefix else f"{key}.json"
+
+
+def new_checkpoint(etag, version_id, size, split_config):
+    """
+    Cria o checkpoint de um envio em partes. As partes são determinadas pelo conteúdo e pelos
+    limites de linhas e bytes, que precisam ser os mesmos na invocação que retoma o envio.
+
+    Args:
+        etag (str): ETag do objeto informado no evento
+        version_id (str): versionId do objeto informado no evento
+        size (int): Tamanho do CSV em bytes
+        split_config (dict): Configurações retornadas por get_split_config
+
+    Returns:
+        dict: Checkpoint sem partes concluídas
+    """
+    return {
+        'versao': CHECKPOINT_VERSION,
+        'etag': etag,
+        'version_id': version_id,
+        'tamanho': size,
+        'max_rows': split_config['max_rows'],
+        'max_bytes': split_config['max_bytes'],
+        'partes': {}
+    }
+
+
+def checkpoint_matches(checkpoint, etag, version_id, size, split_config):
+    """Verifica se o checkpoint pertence à mesma versão do arquivo e à mesma divisão em partes."""
+    return (
+        checkpoint.get('versao') == CHECKPOINT_VERSION
+        and checkpoint.get('etag') == etag
+        and checkpoint.get('version_id') == version_id
+        and checkpoint.get('tamanho') == size
+        and checkpoint.get('max_rows') == split_config['max_rows']
+        and checkpoint.get('max_bytes') == split_config['max_bytes']
+    )
+
+
+def load_checkpoint(s3_client, bucket, checkpoint_key):
+    """
+    Lê o checkpoint do S3.
+
+    Returns:
+        dict: Checkpoint, ou None se não existir
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=checkpoint_key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    checkpoint = json.loads(response['Body'].read())
+    # Chaves JSON são strings: índices das partes voltam para int
+    checkpoint['partes'] = {int(index): part for index, part in checkpoint.get('partes', {}).items()}
+    return checkpoint
+
+
+def save_checkpoint(s3_client, bucket, checkpoint_key, checkpoint, stage):
+    """
+    Grava o checkpoint no S3, registrando a etapa interrompida.
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket (str): Bucket do arquivo de origem
+        checkpoint_key (str): Chave retornada por build_checkpoint_key
+        checkpoint (dict): Checkpoint com as partes concluídas
+        stage (str): Etapa interrompida pelo prazo da invocação
+    """
+    document = dict(checkpoint, etapa=stage, atualizado_em=datetime.datetime.now().isoformat())
+    s3_client.put_object(
+        Bucket=bucket, Key=checkpoint_key, ContentType='application/json',
+        Body=json.dumps(document, ensure_ascii=False).encode('utf-8')
+    )
+
+
+def delete_checkpoint(s3_client, bucket, checkpoint_key):
+    """Remove o checkpoint após a conclusão do envio."""
+    s3_client.delete_object(Bucket=bucket, Key=checkpoint_key)
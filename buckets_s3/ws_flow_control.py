@@ -0,0 +1,450 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+MB = 1024 * 1024
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+# Erros de conexão em que a requisição não chegou a ser processada pelo servidor (seguros para repetir
+# apenas antes do envio completo da requisição; ver RetryPolicy.is_retryable_error)
+RETRYABLE_ERRORS = (ConnectionRefusedError, ConnectionResetError, BrokenPipeError)
+
+
+class EndpointUnavailableError(Exception):
+    """
+    O webservice não recebe novas requisições no momento (circuito aberto ou limite de
+    concorrência esgotado): o arquivo deve ser adiado, sem aguardar o timeout.
+
+    Args:
+        message (str): Descrição do motivo
+        retry_after (float): Tempo sugerido em segundos até uma nova tentativa
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LocalTransferError(IOError):
+    """
+    Falha local durante o envio (ex: leitura da origem interrompida ou tamanho divergente do anunciado):
+    não indica problema no webservice e não reduz o limite de concorrência nem conta para o circuit breaker.
+    """
+
+
+class LocalCoordinationBackend:
+    """
+    Estado mantido apenas no container (compartilhado entre as threads da invocação e entre
+    invocações do mesmo container).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, name):
+        """Retorna o estado atual (dict ou None), sem alterá-lo."""
+        with self._lock:
+            return self._states.get(name)
+
+    def update(self, name, function):
+        """
+        Aplica function ao estado atual de forma atômica.
+
+        Args:
+            name (str): Nome do estado (ex: host do webservice)
+            function: Recebe o estado atual (dict ou None) e retorna (novo estado, resultado)
+
+        Returns:
+            Resultado retornado por function
+        """
+        with self._lock:
+            state, result = function(self._states.get(name))
+            self._states[name] = state
+            return result
+
+
+class FileLockCoordinationBackend:
+    """
+    Estado em um arquivo JSON local, protegido por flock: compartilhado entre processos da mesma
+    máquina (testes locais, benchmarks) ou entre containers com um sistema de arquivos comum (EFS).
+
+    Args:
+        path (str): Caminho do arquivo de estado (o lock usa path + '.lock')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as state_file:
+                return json.load(state_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, states):
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as state_file:
+            json.dump(states, state_file)
+        os.replace(temporary_path, self.path)
+
+    def get(self, name):
+        return self._read().get(name)
+
+    def update(self, name, function):
+        import fcntl
+        with self._lock, open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                states = self._read()
+                state, result = function(states.get(name))
+                states[name] = state
+                self._write(states)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DynamoDBCoordinationBackend:
+    """
+    Estado compartilhado entre todos os containers em uma tabela DynamoDB (chave de partição 'id',
+    String). Cada atualização é condicional à versão lida (controle otimista de concorrência).
+
+    Args:
+        table_name (str): Nome da tabela DynamoDB
+        client: Cliente boto3 do DynamoDB (criado sob demanda se não informado)
+        max_conflicts (int): Tentativas quando outra invocação atualiza o estado ao mesmo tempo
+    """
+
+    def __init__(self, table_name, client=None, max_conflicts=20):
+        self.table_name = table_name
+        self.max_conflicts = max_conflicts
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from aws_clients import get_client
+            self._client = get_client('dynamodb')
+        return self._client
+
+    def get(self, name):
+        item = self.client.get_item(TableName=self.table_name, Key={'id': {'S': name}}, ConsistentRead=True).get('Item')
+        return json.loads(item['state']['S']) if item else None
+
+    def update(self, name, function):
+        for _ in range(self.max_conflicts):
+            item = self.client.get_item(
+                TableName=self.table_name, Key={'id': {'S': name}}, ConsistentRead=True
+            ).get('Item')
+            version = int(item['version']['N']) if item else 0
+            state, result = function(json.loads(item['state']['S']) if item else None)
+            try:
+                self.client.put_item(
+                    TableName=self.table_name,
+                    Item={'id': {'S': name}, 'state': {'S': json.dumps(state)}, 'version': {'N': str(version + 1)}},
+                    ConditionExpression='attribute_not_exists(id) OR version = :version',
+                    ExpressionAttributeValues={':version': {'N': str(version)}}
+                )
+                return result
+            except self.client.exceptions.ConditionalCheckFailedException:
+                time.sleep(random.uniform(0.01, 0.05))
+        raise RuntimeError(f"Conflitos sucessivos ao atualizar o estado {name} no DynamoDB")
+
+
+class Lease:
+    """Vaga de concorrência obtida em EndpointFlowControl.acquire."""
+
+    __slots__ = ('lease_id', 'probe', 'started')
+
+    def __init__(self, lease_id, probe, started):
+        self.lease_id = lease_id
+        self.probe = probe
+        self.started = started
+
+
+class EndpointFlowControl:
+    """
+    Limite de concorrência adaptativo (AIMD) e circuit breaker para as requisições a um endpoint,
+    com o estado compartilhado por um backend de coordenação entre as invocações.
+
+    Limite: cada requisição ocupa uma vaga (com expiração, caso a invocação seja interrompida).
+    Respostas rápidas aumentam o limite em 1/limite (aditivo, +1 a cada "janela" de requisições);
+    respostas 5xx, timeouts, erros de conexão ou latência acima de latency_tolerance vezes a
+    referência reduzem o limite pelo fator decrease_factor (multiplicativo, no máximo uma vez por
+    decrease_cooldown). A latência é normalizada por MB enviado, e a referência acompanha o menor
+    valor observado.
+
+    Circuit breaker: após failure_threshold falhas seguidas o circuito abre e as requisições falham
+    imediatamente por open_seconds; depois uma única requisição de teste é liberada, que fecha o
+    circuito se tiver sucesso ou o reabre se falhar.
+
+    Args:
+        backend: LocalCoordinationBackend, FileLockCoordinationBackend, DynamoDBCoordinationBackend ou compatível
+        name (str): Nome do estado compartilhado (ex: host do webservice)
+        initial_limit (float): Limite de concorrência inicial
+        min_limit (int): Limite mínimo
+        max_limit (int): Limite máximo
+        decrease_factor (float): Fator aplicado ao limite na sobrecarga
+        decrease_cooldown (float): Intervalo mínimo em segundos entre reduções
+        latency_tolerance (float): Múltiplo da latência de referência considerado sobrecarga
+        failure_threshold (int): Falhas seguidas que abrem o circuito
+        open_seconds (float): Tempo em segundos com o circuito aberto
+        max_wait (float): Tempo máximo em segundos aguardando uma vaga antes de adiar o arquivo
+        lease_ttl (float): Expiração de uma vaga em segundos (maior que o timeout da requisição)
+        clock: Relógio de parede compartilhado entre os containers (padrão: time.time)
+        sleep: Espera entre as tentativas de obter uma vaga (padrão: time.sleep)
+    """
+
+    def __init__(self, backend, name, initial_limit=4, min_limit=1, max_limit=32, decrease_factor=0.5,
+                 decrease_cooldown=5.0, latency_tolerance=2.0, failure_threshold=5, open_seconds=60.0,
+                 max_wait=30.0, lease_ttl=900.0, clock=time.time, sleep=time.sleep):
+        self.backend = backend
+        self.name = name
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.latency_tolerance = latency_tolerance
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_wait = max_wait
+        self.lease_ttl = lease_ttl
+        self._clock = clock
+        self._sleep = sleep
+
+    def _initial_state(self):
+        return {
+            'limit': float(self.initial_limit), 'leases': {}, 'baseline': None, 'last_decrease': 0.0,
+            'breaker': BREAKER_CLOSED, 'failures': 0, 'opened_at': 0.0, 'probe': None
+        }
+
+    def _try_acquire(self, state, now):
+        """Tenta ocupar uma vaga. Resultado: (Lease, None), (None, 'busy'), (None, 'probe') ou (None, segundos até reabrir)."""
+        state = state or self._initial_state()
+        state['leases'] = {lease_id: expires for lease_id, expires in state['leases'].items() if expires > now}
+
+        if state['breaker'] == BREAKER_OPEN:
+            remaining = state['opened_at'] + self.open_seconds - now
+            if remaining > 0:
+                return state, (None, remaining)
+            state['breaker'] = BREAKER_HALF_OPEN
+            state['probe'] = None
+
+        lease_id = uuid.uuid4().hex
+        if state['breaker'] == BREAKER_HALF_OPEN:
+            # Apenas uma requisição de teste por vez enquanto o circuito está semiaberto
+            if state['probe'] in state['leases']:
+                return state, (None, 'probe')
+            state['probe'] = lease_id
+        elif len(state['leases']) >= int(state['limit']):
+            return state, (None, 'busy')
+
+        state['leases'][lease_id] = now + self.lease_ttl
+        return state, (Lease(lease_id, probe=state['probe'] == lease_id, started=now), None)
+
+    def check(self):
+        """
+        Falha imediatamente se o circuito estiver aberto (ex: antes de ler o arquivo do S3).
+
+        Raises:
+            EndpointUnavailableError: Circuito aberto
+        """
+        state = self.backend.get(self.name)
+        if state is None or state['breaker'] != BREAKER_OPEN:
+            return
+        remaining = state['opened_at'] + self.open_seconds - self._clock()
+        if remaining > 0:
+            raise EndpointUnavailableError(
+                f"Circuito aberto para {self.name}: requisições suspensas por {remaining:.0f}s", retry_after=remaining
+            )
+
+    def acquire(self, max_wait=None):
+        """
+        Ocupa uma vaga de concorrência, aguardando (com jitter) até max_wait segundos.
+
+        Args:
+            max_wait (float): Espera máxima desta chamada (padrão: max_wait do limite)
+
+        Returns:
+            Lease: Vaga a ser devolvida com release
+
+        Raises:
+            EndpointUnavailableError: Circuito aberto ou nenhuma vaga liberada dentro de max_wait
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = self._clock() + max_wait
+        delay = 0.05
+        while True:
+            lease, reason = self.backend.update(self.name, lambda state: self._try_acquire(state, self._clock()))
+            if lease is not None:
+                return lease
+            if reason == 'probe':
+                raise EndpointUnavailableError(
+                    f"Circuito semiaberto para {self.name}: requisição de teste em andamento",
+                    retry_after=self.open_seconds
+                )
+            if reason != 'busy':
+                raise EndpointUnavailableError(
+                    f"Circuito aberto para {self.name}: requisições suspensas por {reason:.0f}s", retry_after=reason
+                )
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                raise EndpointUnavailableError(
+                    f"Limite de concorrência de {self.name} esgotado após {max_wait:g}s de espera",
+                    retry_after=max_wait
+                )
+            self._sleep(min(remaining, random.uniform(delay / 2, delay)))
+            delay = min(delay * 2, 1.0)
+
+    def _apply_release(self, state, lease, success, latency, size, now):
+        state = state or self._initial_state()
+        state['leases'].pop(lease.lease_id, None)
+        if success is None:
+            # Falha do próprio arquivo (ex: validação): não indica nada sobre o endpoint
+            if state.get('probe') == lease.lease_id:
+                state['probe'] = None
+            return state, None
+
+        overloaded = not success
+        if success and latency is not None:
+            normalized = latency / max(1.0, (size or 0) / MB)
+            baseline = state['baseline']
+            if baseline is not None and normalized > baseline * self.latency_tolerance:
+                overloaded = True
+            if baseline is None or normalized < baseline:
+                state['baseline'] = normalized
+            else:
+                # A referência sobe lentamente, para acompanhar mudanças permanentes do servidor
+                state['baseline'] = baseline + (normalized - baseline) * 0.02
+
+        if overloaded:
+            if now - state['last_decrease'] >= self.decrease_cooldown:
+                state['limit'] = max(float(self.min_limit), state['limit'] * self.decrease_factor)
+                state['last_decrease'] = now
+        else:
+            state['limit'] = min(float(self.max_limit), state['limit'] + 1.0 / state['limit'])
+
+        if success:
+            state['failures'] = 0
+            if state['breaker'] != BREAKER_CLOSED:
+                state['breaker'] = BREAKER_CLOSED
+                state['probe'] = None
+        else:
+            state['failures'] += 1
+            if state['breaker'] == BREAKER_HALF_OPEN or state['failures'] >= self.failure_threshold:
+                state['breaker'] = BREAKER_OPEN
+                state['opened_at'] = now
+                state['probe'] = None
+        return state, {'limit': state['limit'], 'breaker': state['breaker']}
+
+    def release(self, lease, success, size=None):
+        """
+        Devolve a vaga e ajusta o limite e o circuito conforme o resultado da requisição.
+
+        Args:
+            lease (Lease): Vaga obtida em acquire
+            success (bool): True para resposta bem-sucedida, False para 5xx, timeout ou erro de
+                            conexão, None para falhas que não dependem do endpoint
+            size (int): Bytes enviados, para normalizar a latência
+
+        Returns:
+            dict: Limite e estado do circuito após a atualização (None se success for None)
+        """
+        now = self._clock()
+        return self.backend.update(
+            self.name, lambda state: self._apply_release(state, lease, success, now - lease.started, size, now)
+        )
+
+
+class RetryPolicy:
+    """
+    Repetição com backoff exponencial e jitter completo para erros transitórios.
+
+    Args:
+        max_attempts (int): Tentativas no total (1 = sem repetição)
+        base_delay (float): Espera base em segundos
+        max_delay (float): Espera máxima em segundos
+        retry_statuses (set): Status HTTP repetidos (apenas os que indicam requisição não processada)
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, retry_statuses=(503,)):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+
+    def delay(self, attempt):
+        """Espera antes da tentativa seguinte a attempt (jitter completo)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def is_retryable_error(self, error):
+        """
+        Erros de conexão são repetidos somente se ocorreram antes do envio completo da requisição;
+        depois dele (atributo request_sent, ex: conexão encerrada aguardando a resposta) o webservice
+        pode ter processado o arquivo.
+        """
+        return isinstance(error, RETRYABLE_ERRORS) and not getattr(error, 'request_sent', False)
+
+
+def call_with_retry(function, policy, on_retry=None, sleep=time.sleep):
+    """
+    Executa function(attempt) repetindo erros transitórios e respostas com status em
+    policy.retry_statuses. function deve retornar (status HTTP, corpo).
+
+    Args:
+        function: Função que recebe o número da tentativa (a partir de 1)
+        policy (RetryPolicy): Política de repetição
+        on_retry: Chamada com (tentativa, motivo, espera) antes de cada repetição
+
+    Returns:
+        Resultado da última tentativa
+    """
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            result = function(attempt)
+        except Exception as error:
+            if attempt == policy.max_attempts or not policy.is_retryable_error(error):
+                raise
+            reason = f"{type(error).__name__}: {error}"
+        else:
+            if attempt == policy.max_attempts or result[0] not in policy.retry_statuses:
+                return result
+            reason = f"HTTP {result[0]}"
+        wait = policy.delay(attempt)
+        if on_retry is not None:
+            on_retry(attempt, reason, wait)
+        sleep(wait)
+
+
+def create_flow_control(backend_name, name, table_name=None, path=None, **options):
+    """
+    Cria o EndpointFlowControl para o backend de coordenação configurado.
+
+    Args:
+        backend_name (str): 'dynamodb', 'file' ou 'local' (apenas o container)
+        name (str): Nome do estado compartilhado (ex: host do webservice)
+        table_name (str): Tabela DynamoDB (backend 'dynamodb')
+        path (str): Arquivo de estado (backend 'file')
+        **options: Parâmetros de EndpointFlowControl
+    """
+    if backend_name == 'dynamodb':
+        if not table_name:
+            raise ValueError("WS_FLOW_CONTROL_TABLE é obrigatório para o backend dynamodb")
+        backend = DynamoDBCoordinationBackend(table_name)
+    elif backend_name == 'file':
+        backend = FileLockCoordinationBackend(path or '/tmp/ws_flow_control.json')
+    elif backend_name == 'local':
+        backend = LocalCoordinationBackend()
+    else:
+        raise ValueError(f"Backend de coordenação desconhecido: {backend_name}")
+    return EndpointFlowControl(backend, name, **options)
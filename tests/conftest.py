@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos dos Lambdas são importados diretamente da pasta buckets_s3 (como no pacote de deploy)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'buckets_s3'))
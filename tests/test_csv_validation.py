@@ -0,0 +1,126 @@
+import io
+
+import pytest
+
+from csv_validation import CsvValidationError, CsvValidator, ValidatingStream, preflight
+
+
+class SlowPathValidator(CsvValidator):
+    """Validador sem o caminho rápido (regex): todas as linhas são validadas individualmente."""
+
+    def _check_header(self, record):
+        super()._check_header(record)
+        self._valid_lines_pattern = None
+
+
+def validate(validator_class, content, chunk_size, **options):
+    validator = validator_class(**options)
+    for start in range(0, len(content), chunk_size):
+        validator.feed(content[start:start + chunk_size])
+    validator.finish()
+    return validator
+
+
+def outcome(validator):
+    return validator.rows, validator.errors, validator.samples, validator.fatal
+
+
+CASES = {
+    'valido': b'id;nome;valor\n1;ana;10\n2;bia;20\n3;caio;30\n',
+    'sem_quebra_final': b'id;nome;valor\n1;ana;10\n2;bia;20',
+    'crlf': b'id;nome;valor\r\n1;ana;10\r\n2;bia;20\r\n',
+    'aspas': b'id;nome;valor\n1;"Silva, Ana";10\n2;"O ""Bia""";20\n3;caio;30\n',
+    'separador_entre_aspas': b'id;nome;valor\n1;"Silva; Ana";10\n2;bia;20\n3;"a;b;c";30\n',
+    'quebra_entre_aspas': b'id;nome;valor\n1;"linha 1\nlinha 2";10\n2;bia;20\n3;"x\r\ny\nz";30\n4;davi;40\n',
+    'colunas_erradas': b'id;nome;valor\n1;ana;10\n2;bia\n3;caio;30;extra\n4;davi;40\n;;\n',
+    'codificacao_invalida': b'id;nome;valor\n1;ana;10\n2;b\xe9a;20\n3;caio;30\n4;\xff\xfe;40\n',
+    'linhas_vazias': b'id;nome;valor\n1;ana;10\n\n2;bia;20\n\n',
+    'aspas_nao_fechadas': b'id;nome;valor\n1;ana;10\n2;"bia;20\n3;caio;30\n',
+    'utf8_multibyte': 'id;nome;valor\n1;João;10\n2;Conceição;20\n3;Ação;30\n'.encode('utf-8'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 1 << 20])
+def test_fast_and_slow_paths_agree(name, chunk_size):
+    content = CASES[name]
+
+    fast = validate(CsvValidator, content, chunk_size, min_rows=0)
+    slow = validate(SlowPathValidator, content, len(content) or 1, min_rows=0)
+
+    assert outcome(fast) == outcome(slow)
+
+
+def test_fast_path_is_used_without_rules():
+    validator = CsvValidator()
+    validator.feed(b'id;nome;valor\n')
+    assert validator._valid_lines_pattern is not None
+    assert CsvValidator(rules={'valor': 'int'})._valid_lines_pattern is None
+
+
+def test_expected_outcomes():
+    assert outcome(validate(CsvValidator, CASES['valido'], 5))[:2] == (3, 0)
+    assert outcome(validate(CsvValidator, CASES['quebra_entre_aspas'], 5))[:2] == (4, 0)
+    rows, errors, samples, _ = outcome(validate(CsvValidator, CASES['colunas_erradas'], 5))
+    assert (rows, errors) == (5, 2)
+    assert samples == [(3, '2 colunas (esperado 3)'), (4, '4 colunas (esperado 3)')]
+    rows, errors, samples, _ = outcome(validate(CsvValidator, CASES['codificacao_invalida'], 5))
+    assert (rows, errors) == (4, 2)
+    assert [line for line, _ in samples] == [3, 5]
+
+
+def test_wrong_delimiter_is_fatal():
+    validator = validate(CsvValidator, b'id,nome,valor\n1,ana,10\n', 64)
+    assert 'Delimitador inválido' in validator.fatal
+
+
+def test_column_rules():
+    validator = validate(
+        CsvValidator, b'id;cpf;nascimento\n1;12345678901;2000-01-31\n2;123;2000-02-30\n', 64,
+        rules={'cpf': r'\d{11}', 'nascimento': 'date'}
+    )
+    assert (validator.rows, validator.errors) == (2, 1)
+    assert 'coluna cpf inválida' in validator.samples[0][1]
+
+
+class ChunkedStream(io.BytesIO):
+    """Stream que devolve no máximo chunk bytes por leitura (como a leitura do S3)."""
+
+    def __init__(self, data, chunk):
+        super().__init__(data)
+        self.chunk = chunk
+
+    def read(self, size=-1):
+        return super().read(self.chunk if size is None or size < 0 else min(size, self.chunk))
+
+
+@pytest.mark.parametrize('name', ['valido', 'aspas', 'quebra_entre_aspas', 'utf8_multibyte'])
+def test_validating_stream_passes_bytes_through(name):
+    content = CASES[name]
+    validator = CsvValidator()
+    stream = ValidatingStream(ChunkedStream(content, 5), validator)
+
+    received = b''.join(iter(lambda: stream.read(4), b''))
+
+    assert received == content
+    assert validator.errors == 0
+
+
+def test_preflight_returns_complete_content():
+    content = b'id;nome;valor\n' + b''.join(f"{i};nome {i};{i}\n".encode() for i in range(500))
+    validator = CsvValidator()
+
+    stream = preflight(ChunkedStream(content, 1000), validator, max_rows=100, chunk_size=256)
+
+    assert validator.rows >= 100
+    assert b''.join(iter(lambda: stream.read(300), b'')) == content
+    assert validator.rows == 500
+
+
+def test_validating_stream_interrupts_above_error_rate():
+    content = b'id;nome;valor\n' + b'1;ana\n' * 200
+    stream = ValidatingStream(io.BytesIO(content), CsvValidator(max_error_rate=0.01, min_rows=100))
+
+    with pytest.raises(CsvValidationError, match='linhas inválidas'):
+        while stream.read(64):
+            pass
@@ -0,0 +1,171 @@
+import pytest
+from moto import mock_aws
+
+import aws_clients
+import idempotency_store
+from idempotency_store import (
+    DynamoDBIdempotencyBackend, IdempotencyStore, SQLiteIdempotencyBackend, build_idempotency_key,
+    create_idempotency_store
+)
+
+ITEM = 'bucket-in/voxis/carga.csv@etag-1'
+RESULT = {'status': 'Sucesso', 'protocolo': '2025000123'}
+
+
+class FakeTime:
+    """Relógio controlado pelo teste (substitui o módulo time de idempotency_store)."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(idempotency_store, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def dynamodb_backend(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        monkeypatch.setattr(aws_clients, '_clients', {})
+        aws_clients.get_client('dynamodb').create_table(
+            TableName='idempotencia',
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        yield DynamoDBIdempotencyBackend('idempotencia')
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def store(request, clock, tmp_path):
+    if request.param == 'memory':
+        return IdempotencyStore()
+    if request.param == 'sqlite':
+        return IdempotencyStore(SQLiteIdempotencyBackend(str(tmp_path / 'idempotency.sqlite3')))
+    return IdempotencyStore(request.getfixturevalue('dynamodb_backend'))
+
+
+def test_build_idempotency_key_prefers_version_id():
+    assert build_idempotency_key('bucket-in', 'voxis/carga.csv', '"etag-1"') == ITEM
+    assert build_idempotency_key('bucket-in', 'voxis/carga.csv', 'etag-1', 'v2') == 'bucket-in/voxis/carga.csv@v2'
+    assert build_idempotency_key('bucket-in', 'voxis/carga.csv') is None
+
+
+def test_claim_then_complete(store):
+    assert store.claim(ITEM, ttl=900)
+    assert store.get_completed(ITEM) is None
+
+    store.complete(ITEM, RESULT, ttl=86400)
+
+    assert store.get_completed(ITEM) == RESULT
+    assert store.get_unknown(ITEM) is None
+    assert not store.claim(ITEM, ttl=900)
+
+
+def test_second_claim_while_in_progress_is_refused(store):
+    assert store.claim(ITEM, ttl=900)
+    assert not store.claim(ITEM, ttl=900)
+    assert store.claim('bucket-in/voxis/outro.csv@etag-2', ttl=900)
+
+
+def test_release_allows_a_new_claim(store):
+    assert store.claim(ITEM, ttl=900)
+
+    store.release(ITEM)
+
+    assert store.claim(ITEM, ttl=900)
+
+
+def test_unknown_outcome_keeps_the_claim(store):
+    assert store.claim(ITEM, ttl=900)
+
+    store.mark_unknown(ITEM, {'status': 'Resultado desconhecido', 'protocolo': 'N/A'}, ttl=86400)
+
+    assert store.get_unknown(ITEM) == {'status': 'Resultado desconhecido', 'protocolo': 'N/A'}
+    assert store.get_completed(ITEM) is None
+    assert not store.claim(ITEM, ttl=900)
+
+
+def test_claim_expires_after_ttl(store, clock):
+    assert store.claim(ITEM, ttl=900)
+
+    clock.now += 899
+    assert not store.claim(ITEM, ttl=900)
+    # Invocação interrompida sem liberar a reserva: outra invocação assume após o TTL
+    clock.now += 2
+    assert store.claim(ITEM, ttl=900)
+
+
+@pytest.mark.parametrize('backend_name', ['sqlite', 'dynamodb'])
+def test_completed_result_is_shared_through_the_backend(backend_name, clock, tmp_path, request):
+    if backend_name == 'sqlite':
+        path = str(tmp_path / 'idempotency.sqlite3')
+        first, second = SQLiteIdempotencyBackend(path), SQLiteIdempotencyBackend(path)
+    else:
+        first = second = request.getfixturevalue('dynamodb_backend')
+    # Dois containers: caches separados, mesmo backend
+    container_a, container_b = IdempotencyStore(first), IdempotencyStore(second)
+
+    assert container_a.claim(ITEM, ttl=900)
+    assert not container_b.claim(ITEM, ttl=900)
+    container_a.complete(ITEM, RESULT, ttl=86400)
+
+    assert container_b.get_completed(ITEM) == RESULT
+
+
+def test_cache_entries_expire_after_cache_ttl(clock, tmp_path):
+    backend = SQLiteIdempotencyBackend(str(tmp_path / 'idempotency.sqlite3'))
+    store = IdempotencyStore(backend, cache_ttl=60)
+    store.complete(ITEM, RESULT, ttl=86400)
+    # Registro removido do backend (ex: conferência manual): o cache ainda responde até cache_ttl
+    backend.delete(ITEM)
+    assert store.get_completed(ITEM) == RESULT
+
+    clock.now += 61
+
+    assert store.get_completed(ITEM) is None
+
+
+def test_cache_evicts_least_recently_used(clock):
+    store = IdempotencyStore(cache_size=2)
+    store.complete('a', {'protocolo': 'A'}, ttl=86400)
+    store.complete('b', {'protocolo': 'B'}, ttl=86400)
+    assert store.get_completed('a') == {'protocolo': 'A'}
+
+    store.complete('c', {'protocolo': 'C'}, ttl=86400)
+
+    assert store.get_completed('b') is None
+    assert store.get_completed('a') == {'protocolo': 'A'}
+    assert store.get_completed('c') == {'protocolo': 'C'}
+
+
+def test_dynamodb_conditional_write_and_expired_item(dynamodb_backend, clock):
+    record = {'status': idempotency_store.STATUS_IN_PROGRESS, 'result': None, 'expires_at': clock.now + 900}
+
+    assert dynamodb_backend.put_if_absent(ITEM, record)
+    assert not dynamodb_backend.put_if_absent(ITEM, record)
+
+    # Item expirado ainda presente na tabela (o TTL do DynamoDB remove com atraso): ignorado e substituído
+    clock.now += 901
+    assert dynamodb_backend.get(ITEM) is None
+    assert dynamodb_backend.put_if_absent(ITEM, dict(record, expires_at=clock.now + 900))
+
+
+def test_create_idempotency_store_validates_backend(tmp_path):
+    assert create_idempotency_store('memory').backend is None
+    assert isinstance(
+        create_idempotency_store('sqlite', sqlite_path=str(tmp_path / 'i.sqlite3')).backend, SQLiteIdempotencyBackend
+    )
+    with pytest.raises(ValueError):
+        create_idempotency_store('dynamodb')
+    with pytest.raises(ValueError):
+        create_idempotency_store('redis')
@@ -0,0 +1,116 @@
+import io
+import json
+import tracemalloc
+
+import lambda_metrics
+from lambda_metrics import MAX_METRICS_PER_DIRECTIVE, InvocationMetrics
+
+
+def emitted_document(metrics):
+    stream = io.StringIO()
+    metrics._stream = stream
+    metrics.emit()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+def test_emf_document_declares_every_metric():
+    metrics = InvocationMetrics('LambdaIntegration', 's3_csv_to_api_soap', request_id='req-1')
+    with metrics.stage('s3_read'):
+        pass
+    with metrics.stage('s3_read'):
+        pass
+    metrics.add('S3.BytesRead', 1024, lambda_metrics.UNIT_BYTES)
+    metrics.add('S3.BytesRead', 1024, lambda_metrics.UNIT_BYTES)
+    metrics.set_property('Arquivo', 'pasta/arquivo.csv')
+
+    document = emitted_document(metrics)
+
+    aws = document['_aws']
+    assert isinstance(aws['Timestamp'], int)
+    assert len(aws['CloudWatchMetrics']) == 1
+    directive = aws['CloudWatchMetrics'][0]
+    assert directive['Namespace'] == 'LambdaIntegration'
+    assert directive['Dimensions'] == [['FunctionName']]
+    assert {metric['Name']: metric['Unit'] for metric in directive['Metrics']} == {
+        'Invocation.Duration': 'Milliseconds',
+        'S3.BytesRead': 'Bytes',
+        's3_read.Count': 'Count',
+        's3_read.Duration': 'Milliseconds'
+    }
+    # Cada métrica declarada (e a dimensão) precisa de um valor no nível raiz do documento
+    for metric in directive['Metrics']:
+        assert isinstance(document[metric['Name']], (int, float))
+    assert document['FunctionName'] == 's3_csv_to_api_soap'
+    assert document['S3.BytesRead'] == 2048
+    assert document['s3_read.Count'] == 2
+    assert document['RequestId'] == 'req-1'
+    assert document['Arquivo'] == 'pasta/arquivo.csv'
+
+
+def test_emf_document_splits_metrics_per_directive():
+    metrics = InvocationMetrics('LambdaIntegration', 'copy')
+    for number in range(MAX_METRICS_PER_DIRECTIVE + 10):
+        metrics.add(f"Metric{number:03d}", number)
+
+    directives = emitted_document(metrics)['_aws']['CloudWatchMetrics']
+
+    assert [len(directive['Metrics']) for directive in directives] == [MAX_METRICS_PER_DIRECTIVE, 11]
+    names = [metric['Name'] for directive in directives for metric in directive['Metrics']]
+    assert len(names) == len(set(names)) == MAX_METRICS_PER_DIRECTIVE + 11
+
+
+def test_stage_memory_peak_is_per_stage():
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        metrics = InvocationMetrics('LambdaIntegration', 'copy', track_memory=True)
+        with metrics.stage('large'):
+            data = bytearray(20 * 1024 * 1024)
+            del data
+        with metrics.stage('small'):
+            data = bytearray(1024 * 1024)
+            del data
+
+        document = metrics.to_emf()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    assert document['large.PeakTracedMemory'] >= 20 * 1024 * 1024
+    assert 1024 * 1024 <= document['small.PeakTracedMemory'] < 10 * 1024 * 1024
+    units = {
+        metric['Name']: metric['Unit'] for metric in document['_aws']['CloudWatchMetrics'][0]['Metrics']
+    }
+    assert units['small.PeakTracedMemory'] == units['small.MaxRSS'] == 'Bytes'
+
+
+def test_start_invocation_disabled_by_default():
+    metrics = lambda_metrics.start_invocation('s3_csv_to_api_soap', environ={})
+    assert metrics is lambda_metrics.NULL_METRICS
+    with lambda_metrics.stage('s3_read'):
+        lambda_metrics.add('S3.BytesRead', 1)
+    assert metrics.emit() is None
+
+
+def test_start_invocation_uses_context_and_environment():
+    class Context:
+        function_name = 'saudi-voxis'
+        aws_request_id = 'req-2'
+
+    stream = io.StringIO()
+    metrics = lambda_metrics.start_invocation(
+        's3_csv_to_api_soap', Context(), environ={'METRICS_ENABLED': 'true', 'METRICS_NAMESPACE': 'Teste'},
+        stream=stream
+    )
+    try:
+        lambda_metrics.add('Files.Success', 1)
+        metrics.emit()
+    finally:
+        lambda_metrics.start_invocation('s3_csv_to_api_soap', environ={})
+
+    document = json.loads(stream.getvalue())
+    assert document['FunctionName'] == 'saudi-voxis'
+    assert document['RequestId'] == 'req-2'
+    assert document['Files.Success'] == 1
+    assert document['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'Teste'
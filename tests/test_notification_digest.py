@@ -0,0 +1,158 @@
+import threading
+
+import notification_digest
+from notification_digest import NotificationDigest, build_group
+
+
+class RecordingSender:
+    """Sender que guarda os emails enviados (no lugar do SES)."""
+
+    def __init__(self):
+        self.emails = []
+        self.sent = threading.Event()
+
+    def __call__(self, email):
+        self.emails.append(email)
+        self.sent.set()
+        return f"msg-{len(self.emails)}"
+
+
+def enqueue_copy_error(digest, key, message='AccessDenied'):
+    return digest.enqueue(
+        'noreply@empresa.com', ['ops@empresa.com'], f"Erro na cópia de {key}", f"Falha ao copiar {key}: {message}",
+        group=build_group('COPY_ERROR', 'bucket-in', key),
+        item={'arquivo': key.split('/')[-1], 'mensagem': message}
+    )
+
+
+def test_build_group_uses_file_folder():
+    assert build_group('COPY_ERROR', 'bucket-in', 'voxis/relatorio.csv.gz') == ('COPY_ERROR', 'bucket-in', 'voxis/')
+    assert build_group('COPY_ERROR', 'bucket-in', 'relatorio.csv') == ('COPY_ERROR', 'bucket-in', '')
+
+
+def test_events_in_one_window_become_one_digest_per_folder():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=0.05, sender=sender)
+
+    for name in ('a.csv', 'b.csv', 'c.csv'):
+        assert enqueue_copy_error(digest, f"voxis/{name}")
+    for name in ('d.csv', 'e.csv'):
+        assert enqueue_copy_error(digest, f"outra/{name}")
+    assert sender.emails == []
+
+    # A janela fecha na thread do timer e envia os resumos sem chamar flush
+    assert sender.sent.wait(5)
+    with digest._flush_lock:
+        pass
+    assert digest.pending() == 0
+
+    subjects = sorted(email['subject'] for email in sender.emails)
+    assert subjects == [
+        '[RESUMO] 2 notificações COPY_ERROR - s3://bucket-in/outra/',
+        '[RESUMO] 3 notificações COPY_ERROR - s3://bucket-in/voxis/'
+    ]
+    voxis = next(email for email in sender.emails if 'voxis/' in email['subject'])
+    for name in ('a.csv', 'b.csv', 'c.csv'):
+        assert name in voxis['text']
+    assert 'd.csv' not in voxis['text']
+
+
+def test_repeated_notifications_become_one_row_with_count():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=0, sender=sender)
+    for _ in range(3):
+        enqueue_copy_error(digest, 'voxis/a.csv')
+
+    summary = digest.flush()
+
+    assert summary == {'notificacoes': 3, 'emails': 1, 'enviados': 1, 'falhas': 0, 'descartados': 0}
+    assert 'a.csv | AccessDenied | 3' in sender.emails[0]['text']
+
+
+def test_single_notification_keeps_original_email():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=0, sender=sender)
+    enqueue_copy_error(digest, 'voxis/a.csv')
+
+    digest.flush()
+
+    assert [email['subject'] for email in sender.emails] == ['Erro na cópia de voxis/a.csv']
+
+
+def test_flush_sends_remaining_queued_notifications():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=60, sender=sender)
+    enqueue_copy_error(digest, 'voxis/a.csv')
+    enqueue_copy_error(digest, 'voxis/b.csv')
+    enqueue_copy_error(digest, 'outra/c.csv')
+    assert digest.pending() == 3
+
+    summary = digest.flush()
+
+    assert summary['notificacoes'] == 3
+    assert summary['emails'] == 2
+    assert summary['enviados'] == 2
+    assert digest.pending() == 0
+    # O timer da janela é cancelado: nada é reenviado depois do flush
+    assert digest._timer is None
+    assert digest.flush()['notificacoes'] == 0
+    assert len(sender.emails) == 2
+
+
+def test_flush_drops_emails_past_the_deadline():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=0, sender=sender, remaining_time=lambda: 0.5)
+    enqueue_copy_error(digest, 'voxis/a.csv')
+
+    summary = digest.flush()
+
+    assert summary['enviados'] == 0
+    assert summary['descartados'] == 1
+    assert sender.emails == []
+
+
+def test_disabled_digest_sends_immediately():
+    sender = RecordingSender()
+    digest = NotificationDigest(enabled=False, sender=sender)
+
+    assert enqueue_copy_error(digest, 'voxis/a.csv')
+
+    assert len(sender.emails) == 1
+    assert digest.pending() == 0
+
+
+def test_start_invocation_flushes_previous_queue():
+    sender = RecordingSender()
+    previous = notification_digest.start_invocation(environ={'NOTIFY_DIGEST_WINDOW_SECONDS': '0'}, sender=sender)
+    enqueue_copy_error(previous, 'voxis/a.csv')
+
+    notification_digest.start_invocation(environ={'NOTIFY_DIGEST_WINDOW_SECONDS': '0'}, sender=sender)
+
+    assert previous.pending() == 0
+    assert len(sender.emails) == 1
+
+
+def test_digest_keeps_each_file_report_link():
+    sender = RecordingSender()
+    digest = NotificationDigest(window_seconds=0, sender=sender)
+    for name in ('a', 'b'):
+        digest.enqueue(
+            'noreply@empresa.com', ['ops@empresa.com'], f"SUCESSO {name}.csv", f"Arquivo {name}.csv enviado",
+            group=build_group('SUCESSO', 'bucket-in', f"voxis/{name}.csv"),
+            item={
+                'arquivo': f"{name}.csv", 'linhas_rejeitadas': '3',
+                'relatorio_rejeicoes': f"s3://bucket-in/voxis/{name}.rejeicoes.jsonl",
+                'relatorio_rejeicoes_url': f"https://bucket-in.s3.amazonaws.com/voxis/{name}.rejeicoes.jsonl?X-Amz-Signature={name}&x=1"
+            }
+        )
+
+    digest.flush()
+
+    [email] = sender.emails
+    assert 'relatorio_rejeicoes_url' not in email['text']
+    for name in ('a', 'b'):
+        assert f"s3://bucket-in/voxis/{name}.rejeicoes.jsonl (https://bucket-in.s3.amazonaws.com/voxis/{name}" in email['text']
+        assert (
+            f'<a href="https://bucket-in.s3.amazonaws.com/voxis/{name}.rejeicoes.jsonl?X-Amz-Signature={name}&amp;x=1">'
+            f"s3://bucket-in/voxis/{name}.rejeicoes.jsonl</a>"
+        ) in email['html']
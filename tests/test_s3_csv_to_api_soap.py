@@ -0,0 +1,214 @@
+import json
+
+import pytest
+from moto import mock_aws
+
+import aws_clients
+import s3_csv_to_api_soap as soap
+from ws_flow_control import EndpointUnavailableError
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        # Clientes criados dentro do mock (o cache do container é compartilhado entre os testes)
+        monkeypatch.setattr(aws_clients, '_clients', {})
+        yield
+
+
+def s3_event(*keys):
+    return {'Records': [
+        {'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'bucket-in'}, 'object': {'key': key, 'eTag': f"etag-{key}"}}}
+        for key in keys
+    ]}
+
+
+@pytest.fixture
+def deferred_b(monkeypatch):
+    """process_record com o arquivo b.csv adiado (503) e os demais enviados."""
+    processed = []
+
+    def process_record(record):
+        processed.append(record['key'])
+        status = 503 if record['key'].endswith('b.csv') else 200
+        return {'statusCode': status, 'body': json.dumps({'status': 'Adiado' if status == 503 else 'Sucesso'})}
+
+    monkeypatch.setattr(soap, 'process_record', process_record)
+    monkeypatch.setattr(soap, 'idempotency_store', None)
+    monkeypatch.delenv('IDEMPOTENCY_BACKEND', raising=False)
+    monkeypatch.delenv('DEFERRED_QUEUE_URL', raising=False)
+    return processed
+
+
+def test_single_deferred_record_raises_for_lambda_retry(deferred_b):
+    with pytest.raises(EndpointUnavailableError):
+        soap.handle_event(s3_event('voxis/b.csv'))
+
+
+def test_multi_record_event_with_idempotency_raises(deferred_b, monkeypatch):
+    monkeypatch.setenv('IDEMPOTENCY_BACKEND', 'memory')
+
+    with pytest.raises(EndpointUnavailableError):
+        soap.handle_event(s3_event('voxis/a.csv', 'voxis/b.csv'))
+
+
+def test_multi_record_event_without_idempotency_does_not_raise(deferred_b):
+    response = soap.handle_event(s3_event('voxis/a.csv', 'voxis/b.csv'))
+
+    # Sem nova entrega do evento: a.csv, já enviado, não é retransmitido
+    results = json.loads(response['body'])['resultados']
+    assert [result['statusCode'] for result in results] == [200, 503]
+
+
+def test_multi_record_event_requeues_only_deferred_records(aws, deferred_b, monkeypatch):
+    import boto3
+    queue_url = boto3.client('sqs').create_queue(QueueName='soap-adiados')['QueueUrl']
+    monkeypatch.setenv('DEFERRED_QUEUE_URL', queue_url)
+    monkeypatch.setenv('DEFERRED_QUEUE_DELAY_SECONDS', '0')
+
+    soap.handle_event(s3_event('voxis/a.csv', 'voxis/carga 2025/b.csv'))
+
+    messages = boto3.client('sqs').receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)['Messages']
+    assert len(messages) == 1
+    # A mensagem reenfileirada é processada pelo caminho SQS como uma notificação S3
+    sqs_event = {'Records': [{'eventSource': 'aws:sqs', 'messageId': 'm1', 'body': messages[0]['Body']}]}
+    records, invalid = soap.parse_event_records(sqs_event)
+    assert invalid == []
+    assert [(record['key'], record['etag']) for record in records] == [('voxis/carga 2025/b.csv', 'etag-voxis/carga 2025/b.csv')]
+
+
+@pytest.fixture
+def split_upload(aws, monkeypatch):
+    """
+    Arquivo de 6 linhas enviado em 3 partes de 2 linhas (uma por vez), com o webservice substituído por
+    um registro das partes enviadas e o email desabilitado.
+    """
+    import boto3
+    import invocation_deadline
+
+    for name, value in {
+        'WS_URL': 'https://webservice.local/ws', 'WS_LOGIN': 'login', 'WS_PASSWORD': 'senha', 'CLIENT_CODE': '1',
+        'SPLIT_MODE': 'true', 'SPLIT_THRESHOLD_MB': '0', 'SPLIT_MAX_ROWS': '2', 'SPLIT_CONCURRENCY': '1',
+        'MOVE_PROCESSED': 'false', 'WS_MAX_ATTEMPTS': '1'
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ('IDEMPOTENCY_BACKEND', 'WS_FLOW_CONTROL_BACKEND', 'DELTA_MODE', 'CSV_VALIDATION'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(soap, 'idempotency_store', None)
+
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='bucket-in')
+    content = b'id;valor\n' + b''.join(f"{i};{i * 10}\n".encode() for i in range(6))
+    etag = s3.put_object(Bucket='bucket-in', Key='voxis/carga.csv', Body=content)['ETag'].strip('"')
+
+    state = {'sent': [], 'interrupt_after': None}
+
+    def transmit_content(open_stream, size, part_name, ws_config):
+        state['sent'].append(part_name)
+        return 200, part_name
+
+    def check(stage, needed=0.0):
+        if stage == 'split_part' and state['interrupt_after'] is not None and len(state['sent']) >= state['interrupt_after']:
+            raise invocation_deadline.DeadlineExceededError(stage)
+
+    monkeypatch.setattr(soap, 'transmit_content', transmit_content)
+    monkeypatch.setattr(soap, 'build_transmission_result', lambda status_code, response_data: {
+        'status': 'Sucesso', 'mensagem': 'Arquivo recebido', 'protocolo': f"P-{response_data}",
+        'resposta_completa': response_data
+    })
+    monkeypatch.setattr(invocation_deadline, 'check', check)
+    monkeypatch.setattr(soap, 'send_notification_email', lambda *args, **kwargs: True)
+    state.update(s3=s3, etag=etag)
+    return state
+
+
+def test_split_upload_succeeds_when_checkpoint_cleanup_fails(split_upload, monkeypatch):
+    split_upload['interrupt_after'] = 1
+    assert soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])['statusCode'] == 503
+
+    def fail_delete(*args):
+        raise RuntimeError('S3 indisponível')
+
+    monkeypatch.setattr(soap, 'delete_checkpoint', fail_delete)
+    split_upload['interrupt_after'] = None
+    response = soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])
+
+    # Todas as partes enviadas: a falha ao remover o checkpoint não transforma o envio em erro
+    assert response['statusCode'] == 200
+    assert len(split_upload['sent']) == 3
+
+
+def test_sent_file_keeps_success_when_idempotency_store_fails(split_upload, monkeypatch):
+    import idempotency_store
+
+    class FailingCompleteStore(idempotency_store.IdempotencyStore):
+        def complete(self, item_id, result, ttl):
+            raise RuntimeError('database is locked')
+
+    store = FailingCompleteStore()
+    monkeypatch.setenv('IDEMPOTENCY_BACKEND', 'memory')
+    monkeypatch.setattr(soap, 'idempotency_store', store)
+    emails = []
+    monkeypatch.setattr(soap, 'send_notification_email', lambda *args, **kwargs: emails.append(kwargs) or True)
+
+    response = soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])
+
+    assert response['statusCode'] == 200
+    assert all(not email.get('is_error') for email in emails)
+    # A reserva continua: uma reentrega do evento não retransmite o arquivo
+    assert soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])['statusCode'] == 409
+    assert len(split_upload['sent']) == 3
+
+
+def test_split_upload_resumes_from_checkpoint_without_resending_parts(split_upload):
+    s3 = split_upload['s3']
+    split_upload['interrupt_after'] = 1
+    assert soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])['statusCode'] == 503
+
+    # Prazo esgotado após a parte 1: o checkpoint registra apenas a parte concluída
+    checkpoint = json.loads(s3.get_object(Bucket='bucket-in', Key='checkpoints/voxis/carga.csv.json')['Body'].read())
+    assert len(checkpoint['partes']) == 1
+    assert len(split_upload['sent']) == 1
+
+    split_upload['interrupt_after'] = None
+    response = soap.process_file('bucket-in', 'voxis/carga.csv', split_upload['etag'])
+
+    # A invocação seguinte envia somente as partes 2 e 3 e remove o checkpoint
+    assert response['statusCode'] == 200
+    assert split_upload['sent'] == [soap.build_part_filename('carga.csv', index) for index in range(1, 4)]
+    assert s3.list_objects_v2(Bucket='bucket-in', Prefix='checkpoints/').get('KeyCount') == 0
+
+
+@pytest.mark.parametrize('session_token, configured, expected', [
+    (None, None, soap.SESSION_URL_MAX_EXPIRES),
+    (None, '86400', 86400),
+    ('token', '86400', soap.SESSION_URL_MAX_EXPIRES)
+])
+def test_rejection_report_url_expiry_is_capped_with_temporary_credentials(aws, monkeypatch, session_token, configured, expected):
+    import boto3
+
+    for name, value in {'AWS_SESSION_TOKEN': session_token, 'REJECTION_REPORT_URL_EXPIRES': configured}.items():
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    boto3.client('s3').create_bucket(Bucket='bucket-in')
+    s3 = soap.get_s3_client()
+    requested = []
+    presign = s3.generate_presigned_url
+
+    def generate_presigned_url(*args, **kwargs):
+        requested.append(kwargs['ExpiresIn'])
+        return presign(*args, **kwargs)
+
+    monkeypatch.setattr(s3, 'generate_presigned_url', generate_presigned_url)
+    result = {}
+
+    soap.attach_rejection_report('bucket-in', 'voxis/carga.csv', result, [('carga.csv', 'Linha 2: campo valor inválido')])
+
+    assert requested == [expected]
+    assert result['relatorio_rejeicoes_url'].startswith('https://')
+    assert result['relatorio_rejeicoes_url_expira'].endswith('UTC')
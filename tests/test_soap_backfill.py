@@ -0,0 +1,50 @@
+import datetime
+import json
+
+from soap_backfill import BackfillCheckpoint, run_backfill
+
+
+def build_items(*keys):
+    return [
+        {'key': key, 'etag': f"etag-{key}", 'size': 1024, 'last_modified': datetime.datetime(2025, 3, 1)}
+        for key in keys
+    ]
+
+
+def process_by_key(responses):
+    def process(bucket, key, etag):
+        response = responses[key]
+        if isinstance(response, Exception):
+            raise response
+        return {'statusCode': response, 'body': json.dumps({'status': str(response)})}
+    return process
+
+
+def test_statuses_are_counted_as_success_deferred_and_error(tmp_path):
+    checkpoint = BackfillCheckpoint(str(tmp_path / 'checkpoint.json'), 'bucket-in', 'voxis/')
+    process = process_by_key({'voxis/a.csv': 200, 'voxis/b.csv': 503, 'voxis/c.csv': 409, 'voxis/d.csv': 500})
+
+    stats = run_backfill('bucket-in', iter(build_items('voxis/a.csv', 'voxis/b.csv', 'voxis/c.csv', 'voxis/d.csv')),
+                         process, checkpoint, concurrency=2)
+
+    summary = stats.summary()
+    assert (summary['sucesso'], summary['adiados'], summary['erro']) == (1, 2, 1)
+    assert sorted(summary['falhas']) == ['voxis/b.csv', 'voxis/c.csv', 'voxis/d.csv']
+
+
+def test_unexpected_exception_counts_as_error_and_is_resent_on_resume(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    process = process_by_key({'voxis/a.csv': 200, 'voxis/b.csv': RuntimeError('falha inesperada')})
+
+    stats = run_backfill('bucket-in', iter(build_items('voxis/a.csv', 'voxis/b.csv')), process,
+                         BackfillCheckpoint(path, 'bucket-in', 'voxis/'))
+
+    summary = stats.summary()
+    assert (summary['sucesso'], summary['adiados'], summary['erro']) == (1, 0, 1)
+
+    # Retomada: apenas o arquivo sem sucesso é reenviado
+    resumed = run_backfill('bucket-in', iter(build_items('voxis/a.csv', 'voxis/b.csv')),
+                           process_by_key({'voxis/b.csv': 200}), BackfillCheckpoint(path, 'bucket-in', 'voxis/'))
+
+    assert resumed.skipped == 1
+    assert resumed.succeeded == 1
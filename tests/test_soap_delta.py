@@ -0,0 +1,185 @@
+import io
+import random
+from array import array
+
+import pytest
+from moto import mock_aws
+
+import aws_clients
+from soap_delta import DeltaTransmission, RowIndex, build_delta, build_index_key, hash64, load_index, sort_hashes
+
+HEADER = b'id;nome;valor'
+
+
+def csv_bytes(*rows, header=HEADER):
+    return b'\n'.join((header,) + rows) + b'\n'
+
+
+def delta(previous_rows, current_rows, **options):
+    previous, _ = build_delta(io.BytesIO(csv_bytes(*previous_rows)), **options)
+    output = io.BytesIO()
+    index, stats = build_delta(io.BytesIO(csv_bytes(*current_rows)), previous, output, **options)
+    return index, stats, output.getvalue()
+
+
+def test_first_send_writes_every_row():
+    output = io.BytesIO()
+    content = csv_bytes(b'1;ana;10', b'2;bia;20')
+
+    _, stats = build_delta(io.BytesIO(content), None, output)
+
+    assert stats['modo'] == 'completo'
+    assert stats['linhas_enviadas'] == 2
+    assert output.getvalue() == content
+
+
+def test_only_new_and_changed_rows_are_written():
+    _, stats, output = delta(
+        [b'1;ana;10', b'2;bia;20', b'3;caio;30', b'4;davi;40'],
+        [b'1;ana;10', b'2;bia;25', b'3;caio;30', b'5;eva;50']
+    )
+
+    assert output == csv_bytes(b'2;bia;25', b'5;eva;50')
+    assert stats == {
+        'modo': 'delta', 'linhas': 4, 'linhas_enviadas': 2, 'linhas_novas': 1,
+        'linhas_alteradas': 1, 'linhas_inalteradas': 2, 'linhas_removidas': 1
+    }
+
+
+def test_unchanged_file_writes_only_header():
+    rows = [b'1;ana;10', b'2;bia;20']
+
+    _, stats, output = delta(rows, list(reversed(rows)))
+
+    assert output == HEADER + b'\n'
+    assert stats['linhas_enviadas'] == 0
+    assert stats['linhas_inalteradas'] == 2
+
+
+def test_key_column_with_quoted_fields():
+    _, stats, output = delta(
+        [b'1;"Silva; Ana";10', b'2;bia;20'],
+        [b'1;"Silva; Ana";11', b'2;bia;20'],
+        key_column='nome'
+    )
+
+    # A chave é o campo entre aspas (com o separador dentro): a linha conta como alterada, não como nova
+    assert (stats['linhas_alteradas'], stats['linhas_novas']) == (1, 0)
+    assert output == csv_bytes(b'1;"Silva; Ana";11')
+
+
+def test_header_change_sends_complete_file():
+    previous, _ = build_delta(io.BytesIO(csv_bytes(b'1;ana;10')))
+    output = io.BytesIO()
+    content = csv_bytes(b'1;ana;10', header=b'id;nome;valor;plano')
+
+    _, stats = build_delta(io.BytesIO(content), previous, output)
+
+    assert stats['modo'] == 'completo'
+    assert output.getvalue() == content
+
+
+def test_missing_key_column_is_reported():
+    with pytest.raises(ValueError, match='DELTA_KEY_COLUMN'):
+        build_delta(io.BytesIO(csv_bytes(b'1;ana;10')), key_column='cpf')
+
+
+@pytest.mark.parametrize('count, buckets', [(0, 256), (1, 256), (1000, 256), (5000, 16)])
+def test_sort_hashes_matches_sorted(count, buckets):
+    rng = random.Random(count)
+    values = array('Q', (rng.getrandbits(64) for _ in range(count)))
+    # Extremos e repetidos
+    values.extend([0, 2 ** 64 - 1, 12345, 12345] if count else [])
+    expected = sorted(values)
+
+    sort_hashes(values, buckets)
+
+    assert list(values) == expected
+
+
+def test_row_index_round_trip():
+    index, _ = build_delta(io.BytesIO(csv_bytes(b'1;ana;10', b'2;bia;20', b'3;caio;30')), key_column='id')
+    index.metadata.update(protocolo='2025000123')
+
+    loaded = RowIndex.from_bytes(index.to_bytes())
+
+    assert list(loaded.key_hashes) == list(index.key_hashes)
+    assert list(loaded.row_hashes) == list(index.row_hashes)
+    assert loaded.header_hash == hash64(HEADER)
+    assert loaded.metadata['protocolo'] == '2025000123'
+    assert loaded.metadata['coluna_chave'] == 'id'
+    assert loaded.has_row(hash64(b'2;bia;20'))
+    assert loaded.has_key(hash64(b'3'))
+    assert not loaded.has_key(hash64(b'4'))
+
+
+@pytest.mark.parametrize('data', [b'', b'XXXX\x00\x00\x00\x00', b'SDLT\x02\x00\x00\x00{}'])
+def test_row_index_rejects_unknown_format(data):
+    assert RowIndex.from_bytes(data) is None
+
+
+def test_row_index_rejects_truncated_data():
+    index, _ = build_delta(io.BytesIO(csv_bytes(b'1;ana;10', b'2;bia;20')))
+    assert RowIndex.from_bytes(index.to_bytes()[:-8]) is None
+
+
+def test_build_index_key_removes_name_pattern():
+    assert build_index_key('voxis/benef_20250102.csv.gz', 'benef_20250102.csv', 'delta/', r'_\d{8}') == \
+        'delta/voxis/benef.csv.idx'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        monkeypatch.setattr(aws_clients, '_clients', {})
+        client = aws_clients.get_client('s3')
+        client.create_bucket(Bucket='bucket-in')
+        yield client
+
+
+def prepared(s3, tmp_path, *rows):
+    # Arquivos delta temporários na pasta do teste
+    transmission = DeltaTransmission(s3, 'bucket-in', 'voxis/benef.csv', tmp_dir=str(tmp_path))
+    transmission.prepare(io.BytesIO(csv_bytes(*rows)), 'benef.csv', size=1024)
+    return transmission
+
+
+def test_save_index_creates_then_replaces_index(s3, tmp_path):
+    first = prepared(s3, tmp_path, b'1;ana;10')
+    assert first.save_index('P1')
+
+    second = prepared(s3, tmp_path, b'1;ana;11', b'2;bia;20')
+    assert second.stats['modo'] == 'delta'
+    assert second.save_index('P2')
+
+    index, _ = load_index(s3, 'bucket-in', first.index_key)
+    assert index.metadata['protocolo'] == 'P2'
+    assert len(index) == 2
+
+
+def test_save_index_conflict_on_first_send_removes_index(s3, tmp_path):
+    # Dois envios simultâneos do primeiro arquivo: ambos leram "sem índice" (IfNoneMatch='*')
+    first = prepared(s3, tmp_path, b'1;ana;10')
+    second = prepared(s3, tmp_path, b'1;ana;10', b'2;bia;20')
+
+    assert first.save_index('P1')
+    assert not second.save_index('P2')
+
+    # Sem saber qual conteúdo o webservice recebeu por último, o índice é removido: o próximo envio é completo
+    assert load_index(s3, 'bucket-in', first.index_key) == (None, None)
+    assert prepared(s3, tmp_path, b'1;ana;10').stats['modo'] == 'completo'
+
+
+def test_save_index_conflict_with_newer_index_removes_index(s3, tmp_path):
+    prepared(s3, tmp_path, b'1;ana;10').save_index('P1')
+    # Dois envios leram o índice P1 (IfMatch no mesmo ETag); o primeiro a gravar vence
+    first = prepared(s3, tmp_path, b'1;ana;11')
+    second = prepared(s3, tmp_path, b'1;ana;12')
+
+    assert first.save_index('P2')
+    assert not second.save_index('P3')
+
+    assert load_index(s3, 'bucket-in', first.index_key) == (None, None)
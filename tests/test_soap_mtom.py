@@ -0,0 +1,69 @@
+import pytest
+
+import s3_csv_to_api_soap as soap
+from soap_mtom import is_mtom_rejected
+
+
+def soap_fault(message):
+    return (
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><soap:Fault>'
+        f'<faultcode>soap:Client</faultcode><faultstring>{message}</faultstring>'
+        '</soap:Fault></soap:Body></soap:Envelope>'
+    )
+
+
+@pytest.mark.parametrize('status_code, response_data', [
+    (415, ''),
+    (400, soap_fault('Unable to resolve xop:Include reference cid:arquivo@saudi.voxis')),
+    (500, soap_fault('Content-Type multipart/related is not supported')),
+    (500, soap_fault('Unsupported Content-Type: multipart/related; type="application/xop+xml"')),
+    (400, soap_fault('MTOM não habilitado neste serviço')),
+])
+def test_format_rejections(status_code, response_data):
+    assert is_mtom_rejected(status_code, response_data)
+
+
+@pytest.mark.parametrize('status_code, response_data', [
+    (400, soap_fault('Campo cpf inválido na linha 3')),
+    (400, soap_fault('Arquivo multipart recebido com 0 linhas válidas')),
+    (500, soap_fault('Erro ao gravar o arquivo: tipo de plano (content_type) inválido na linha 12')),
+    (500, soap_fault('NullPointerException')),
+    (503, soap_fault('Unsupported Content-Type')),
+    (200, ''),
+])
+def test_other_faults_are_not_format_rejections(status_code, response_data):
+    assert not is_mtom_rejected(status_code, response_data)
+
+
+def test_plain_400_fault_is_not_resent_in_base64(monkeypatch):
+    ws_config = {'transfer_mode': 'mtom', 'url': 'https://webservice.local/ws-400'}
+    sent = []
+
+    def transmit_file(body_stream, file_size, filename, ws_config, transfer_mode='base64'):
+        sent.append(transfer_mode)
+        return 400, soap_fault('Campo cpf inválido na linha 3')
+
+    monkeypatch.setattr(soap, 'transmit_file', transmit_file)
+    monkeypatch.setattr(soap, 'mtom_rejected_endpoints', set())
+
+    status_code, _ = soap.transmit_content(lambda: None, 10, 'carga.csv', ws_config)
+
+    assert status_code == 400
+    assert sent == ['mtom']
+    assert ws_config['url'] not in soap.mtom_rejected_endpoints
+
+
+def test_format_rejection_falls_back_to_base64(monkeypatch):
+    ws_config = {'transfer_mode': 'mtom', 'url': 'https://webservice.local/ws-415'}
+    sent = []
+
+    def transmit_file(body_stream, file_size, filename, ws_config, transfer_mode='base64'):
+        sent.append(transfer_mode)
+        return (415, '') if transfer_mode == 'mtom' else (200, 'ok')
+
+    monkeypatch.setattr(soap, 'transmit_file', transmit_file)
+    monkeypatch.setattr(soap, 'mtom_rejected_endpoints', set())
+
+    assert soap.transmit_content(lambda: None, 10, 'carga.csv', ws_config) == (200, 'ok')
+    assert soap.transmit_content(lambda: None, 10, 'carga.csv', ws_config) == (200, 'ok')
+    assert sent == ['mtom', 'base64', 'base64']
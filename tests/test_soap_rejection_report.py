@@ -0,0 +1,19 @@
+from soap_rejection_report import build_report_key, is_report_key
+
+
+def test_report_key_strips_only_supported_suffix():
+    assert build_report_key('pasta/arquivo.csv') == 'pasta/arquivo.rejeicoes.jsonl'
+    assert build_report_key('pasta/carga.2025.03.csv.gz') == 'pasta/carga.2025.03.rejeicoes.jsonl'
+    assert build_report_key('pasta/CARGA.CSV.ZST', 'csv') == 'pasta/CARGA.rejeicoes.csv'
+    assert build_report_key('arquivo.v2.zip') == 'arquivo.v2.rejeicoes.jsonl'
+
+
+def test_files_differing_after_first_dot_get_distinct_reports():
+    assert build_report_key('pasta/carga.2025.03.csv') != build_report_key('pasta/carga.2025.04.csv')
+
+
+def test_report_key_with_prefix_and_marker():
+    key = build_report_key('voxis/carga.parte1.csv', prefix='relatorios/')
+    assert key == 'relatorios/carga.parte1.rejeicoes.jsonl'
+    assert is_report_key(key)
+    assert not is_report_key('voxis/carga.parte1.csv')
@@ -0,0 +1,119 @@
+import io
+import json
+import logging
+
+import pytest
+
+import structured_logging
+from structured_logging import RECORD_OVERHEAD, TRUNCATION_MARKER, InvocationLogBudget, truncate
+
+
+@pytest.fixture
+def capture():
+    """Logger isolado com o formato JSON e o limite de volume instalados por configure."""
+    logger = logging.getLogger('test_structured_logging')
+    logger.propagate = False
+    logger.handlers = []
+    stream = io.StringIO()
+
+    def setup(**environ):
+        logger.handlers = []
+        budget = structured_logging.configure(logger, environ=dict(environ, LOG_LEVEL='DEBUG'), stream=stream)
+        return budget
+
+    def lines():
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield logger, setup, lines
+    logger.handlers = []
+
+
+def test_byte_budget_drops_info_and_keeps_warnings_in_reserve(capture):
+    logger, setup, lines = capture
+    # Orçamento para três registros INFO de 13 caracteres; reserva para um WARNING de 10
+    budget = setup(
+        LOG_MAX_INVOCATION_BYTES=str(3 * (RECORD_OVERHEAD + 13)), LOG_ERROR_RESERVE_BYTES=str(RECORD_OVERHEAD + 10)
+    )
+
+    for number in range(5):
+        logger.info("registro %04d", number)
+    logger.warning("aviso 0001")
+    logger.error("erro 000001")
+
+    messages = [line['message'] for line in lines()]
+    assert messages == ['registro 0000', 'registro 0001', 'registro 0002', 'aviso 0001']
+    summary = budget.summary()
+    assert summary['registros'] == 4
+    assert summary['descartados_orcamento'] == 3
+    assert summary['bytes'] == 3 * (RECORD_OVERHEAD + 13) + RECORD_OVERHEAD + 10
+
+
+def test_budget_reset_between_invocations(capture):
+    logger, setup, lines = capture
+    setup(LOG_MAX_INVOCATION_BYTES=str(RECORD_OVERHEAD + 20))
+
+    logger.info("primeira invocação")
+    logger.info("descartado")
+    structured_logging.start_invocation()
+    logger.info("segunda invocação")
+
+    assert [line['message'] for line in lines()] == ['primeira invocação', 'segunda invocação']
+
+
+def test_long_argument_truncated_with_marker(capture):
+    logger, setup, lines = capture
+    budget = setup(LOG_MAX_FIELD_CHARS='50')
+
+    logger.info("Resposta completa: %s", 'x' * 200)
+    logger.info("Corpo: %s", b'y' * 80)
+
+    # O argumento é limitado antes da formatação e a mensagem formatada, de novo, a max_field_chars
+    first, second = [line['message'] for line in lines()]
+    assert first == truncate('Resposta completa: ' + 'x' * 50 + TRUNCATION_MARKER.format(150), 50)
+    assert second == truncate('Corpo: ' + 'y' * 50 + TRUNCATION_MARKER.format(30), 50)
+    assert first.endswith(TRUNCATION_MARKER.format(len('Resposta completa: ') + len(TRUNCATION_MARKER.format(150))))
+    assert budget.summary()['truncados'] == 2
+
+
+def test_long_message_truncated_with_marker(capture):
+    logger, setup, lines = capture
+    setup(LOG_MAX_FIELD_CHARS='20')
+
+    logger.info("%s-%s-%s", 'a' * 10, 'b' * 10, 'c' * 10)
+
+    assert lines()[0]['message'] == 'a' * 10 + '-' + 'b' * 9 + TRUNCATION_MARKER.format(12)
+
+
+def test_invalid_format_does_not_raise_at_call_site(capture):
+    logger, setup, lines = capture
+    setup()
+
+    logger.info("Arquivo %s enviado em %d s", 'a.csv')
+    logger.info("Sem argumentos: 100%")
+
+    first, second = [line['message'] for line in lines()]
+    assert first == "Arquivo %s enviado em %d s ('a.csv',)"
+    assert second == 'Sem argumentos: 100%'
+
+
+def test_dict_arguments_are_formatted(capture):
+    logger, setup, lines = capture
+    setup(LOG_MAX_FIELD_CHARS='80')
+
+    logger.info("%(arquivo)s: %(linhas)d linhas", {'arquivo': 'beneficiarios.csv', 'linhas': 3})
+
+    assert lines()[0]['message'] == 'beneficiarios.csv: 3 linhas'
+
+
+def test_sampling_keeps_first_and_every_nth():
+    budget = InvocationLogBudget(sample_first=2, sample_every=3)
+    records = [
+        logging.LogRecord('test', logging.INFO, __file__, 1, "linha %d", (number,), None) for number in range(10)
+    ]
+    for record in records:
+        record.sample_key = 'copy_record'
+
+    kept = [record.msg for record in records if budget.filter(record)]
+
+    assert kept == ['linha 0', 'linha 1', 'linha 4', 'linha 7']
+    assert budget.summary()['descartados_amostragem'] == 6
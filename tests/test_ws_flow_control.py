@@ -0,0 +1,229 @@
+import pytest
+
+from ws_flow_control import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, EndpointFlowControl, EndpointUnavailableError,
+    FileLockCoordinationBackend, LocalTransferError, RetryPolicy, call_with_retry, create_flow_control
+)
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    """Relógio controlado pelo teste; sleep avança o relógio em vez de esperar."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def flow(tmp_path, clock):
+    def create(**options):
+        options = {'initial_limit': 2, 'max_wait': 0, 'decrease_cooldown': 5.0, 'failure_threshold': 3,
+                   'open_seconds': 60.0, **options}
+        return EndpointFlowControl(
+            FileLockCoordinationBackend(str(tmp_path / 'ws_flow_control.json')), 'webservice.local',
+            clock=clock, sleep=clock.sleep, **options
+        )
+    return create
+
+
+def state(control):
+    return control.backend.get(control.name)
+
+
+def request(control, clock, success=True, seconds=0.1, size=MB):
+    lease = control.acquire()
+    clock.now += seconds
+    return control.release(lease, success, size)
+
+
+def test_limit_blocks_requests_beyond_concurrency(flow):
+    control = flow(initial_limit=2)
+    control.acquire()
+    control.acquire()
+
+    with pytest.raises(EndpointUnavailableError, match='Limite de concorrência'):
+        control.acquire()
+
+
+def test_waiting_request_gets_lease_released_by_another_process(flow, tmp_path, clock):
+    control = flow(initial_limit=1)
+    lease = control.acquire()
+    # Outro processo com o mesmo arquivo de estado devolve a vaga
+    other = flow(initial_limit=1)
+    other.release(lease, True, MB)
+
+    assert control.acquire() is not None
+
+
+def test_leases_expire_after_lease_ttl(flow, clock):
+    control = flow(initial_limit=1, lease_ttl=900)
+    control.acquire()
+
+    clock.now += 901
+
+    assert control.acquire() is not None
+
+
+def test_additive_increase_on_fast_responses(flow, clock):
+    control = flow(initial_limit=2, max_limit=3)
+
+    assert request(control, clock)['limit'] == pytest.approx(2.5)
+    assert request(control, clock)['limit'] == pytest.approx(2.9)
+    assert request(control, clock)['limit'] == pytest.approx(3.0)
+
+
+def test_multiplicative_decrease_with_cooldown(flow, clock):
+    control = flow(initial_limit=8, failure_threshold=100)
+
+    assert request(control, clock, success=False)['limit'] == 4
+    # Dentro do cooldown, uma nova falha não reduz novamente
+    clock.now += 1
+    assert request(control, clock, success=False)['limit'] == 4
+    clock.now += 5
+    assert request(control, clock, success=False)['limit'] == 2
+
+
+def test_slow_response_per_mb_reduces_limit(flow, clock):
+    control = flow(initial_limit=8, latency_tolerance=2.0)
+    request(control, clock, seconds=1.0, size=10 * MB)
+
+    # 0,1 s/MB de referência: 5 MB em 2 s (0,4 s/MB) é sobrecarga
+    assert request(control, clock, seconds=2.0, size=5 * MB)['limit'] == pytest.approx((8 + 1 / 8) / 2)
+
+
+def test_local_failures_do_not_change_limit_or_breaker(flow, clock):
+    control = flow(initial_limit=2, failure_threshold=1)
+    lease = control.acquire()
+
+    assert control.release(lease, None) is None
+
+    assert state(control)['limit'] == 2
+    assert state(control)['breaker'] == BREAKER_CLOSED
+    assert state(control)['leases'] == {}
+
+
+def test_breaker_opens_half_opens_and_closes(flow, clock):
+    control = flow(failure_threshold=3, open_seconds=60)
+    for _ in range(3):
+        request(control, clock, success=False)
+    assert state(control)['breaker'] == BREAKER_OPEN
+
+    with pytest.raises(EndpointUnavailableError, match='Circuito aberto'):
+        control.check()
+    with pytest.raises(EndpointUnavailableError, match='Circuito aberto'):
+        control.acquire()
+
+    clock.now += 61
+    control.check()
+    probe = control.acquire()
+    assert probe.probe
+    assert state(control)['breaker'] == BREAKER_HALF_OPEN
+    # Apenas uma requisição de teste por vez
+    with pytest.raises(EndpointUnavailableError, match='semiaberto'):
+        control.acquire()
+
+    assert control.release(probe, True, MB)['breaker'] == BREAKER_CLOSED
+    assert control.acquire() is not None
+
+
+def test_failed_probe_reopens_breaker(flow, clock):
+    control = flow(failure_threshold=1, open_seconds=60)
+    request(control, clock, success=False)
+    clock.now += 61
+
+    probe = control.acquire()
+    assert control.release(probe, False, MB)['breaker'] == BREAKER_OPEN
+
+    with pytest.raises(EndpointUnavailableError):
+        control.check()
+
+
+def test_create_flow_control_file_backend(tmp_path):
+    control = create_flow_control('file', 'webservice.local', path=str(tmp_path / 'state.json'), initial_limit=1)
+    assert isinstance(control.backend, FileLockCoordinationBackend)
+    with pytest.raises(ValueError):
+        create_flow_control('dynamodb', 'webservice.local')
+
+
+def sent_error(error):
+    error.request_sent = True
+    return error
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (ConnectionResetError('reset'), True),
+    (ConnectionRefusedError('refused'), True),
+    (BrokenPipeError('broken pipe'), True),
+    (sent_error(ConnectionResetError('reset aguardando resposta')), False),
+    (sent_error(BrokenPipeError('broken pipe')), False),
+    (TimeoutError('timeout'), False),
+    (LocalTransferError('leitura do S3 interrompida'), False),
+])
+def test_retryable_errors(error, retryable):
+    assert RetryPolicy().is_retryable_error(error) is retryable
+
+
+def test_call_with_retry_repeats_retry_statuses(clock):
+    responses = iter([(503, 'indisponível'), (503, 'indisponível'), (200, 'ok')])
+    retries = []
+
+    result = call_with_retry(
+        lambda attempt: next(responses), RetryPolicy(max_attempts=3, retry_statuses=(503,)),
+        on_retry=lambda attempt, reason, wait: retries.append((attempt, reason)), sleep=clock.sleep
+    )
+
+    assert result == (200, 'ok')
+    assert retries == [(1, 'HTTP 503'), (2, 'HTTP 503')]
+
+
+def test_call_with_retry_returns_last_response_after_max_attempts(clock):
+    calls = []
+
+    result = call_with_retry(
+        lambda attempt: calls.append(attempt) or (503, 'indisponível'), RetryPolicy(max_attempts=2), sleep=clock.sleep
+    )
+
+    assert result == (503, 'indisponível')
+    assert calls == [1, 2]
+
+
+def test_call_with_retry_does_not_repeat_after_request_sent(clock):
+    calls = []
+
+    def send(attempt):
+        calls.append(attempt)
+        raise sent_error(ConnectionResetError('conexão encerrada aguardando a resposta'))
+
+    with pytest.raises(ConnectionResetError):
+        call_with_retry(send, RetryPolicy(max_attempts=5), sleep=clock.sleep)
+    assert calls == [1]
+
+
+def test_call_with_retry_repeats_connection_error_before_send(clock):
+    calls = []
+
+    def send(attempt):
+        calls.append(attempt)
+        if attempt == 1:
+            raise ConnectionRefusedError('refused')
+        return 200, 'ok'
+
+    assert call_with_retry(send, RetryPolicy(max_attempts=3), sleep=clock.sleep) == (200, 'ok')
+    assert calls == [1, 2]
+
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(0 <= policy.delay(attempt) <= min(5.0, 2 ** (attempt - 1)) for attempt in range(1, 10))